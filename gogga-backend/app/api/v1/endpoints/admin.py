@@ -6,19 +6,30 @@ Provides:
 - Live usage monitoring
 - System health details
 - API key management (add/delete)
+- Batch language detection (analytics, reconciliation, imports)
+- Local legislation index sync and stats
 
 SECURITY (Dec 2025 Audit):
 - All endpoints require admin authentication
 - Use X-Admin-Secret header or admin JWT
 """
+import asyncio
 import os
 import re
+import time
 from pathlib import Path
 
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from app.config import settings
 from app.services.cerebras_key_rotator import get_key_rotator, reset_rotator
+from app.services.credit_reservations import get_credit_reservations
+from app.services.document_cache import get_document_cache
+from app.services.entitlement_cache import get_entitlement_cache
+from app.services.language_batch import get_batch_language_detector
+from app.services.legal_corpus import get_legal_corpus
+from app.services.usage_ledger import get_usage_ledger
 from app.core.security import require_admin
 
 
@@ -60,6 +71,18 @@ class DeleteKeyRequest(BaseModel):
     name: str
 
 
+class LanguageBatchRequest(BaseModel):
+    """Texts to label with their language."""
+    texts: list[str] = Field(..., min_length=1, max_length=settings.LANGUAGE_BATCH_MAX_TEXTS)
+
+
+class LanguageBatchResponse(BaseModel):
+    """Detection results, one per input text, in input order."""
+    results: list[dict]
+    count: int
+    elapsed_ms: float
+
+
 @router.get("/cerebras/keys", response_model=KeyRotationStats)
 async def get_cerebras_key_stats(admin: bool = Depends(require_admin)):
     """
@@ -234,3 +257,64 @@ async def delete_cerebras_key(request: DeleteKeyRequest, _: str = Depends(requir
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete key: {str(e)}")
+
+
+@router.post("/language/detect-batch", response_model=LanguageBatchResponse)
+async def detect_language_batch(request: LanguageBatchRequest, _: str = Depends(require_admin)):
+    """
+    Detect the language of many texts at once.
+    
+    Runs on the batch worker pool (off the event loop), without the
+    per-conversation session state used on the chat path.
+    Requires admin authentication.
+    """
+    start = time.perf_counter()
+    results = await asyncio.to_thread(get_batch_language_detector().detect, request.texts)
+    return LanguageBatchResponse(
+        results=[r.to_dict() for r in results],
+        count=len(results),
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 1),
+    )
+
+
+@router.post("/legal/corpus/sync")
+async def sync_legal_corpus(_: str = Depends(require_admin)):
+    """
+    Re-index changed files in the legislation corpus now.
+    
+    Only files whose size, mtime or content changed are re-indexed.
+    Requires admin authentication.
+    """
+    corpus = get_legal_corpus()
+    counts = await corpus.sync_async()
+    return {**counts, **corpus.get_stats()}
+
+
+@router.get("/legal/corpus/stats")
+async def get_legal_corpus_stats(_: str = Depends(require_admin)):
+    """Legislation index size and local answer rate. Requires admin authentication."""
+    return await asyncio.to_thread(get_legal_corpus().get_stats)
+
+
+@router.get("/documents/cache/stats")
+async def get_document_cache_stats(_: str = Depends(require_admin)):
+    """Parsed-document cache size, hit rate and evictions. Requires admin authentication."""
+    return await asyncio.to_thread(get_document_cache().get_stats)
+
+
+@router.get("/usage/ledger/stats")
+async def get_usage_ledger_stats(_: str = Depends(require_admin)):
+    """Pending, shipped and replayed usage records. Requires admin authentication."""
+    return get_usage_ledger().get_stats()
+
+
+@router.get("/entitlements/cache/stats")
+async def get_entitlement_cache_stats(_: str = Depends(require_admin)):
+    """Subscription/credit lookup hit rate, coalescing and stale serves. Requires admin authentication."""
+    return get_entitlement_cache().get_stats()
+
+
+@router.get("/credits/reservations/stats")
+async def get_credit_reservation_stats(_: str = Depends(require_admin)):
+    """Held chat credits and settlements awaiting the frontend. Requires admin authentication."""
+    return get_credit_reservations().get_stats()
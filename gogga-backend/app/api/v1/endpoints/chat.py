@@ -7,17 +7,31 @@ JIGGA Tier: Cerebras Qwen 3 235B (thinking or /no_think)
 
 Universal: Prompt enhancement via Qwen 3 235B FREE (all tiers)
 """
+import json
 import logging
-from typing import Any
+import re
+import uuid
+from typing import Any, AsyncIterator
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
+from app.config import settings
 from app.models.domain import ChatRequest, ChatResponse
 from app.services.ai_service import ai_service
+from app.services.chat_preflight import ChatPreflight, run_chat_preflight
+from app.services.credit_reservations import estimate_chat_units, get_credit_reservations
+from app.services.cost_tracker import track_usage
+from app.services.conversation_store import (
+    get_conversation_store,
+    ConversationOwnershipError,
+    ConversationVersionConflict,
+)
+from app.services.long_doc_qa import get_long_doc_qa
 from app.services.openrouter_service import openrouter_service
 from app.services.posthog_service import posthog_service
-from app.services.subscription_service import subscription_service
+from app.services.stream_replay import GenerationStream, get_stream_registry, parse_last_event_id
 from app.core.router import CognitiveLayer, UserTier, tier_router, is_image_prompt
 from app.core.exceptions import InferenceError
 
@@ -25,6 +39,18 @@ from app.core.exceptions import InferenceError
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+# Reasoning tags that can leak into streamed content events at block boundaries
+_REASONING_TAG_PATTERN = re.compile(r"</?(?:think|thinking|reflection|plan)>", re.IGNORECASE)
+
+# Layer reported (and priced) for map-reduce answers over long documents
+LONG_DOCUMENT_LAYER = "long_document"
+
+SSE_HEADERS: dict[str, str] = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Disable nginx buffering
+}
+
 
 class TieredChatRequest(BaseModel):
     """Extended chat request with tier support."""
@@ -42,6 +68,117 @@ class TieredChatRequest(BaseModel):
     detected_language_confidence: float = Field(default=0.0, description="Confidence of frontend language detection")
     # Raw user message for language detection (without context injection)
     raw_user_message: str | None = Field(default=None, description="Original user message before context was added - use for language detection")
+    # Server-side conversation state: omit history and send only the new message
+    conversation_id: str | None = Field(default=None, max_length=128, description="Conversation ID for server-side history")
+    conversation_version: int | None = Field(default=None, ge=0, description="Last conversation version returned by the server")
+
+
+async def _resolve_history(
+    request: TieredChatRequest,
+) -> tuple[list[dict[str, str]] | None, int | None]:
+    """Reconstruct history from the conversation store for delta requests.
+    
+    Requests without a conversation_id use the client-supplied history as before.
+    On version mismatch the client gets a 409 and resends with the full history.
+    
+    Returns:
+        Tuple of (history, base_version); pass base_version to _commit_conversation
+    """
+    if not request.conversation_id:
+        return request.history, None
+    
+    try:
+        return await get_conversation_store().resolve_history(
+            conversation_id=request.conversation_id,
+            user_id=request.user_id,
+            client_version=request.conversation_version,
+            history=request.history,
+        )
+    except ConversationOwnershipError as e:
+        raise HTTPException(status_code=403, detail=e.message)
+    except ConversationVersionConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": e.message,
+                "conversation_id": e.conversation_id,
+                "server_version": e.server_version,
+            },
+        )
+
+
+async def _commit_conversation(
+    request: TieredChatRequest,
+    history: list[dict[str, str]] | None,
+    assistant_message: str,
+    base_version: int | None = None,
+) -> int | None:
+    """Store the completed turn. Returns the new version, or None if not tracked.
+    
+    The commit only succeeds if the conversation is still at base_version, so
+    a concurrent turn is never silently overwritten.
+    """
+    if not request.conversation_id:
+        return None
+    try:
+        return await get_conversation_store().commit_turn(
+            conversation_id=request.conversation_id,
+            user_id=request.user_id,
+            history=history or [],
+            user_message=request.message,
+            assistant_message=assistant_message,
+            base_version=base_version,
+        )
+    except Exception as e:
+        # Never fail a delivered answer because state could not be saved;
+        # the client falls back to full history on the next turn.
+        logger.warning("Conversation commit failed for %s: %s", request.conversation_id, e)
+        return None
+
+
+async def _stream_with_conversation(
+    events: AsyncIterator[str],
+    request: TieredChatRequest,
+    history: list[dict[str, str]] | None,
+    base_version: int | None = None,
+) -> AsyncIterator[str]:
+    """Pass SSE events through and commit the turn once the stream completes.
+    
+    Emits a final `conversation` event with the new version for delta requests.
+    """
+    content_parts: list[str] = []
+    failed = False
+    
+    async for event in events:
+        yield event
+        if not request.conversation_id:
+            continue
+        for line in event.splitlines():
+            if not line.startswith("data:"):
+                continue
+            try:
+                payload = json.loads(line[len("data:"):])
+            except ValueError:
+                continue
+            if not isinstance(payload, dict):
+                continue
+            if payload.get("type") == "content":
+                content_parts.append(str(payload.get("content") or ""))
+            elif payload.get("type") == "error":
+                failed = True
+    
+    if not request.conversation_id or failed or not content_parts:
+        return
+    
+    answer = _REASONING_TAG_PATTERN.sub("", "".join(content_parts)).strip()
+    version = await _commit_conversation(request, history, answer, base_version)
+    if version is not None:
+        conversation_event = {
+            "type": "conversation",
+            "conversation_id": request.conversation_id,
+            "version": version,
+        }
+        yield f"data: {json.dumps(conversation_event)}\n\n"
 
 
 @router.post("", response_model=ChatResponse)
@@ -72,65 +209,64 @@ async def chat(request: TieredChatRequest) -> ChatResponse:
                 detail="This looks like an image request. Use /api/v1/images/generate instead."
             )
         
-        # BACKEND ENFORCEMENT: Verify subscription and determine effective tier
-        effective_tier = request.user_tier
-        if request.user_email and request.user_tier != UserTier.FREE:
-            sub_status = await subscription_service.verify_subscription(
-                user_email=request.user_email,
-                requested_tier=request.user_tier,
-            )
-            effective_tier = sub_status.effective_tier
-            
-            # Log if tier was downgraded due to credits
-            if effective_tier != request.user_tier:
-                logger.info(
-                    "Tier enforcement: %s → %s (credits: %d, status: %s)",
-                    request.user_tier.value, effective_tier.value,
-                    sub_status.credits_available, sub_status.status
-                )
+        # Oversized messages: paid tiers map-reduce the whole text below; the
+        # truncated copy is what the model sees on the fallback, so preflight on that
+        is_long = len(request.message) > settings.LONG_DOC_THRESHOLD_CHARS
+        message = _truncate_message(request.message) if is_long else request.message
         
-        # Resolve force_layer if provided
-        force_layer = _resolve_force_layer(request.force_layer, effective_tier)
+        # Delta requests: history comes from the conversation store
+        base_version: int | None = None
         
-        # Truncate oversized messages to fit context window (65k tokens ≈ 50k chars safely)
-        MAX_MESSAGE_CHARS = 50000
-        message = request.message
-        if len(message) > MAX_MESSAGE_CHARS:
-            logger.warning(
-                "Message too long (%d chars), truncating to %d for user %s",
-                len(message), MAX_MESSAGE_CHARS, request.user_id
-            )
-            # Try to preserve the instruction and truncate the data
-            lines = message.split('\n')
-            # Keep first 5 lines (usually instructions) and last line
-            header_lines = lines[:5]
-            # Find data lines and limit them
-            truncated = '\n'.join(header_lines)
-            remaining_budget = MAX_MESSAGE_CHARS - len(truncated) - 200  # Buffer for footer
-            
-            # Add as many data lines as we can fit
-            data_lines = lines[5:]
-            current_size = 0
-            included_lines = []
-            for line in data_lines:
-                if current_size + len(line) + 1 < remaining_budget:
-                    included_lines.append(line)
-                    current_size += len(line) + 1
-                else:
-                    break
-            
-            truncated += '\n' + '\n'.join(included_lines)
-            truncated += f'\n\n[DATA TRUNCATED: Showing {len(included_lines)} of {len(data_lines)} rows. For full analysis, please send smaller datasets.]'
-            message = truncated
+        async def resolve_history() -> list[dict[str, str]] | None:
+            nonlocal base_version
+            resolved, base_version = await _resolve_history(request)
+            return resolved
         
-        result = await ai_service.generate_response(
+        # BACKEND ENFORCEMENT: Verify subscription and credits while history,
+        # plugins and intent classification run (see chat_preflight)
+        preflight = await run_chat_preflight(
             user_id=request.user_id,
             message=message,
-            history=request.history,
-            user_tier=effective_tier,  # Use verified effective tier
-            force_layer=force_layer,
-            context_tokens=request.context_tokens
+            user_tier=request.user_tier,
+            history=resolve_history(),
+            user_email=request.user_email,
+            context_tokens=request.context_tokens,
+            conversation_id=request.conversation_id,
+            # Map-reduce reads the whole document: hold enough to settle it
+            reserve_units=estimate_chat_units(request.message) if is_long else None,
         )
+        effective_tier = preflight.verified_tier
+        history = preflight.history
+        
+        # Resolve force_layer if provided
+        force_layer = _resolve_force_layer(request.force_layer, effective_tier)
+        
+        # Long documents: map-reduce over the whole text when the served tier
+        # is paid (not a paid user fallen back to FREE), else the truncated copy
+        result = None
+        if is_long:
+            try:
+                result = await _answer_long_document(request, preflight.tier, preflight)
+            except BaseException:
+                get_credit_reservations().release(preflight.reservation)
+                raise
+        
+        if result is None:
+            if is_long:
+                logger.warning(
+                    "Message too long (%d chars), truncating to %d for user %s",
+                    len(request.message), settings.LONG_DOC_THRESHOLD_CHARS, request.user_id
+                )
+            result = await ai_service.generate_response(
+                user_id=request.user_id,
+                message=message,
+                history=history,
+                user_tier=effective_tier,  # Use verified effective tier
+                force_layer=force_layer,
+                context_tokens=request.context_tokens,
+                conversation_id=request.conversation_id,
+                preflight=preflight,
+            )
         
         # Track chat event in PostHog (non-blocking)
         meta = result.get("meta", {})
@@ -146,10 +282,19 @@ async def chat(request: TieredChatRequest) -> ChatResponse:
         )
         
         # Add tier enforcement info to meta
+        meta.setdefault("preflight_ms", preflight.timings)
         meta["requested_tier"] = request.user_tier.value
         meta["effective_tier"] = effective_tier.value
         meta["tier_enforced"] = effective_tier != request.user_tier
         
+        # Commit the turn so the next request can be a delta
+        conversation_version = await _commit_conversation(request, history, result["response"], base_version)
+        if conversation_version is not None:
+            meta["conversation"] = {
+                "conversation_id": request.conversation_id,
+                "version": conversation_version,
+            }
+        
         return ChatResponse(
             response=result["response"],
             thinking=result.get("thinking"),  # JIGGA thinking block for UI
@@ -179,6 +324,97 @@ async def chat(request: TieredChatRequest) -> ChatResponse:
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
 
+def _truncate_message(message: str) -> str:
+    """Cut an oversized message to fit the context window (65k tokens ≈ 50k chars safely)."""
+    max_chars = settings.LONG_DOC_THRESHOLD_CHARS
+    # Try to preserve the instruction and truncate the data
+    lines = message.split('\n')
+    # Keep first 5 lines (usually instructions) and last line
+    header_lines = lines[:5]
+    # Find data lines and limit them
+    truncated = '\n'.join(header_lines)
+    remaining_budget = max_chars - len(truncated) - 200  # Buffer for footer
+    
+    # Add as many data lines as we can fit
+    data_lines = lines[5:]
+    current_size = 0
+    included_lines = []
+    for line in data_lines:
+        if current_size + len(line) + 1 < remaining_budget:
+            included_lines.append(line)
+            current_size += len(line) + 1
+        else:
+            break
+    
+    truncated += '\n' + '\n'.join(included_lines)
+    truncated += f'\n\n[DATA TRUNCATED: Showing {len(included_lines)} of {len(data_lines)} rows. For full analysis, please send smaller datasets.]'
+    return truncated
+
+
+async def _answer_long_document(
+    request: TieredChatRequest, tier: UserTier, preflight: ChatPreflight
+) -> dict[str, Any] | None:
+    """Answer a long message map-reduce style. None means fall back to truncation.
+    
+    FREE tier stays on the single OpenRouter call; the map calls run on Cerebras.
+    The map and reduce tokens are billed together against the preflight
+    reservation, like a generate_response turn.
+    """
+    if not settings.LONG_DOC_ENABLED or tier == UserTier.FREE:
+        return None
+    reduce_model = settings.MODEL_JIGGA_235B if tier == UserTier.JIGGA else settings.MODEL_JIVE
+    try:
+        answer = await get_long_doc_qa().answer(request.message, reduce_model=reduce_model)
+    except Exception as e:
+        logger.warning("Long document QA failed for user %s, truncating instead: %s", request.user_id, e)
+        return None
+    
+    input_tokens = sum(tokens[0] for tokens in answer.usage.values())
+    output_tokens = sum(tokens[1] for tokens in answer.usage.values())
+    cost_usd = cost_zar = 0.0
+    for model, (model_input, model_output) in answer.usage.items():
+        cost = await track_usage(
+            user_id=request.user_id,
+            model=model,
+            layer=LONG_DOCUMENT_LAYER,
+            input_tokens=model_input,
+            output_tokens=model_output,
+            tier=tier.value,
+        )
+        cost_usd += cost["usd"]
+        cost_zar += cost["zar"]
+    
+    billing = ai_service.settle_chat_usage(
+        request.user_id,
+        preflight,
+        input_tokens + output_tokens,
+        request_id=str(uuid.uuid4()),
+        model=reduce_model,
+        provider="cerebras",
+        duration_ms=round(answer.latency_seconds * 1000),
+    )
+    
+    return {
+        "response": answer.answer,
+        "thinking": answer.thinking,
+        "meta": {
+            "tier": tier.value,
+            "layer": LONG_DOCUMENT_LAYER,
+            "model": reduce_model,
+            "provider": "cerebras",
+            "latency_seconds": round(answer.latency_seconds, 3),
+            "latency_ms": round(answer.latency_seconds * 1000),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "tokens": {"input": input_tokens, "output": output_tokens},
+            "cost_usd": cost_usd,
+            "cost_zar": cost_zar,
+            "long_document": answer.coverage(),
+            "billing": billing,
+        },
+    }
+
+
 def _resolve_force_layer(
     force_layer: str | None, 
     user_tier: UserTier
@@ -255,7 +491,7 @@ async def enhance_prompt(request: EnhanceRequest) -> dict[str, Any]:
 
 
 # =========================================================================
-# STREAMING (JIVE/JIGGA Only)
+# STREAMING (All Tiers; tool streaming JIVE/JIGGA Only)
 # =========================================================================
 
 @router.post("/stream")
@@ -263,7 +499,8 @@ async def chat_stream(request: TieredChatRequest):
     """
     Stream a response using Server-Sent Events (SSE).
     
-    Only available for JIVE and JIGGA tiers - FREE tier uses standard response.
+    FREE tier streams from OpenRouter; JIVE and JIGGA stream from Cerebras.
+    All tiers emit the same event schema.
     
     SSE Event Types:
         - meta: Initial metadata (tier, layer, model)
@@ -273,17 +510,17 @@ async def chat_stream(request: TieredChatRequest):
         - thinking_end: End of JIGGA thinking block
         - done: Final metadata with usage stats and costs
         - error: Error message if something goes wrong
+        - conversation: New conversation version (only when conversation_id is sent)
     
     Returns:
-        StreamingResponse with text/event-stream content type
+        StreamingResponse with text/event-stream content type.
+        Events carry ids; reconnect via GET /chat/stream/{generation_id}.
     """
-    from fastapi.responses import StreamingResponse
-    
-    # Only JIVE and JIGGA support streaming
-    if request.user_tier == UserTier.FREE:
+    # FREE tier image prompts go to the image endpoint (same as /chat)
+    if request.user_tier == UserTier.FREE and is_image_prompt(request.message):
         raise HTTPException(
-            status_code=400, 
-            detail="Streaming not available for FREE tier. Use the standard /chat endpoint."
+            status_code=400,
+            detail="This looks like an image request. Use /api/v1/images/generate instead."
         )
     
     # Track analytics
@@ -315,27 +552,27 @@ async def chat_stream(request: TieredChatRequest):
     long_context_threshold = 100000
     append_no_think = is_jigga and request.context_tokens >= long_context_threshold
     
+    history, base_version = await _resolve_history(request)
+    
     async def event_generator():
         async for chunk in ai_service.generate_stream(
             user_id=request.user_id,
             message=request.message,
-            history=request.history,
+            history=history,
             layer=layer,
             thinking_mode=thinking_mode,
             append_no_think=append_no_think,
             raw_user_message=request.raw_user_message,  # For accurate language detection
+            conversation_id=request.conversation_id,
         ):
             yield chunk
     
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
-        }
+    # Run the generation in the background so a dropped connection can resume
+    stream = get_stream_registry().start(
+        _stream_with_conversation(event_generator(), request, history, base_version),
+        user_id=request.user_id,
     )
+    return _sse_response(stream)
 
 
 @router.post("/stream-with-tools")
@@ -354,12 +591,12 @@ async def chat_stream_with_tools(request: TieredChatRequest):
         - thinking_start/thinking/thinking_end: JIGGA thinking blocks
         - done: Final metadata with usage stats, costs, tool info
         - error: Error message if something goes wrong
+        - conversation: New conversation version (only when conversation_id is sent)
     
     Returns:
-        StreamingResponse with text/event-stream content type
+        StreamingResponse with text/event-stream content type.
+        Events carry ids; reconnect via GET /chat/stream/{generation_id}.
     """
-    from fastapi.responses import StreamingResponse
-    
     # Only JIVE and JIGGA support tool streaming
     if request.user_tier == UserTier.FREE:
         raise HTTPException(
@@ -384,31 +621,70 @@ async def chat_stream_with_tools(request: TieredChatRequest):
     # Auto /no_think for long contexts
     append_no_think = is_jigga and request.context_tokens >= 100000
     
+    history, base_version = await _resolve_history(request)
+    
     async def event_generator():
         async for chunk in ai_service.generate_response_with_tools_stream(
             user_id=request.user_id,
             message=request.message,
-            history=request.history,
+            history=history,
             layer=layer,
             thinking_mode=thinking_mode,
             append_no_think=append_no_think,
             tier=tier,
             force_tool=request.force_tool,  # ToolShed: Force specific tool
             raw_user_message=request.raw_user_message,  # For accurate language detection
+            conversation_id=request.conversation_id,
         ):
             yield chunk
     
+    # Run the generation in the background so a dropped connection can resume
+    stream = get_stream_registry().start(
+        _stream_with_conversation(event_generator(), request, history, base_version),
+        user_id=request.user_id,
+    )
+    return _sse_response(stream)
+
+
+def _sse_response(stream: GenerationStream, after_seq: int = 0) -> StreamingResponse:
+    """Subscribe an HTTP response to a replayable generation."""
     return StreamingResponse(
-        event_generator(),
+        stream.subscribe(after_seq),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+        headers={**SSE_HEADERS, "X-Generation-Id": stream.generation_id},
     )
 
 
+@router.get("/stream/{generation_id}")
+async def resume_stream(
+    generation_id: str,
+    user_id: str = "anonymous",
+    last_event_id: str | None = Header(default=None, alias="Last-Event-ID"),
+    after: int | None = None,
+):
+    """
+    Resume a dropped stream without re-running the generation.
+    
+    Replays every event after `Last-Event-ID` (or the `after` sequence number
+    for clients that cannot set headers), then follows the live tail until
+    the generation finishes. Generations stay replayable for a few minutes.
+    
+    Extra SSE Event Types:
+        - replay_gap: Some events were dropped by the replay buffer cap
+    """
+    header_generation, header_seq = parse_last_event_id(last_event_id)
+    if header_generation and header_generation != generation_id:
+        raise HTTPException(status_code=400, detail="Last-Event-ID belongs to a different generation")
+    
+    stream = get_stream_registry().get(generation_id, user_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream expired or not found. Please resend your message.")
+    
+    after_seq = after if after is not None else header_seq
+    logger.info("Resuming stream %s for user %s after event %d", generation_id[:12], user_id, after_seq)
+    return _sse_response(stream, after_seq)
+
+
 # =========================================================================
 # MODEL INFO
 # =========================================================================
@@ -0,0 +1,38 @@
+"""
+GOGGA Entitlement Cache API Endpoints
+
+Lets the frontend drop the backend's cached subscription and credit state
+after it changes a user's tier, status or balance.
+
+Endpoints:
+- POST /api/v1/entitlements/invalidate - Drop a user's cached entitlements
+
+Requires the shared INTERNAL_API_KEY (X-Internal-Key header).
+"""
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+
+from app.core.security import require_internal_key
+from app.services.entitlement_cache import get_entitlement_cache
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class InvalidateRequest(BaseModel):
+    """User whose entitlements changed (either identifier, or both)."""
+    userId: Optional[str] = Field(default=None, max_length=200)
+    email: Optional[str] = Field(default=None, max_length=320)
+
+
+@router.post("/invalidate")
+async def invalidate_entitlements(request: InvalidateRequest, _: bool = Depends(require_internal_key)):
+    """Drop cached subscription and usage state so the next request re-fetches it."""
+    if not request.userId and not request.email:
+        raise HTTPException(status_code=400, detail="userId or email is required")
+    dropped = get_entitlement_cache().invalidate_user(user_id=request.userId, email=request.email)
+    logger.debug("[EntitlementCache] Invalidated %s / %s (%d entries)", request.userId, request.email, dropped)
+    return {"success": True, "dropped": dropped}
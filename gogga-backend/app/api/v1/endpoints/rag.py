@@ -0,0 +1,164 @@
+"""
+GOGGA Document Retrieval API Endpoints
+
+Per-user document indexes for retrieval-augmented answers: upload text
+once, then fetch only the passages relevant to each question instead of
+pasting the whole document into the prompt.
+
+Endpoints:
+- POST /api/v1/rag/documents - Index a document (same doc_id replaces it)
+- GET /api/v1/rag/documents - List the user's indexed documents
+- DELETE /api/v1/rag/documents/{doc_id} - Remove a document
+- POST /api/v1/rag/search - Hybrid, keyword or semantic search
+- POST /api/v1/rag/parse - Extract text from an uploaded file (cached by content)
+- POST /api/v1/rag/documents/upload - Parse an uploaded file and index it
+"""
+import asyncio
+import logging
+from dataclasses import asdict
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Header, UploadFile
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.core.auth import get_user_id
+from app.services.document_cache import ParsedDocument, get_document_cache
+from app.services.posthog_service import posthog_service
+from app.services.rag_service import get_rag_service
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class IndexDocumentRequest(BaseModel):
+    """Document text to index."""
+    text: str = Field(..., min_length=1, max_length=settings.RAG_MAX_DOCUMENT_CHARS, description="Extracted document text")
+    title: str = Field(default="", max_length=300, description="Title used in citations")
+    doc_id: Optional[str] = Field(default=None, max_length=128, description="Document id (generated if omitted)")
+
+
+class RagSearchRequest(BaseModel):
+    """Question to answer from the user's documents."""
+    query: str = Field(..., min_length=1, max_length=2000)
+    limit: int = Field(default=5, ge=1, le=50)
+    mode: Literal["hybrid", "keyword", "semantic"] = "hybrid"
+
+
+def _require_user(user_id: Optional[str]) -> str:
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User ID required")
+    return user_id
+
+
+async def _parse_upload(file: UploadFile) -> tuple[ParsedDocument, bool]:
+    data = await file.read(settings.DOCUMENT_UPLOAD_MAX_BYTES + 1)
+    if len(data) > settings.DOCUMENT_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty file")
+    return await get_document_cache().parse_async(data, file.filename or "")
+
+
+def _parse_summary(document: ParsedDocument, cached: bool) -> dict:
+    return {
+        "sha256": document.sha256,
+        "kind": document.kind,
+        "filename": document.filename,
+        "pages": document.pages,
+        "page_offsets": document.page_offsets,
+        "language": document.language,
+        "language_confidence": document.language_confidence,
+        "classification": document.classification,
+        "token_count": document.token_count,
+        "cached": cached,
+    }
+
+
+@router.post("/parse")
+async def parse_document(
+    user_id: Annotated[Optional[str], Depends(get_user_id)],
+    file: UploadFile = File(...),
+):
+    """Extract, clean and classify an uploaded file. Repeat uploads are served from the cache."""
+    _require_user(user_id)
+    document, cached = await _parse_upload(file)
+    return {**_parse_summary(document, cached), "text": document.text}
+
+
+@router.post("/documents/upload")
+async def upload_document(
+    user_id: Annotated[Optional[str], Depends(get_user_id)],
+    file: UploadFile = File(...),
+    title: str = Form(default="", max_length=300),
+):
+    """
+    Parse an uploaded file and index it in the user's namespace.
+
+    The doc_id is derived from the content hash, so re-uploading the same
+    file neither parses nor re-indexes it.
+    """
+    user_id = _require_user(user_id)
+    document, cached = await _parse_upload(file)
+    doc_id = document.sha256[:32]
+    service = get_rag_service()
+    existing = await asyncio.to_thread(service.list_documents, user_id)
+    indexed = next((d for d in existing if d["doc_id"] == doc_id), None)
+    if indexed is None:
+        indexed = await service.add_document_async(user_id, document.text, title or document.filename, doc_id)
+    return {**_parse_summary(document, cached), "document": indexed}
+
+
+@router.post("/documents")
+async def index_document(
+    request: IndexDocumentRequest,
+    user_id: Annotated[Optional[str], Depends(get_user_id)],
+):
+    """Chunk, embed and index a document in the user's namespace."""
+    return await get_rag_service().add_document_async(
+        _require_user(user_id), request.text, request.title, request.doc_id,
+    )
+
+
+@router.get("/documents")
+async def list_documents(user_id: Annotated[Optional[str], Depends(get_user_id)]):
+    """Documents in the user's namespace."""
+    documents = await asyncio.to_thread(get_rag_service().list_documents, _require_user(user_id))
+    return {"documents": documents}
+
+
+@router.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, user_id: Annotated[Optional[str], Depends(get_user_id)]):
+    """Remove a document from the user's namespace."""
+    deleted = await asyncio.to_thread(get_rag_service().delete_document, _require_user(user_id), doc_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"deleted": doc_id}
+
+
+@router.post("/search")
+async def search_documents(
+    request: RagSearchRequest,
+    user_id: Annotated[Optional[str], Depends(get_user_id)],
+    x_user_tier: str = Header(default="FREE", alias="X-User-Tier"),
+):
+    """Rank the user's document chunks against a question."""
+    user_id = _require_user(user_id)
+    result = await get_rag_service().search_async(user_id, request.query, request.limit, request.mode)
+    await posthog_service.track_rag_query(
+        user_id=user_id,
+        tier=x_user_tier.lower(),
+        mode=request.mode,
+        doc_count=len({chunk.doc_id for chunk in result.chunks}),
+        chunk_count=len(result.chunks),
+        latency_ms=result.elapsed_ms,
+        top_score=result.chunks[0].score if result.chunks else None,
+    )
+    return {
+        "query": result.query,
+        "mode": result.mode,
+        "chunks": [asdict(chunk) for chunk in result.chunks],
+        "searched_chunks": result.searched_chunks,
+        "elapsed_ms": result.elapsed_ms,
+        "context": result.format_for_llm(),
+    }
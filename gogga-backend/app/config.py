@@ -44,13 +44,31 @@ class Settings(BaseSettings):
         description="Serper.dev API Key for Google Search"
     )
     SERPER_RATE_LIMIT: int = Field(default=100, ge=1, le=1000, description="Serper requests per minute")
-    
-    # CePO Configuration (Cerebras Planning and Optimization)
-    # Routes JIVE/JIGGA requests through 4-step planning pipeline + Best of N selection
-    CEPO_ENABLED: bool = Field(default=True, description="Enable CePO for JIVE/JIGGA tiers")
-    CEPO_BASE_URL: str = Field(default="http://cepo:8080", description="CePO sidecar URL")
-    CEPO_TIMEOUT: float = Field(default=120.0, ge=30.0, le=300.0, description="CePO request timeout (seconds)")
-    CEPO_BESTOFN_N: int = Field(default=3, ge=1, le=5, description="Best of N sample count")
+    SEARCH_CACHE_MAX_BYTES: int = Field(default=64 * 1024 * 1024, ge=1024 * 1024, description="Byte budget for cached search results (compressed)")
+    SEARCH_CACHE_SWEEP_SECONDS: float = Field(default=60.0, ge=1.0, description="Interval between expired-entry sweeps of the search cache")
+    SEARCH_SERPER_BATCH: bool = Field(default=True, description="Send multi-query fan-outs to Serper as one batch request")
+    PAGE_CACHE_MAX_BYTES: int = Field(default=32 * 1024 * 1024, ge=1024 * 1024, description="Byte budget for scraped pages cached by URL")
+    PAGE_CACHE_TTL_SECONDS: int = Field(default=3600, ge=60, description="Scraped pages are reused without revalidation for this long")
+    SCRAPE_MAX_BYTES: int = Field(default=1_500_000, ge=64 * 1024, description="Stop downloading a scraped page after this many bytes")
+    SCRAPE_EXTRACT_WORKERS: int = Field(default=0, ge=0, description="Processes for HTML extraction of large pages (0 = min(4, CPUs))")
+    SEARCH_CONTEXT_TOKENS: int = Field(default=3000, ge=256, description="Token budget for scraped passages packed into search context")
+    
+    # Long documents in /chat: map-reduce over token-bounded parts instead of line truncation
+    LONG_DOC_ENABLED: bool = Field(default=True, description="Answer long JIVE/JIGGA messages map-reduce style (FREE keeps truncation)")
+    LONG_DOC_THRESHOLD_CHARS: int = Field(default=50_000, ge=1000, description="Messages longer than this are treated as long documents")
+    LONG_DOC_CHUNK_TOKENS: int = Field(default=6000, ge=500, description="Target part size (estimated tokens) per map call")
+    LONG_DOC_MAX_CONCURRENCY: int = Field(default=8, ge=1, description="Map calls in flight across all requests")
+    LONG_DOC_MAP_MAX_TOKENS: int = Field(default=600, ge=64, description="Completion budget per map call")
+    LONG_DOC_REDUCE_MAX_TOKENS: int = Field(default=4096, ge=256, description="Completion budget for the merged answer")
+    LONG_DOC_MIN_RELATIVE_SCORE: float = Field(default=0.1, ge=0.0, le=1.0, description="Targeted questions skip parts scoring below this share of the best part")
+    
+    # Best-of-N (in-process parallel sampling, replaces the CePO sidecar)
+    # Complex JIVE/JIGGA requests sample N candidates concurrently, stop early on agreement
+    BEST_OF_N_ENABLED: bool = Field(default=True, description="Enable Best-of-N for complex JIVE/JIGGA requests")
+    BEST_OF_N_MAX: int = Field(default=3, ge=1, le=5, description="Max candidates per request")
+    BEST_OF_N_AGREEMENT: float = Field(default=0.6, ge=0.0, le=1.0, description="Similarity at which two candidates agree (early stop)")
+    BEST_OF_N_MAX_INFLIGHT: int = Field(default=24, ge=1, description="Candidate calls in flight across all requests before N shrinks")
+    BEST_OF_N_TIMEOUT: float = Field(default=120.0, ge=30.0, le=300.0, description="Best-of-N deadline (seconds)")
     
     # SIMPLIFIED MODEL ARCHITECTURE (2025-01):
     # - All tiers use Qwen models (removed Llama)
@@ -255,6 +273,23 @@ class Settings(BaseSettings):
     
     # Internal API Key (for scheduler to call frontend internal APIs)
     INTERNAL_API_KEY: str = Field(default="dev-internal-key-change-in-production")
+
+    # Usage ledger: records are logged to disk and shipped to FRONTEND_URL in the background
+    USAGE_LEDGER_DIR: str = Field(default="./data/usage_ledger", description="Write-ahead log segments of unshipped usage records")
+    USAGE_LEDGER_BATCH_SIZE: int = Field(default=200, ge=1, le=1000, description="Usage records per shipment to the frontend")
+    USAGE_LEDGER_FSYNC_INTERVAL: float = Field(default=0.05, ge=0.0, le=5.0, description="Group-commit window before fsync (seconds)")
+    USAGE_LEDGER_SHIP_INTERVAL: float = Field(default=1.0, ge=0.0, description="Wait for more records before shipping a partial batch (seconds)")
+    USAGE_LEDGER_MAX_BACKOFF: float = Field(default=60.0, ge=1.0, description="Longest retry delay while the frontend is unreachable (seconds)")
+
+    # Entitlement cache: subscription and credit lookups against FRONTEND_URL
+    ENTITLEMENT_CACHE_TTL: float = Field(default=30.0, ge=0.0, description="Serve cached subscription/credit state this long before re-fetching (seconds)")
+    ENTITLEMENT_STALE_TTL: float = Field(default=300.0, ge=0.0, description="Serve expired entries this long while the frontend is failing (seconds)")
+    ENTITLEMENT_CACHE_MAX_ENTRIES: int = Field(default=10_000, ge=1, description="Users kept in the entitlement cache (LRU)")
+
+    # Credit reservations: hold an estimate at request start, settle actuals in batches
+    CREDIT_SETTLEMENT_DIR: str = Field(default="./data/credit_settlements", description="Write-ahead log of settlements not yet applied by the frontend")
+    CREDIT_RESERVE_OUTPUT_TOKENS: int = Field(default=4000, ge=0, description="Predicted output tokens added to the input when reserving chat credits")
+    CREDIT_RESERVATION_TTL: float = Field(default=600.0, ge=1.0, description="Release holds never settled (crashed request) after this many seconds")
     
     # DeepInfra - Image Generation (FLUX 1.1 Pro)
     DEEPINFRA_API_KEY: str = Field(default="", description="DeepInfra API Key for image generation")
@@ -264,6 +299,10 @@ class Settings(BaseSettings):
     OPENROUTER_API_KEY: str = Field(default="", description="OpenRouter API Key for FREE tier and prompt enhancement")
     OPENROUTER_MODEL_QWEN: str = Field(default="qwen/qwen3-coder:free")  # FREE tier text (262k context)
     OPENROUTER_MODEL_LONGCAT: str = Field(default="openai/gpt-oss-20b:free")  # Updated to valid free model
+    OPENROUTER_FREE_FALLBACK_MODELS: list[str] = Field(
+        default=["openai/gpt-oss-20b:free"],
+        description="Free tier models tried in order when the primary model fails (JSON list in env)"
+    )
     
     # PostHog Analytics (EU region)
     POSTHOG_API_KEY: str = Field(default="", description="PostHog API Key for analytics")
@@ -271,7 +310,48 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = Field(default="sqlite:///./gogga.db")
-    
+
+    # Server-side conversation state (clients send message deltas, not full history)
+    CONVERSATION_STORE_PATH: str = Field(default="./data/conversations.db", description="SQLite file for conversation state")
+    CONVERSATION_CACHE_SIZE: int = Field(default=2048, ge=0, description="Conversations kept in the in-memory hot cache")
+    CONVERSATION_MAX_MESSAGES: int = Field(default=100, ge=2, description="Messages retained per stored conversation")
+
+    # Local SA legislation index consulted by legal_search before the web
+    LEGAL_CORPUS_INDEX_PATH: str = Field(default="./data/legal_corpus.db", description="SQLite FTS5 index of the legislation corpus")
+    LEGAL_CORPUS_DROP_DIR: str = Field(default="./data/legal_corpus", description="Extra or replacement corpus files (indexed incrementally)")
+    LEGAL_CORPUS_MIN_COVERAGE: float = Field(default=0.6, ge=0.0, le=1.0, description="Query coverage of the best local section needed to skip the web")
+    LEGAL_CORPUS_SYNC_SECONDS: float = Field(default=300.0, ge=1.0, description="Minimum interval between incremental corpus syncs")
+
+    # Per-user hybrid retrieval over uploaded documents (BM25 + int8 embeddings, memory-mapped)
+    RAG_INDEX_DIR: str = Field(default="./data/rag", description="Root directory of the per-user document indexes")
+    RAG_EMBED_MODEL: str = Field(default="BAAI/bge-small-en-v1.5", description="fastembed model (hashing embedder if empty or fastembed is missing)")
+    RAG_CHUNK_WORDS: int = Field(default=200, ge=20, description="Target chunk size in words")
+    RAG_EXACT_SCAN_CHUNKS: int = Field(default=100_000, ge=0, description="Namespaces up to this many chunks get an exact vector scan")
+    RAG_RESCORE_CANDIDATES: int = Field(default=2000, ge=10, description="Sign-bit candidates rescored exactly in larger namespaces")
+    RAG_MAX_SEGMENTS: int = Field(default=8, ge=1, description="Lexical index segments per namespace before merging")
+    RAG_OPEN_NAMESPACES: int = Field(default=64, ge=1, description="User indexes kept open")
+    RAG_MAX_DOCUMENT_CHARS: int = Field(default=5_000_000, ge=1000, description="Largest document accepted for indexing")
+
+    # Content-addressed cache of parsed uploads (text, pages, language, classification)
+    DOCUMENT_CACHE_PATH: str = Field(default="./data/document_cache.db", description="SQLite file of compressed parse results")
+    DOCUMENT_CACHE_MAX_BYTES: int = Field(default=512 * 1024 * 1024, ge=1024 * 1024, description="Disk budget for cached parses (least recently used evicted)")
+    DOCUMENT_UPLOAD_MAX_BYTES: int = Field(default=25 * 1024 * 1024, ge=1024, description="Largest uploaded file accepted for parsing")
+
+    # Resumable SSE streams (Last-Event-ID replay)
+    STREAM_REPLAY_BUFFER_BYTES: int = Field(default=512_000, ge=16_384, description="Replay buffer cap per generation (bytes)")
+    STREAM_REPLAY_TTL_SECONDS: float = Field(default=300.0, ge=10.0, description="How long finished generations stay replayable")
+    STREAM_DISCONNECT_GRACE_SECONDS: float = Field(default=60.0, ge=0.0, description="Keep generating this long after the client disconnects")
+
+    # Batch language detection (analytics, reconciliation, document imports)
+    LANGUAGE_BATCH_WORKERS: int = Field(default=0, ge=0, description="Worker processes for batch language detection (0 = CPU count)")
+    LANGUAGE_BATCH_CHUNK_SIZE: int = Field(default=1000, ge=10, description="Texts sent to a worker per task")
+    LANGUAGE_BATCH_MAX_TEXTS: int = Field(default=100_000, ge=1, description="Max texts per batch detection request")
+
+    # Tool result cache (in-process LRU in front of optional shared Redis)
+    TOOL_CACHE_REDIS_URL: str = Field(default="", description="Redis URL for the shared tool result tier (empty = in-process only)")
+    TOOL_CACHE_MAX_ENTRIES: int = Field(default=2048, ge=0, description="Tool results kept in the in-process LRU")
+    TOOL_CACHE_TTL_SECONDS: int = Field(default=300, ge=1, description="Default tool result TTL (per-tool overrides in tool_result_cache)")
+
     @field_validator("CEREBRAS_API_KEY")
     @classmethod
     def validate_api_key(cls, v: str) -> str:
@@ -5,11 +5,13 @@ Determines whether user queries require math tool processing.
 Routes queries to appropriate math tools based on intent classification.
 """
 
-from typing import Literal, Optional
+from typing import Final, Literal, Optional
 from dataclasses import dataclass
 import re
 from enum import Enum
 
+from app.core.text_features import extract_features, register_vocabulary
+
 
 class MathCategory(str, Enum):
     """Categories of math-related queries"""
@@ -93,6 +95,15 @@ CALC_PATTERNS = [
     r"how much\s+(?:is|will|would)",
 ]
 
+# Compiled once: any explicit calculation request
+CALC_REGEX: Final[re.Pattern] = re.compile("|".join(f"(?:{p})" for p in CALC_PATTERNS))
+
+# Comma-separated numeric data ("12, 15, 18")
+NUMBER_LIST_REGEX: Final[re.Pattern] = re.compile(r'\d+(?:\.\d+)?(?:\s*,\s*\d+(?:\.\d+)?)+')
+
+for _category_name, _keywords in MATH_KEYWORDS.items():
+    register_vocabulary(f"math.{_category_name}", _keywords)
+
 
 def _get_tool_for_category(category: MathCategory) -> Optional[str]:
     """Map category to tool name."""
@@ -119,15 +130,15 @@ def classify_math_intent(message: str) -> MathIntent:
         MathIntent with classification details including category,
         confidence score, tool name, and whether data is required
     """
-    message_lower = message.lower()
+    features = extract_features(message)
     
     # Track best match
     best_category = MathCategory.NONE
     best_confidence = 0.0
     
-    # Check each category for keyword matches
-    for category_name, keywords in MATH_KEYWORDS.items():
-        matches = sum(1 for kw in keywords if kw in message_lower)
+    # Check each category for keyword matches (shared single-pass scan)
+    for category_name in MATH_KEYWORDS:
+        matches = len(features.matched(f"math.{category_name}"))
         if matches > 0:
             # Calculate confidence based on keyword density
             # Max out at 3 matches = 1.0 confidence
@@ -137,19 +148,17 @@ def classify_math_intent(message: str) -> MathIntent:
                 best_confidence = confidence
     
     # Boost confidence for explicit calculation requests
-    for pattern in CALC_PATTERNS:
-        if re.search(pattern, message_lower):
-            if best_category == MathCategory.NONE:
-                # Default to statistics for generic calc requests
-                best_category = MathCategory.STATISTICS
-                best_confidence = 0.5
-            else:
-                # Boost existing confidence
-                best_confidence = min(best_confidence + 0.2, 1.0)
-            break
+    if features.search(CALC_REGEX):
+        if best_category == MathCategory.NONE:
+            # Default to statistics for generic calc requests
+            best_category = MathCategory.STATISTICS
+            best_confidence = 0.5
+        else:
+            # Boost existing confidence
+            best_confidence = min(best_confidence + 0.2, 1.0)
     
     # Check for numeric data presence (comma-separated numbers)
-    has_numbers = bool(re.search(r'\d+(?:\.\d+)?(?:\s*,\s*\d+(?:\.\d+)?)+', message))
+    has_numbers = bool(NUMBER_LIST_REGEX.search(message))
     
     # Determine if data is required
     requires_data = (
@@ -19,6 +19,8 @@ SIMPLIFIED ARCHITECTURE (2025-01):
 PERFORMANCE NOTE (Dec 2025):
 - Uses Aho-Corasick automaton for O(n) pattern matching across all keyword sets
 - ~10x faster than previous O(n*m) approach with multiple frozenset iterations
+- Keyword sets live in the shared text feature automaton (core/text_features.py),
+  so routing, math, document and planning classifiers share ONE scan per message
 """
 from enum import Enum
 from functools import lru_cache
@@ -29,6 +31,7 @@ import logging
 from app.models.domain import ChatRequest
 
 from app.config import settings
+from app.core.text_features import extract_features, register_vocabulary
 
 logger = logging.getLogger(__name__)
 
@@ -36,13 +39,10 @@ logger = logging.getLogger(__name__)
 if sys.version_info >= (3, 14) and hasattr(sys, '_experimental_jit'):
     sys._experimental_jit = 1  # Enable tier 1 JIT for routing hot paths
 
-# Try to import Aho-Corasick for O(n) pattern matching
-# Falls back to standard O(n*m) iteration if not available
-try:
-    import ahocorasick
-    AHOCORASICK_AVAILABLE = True
-except ImportError:
-    AHOCORASICK_AVAILABLE = False
+# Aho-Corasick availability (the automaton itself lives in core/text_features.py)
+from app.core.text_features import AHOCORASICK_AVAILABLE
+
+if not AHOCORASICK_AVAILABLE:
     logger.warning("pyahocorasick not installed - using slower O(n*m) pattern matching")
 
 
@@ -332,82 +332,56 @@ class PatternCategory(str, Enum):
     SA_BANTU = "sa_bantu"
 
 
+# Keyword set per category, registered in the shared text feature automaton
+CATEGORY_PATTERNS: Final[dict[PatternCategory, frozenset[str]]] = {
+    PatternCategory.EXTENDED_OUTPUT: EXTENDED_OUTPUT_KEYWORDS,
+    PatternCategory.COMPLEX_OUTPUT: COMPLEX_OUTPUT_KEYWORDS,
+    PatternCategory.DOCUMENT_ANALYSIS: DOCUMENT_ANALYSIS_KEYWORDS,
+    PatternCategory.COMPLEX_235B: COMPLEX_235B_KEYWORDS,
+    PatternCategory.THINKING: THINKING_KEYWORDS,
+    PatternCategory.IMAGE: IMAGE_KEYWORDS,
+    PatternCategory.SA_BANTU: SA_BANTU_LANGUAGE_PATTERNS,
+}
+
+for _category, _patterns in CATEGORY_PATTERNS.items():
+    register_vocabulary(f"router.{_category.value}", _patterns)
+
+# Image prompts are only checked in the first N characters (not RAG context)
+IMAGE_PROMPT_WINDOW: Final[int] = 200
+
+
 class PatternMatcher:
     """
     High-performance pattern matcher using Aho-Corasick automaton.
     
     Processes all keyword categories in a single O(n) pass through the text,
     instead of O(n*m) where m is the number of keywords per category.
+    The scan is shared with the other classifiers via extract_features(),
+    so repeated checks on the same message cost a cache lookup.
     
     Performance improvement: ~10x faster for typical messages.
     """
     
-    def __init__(self):
-        self._automaton = None
-        self._pattern_to_categories: dict[str, set[PatternCategory]] = {}
-        self._initialized = False
-        
-    def _build_automaton(self) -> None:
-        """Build the Aho-Corasick automaton from all keyword sets."""
-        # Map patterns to categories (needed for both AC and fallback)
-        category_patterns = {
-            PatternCategory.EXTENDED_OUTPUT: EXTENDED_OUTPUT_KEYWORDS,
-            PatternCategory.COMPLEX_OUTPUT: COMPLEX_OUTPUT_KEYWORDS,
-            PatternCategory.DOCUMENT_ANALYSIS: DOCUMENT_ANALYSIS_KEYWORDS,
-            PatternCategory.COMPLEX_235B: COMPLEX_235B_KEYWORDS,
-            PatternCategory.THINKING: THINKING_KEYWORDS,
-            PatternCategory.IMAGE: IMAGE_KEYWORDS,
-            PatternCategory.SA_BANTU: SA_BANTU_LANGUAGE_PATTERNS,
-        }
-        
-        # Build mapping for all patterns
-        for category, patterns in category_patterns.items():
-            for pattern in patterns:
-                pattern_lower = pattern.lower()
-                if pattern_lower not in self._pattern_to_categories:
-                    self._pattern_to_categories[pattern_lower] = set()
-                self._pattern_to_categories[pattern_lower].add(category)
-        
-        # Build Aho-Corasick automaton if available
-        if AHOCORASICK_AVAILABLE:
-            self._automaton = ahocorasick.Automaton()
-            for pattern in self._pattern_to_categories.keys():
-                self._automaton.add_word(pattern, pattern)
-            self._automaton.make_automaton()
-            logger.info(f"PatternMatcher initialized with Aho-Corasick ({len(self._pattern_to_categories)} patterns)")
-        else:
-            logger.info(f"PatternMatcher initialized with fallback ({len(self._pattern_to_categories)} patterns)")
-        
-        self._initialized = True
-    
-    def find_categories(self, message: str) -> set[PatternCategory]:
+    def find_categories(self, message: str, within: int | None = None) -> set[PatternCategory]:
         """
         Find all pattern categories that match in the message.
         
+        Args:
+            message: Text to check
+            within: Only consider matches in the first N characters
+        
         Returns:
             Set of PatternCategory enums that matched
         """
-        if not self._initialized:
-            self._build_automaton()
-        
-        message_lower = message.lower()
-        matched_categories: set[PatternCategory] = set()
-        
-        if AHOCORASICK_AVAILABLE and self._automaton:
-            # O(n) Aho-Corasick matching
-            for _, pattern in self._automaton.iter(message_lower):
-                matched_categories.update(self._pattern_to_categories[pattern])
-        else:
-            # Fallback: O(n*m) substring matching
-            for pattern, categories in self._pattern_to_categories.items():
-                if pattern in message_lower:
-                    matched_categories.update(categories)
-        
-        return matched_categories
+        features = extract_features(message)
+        return {
+            category for category in PatternCategory
+            if features.any(f"router.{category.value}", within)
+        }
     
-    def matches_category(self, message: str, category: PatternCategory) -> bool:
+    def matches_category(self, message: str, category: PatternCategory, within: int | None = None) -> bool:
         """Check if message matches a specific category."""
-        return category in self.find_categories(message)
+        return extract_features(message).any(f"router.{category.value}", within)
 
 
 # Global pattern matcher instance (lazy initialization)
@@ -445,8 +419,9 @@ def is_image_prompt(prompt: str) -> bool:
     Uses optimized Aho-Corasick matching when available.
     """
     # Only check the beginning of the message, not full RAG context
-    prompt_start = prompt[:200]
-    return get_pattern_matcher().matches_category(prompt_start, PatternCategory.IMAGE)
+    return get_pattern_matcher().matches_category(
+        prompt, PatternCategory.IMAGE, within=IMAGE_PROMPT_WINDOW
+    )
 
 
 def is_extended_output_request(message: str) -> bool:
@@ -551,9 +526,8 @@ def _extract_keywords(message: str) -> set[str]:
 def _matches_complex_keywords(message: str) -> bool:
     """Check if message matches any COMPLEX_235B_KEYWORDS.
     
-    Uses optimized Aho-Corasick matching when available.
-    Falls back to word boundary regex matching for single-word keywords
-    to avoid false positives like 'rica' matching 'Africa'.
+    Uses the shared text feature automaton; short single-word keywords must
+    start on a word boundary to avoid false positives like 'rica' matching 'Africa'.
     """
     # Use optimized pattern matcher
     return get_pattern_matcher().matches_category(message, PatternCategory.COMPLEX_235B)
@@ -350,6 +350,23 @@ async def require_admin(
     )
 
 
+async def require_internal_key(
+    x_internal_key: Optional[str] = Header(default=None, alias="X-Internal-Key"),
+) -> bool:
+    """
+    Require the shared INTERNAL_API_KEY for frontend-to-backend calls.
+    
+    Returns True if authenticated, raises 403 otherwise.
+    """
+    if x_internal_key and secrets.compare_digest(x_internal_key, settings.INTERNAL_API_KEY):
+        return True
+    logger.warning("Unauthorized internal API access attempt")
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Internal API key required.",
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a properly signed JWT access token.
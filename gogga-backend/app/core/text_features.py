@@ -0,0 +1,236 @@
+"""
+GOGGA Text Features - One scan per message, shared by every classifier
+
+The same message used to be scanned over and over per request: the tier
+router (image, complex, African language, complex output checks), the math
+intent classifier, the document classifier, OptiLLM's planning detector and
+the language detector each lowercased and searched it independently.
+
+extract_features() does that work once:
+- Lowercases and tokenizes the text
+- Runs ONE Aho-Corasick automaton holding every registered vocabulary
+- Records, per matched pattern, where it first occurs and whether it sits
+  on word boundaries
+- Caches the result per message (LRU), so classifiers later in the same
+  request get it for free
+
+Vocabularies are registered at import time by the modules that own them
+(register_vocabulary). Consumers then ask the feature object which of
+their patterns matched, instead of rescanning.
+
+Word boundaries:
+    Short single-word patterns (<= SHORT_PATTERN_MAX chars, e.g. 'rica',
+    'ewe', 'api') must start at a word boundary, so 'Africa', 'fewer' and
+    'capital' no longer trigger them. Suffixes are still allowed ('apis',
+    'poems'). Longer patterns keep plain substring semantics.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Final, Iterable
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Single-word patterns up to this length must start on a word boundary
+SHORT_PATTERN_MAX: Final[int] = 4
+
+# Feature objects kept for reuse (one request touches the same text many times)
+FEATURE_CACHE_SIZE: Final[int] = 256
+
+# Word tokenizer (same definition the language detector has always used)
+WORD_PATTERN: Final[re.Pattern] = re.compile(r"\b[a-zA-Z']+\b")
+
+
+@dataclass(slots=True)
+class PatternHit:
+    """First occurrences of a pattern (end index, exclusive) by boundary kind."""
+    first_end: int
+    word_start_end: int | None = None  # Occurrence starting on a word boundary
+    whole_word_end: int | None = None  # Occurrence bounded on both sides
+
+
+class _Vocabulary:
+    """All registered patterns, compiled into one automaton."""
+
+    def __init__(self) -> None:
+        self.sets: dict[str, frozenset[str]] = {}
+        self.patterns: set[str] = set()
+        self.owners: dict[str, tuple[str, ...]] = {}  # pattern -> vocabulary names
+        self.automaton = None
+        self.dirty = True
+
+    def register(self, name: str, patterns: Iterable[str]) -> None:
+        lowered = frozenset(p.lower() for p in patterns if p)
+        if self.sets.get(name) == lowered:
+            return
+        self.sets[name] = lowered
+        self.patterns = set().union(*self.sets.values())
+        owners: dict[str, list[str]] = {}
+        for vocabulary, patterns in self.sets.items():
+            for pattern in patterns:
+                owners.setdefault(pattern, []).append(vocabulary)
+        self.owners = {pattern: tuple(names) for pattern, names in owners.items()}
+        self.dirty = True
+        extract_features.cache_clear()
+
+    def build(self) -> None:
+        if AHOCORASICK_AVAILABLE:
+            automaton = ahocorasick.Automaton()
+            for pattern in self.patterns:
+                automaton.add_word(pattern, pattern)
+            automaton.make_automaton()
+            self.automaton = automaton
+        self.dirty = False
+        logger.info(
+            "Text feature automaton built: %d patterns across %d vocabularies (aho-corasick=%s)",
+            len(self.patterns), len(self.sets), AHOCORASICK_AVAILABLE,
+        )
+
+    def iter_matches(self, lower: str) -> Iterable[tuple[int, str]]:
+        """Yield (end index inclusive, pattern) in order of end position."""
+        if self.dirty:
+            self.build()
+        if self.automaton is not None:
+            if len(self.automaton):
+                yield from self.automaton.iter(lower)
+            return
+        # Fallback: per-pattern find loop
+        found: list[tuple[int, str]] = []
+        for pattern in self.patterns:
+            start = lower.find(pattern)
+            while start != -1:
+                found.append((start + len(pattern) - 1, pattern))
+                start = lower.find(pattern, start + 1)
+        found.sort()
+        yield from found
+
+
+_vocabulary = _Vocabulary()
+
+
+def register_vocabulary(name: str, patterns: Iterable[str]) -> None:
+    """
+    Add a named pattern set to the shared automaton.
+
+    Call at import time from the module that owns the keywords. Registering
+    the same name again replaces that set.
+    """
+    _vocabulary.register(name, patterns)
+
+
+def requires_word_start(pattern: str) -> bool:
+    """Short single-word patterns only match at the start of a word."""
+    return len(pattern) <= SHORT_PATTERN_MAX and pattern.isalpha()
+
+
+class TextFeatures:
+    """
+    Everything classifiers need to know about one message.
+
+    Built once by extract_features(); treat as read-only.
+    """
+
+    __slots__ = ("text", "lower", "hits", "by_vocabulary", "_words", "_regex_cache")
+
+    def __init__(
+        self,
+        text: str,
+        lower: str,
+        hits: dict[str, PatternHit],
+        by_vocabulary: dict[str, list[str]],
+    ) -> None:
+        self.text = text
+        self.lower = lower
+        self.hits = hits
+        self.by_vocabulary = by_vocabulary  # vocabulary name -> patterns found
+        self._words: tuple[str, ...] | None = None
+        self._regex_cache: dict[re.Pattern, bool] = {}
+
+    @property
+    def words(self) -> tuple[str, ...]:
+        """Lowercase word tokens (letters and apostrophes), in order."""
+        if self._words is None:
+            self._words = tuple(WORD_PATTERN.findall(self.lower))
+        return self._words
+
+    def has(self, pattern: str, within: int | None = None, whole_word: bool = False) -> bool:
+        """
+        Check whether a registered pattern occurs.
+
+        Args:
+            pattern: Lowercase pattern (must belong to a registered vocabulary)
+            within: Only count occurrences that end within the first N chars
+            whole_word: Require word boundaries on both sides
+        """
+        hit = self.hits.get(pattern)
+        if hit is None:
+            return False
+        if whole_word:
+            end = hit.whole_word_end
+        elif requires_word_start(pattern):
+            end = hit.word_start_end
+        else:
+            end = hit.first_end
+        return end is not None and (within is None or end <= within)
+
+    def matched(self, vocabulary: str, within: int | None = None) -> list[str]:
+        """Patterns from a registered vocabulary that occur in the text."""
+        return [p for p in self.by_vocabulary.get(vocabulary, ()) if self.has(p, within)]
+
+    def any(self, vocabulary: str, within: int | None = None) -> bool:
+        """True if any pattern from the vocabulary occurs."""
+        return any(self.has(p, within) for p in self.by_vocabulary.get(vocabulary, ()))
+
+    def search(self, regex: re.Pattern) -> bool:
+        """Cached regex search over the lowercased text."""
+        result = self._regex_cache.get(regex)
+        if result is None:
+            result = self._regex_cache[regex] = regex.search(self.lower) is not None
+        return result
+
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def extract_features(text: str) -> TextFeatures:
+    """
+    Scan a message once and return its features.
+
+    Cached per text, so every classifier handling the same request reuses
+    the same object.
+    """
+    lower = text.lower()
+    length = len(lower)
+    hits: dict[str, PatternHit] = {}
+
+    for end_idx, pattern in _vocabulary.iter_matches(lower):
+        end = end_idx + 1
+        hit = hits.get(pattern)
+        if hit is None:
+            hit = hits[pattern] = PatternHit(first_end=end)
+        elif hit.whole_word_end is not None:
+            continue  # Every boundary kind already recorded
+
+        # Word characters: alphanumerics and underscore (as in regex \w)
+        start = end - len(pattern)
+        before = lower[start - 1] if start else " "
+        if before.isalnum() or before == "_":
+            continue
+        if hit.word_start_end is None:
+            hit.word_start_end = end
+        after = lower[end] if end < length else " "
+        if not (after.isalnum() or after == "_"):
+            hit.whole_word_end = end
+
+    by_vocabulary: dict[str, list[str]] = {}
+    owners = _vocabulary.owners
+    for pattern in hits:
+        for vocabulary in owners[pattern]:
+            by_vocabulary.setdefault(vocabulary, []).append(pattern)
+
+    return TextFeatures(text, lower, hits, by_vocabulary)
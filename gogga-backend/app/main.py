@@ -11,10 +11,14 @@ from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.api.v1.endpoints import chat, payments, images, prompts, tools, gogga_talk, media, admin, icons
+from app.api.v1.endpoints import chat, payments, images, prompts, tools, gogga_talk, media, admin, icons, rag, entitlements
 from app.api.v1 import tts
 from app.services.posthog_service import posthog_service
 from app.services.scheduler_service import scheduler_service
+from app.services.language_batch import shutdown_batch_language_detector
+from app.services.html_extract import shutdown_extract_pool
+from app.services.usage_ledger import get_usage_ledger
+from app.services.credit_reservations import get_credit_reservations
 from app.core.exceptions import (
     GoggaException,
     gogga_exception_handler,
@@ -58,12 +62,20 @@ async def lifespan(app: FastAPI):
     # Start the scheduler for subscription management
     scheduler_service.start()
     
+    # Replay unshipped usage records and start background delivery
+    await get_usage_ledger().start()
+    await get_credit_reservations().start()  # Same for credit settlements
+    
     yield
     
     # Shutdown
     logger.info("GOGGA API Shutting down...")
     scheduler_service.stop()
+    shutdown_batch_language_detector()
+    shutdown_extract_pool()
     posthog_service.flush()  # Ensure all PostHog events are sent
+    await get_usage_ledger().stop()  # Last delivery attempt; the rest replays on next start
+    await get_credit_reservations().stop()
 
 
 # Initialize FastAPI application
@@ -171,6 +183,8 @@ app.include_router(gogga_talk.router, prefix=f"{settings.API_V1_STR}/voice")
 app.include_router(media.router, prefix=settings.API_V1_STR)
 app.include_router(icons.router, prefix=f"{settings.API_V1_STR}/icons", tags=["icons"])
 app.include_router(admin.router, prefix=f"{settings.API_V1_STR}/admin", tags=["admin"])
+app.include_router(rag.router, prefix=f"{settings.API_V1_STR}/rag", tags=["rag"])
+app.include_router(entitlements.router, prefix=f"{settings.API_V1_STR}/entitlements", tags=["entitlements"])
 app.include_router(tts.router, prefix=settings.API_V1_STR)
 
 
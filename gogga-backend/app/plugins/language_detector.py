@@ -8,11 +8,16 @@ This plugin CANNOT be disabled and labels EVERY user input before LLM processing
 """
 
 import re
+import hashlib
 import logging
+import time
 from typing import Dict, Any, List, Optional, Tuple, Final
 from dataclasses import dataclass
 from enum import Enum
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict
+from functools import lru_cache
+
+from app.core.text_features import TextFeatures, extract_features, register_vocabulary
 
 logger = logging.getLogger(__name__)
 
@@ -20,28 +25,50 @@ logger = logging.getLogger(__name__)
 # CONSTANTS & CONFIGURATION
 # -----------------------------------------------------------------------------
 
-# Optimized for performance; pre-compiled regex for morphological roots
+# Optimized for performance; morphological roots compiled into one token pass
 # Enhanced with Swadesh-derived linguistic patterns
 # Rather than whole words, we look for irreducible linguistic roots
-MORPHOLOGY_ROOTS: Final[Dict[str, re.Pattern]] = {
+MORPHOLOGY_PREFIXES: Final[Dict[str, Tuple[str, ...]]] = {
     # Nguni family: distinctive ngi/ndi prefixes, uku infinitive, -ile past tense
-    'nguni': re.compile(r'\b(ngi|ndi|si|ba|siya|kwi|nga|uma|uku|molo|sawu|lotjh|bona|yebo|cha|ewe|hayi|enkosi|kahle|kakhulu)\w*', re.IGNORECASE),
+    'nguni': ('ngi', 'ndi', 'si', 'ba', 'siya', 'kwi', 'nga', 'uma', 'uku', 'molo', 'sawu', 'lotjh',
+              'bona', 'yebo', 'cha', 'ewe', 'hayi', 'enkosi', 'kahle', 'kakhulu'),
     
     # Sotho family: distinctive ke/go/ho patterns, -ile past, -a present
     # Key differentiators: Sesotho uses 'ho', Setswana uses 'go', Sepedi uses 'go' with 'bja'
-    'sotho': re.compile(r'\b(ka|ke|go|ho|ha|le|re|tsa|tse|tlh|dum|lum|thob|lebo|gabotse|hantle|sentle|pula|motho|batho)\w*', re.IGNORECASE),
-    
-    # Afrikaans: double negation 'nie...nie', distinctive articles 'die/\'n'
-    'afrikaans': re.compile(r'\b(die|is|en|ek|jy|hy|ons|het|nie|te|van|wat|maar|ook|sal|kan|moet|dankie|asseblief|lekker|baie)\b', re.IGNORECASE),
-    
-    # English: common function words, SA slang integrated
-    'english': re.compile(r'\b(the|and|is|are|to|in|of|that|it|you|for|with|have|this|was|were|been|being|would|could|howzit|lekker|braai|bru)\b', re.IGNORECASE),
+    'sotho': ('ka', 'ke', 'go', 'ho', 'ha', 'le', 're', 'tsa', 'tse', 'tlh', 'dum', 'lum', 'thob', 'lebo',
+              'gabotse', 'hantle', 'sentle', 'pula', 'motho', 'batho'),
     
     # Tsonga: distinctive ndzi/hi/ku prefixes, xa locative, swinene intensifier
-    'tsonga': re.compile(r'\b(ndzi|ku|hi|ka|va|avu|xeni|khensa|riva|swinene|famba|mina|hina|kahle|n\'we|dyambu|mpfula)\w*', re.IGNORECASE),
+    'tsonga': ('ndzi', 'ku', 'hi', 'ka', 'va', 'avu', 'xeni', 'khensa', 'riva', 'swinene', 'famba', 'mina',
+               'hina', 'kahle', "n'we", 'dyambu', 'mpfula'),
     
     # Venda: distinctive ndi/vha/u prefixes, tshi- class prefix, unique consonant clusters
-    'venda': re.compile(r'\b(ndi|vha|u|nda|livhu|tshi|vho|hani|ndaa|zwavhudi|nga|maanda|shango|thavha|duvha|mvula)\w*', re.IGNORECASE),
+    'venda': ('ndi', 'vha', 'u', 'nda', 'livhu', 'tshi', 'vho', 'hani', 'ndaa', 'zwavhudi', 'nga', 'maanda',
+              'shango', 'thavha', 'duvha', 'mvula'),
+}
+
+# Whole-word function words
+MORPHOLOGY_WORDS: Final[Dict[str, frozenset[str]]] = {
+    # Afrikaans: double negation 'nie...nie', distinctive articles 'die/\'n'
+    'afrikaans': frozenset({'die', 'is', 'en', 'ek', 'jy', 'hy', 'ons', 'het', 'nie', 'te', 'van', 'wat',
+                            'maar', 'ook', 'sal', 'kan', 'moet', 'dankie', 'asseblief', 'lekker', 'baie'}),
+    
+    # English: common function words, SA slang integrated
+    'english': frozenset({'the', 'and', 'is', 'are', 'to', 'in', 'of', 'that', 'it', 'you', 'for', 'with',
+                          'have', 'this', 'was', 'were', 'been', 'being', 'would', 'could', 'howzit',
+                          'lekker', 'braai', 'bru'}),
+}
+
+# Equivalent per-family regexes (reference form of the roots above)
+MORPHOLOGY_ROOTS: Final[Dict[str, re.Pattern]] = {
+    **{
+        family: re.compile(r'\b(' + '|'.join(map(re.escape, prefixes)) + r')\w*', re.IGNORECASE)
+        for family, prefixes in MORPHOLOGY_PREFIXES.items()
+    },
+    **{
+        family: re.compile(r'\b(' + '|'.join(sorted(words)) + r')\b', re.IGNORECASE)
+        for family, words in MORPHOLOGY_WORDS.items()
+    },
 }
 
 # Character-level features for tie-breaking
@@ -50,6 +77,21 @@ DISTINCTIVE_CHARACTERS: Final[Dict[str, str]] = {
     'af': 'ëïôûêîôáéíóú',  # Diacritics common in Afrikaans
 }
 
+# Detection results cached per normalized text ("ok", "thanks", repeated prompts)
+DETECTION_CACHE_SIZE: Final[int] = 4096
+
+# Session-sticky language state (per conversation)
+SESSION_MAX: Final[int] = 10_000
+SESSION_TTL_SECONDS: Final[float] = 3600.0
+SESSION_DECAY: Final[float] = 0.85  # Share of the session strength kept per turn
+LOW_SIGNAL_MAX_WORDS: Final[int] = 3  # Shorter messages inherit the session language
+
+# Length-aware sampling: long texts are scored on start/middle/end windows
+# first and only get the full scan when the windows are inconclusive
+SAMPLE_MIN_CHARS: Final[int] = 6000
+SAMPLE_WINDOW_CHARS: Final[int] = 1500
+SAMPLE_MARGIN: Final[float] = 0.05  # Top-2 score gap that counts as conclusive
+
 # -----------------------------------------------------------------------------
 # DATA STRUCTURES
 # -----------------------------------------------------------------------------
@@ -121,6 +163,15 @@ class DetectionResult:
         }
 
 
+@dataclass(slots=True)
+class SessionLanguage:
+    """Established language of one conversation, decaying turn by turn."""
+    code: str
+    strength: float
+    updated_at: float
+    turns: int = 1
+
+
 # -----------------------------------------------------------------------------
 # LANGUAGE PROFILES (All 11 SA Official Languages)
 # -----------------------------------------------------------------------------
@@ -514,6 +565,166 @@ LANGUAGE_PROFILES: Final[Dict[str, LanguageProfile]] = {
 }
 
 
+# -----------------------------------------------------------------------------
+# COMPILED PROFILE INDEXES
+# -----------------------------------------------------------------------------
+
+# Profiles are tuples (ordered, immutable), so `word in profile.core_vocab` is a
+# linear scan. They are compiled once at import into inverted indexes, so
+# scoring is a single pass over the message tokens instead of
+# tokens x languages x vocabulary.
+
+def _build_vocab_index() -> Dict[str, Tuple[Tuple[str, int], ...]]:
+    """word -> ((language, occurrences in that profile's core_vocab), ...)"""
+    index: Dict[str, Counter] = defaultdict(Counter)
+    for lang_code, profile in LANGUAGE_PROFILES.items():
+        for word in profile.core_vocab:
+            index[word][lang_code] += 1
+    return {word: tuple(counts.items()) for word, counts in index.items()}
+
+
+def _build_ngram_index() -> Dict[str, Tuple[str, ...]]:
+    """3-gram -> languages listing it as a fingerprint"""
+    index: Dict[str, List[str]] = defaultdict(list)
+    for lang_code, profile in LANGUAGE_PROFILES.items():
+        for gram in dict.fromkeys(profile.fingerprints):
+            index[gram].append(lang_code)
+    return {gram: tuple(langs) for gram, langs in index.items()}
+
+
+VOCAB_INDEX: Final[Dict[str, Tuple[Tuple[str, int], ...]]] = _build_vocab_index()
+NGRAM_INDEX: Final[Dict[str, Tuple[str, ...]]] = _build_ngram_index()
+
+# Substring matches (compounds, phrases) come from the shared text feature scan
+register_vocabulary("language.vocab", VOCAB_INDEX)
+
+
+def _build_cultural_index() -> Dict[str, Tuple[Tuple[str, float], ...]]:
+    """marker -> ((language, bonus), ...)"""
+    index: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+    for lang_code, profile in LANGUAGE_PROFILES.items():
+        for marker in profile.cultural_markers:
+            # Multi-word markers are more specific, give higher weight
+            # Base 0.2 + 0.15 per additional word (2 words = 0.35, 3 words = 0.5)
+            index[marker.lower()].append((lang_code, 0.2 + (len(marker.split()) - 1) * 0.15))
+    return {marker: tuple(entries) for marker, entries in index.items()}
+
+
+CULTURAL_INDEX: Final[Dict[str, Tuple[Tuple[str, float], ...]]] = _build_cultural_index()
+
+
+def _cache_key(text: str) -> bytes:
+    """Hash of the normalized text (case and whitespace insensitive)."""
+    normalized = " ".join(text.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def _has_strong_signal(features: TextFeatures) -> bool:
+    """
+    True if a message names a specific non-English language on its own:
+    a word unique to one vernacular profile or a vernacular cultural marker.
+    """
+    for word in features.words:
+        entry = VOCAB_INDEX.get(word)
+        if entry is not None and len(entry) == 1 and entry[0][0] != 'en':
+            return True
+    for marker in features.hits:
+        entries = CULTURAL_INDEX.get(marker)
+        if (
+            entries is not None
+            and any(lang_code != 'en' for lang_code, _ in entries)
+            and features.has(marker, whole_word=True)
+        ):
+            return True
+    return False
+
+# Cultural markers are matched by the shared automaton too (whole words only,
+# so 'aa' no longer fires inside 'baas')
+register_vocabulary("language.cultural", CULTURAL_INDEX)
+
+# Word runs (the spans `\b...\w*` / `\b...\b` operate on)
+_WORD_RUN: Final[re.Pattern] = re.compile(r'\w+')
+
+# Prefixes that cross a word boundary (e.g. n'we) are checked positionally
+_SPANNING_PREFIXES: Final[Tuple[Tuple[str, str], ...]] = tuple(
+    (family, prefix)
+    for family, prefixes in MORPHOLOGY_PREFIXES.items()
+    for prefix in prefixes
+    if not _WORD_RUN.fullmatch(prefix)
+)
+
+
+@lru_cache(maxsize=8192)
+def _morphology_families(word: str) -> Tuple[str, ...]:
+    """Families whose roots match a single word run (memoized; chat vocabulary repeats)."""
+    families = [
+        family for family, prefixes in MORPHOLOGY_PREFIXES.items()
+        if word.startswith(prefixes)
+    ]
+    families.extend(family for family, words in MORPHOLOGY_WORDS.items() if word in words)
+    return tuple(families)
+
+
+def count_morphology_roots(text_lower: str) -> Counter:
+    """
+    Count root matches per family in ONE scan of the text.
+    
+    Gives the same counts as running every MORPHOLOGY_ROOTS regex over the
+    text, without one regex pass per family.
+    """
+    counts: Counter = Counter()
+    consumed: Dict[str, int] = {}  # family -> end of a match spanning several runs
+    
+    for run in _WORD_RUN.finditer(text_lower):
+        start = run.start()
+        matched = _morphology_families(run.group())
+        for family in matched:
+            if start >= consumed.get(family, 0):
+                counts[family] += 1
+        
+        for family, prefix in _SPANNING_PREFIXES:
+            if family in matched or start < consumed.get(family, 0):
+                continue
+            if text_lower.startswith(prefix, start):
+                counts[family] += 1
+                tail = _WORD_RUN.match(text_lower, start + len(prefix))
+                consumed[family] = tail.end() if tail else start + len(prefix)
+    
+    return counts
+
+
+def sample_windows(text: str, size: int = SAMPLE_WINDOW_CHARS) -> List[str]:
+    """
+    Start, middle and end windows of a long text, trimmed to whole words.
+    
+    Returns [text] when the text is too short to sample.
+    """
+    length = len(text)
+    if length <= 3 * size:
+        return [text]
+    
+    windows = []
+    for start in (0, (length - size) // 2, length - size):
+        end = start + size
+        if start > 0:
+            # Drop the partial word at the window start
+            space = text.find(' ', start, end)
+            start = space + 1 if space != -1 else start
+        if end < length:
+            space = text.rfind(' ', start, end)
+            end = space if space > start else end
+        windows.append(text[start:end])
+    return windows
+
+
+def _top_margin(vector: Dict[str, float]) -> float:
+    """Score gap between the best and second-best language."""
+    top = sorted(vector.values(), reverse=True)[:2]
+    if not top:
+        return 0.0
+    return top[0] - (top[1] if len(top) > 1 else 0.0)
+
+
 # -----------------------------------------------------------------------------
 # CORE DETECTION ENGINE
 # -----------------------------------------------------------------------------
@@ -547,8 +758,18 @@ class LanguageDetectorPlugin:
             r'\b(hello|hi|hey|thanks|thank\s+you|please|sorry|excuse\s+me|good\s+(morning|afternoon|evening))\b',
             re.IGNORECASE
         )
+        
+        # LRU of detection results + per-conversation language state
+        self._cache: OrderedDict[bytes, DetectionResult] = OrderedDict()
+        self._sessions: OrderedDict[str, SessionLanguage] = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._inherited = 0
+        self._switches = 0
+        self._sampled = 0
+        self._sample_fallbacks = 0
     
-    def _calculate_vocabulary_score(self, text_lower: str) -> Dict[str, float]:
+    def _calculate_vocabulary_score(self, features: TextFeatures) -> Dict[str, float]:
         """
         Score based on core vocabulary presence.
         
@@ -556,38 +777,41 @@ class LanguageDetectorPlugin:
         matches are the most reliable indicators.
         
         Enhanced: Unique word bonus - words that match only ONE language get extra weight
+        
+        Args:
+            features: Shared text features (tokens + vocabulary substring hits)
         """
         import math
-        import re
         scores: Dict[str, float] = defaultdict(float)
         
         # Tokenize: split on whitespace and strip punctuation
-        words = set(re.findall(r'\b[a-zA-Z\']+\b', text_lower))
+        words = set(features.words)
         
-        # First pass: find which words match which languages
-        word_language_map: Dict[str, set] = defaultdict(set)
+        # Word-level matches: one index lookup per token
+        word_matches: Dict[str, float] = defaultdict(float)
         for word in words:
-            for lang_code, profile in LANGUAGE_PROFILES.items():
-                if word in profile.core_vocab:
-                    word_language_map[word].add(lang_code)
-        
-        for lang_code, profile in LANGUAGE_PROFILES.items():
-            # Count word-level matches with unique word bonus
-            word_matches = 0.0
-            for vocab_word in profile.core_vocab:
-                if vocab_word in words:
-                    # Base score: 1 point per match
-                    match_score = 1.0
-                    # UNIQUE WORD BONUS: +0.5 if this word ONLY matches this language
-                    if len(word_language_map.get(vocab_word, set())) == 1:
-                        match_score = 1.5
-                    word_matches += match_score
-            
-            # Also check substring matches for compound words and phrases
-            substring_matches = sum(1 for vocab_word in profile.core_vocab 
-                                  if vocab_word in text_lower and vocab_word not in words)
-            
-            total_matches = word_matches + (substring_matches * 0.3)  # Weight substrings lower
+            entry = VOCAB_INDEX.get(word)
+            if entry is None:
+                continue
+            # UNIQUE WORD BONUS: +0.5 if this word ONLY matches one language
+            match_score = 1.5 if len(entry) == 1 else 1.0
+            for lang_code, count in entry:
+                word_matches[lang_code] += match_score * count
+        
+        # Also count substring matches for compound words and phrases
+        substring_matches: Dict[str, int] = defaultdict(int)
+        for pattern in features.hits:
+            if pattern in words:
+                continue
+            entry = VOCAB_INDEX.get(pattern)
+            if entry is not None:
+                for lang_code, count in entry:
+                    substring_matches[lang_code] += count
+        
+        for lang_code in LANGUAGE_PROFILES:
+            total_matches = word_matches.get(lang_code, 0.0) + (
+                substring_matches.get(lang_code, 0) * 0.3  # Weight substrings lower
+            )
             
             if total_matches > 0:
                 # Use logarithmic scaling that continues to reward more matches
@@ -595,8 +819,6 @@ class LanguageDetectorPlugin:
                 scores[lang_code] = min(1.0, 0.3 + (math.log2(1 + total_matches) * 0.25))
         
         return scores
-        
-        return scores
     
     def _calculate_morphology_score(self, text_lower: str) -> Dict[str, float]:
         """
@@ -607,13 +829,14 @@ class LanguageDetectorPlugin:
         """
         scores: Dict[str, float] = defaultdict(float)
         
-        # Family-level detection
-        nguni_matches = len(MORPHOLOGY_ROOTS['nguni'].findall(text_lower))
-        sotho_matches = len(MORPHOLOGY_ROOTS['sotho'].findall(text_lower))
-        afrikaans_matches = len(MORPHOLOGY_ROOTS['afrikaans'].findall(text_lower))
-        english_matches = len(MORPHOLOGY_ROOTS['english'].findall(text_lower))
-        tsonga_matches = len(MORPHOLOGY_ROOTS['tsonga'].findall(text_lower))
-        venda_matches = len(MORPHOLOGY_ROOTS['venda'].findall(text_lower))
+        # Family-level detection (single pass over the word runs)
+        roots = count_morphology_roots(text_lower)
+        nguni_matches = roots['nguni']
+        sotho_matches = roots['sotho']
+        afrikaans_matches = roots['afrikaans']
+        english_matches = roots['english']
+        tsonga_matches = roots['tsonga']
+        venda_matches = roots['venda']
         
         # Distribute scores to languages in each family
         if nguni_matches > 0:
@@ -659,36 +882,41 @@ class LanguageDetectorPlugin:
         
         # Normalize and generate 3-grams
         normalized = text.lower().replace(' ', '')
-        grams = [normalized[i:i+3] for i in range(len(normalized)-2)]
+        total_grams = len(normalized) - 2
         
-        if not grams:
+        if total_grams <= 0:
             return scores
         
+        # Count each distinct 3-gram once, then attribute via the index
+        gram_counts = Counter(normalized[i:i+3] for i in range(total_grams))
+        matches: Dict[str, int] = defaultdict(int)
+        for gram, count in gram_counts.items():
+            for lang_code in NGRAM_INDEX.get(gram, ()):
+                matches[lang_code] += count
+        
         # Score each language based on fingerprint matches
-        for lang_code, profile in LANGUAGE_PROFILES.items():
-            matches = sum(1 for gram in grams if gram in profile.fingerprints)
-            if matches > 0:
-                scores[lang_code] = matches / len(grams)
+        for lang_code in LANGUAGE_PROFILES:
+            if matches.get(lang_code):
+                scores[lang_code] = matches[lang_code] / total_grams
         
         return scores
     
-    def _calculate_cultural_score(self, text_lower: str) -> Dict[str, float]:
+    def _calculate_cultural_score(self, features: TextFeatures) -> Dict[str, float]:
         """
         Bonus scoring for cultural markers (greetings, honorifics, common phrases).
         
         High confidence indicator when present.
         Longer/multi-word markers get higher weight (more specific = more confident).
+        Markers must appear as whole words/phrases.
         """
         scores: Dict[str, float] = defaultdict(float)
         
-        for lang_code, profile in LANGUAGE_PROFILES.items():
-            for marker in profile.cultural_markers:
-                if marker.lower() in text_lower:
-                    # Multi-word markers are more specific, give higher weight
-                    word_count = len(marker.split())
-                    # Base 0.2 + 0.15 per additional word (2 words = 0.35, 3 words = 0.5)
-                    bonus = 0.2 + (word_count - 1) * 0.15
-                    scores[lang_code] += bonus
+        for marker in features.hits:
+            entries = CULTURAL_INDEX.get(marker)
+            if entries is None or not features.has(marker, whole_word=True):
+                continue
+            for lang_code, bonus in entries:
+                scores[lang_code] += bonus
         
         return scores
     
@@ -707,6 +935,9 @@ class LanguageDetectorPlugin:
         """
         Execute multi-stage detection pipeline.
         
+        Texts of SAMPLE_MIN_CHARS or more are scored on sampled windows
+        first, so long documents cost about the same as a few paragraphs.
+        
         Args:
             text: User input text to analyze
             
@@ -724,8 +955,6 @@ class LanguageDetectorPlugin:
                 method='fallback_too_short'
             )
         
-        text_lower = text.lower()
-        
         # Check for distinctive features first (highest confidence)
         if distinctive_lang := self._check_distinctive_features(text):
             profile = LANGUAGE_PROFILES[distinctive_lang]
@@ -738,28 +967,12 @@ class LanguageDetectorPlugin:
                 method='distinctive_features'
             )
         
-        # Initialize score vector
-        vector: Dict[str, float] = defaultdict(float)
-        
-        # Stage 1: Vocabulary scoring (50% weight)
-        vocab_scores = self._calculate_vocabulary_score(text_lower)
-        for lang, score in vocab_scores.items():
-            vector[lang] += score * 0.5
-        
-        # Stage 2: Morphology scoring (30% weight)
-        morph_scores = self._calculate_morphology_score(text_lower)
-        for lang, score in morph_scores.items():
-            vector[lang] += score * 0.3
-        
-        # Stage 3: N-gram scoring (15% weight)
-        ngram_scores = self._calculate_ngram_score(text)
-        for lang, score in ngram_scores.items():
-            vector[lang] += score * 0.15
-        
-        # Stage 4: Cultural markers (5% weight, bonus)
-        cultural_scores = self._calculate_cultural_score(text_lower)
-        for lang, score in cultural_scores.items():
-            vector[lang] += score * 0.05
+        scored = None
+        if len(text) >= SAMPLE_MIN_CHARS:
+            scored = self._score_sampled(text)
+        if scored is None:
+            scored = self._score(text)
+        vector, vocab_scores, morph_scores, ngram_scores = scored
         
         # Determine winner
         if not vector:
@@ -797,6 +1010,185 @@ class LanguageDetectorPlugin:
             method=method_used
         )
     
+    def _score(self, text: str) -> Tuple[Dict[str, float], ...]:
+        """
+        Run the scoring stages over a text.
+        
+        Returns:
+            (final vector, vocab scores, morphology scores, n-gram scores)
+        """
+        features = extract_features(text)
+        
+        # Initialize score vector
+        vector: Dict[str, float] = defaultdict(float)
+        
+        # Stage 1: Vocabulary scoring (50% weight)
+        vocab_scores = self._calculate_vocabulary_score(features)
+        for lang, score in vocab_scores.items():
+            vector[lang] += score * 0.5
+        
+        # Stage 2: Morphology scoring (30% weight)
+        morph_scores = self._calculate_morphology_score(features.lower)
+        for lang, score in morph_scores.items():
+            vector[lang] += score * 0.3
+        
+        # Stage 3: N-gram scoring (15% weight)
+        ngram_scores = self._calculate_ngram_score(text)
+        for lang, score in ngram_scores.items():
+            vector[lang] += score * 0.15
+        
+        # Stage 4: Cultural markers (5% weight, bonus)
+        cultural_scores = self._calculate_cultural_score(features)
+        for lang, score in cultural_scores.items():
+            vector[lang] += score * 0.05
+        
+        return vector, vocab_scores, morph_scores, ngram_scores
+    
+    def _score_sampled(self, text: str) -> Optional[Tuple[Dict[str, float], ...]]:
+        """
+        Score a long text from its start, middle and end windows.
+        
+        Windows are added one at a time. Stops as soon as at least two
+        windows agree on the winner and the top-2 margin reaches
+        SAMPLE_MARGIN; returns None (full scan needed) if that never happens.
+        """
+        windows = sample_windows(text)
+        if len(windows) == 1:
+            return None
+        
+        previous_winner = None
+        for count in range(1, len(windows) + 1):
+            scored = self._score("\n".join(windows[:count]))
+            vector = scored[0]
+            winner = max(vector, key=vector.get) if vector else None
+            if (
+                winner is not None
+                and winner == previous_winner
+                and _top_margin(vector) >= SAMPLE_MARGIN
+            ):
+                self._sampled += 1
+                return scored
+            previous_winner = winner
+        
+        self._sample_fallbacks += 1
+        return None
+    
+    def detect_cached(self, text: str) -> DetectionResult:
+        """detect() with an LRU cache keyed on the normalized text hash."""
+        key = _cache_key(text)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            self._cache_hits += 1
+            return result
+        
+        self._cache_misses += 1
+        result = self.detect(text)
+        self._cache[key] = result
+        if len(self._cache) > DETECTION_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+    
+    def _is_low_signal(self, text: str) -> bool:
+        """Short replies ("ok", "thanks", emoji) with no vernacular evidence."""
+        features = extract_features(text)
+        return (
+            len(features.words) <= LOW_SIGNAL_MAX_WORDS
+            and self._check_distinctive_features(text) is None
+            and not _has_strong_signal(features)
+        )
+    
+    def _get_session(self, session_id: str) -> Optional[SessionLanguage]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.updated_at > SESSION_TTL_SECONDS:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+    
+    def _inherit(self, session: SessionLanguage) -> DetectionResult:
+        """Carry the session language forward one turn (with decay)."""
+        session.strength *= SESSION_DECAY
+        session.turns += 1
+        session.updated_at = time.time()
+        self._inherited += 1
+        profile = LANGUAGE_PROFILES[session.code]
+        return DetectionResult(
+            code=session.code,
+            name=profile.name,
+            confidence=session.strength,
+            family=profile.family,
+            is_hybrid=False,
+            method='session'
+        )
+    
+    def _update_session(
+        self, session_id: str, session: Optional[SessionLanguage], result: DetectionResult
+    ) -> None:
+        """Fold a full detection into the session state."""
+        now = time.time()
+        if session is None:
+            self._sessions[session_id] = SessionLanguage(result.code, result.confidence, now)
+            if len(self._sessions) > SESSION_MAX:
+                self._sessions.popitem(last=False)
+            return
+        
+        decayed = session.strength * SESSION_DECAY
+        if result.code == session.code:
+            session.strength = max(decayed, result.confidence)
+        elif result.confidence >= decayed:
+            # Code-switch: a stronger signal replaces the established language
+            session.code = result.code
+            session.strength = result.confidence
+            self._switches += 1
+        else:
+            session.strength = decayed
+        session.turns += 1
+        session.updated_at = now
+    
+    def detect_in_session(self, text: str, session_id: Optional[str]) -> DetectionResult:
+        """
+        Detect with conversation context.
+        
+        Low-signal messages (and messages nothing matched) inherit the
+        conversation's established language without a full scan; everything
+        else is detected (cached) and updates the session state.
+        
+        Args:
+            text: User input text
+            session_id: Conversation key (None = stateless detection)
+        """
+        if not session_id:
+            return self.detect_cached(text)
+        
+        session = self._get_session(session_id)
+        if session is not None and self._is_low_signal(text):
+            return self._inherit(session)
+        
+        result = self.detect_cached(text)
+        if session is not None and result.method.startswith('fallback'):
+            return self._inherit(session)
+        
+        self._update_session(session_id, session, result)
+        return result
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache, session and sampling statistics."""
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            "cache_size": len(self._cache),
+            "cache_hits": self._cache_hits,
+            "cache_misses": self._cache_misses,
+            "cache_hit_rate": round(self._cache_hits / lookups, 3) if lookups else 0.0,
+            "sessions": len(self._sessions),
+            "inherited": self._inherited,
+            "switches": self._switches,
+            "sampled": self._sampled,
+            "sample_fallbacks": self._sample_fallbacks,
+        }
+    
     async def before_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """
         CRITICAL: This runs on EVERY request and CANNOT be disabled.
@@ -808,7 +1200,8 @@ class LanguageDetectorPlugin:
         4. Strategic system prompt injection for vernacular
         
         Args:
-            request: Chat completion request
+            request: Chat completion request (optional "session_id" keys the
+                conversation language state)
             
         Returns:
             Enriched request with language intelligence
@@ -826,8 +1219,8 @@ class LanguageDetectorPlugin:
             self._logger.debug("No user input found, skipping detection")
             return request
         
-        # Execute detection
-        result = self.detect(user_input)
+        # Execute detection (cached; short replies inherit the conversation language)
+        result = self.detect_in_session(user_input, request.get("session_id"))
         
         self._logger.info(
             f"Detected language: {result.name} ({result.code}) "
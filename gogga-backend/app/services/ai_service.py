@@ -16,16 +16,17 @@ Plugin System:
 - Language Detection: Runs on EVERY request (cannot be disabled)
 - Enriches context with language intelligence before LLM processing
 
-CePO Integration:
-- JIVE/JIGGA tiers route through CePO sidecar for enhanced reasoning
-- 4-step pipeline: Plan → Solution → Refine → Final + Best of N selection
-- Automatic failsafe to direct Cerebras API on CePO failure
+Best-of-N (replaces the CePO sidecar):
+- Complex JIVE/JIGGA requests sample N candidates concurrently in-process
+- Early stop when candidates agree; N adapts to difficulty and load
+- Falls back to the single-call path on failure
 """
+import json
 import logging
 import time
 import asyncio
 import re
-from typing import Any, Final
+from typing import TYPE_CHECKING, Any, Final
 
 from cerebras.cloud.sdk import Cerebras
 
@@ -40,24 +41,23 @@ from app.core.router import (
     COMPLEX_235B_KEYWORDS,
 )
 from app.services.cost_tracker import track_usage
-from app.services.cepo_service import get_cepo_service, CePoConfig
+from app.services.best_of_n import get_best_of_n
 from app.services.optillm_enhancements import (
     get_enhancement_config,
     enhance_system_prompt,
     enhance_user_message,
     should_use_planning,
-    parse_enhanced_response,
     EnhancementLevel,
 )
-from app.services.credit_service import (
-    CreditService,
-    ActionType,
-    DeductionSource,
-)
+from app.services.credit_service import DeductionSource
+from app.services.credit_reservations import get_credit_reservations
 from app.core.exceptions import InferenceError
 from app.tools.definitions import GOGGA_TOOLS, get_tools_for_tier, ToolCall
 from app.plugins import LanguageDetectorPlugin, Plugin
 
+if TYPE_CHECKING:
+    from app.services.chat_preflight import ChatPreflight
+
 
 
 def build_language_context(language_intel: dict | None) -> str | None:
@@ -263,6 +263,16 @@ def get_plugins() -> list[Plugin]:
     return _plugins
 
 
+def language_session_id(user_id: str, conversation_id: str | None = None) -> str:
+    """
+    Key for the language detector's session state.
+    
+    Per conversation when the client sends a conversation_id (scoped to the
+    user), otherwise per user.
+    """
+    return f"{user_id}:{conversation_id}" if conversation_id else user_id
+
+
 async def run_plugins_before_request(request: dict[str, Any]) -> dict[str, Any]:
     """
     Run all plugins' before_request hooks.
@@ -339,6 +349,37 @@ def parse_thinking_response(content: str) -> tuple[str, str | None]:
     return content, None
 
 
+def stream_chunk_events(content: str, in_thinking: bool) -> tuple[list[str], bool]:
+    """
+    Turn one streamed text delta into SSE events.
+    
+    Detects reasoning tags in any OptiLLM/CePO format (<think>, <thinking>,
+    <reflection>, <plan>) and emits thinking_start/thinking/thinking_end
+    around them; everything else is plain content.
+    
+    Args:
+        content: Text delta from the provider stream
+        in_thinking: Whether a reasoning block is currently open
+        
+    Returns:
+        Tuple of (SSE-formatted events, updated in_thinking)
+    """
+    content_lower = content.lower()
+    events: list[str] = []
+    
+    if not in_thinking and any(tag in content_lower for tag in REASONING_OPEN_TAGS):
+        in_thinking = True
+        events.append(f"data: {json.dumps({'type': 'thinking_start'})}\n\n")
+    
+    if in_thinking and any(tag in content_lower for tag in REASONING_CLOSE_TAGS):
+        in_thinking = False
+        events.append(f"data: {json.dumps({'type': 'thinking_end'})}\n\n")
+    
+    event_type = "thinking" if in_thinking else "content"
+    events.append(f"data: {json.dumps({'type': event_type, 'content': content})}\n\n")
+    return events, in_thinking
+
+
 class AIService:
     """
     Tier-based AI Service for text generation.
@@ -346,7 +387,7 @@ class AIService:
     SIMPLIFIED ARCHITECTURE (2025-01):
     
     FREE Tier:
-        → OpenRouter Qwen 3 235B FREE
+        → OpenRouter Qwen 3 235B FREE (streams via OpenRouter SSE)
         
     JIVE Tier:
         → Cerebras Qwen 3 32B (thinking mode)
@@ -365,6 +406,8 @@ class AIService:
         force_layer: CognitiveLayer | None = None,
         context_tokens: int = 0,
         request_id: str | None = None,
+        conversation_id: str | None = None,
+        preflight: "ChatPreflight | None" = None,
     ) -> ResponseDict:
         """
         Generate a response based on user tier.
@@ -385,6 +428,8 @@ class AIService:
             force_layer: Optional layer override
             context_tokens: Number of tokens in context (for JIGGA thinking mode)
             request_id: Unique request ID for idempotency
+            conversation_id: Conversation ID (keys session language state)
+            preflight: Preflight already run by the caller (credit check, plugins, intent)
             
         Returns:
             Dict containing the response and metadata
@@ -398,126 +443,92 @@ class AIService:
         if not request_id:
             request_id = str(uuid.uuid4())
         
-        # PRE-FLIGHT CREDIT CHECK
-        # Estimate 10K tokens for initial check (actual deduction uses real count)
-        user_state = await CreditService.get_user_state(user_id)
-        credit_check = CreditService.check_action(
-            user_state, 
-            ActionType.CHAT_10K_TOKENS,
-            quantity=1,  # 1 unit = 10K tokens estimate
-        )
-        
-        # Track deduction source for later
-        deduction_source = credit_check.source
-        original_tier = user_tier
-        
-        # Handle tier fallback if needed
-        if not credit_check.allowed:
-            # This shouldn't happen for chat (always falls back to FREE)
-            # but handle edge case
-            logger.warning(
-                f"Credit check denied for chat: user={user_id}, reason={credit_check.reason}"
-            )
-            user_tier = UserTier.FREE
-            deduction_source = DeductionSource.FREE
-        elif credit_check.source == DeductionSource.FREE:
-            # Subscription exceeded, no credits → fallback to FREE tier
-            logger.info(
-                f"Tier fallback to FREE: user={user_id}, original_tier={user_tier.value}"
+        # PRE-FLIGHT: credit check concurrently with plugins and intent classification
+        # (the chat endpoint runs it earlier, together with subscription verification)
+        if preflight is None:
+            from app.services.chat_preflight import run_chat_preflight
+            preflight = await run_chat_preflight(
+                user_id=user_id,
+                message=message,
+                user_tier=user_tier,
+                history=history,
+                context_tokens=context_tokens,
+                conversation_id=conversation_id,
             )
-            user_tier = UserTier.FREE
-        # Build request object for plugins
-        request = {
-            "user_id": user_id,
-            "message": message,
-            "messages": [],  # Will be built by internal methods
-            "history": history,
-            "user_tier": user_tier.value,
-            "metadata": {
-                "original_message": message,
-                "user_tier": user_tier.value,
-                "context_tokens": context_tokens
-            }
-        }
-        
-        # Build messages for plugin processing
-        if history:
-            request["messages"].extend(history[-MAX_HISTORY_TURNS:])
-        request["messages"].append({"role": "user", "content": message})
         
-        # RUN PLUGINS: Enrich context with language intelligence (MANDATORY)
-        request = await run_plugins_before_request(request)
+        user_tier = preflight.tier
         
-        # Extract potentially modified message and history
         # Plugins may have added system prompts or modified content
+        request = preflight.request
         messages = request.get("messages", [])
         modified_history = [msg for msg in messages if msg.get("role") != "user"]
-        
-        # Use last user message in case plugin modified it
-        last_user_msg = next(
-            (msg["content"] for msg in reversed(messages) if msg.get("role") == "user"),
-            message
-        )
+        last_user_msg = preflight.message
         
         # Determine which layer to use
-        if force_layer:
-            layer = force_layer
-        else:
-            layer = tier_router.classify_intent(last_user_msg, user_tier, context_tokens)
+        layer = force_layer or preflight.layer
         
         # Extract language intelligence from plugin metadata for system prompt injection
-        lang_intel = request.get("metadata", {}).get("language_intelligence", None)
+        lang_intel = preflight.language_intelligence
         
-        # SIMPLIFIED ROUTING (2025-01):
-        # - FREE: OpenRouter
-        # - JIVE/JIGGA: Cerebras Qwen (unified path)
-        if layer == CognitiveLayer.FREE_TEXT:
-            response = await AIService._generate_free(user_id, last_user_msg, modified_history or history, lang_intel)
-        
-        elif layer == CognitiveLayer.JIVE_TEXT:
-            # JIVE tier: Qwen 32B with thinking mode
-            response = await AIService._generate_cerebras(
-                user_id, last_user_msg, modified_history or history, layer,
-                thinking_mode=True,
-                enable_tools=True,
-                tier="jive",
-                language_intel=lang_intel
-            )
+        reservations = get_credit_reservations()
+        try:
+            # SIMPLIFIED ROUTING (2025-01):
+            # - FREE: OpenRouter
+            # - JIVE/JIGGA: Cerebras Qwen (unified path)
+            if layer == CognitiveLayer.FREE_TEXT:
+                response = await AIService._generate_free(user_id, last_user_msg, modified_history or history, lang_intel)
+        
+            elif layer == CognitiveLayer.JIVE_TEXT:
+                # JIVE tier: Qwen 32B with thinking mode
+                response = await AIService._generate_cerebras(
+                    user_id, last_user_msg, modified_history or history, layer,
+                    thinking_mode=True,
+                    enable_tools=True,
+                    tier="jive",
+                    language_intel=lang_intel
+                )
         
-        elif layer == CognitiveLayer.JIVE_COMPLEX:
-            # JIVE tier (complex/legal/extended): Qwen 235B with thinking mode
-            response = await AIService._generate_cerebras(
-                user_id, last_user_msg, modified_history or history, layer,
-                thinking_mode=True,
-                enable_tools=True,
-                tier="jive",
-                use_235b=True,  # Use 235B model for complex queries
-                language_intel=lang_intel
-            )
+            elif layer == CognitiveLayer.JIVE_COMPLEX:
+                # JIVE tier (complex/legal/extended): Qwen 235B with thinking mode
+                response = await AIService._generate_cerebras(
+                    user_id, last_user_msg, modified_history or history, layer,
+                    thinking_mode=True,
+                    enable_tools=True,
+                    tier="jive",
+                    use_235b=True,  # Use 235B model for complex queries
+                    language_intel=lang_intel
+                )
         
-        elif layer == CognitiveLayer.JIGGA_THINK:
-            # JIGGA tier (general): Qwen 32B with thinking mode
-            response = await AIService._generate_cerebras(
-                user_id, last_user_msg, modified_history or history, layer,
-                thinking_mode=True,
-                enable_tools=True,
-                tier="jigga",
-                language_intel=lang_intel
-            )
+            elif layer == CognitiveLayer.JIGGA_THINK:
+                # JIGGA tier (general): Qwen 32B with thinking mode
+                response = await AIService._generate_cerebras(
+                    user_id, last_user_msg, modified_history or history, layer,
+                    thinking_mode=True,
+                    enable_tools=True,
+                    tier="jigga",
+                    language_intel=lang_intel
+                )
         
-        elif layer == CognitiveLayer.JIGGA_COMPLEX:
-            # JIGGA tier (complex/legal): Qwen 235B with thinking mode
-            response = await AIService._generate_cerebras(
-                user_id, last_user_msg, modified_history or history, layer,
-                thinking_mode=True,
-                enable_tools=True,
-                tier="jigga",
-                use_235b=True,  # Use 235B model for complex queries
-                language_intel=lang_intel
-            )
-        else:
-            # Default fallback
-            response = await AIService._generate_free(user_id, last_user_msg, modified_history or history, lang_intel)
+            elif layer == CognitiveLayer.JIGGA_COMPLEX:
+                # JIGGA tier (complex/legal): Qwen 235B with thinking mode
+                response = await AIService._generate_cerebras(
+                    user_id, last_user_msg, modified_history or history, layer,
+                    thinking_mode=True,
+                    enable_tools=True,
+                    tier="jigga",
+                    use_235b=True,  # Use 235B model for complex queries
+                    language_intel=lang_intel
+                )
+            else:
+                # Default fallback
+                response = await AIService._generate_free(user_id, last_user_msg, modified_history or history, lang_intel)
+        except BaseException:
+            # Nothing to bill: give the held estimate back
+            reservations.release(preflight.reservation)
+            raise
+        
+        # Per-stage preflight timings (ms) for TTFT analysis
+        response.setdefault("meta", {})["preflight_ms"] = preflight.timings
         
         # Merge plugin metadata into response
         if "metadata" in request:
@@ -539,61 +550,76 @@ class AIService:
         # RUN PLUGINS: Post-process response (if needed)
         response = await run_plugins_after_response(response)
         
-        # ENTERPRISE: Deduct usage with idempotency
+        # ENTERPRISE: Settle usage with idempotency
         # Extract actual token counts from response for accurate billing
-        duration_ms = int((time_module.time() - start_time) * 1000)
-        meta = response.get("meta", {})
-        total_tokens = meta.get("total_tokens", 0)
-        input_tokens = meta.get("input_tokens", 0)
-        output_tokens = meta.get("output_tokens", 0)
+        meta = response.setdefault("meta", {})
+        meta["billing"] = AIService.settle_chat_usage(
+            user_id,
+            preflight,
+            meta.get("total_tokens", 0),
+            request_id=request_id,
+            model=meta.get("model", "unknown"),
+            provider=meta.get("provider", "unknown"),
+            duration_ms=int((time_module.time() - start_time) * 1000),
+        )
+        
+        return response
+    
+    @staticmethod
+    def settle_chat_usage(
+        user_id: str,
+        preflight: "ChatPreflight",
+        total_tokens: int,
+        *,
+        request_id: str,
+        model: str,
+        provider: str,
+        duration_ms: int,
+    ) -> dict[str, Any]:
+        """
+        Bill a chat turn: settle its tokens against the preflight reservation.
+        
+        Paid turns swap the held estimate for the actual 10K-token units
+        (shipped to the frontend in batches, keyed chat:<user>:<request>);
+        FREE turns release the hold.
+        
+        Returns:
+            Billing info for response meta
+        """
+        deduction_source = preflight.deduction_source
+        reservations = get_credit_reservations()
         
         # Calculate 10K token units for billing (round up)
         token_units = max(1, (total_tokens + 9999) // 10000)
         
         # Only deduct if not FREE tier and action was allowed
-        if deduction_source and deduction_source != DeductionSource.FREE:
-            try:
-                # Generate idempotency key: action:user:request_id
-                idempotency_key = f"chat:{user_id}:{request_id}"
-                
-                deduct_result = await CreditService.deduct_usage(
-                    user_id=user_id,
-                    action=ActionType.CHAT_10K_TOKENS,
-                    quantity=token_units,
-                    source=deduction_source,
-                    idempotency_key=idempotency_key,
-                    request_id=request_id,
-                    model=meta.get("model", "unknown"),
-                    provider=meta.get("provider", "unknown"),
-                    tier=original_tier.value,
-                    duration_ms=duration_ms,
-                )
-                
-                # Add billing info to response meta
-                if "meta" not in response:
-                    response["meta"] = {}
-                response["meta"]["billing"] = {
-                    "source": deduction_source.value,
-                    "token_units": token_units,
-                    "credits_deducted": deduct_result.get("creditsDeducted", 0),
-                    "event_id": deduct_result.get("eventId"),
-                    "duplicate": deduct_result.get("duplicate", False),
-                }
-            except Exception as e:
-                # Log but don't fail the response
-                logger.error(f"Failed to deduct usage: user={user_id}, error={e}")
-        else:
-            # FREE tier - add billing info for transparency
-            if "meta" not in response:
-                response["meta"] = {}
-            response["meta"]["billing"] = {
-                "source": "free",
+        if deduction_source and deduction_source != DeductionSource.FREE and preflight.reservation:
+            settlement = reservations.settle(
+                preflight.reservation,
+                token_units,
+                idempotency_key=f"chat:{user_id}:{request_id}",
+                request_id=request_id,
+                model=model,
+                provider=provider,
+                tier=preflight.verified_tier.value,
+                duration_ms=duration_ms,
+            )
+            return {
+                "source": deduction_source.value,
                 "token_units": token_units,
-                "credits_deducted": 0,
-                "reason": "Free tier fallback" if deduction_source == DeductionSource.FREE else "Subscription included",
+                "credits_deducted": settlement["creditsDeducted"],
+                "event_id": settlement["settlementId"],
+                "estimated_units": preflight.reservation.quantity,
             }
         
-        return response
+        # FREE tier - add billing info for transparency
+        reservations.release(preflight.reservation)
+        return {
+            "source": "free",
+            "token_units": token_units,
+            "credits_deducted": 0,
+            "reason": "Free tier fallback" if deduction_source == DeductionSource.FREE else "Subscription included",
+        }
     
     @staticmethod
     async def _generate_free(
@@ -613,6 +639,30 @@ class AIService:
         """
         from app.services.openrouter_service import openrouter_service
         
+        system_prompt, enhanced_message = AIService._prepare_free_prompt(message, language_intel)
+        
+        logger.info(
+            f"FREE text | user={user_id} | prompt={message[:50]}..." if len(message) > 50 else f"FREE text | user={user_id} | prompt={message}"
+        )
+        
+        return await openrouter_service.chat_free(
+            message=enhanced_message,
+            system_prompt=system_prompt,
+            history=history,
+            user_id=user_id
+        )
+    
+    @staticmethod
+    def _prepare_free_prompt(message: str, language_intel: dict | None) -> tuple[str, str]:
+        """
+        Build the FREE tier system prompt and user message.
+        
+        Shared by the blocking and streaming FREE paths so both get the same
+        language context and light OptiLLM enhancements.
+        
+        Returns:
+            Tuple of (system_prompt, enhanced_message)
+        """
         system_prompt = tier_router.get_system_prompt(CognitiveLayer.FREE_TEXT)
         
         # INJECT LANGUAGE INTELLIGENCE into system prompt
@@ -634,16 +684,7 @@ class AIService:
         if enhancement_config.use_reread and len(message) > 50:
             enhanced_message = enhance_user_message(message, enhancement_config)
         
-        logger.info(
-            f"FREE text | user={user_id} | prompt={message[:50]}..." if len(message) > 50 else f"FREE text | user={user_id} | prompt={message}"
-        )
-        
-        return await openrouter_service.chat_free(
-            message=enhanced_message,
-            system_prompt=system_prompt,
-            history=history,
-            user_id=user_id
-        )
+        return system_prompt, enhanced_message
     
     @staticmethod
     async def _generate_cerebras(
@@ -753,89 +794,44 @@ class AIService:
         logger.info(f"{tier.upper()} thinking mode - model={model_id}, temp=0.6, top_p=0.95, max_tokens={max_tokens}")
 
         try:
-            # === CEPO ROUTING (if enabled) ===
-            # Route through CePO sidecar for enhanced 4-step reasoning + Best of N
-            # Falls back to direct Cerebras API on failure
-            if settings.CEPO_ENABLED and not enable_tools:  # CePO doesn't support tool calling yet
-                try:
-                    cepo_service = get_cepo_service()
-                    cepo_config = CePoConfig(
-                        bestofn_n=settings.CEPO_BESTOFN_N,
-                        max_tokens=max_tokens,
-                        timeout_seconds=settings.CEPO_TIMEOUT,
-                    )
-                    
-                    logger.info(f"Routing {tier.upper()} request through CePO sidecar")
-                    cepo_response = await cepo_service.generate_with_cepo(
-                        model=model_id,
-                        messages=messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        config=cepo_config,
-                    )
-                    
-                    # Parse CePO response (OpenAI format)
-                    choice = cepo_response.get("choices", [{}])[0]
-                    raw_content = choice.get("message", {}).get("content", "")
-                    usage = cepo_response.get("usage", {})
-                    
-                    # Extract thinking/reasoning sections from CePO response
-                    # CePO uses cot_reflection approach which outputs <thinking>, <reflection>, <output> tags
-                    parsed_sections = parse_enhanced_response(raw_content)
-                    thinking_content = ""
-                    
-                    # Combine all reasoning sections for display
-                    if parsed_sections.get("thinking"):
-                        thinking_content += f"[Thinking]\n{parsed_sections['thinking']}\n\n"
-                    if parsed_sections.get("reflection"):
-                        thinking_content += f"[Reflection]\n{parsed_sections['reflection']}\n\n"
-                    if parsed_sections.get("plan"):
-                        thinking_content += f"[Plan]\n{parsed_sections['plan']}\n\n"
-                    
-                    # Use clean output as main response, or raw content if no <output> found
-                    content = parsed_sections.get("output", raw_content)
-                    
-                    elapsed = time.perf_counter() - start_time
-                    logger.info(f"CePO response received in {elapsed:.2f}s (has_thinking={bool(thinking_content)})")
-                    
-                    # Track usage and return response
-                    await track_usage(
-                        user_id=user_id,
-                        tier=tier,
-                        input_tokens=usage.get("prompt_tokens", 0),
-                        output_tokens=usage.get("completion_tokens", 0),
-                        model=model_id,
-                    )
-                    
-                    return {
-                        "response": content,
-                        "thinking": thinking_content.strip() if thinking_content else None,
-                        "tool_calls": [],
-                        "meta": {
-                            "model": model_id,
-                            "layer": layer.value,
-                            "provider": "cepo",
-                            "latency_ms": int(elapsed * 1000),
-                            "input_tokens": usage.get("prompt_tokens", 0),
-                            "output_tokens": usage.get("completion_tokens", 0),
-                            "cepo_metrics": cepo_service.get_metrics(),
-                            "has_thinking": bool(thinking_content),
-                        }
+            # Get tools for this tier (JIVE gets basic, JIGGA gets all, 235B gets delegate)
+            tools = get_tools_for_tier(tier, model=model_id) if enable_tools else None
+
+            # === BEST-OF-N (complex prompts, in-process) ===
+            # Concurrent candidates with early stopping; N=1 means a plain single call.
+            # Candidates get the tools too: one that calls a tool is returned as the single call
+            response = None
+            best_of_n = None
+            if settings.BEST_OF_N_ENABLED:
+                orchestrator = get_best_of_n()
+                n = orchestrator.choose_n(message, is_complex=is_complex)
+                if n > 1:
+                    sample_kwargs = {
+                        "messages": messages,
+                        "model": model_id,
+                        "max_tokens": max_tokens,
+                        "top_p": top_p,
                     }
-                    
-                except Exception as cepo_error:
-                    # CePO failed - continue to standard Cerebras path (failsafe)
-                    logger.warning(f"CePO routing failed, falling back to direct: {cepo_error}")
+                    if tools:
+                        sample_kwargs["tools"] = tools
+                        sample_kwargs["parallel_tool_calls"] = False
+                    try:
+                        best_of_n = await orchestrator.run(
+                            lambda temp: AIService._sample_cerebras(sample_kwargs, temp),
+                            n=n,
+                            temperature=temperature,
+                        )
+                        response = best_of_n.response
+                    except Exception as bon_error:
+                        # Failsafe: continue to the standard single-call path
+                        logger.warning(f"Best-of-N failed, falling back to single call: {bon_error}")
             
             # === STANDARD CEREBRAS PATH ===
             rotator = get_key_rotator()
-            
-            # Get tools for this tier (JIVE gets basic, JIGGA gets all, 235B gets delegate)
-            tools = get_tools_for_tier(tier, model=model_id) if enable_tools else None
 
-            # Retry loop with key rotation for rate limits
+            # Retry loop with key rotation for rate limits (skipped when Best-of-N answered)
             last_error = None
-            for attempt in range(MAX_RETRIES):
+            for attempt in range(MAX_RETRIES if response is None else 0):
                 client, api_key = get_client()  # Get next key via rotation
                 key_name = api_key[:8] + "..." + api_key[-4:]  # For logging
                 logger.debug(f"🔑 Attempt {attempt+1}/{MAX_RETRIES} using key {key_name}")
@@ -900,6 +896,10 @@ class AIService:
                     )
 
             usage = response.usage
+            input_tokens, output_tokens = usage.prompt_tokens, usage.completion_tokens
+            if best_of_n:
+                # Bill every completed candidate, not just the winner
+                input_tokens, output_tokens = best_of_n.input_tokens, best_of_n.output_tokens
             choice = response.choices[0].message
             raw_content = choice.content or ""
             latency = time.perf_counter() - start_time
@@ -946,14 +946,14 @@ class AIService:
                 user_id=user_id,
                 model=model_id,
                 layer=layer.value,
-                input_tokens=usage.prompt_tokens,
-                output_tokens=usage.completion_tokens,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
                 tier=tier
             )
 
             logger.info(
                 "Cerebras complete | tier=%s | layer=%s | latency=%.2fs | tokens=%d/%d",
-                tier, layer.value, latency, usage.prompt_tokens, usage.completion_tokens
+                tier, layer.value, latency, input_tokens, output_tokens
             )
 
             result: ResponseDict = {
@@ -972,14 +972,17 @@ class AIService:
                     },
                     "latency_seconds": round(latency, 3),
                     "tokens": {
-                        "input": usage.prompt_tokens,
-                        "output": usage.completion_tokens
+                        "input": input_tokens,
+                        "output": output_tokens
                     },
                     "cost_usd": cost_data["usd"],
                     "cost_zar": cost_data["zar"]
                 }
             }
 
+            if best_of_n:
+                result["meta"]["best_of_n"] = best_of_n.to_meta()
+
             # Include thinking block separately if present (for UI to display collapsed)
             if thinking_block:
                 result["thinking"] = thinking_block
@@ -1008,6 +1011,30 @@ class AIService:
                 "GOGGA AI encountered an issue. Please try again."
             ) from e
     
+    @staticmethod
+    async def _sample_cerebras(api_kwargs: dict[str, Any], temperature: float) -> Any:
+        """
+        One Best-of-N candidate: a single Cerebras call on the next rotated key.
+        
+        No retry loop here - a rate-limited candidate just drops out and the
+        orchestrator continues with the others.
+        """
+        rotator = get_key_rotator()
+        client, api_key = get_client()
+        try:
+            response = await asyncio.to_thread(
+                client.chat.completions.create,
+                temperature=temperature,
+                **api_kwargs
+            )
+        except Exception as e:
+            error_str = str(e).lower()
+            if "429" in error_str or "too_many_requests" in error_str or "rate" in error_str:
+                rotator.mark_rate_limited(api_key)
+            raise
+        rotator.mark_success(api_key)
+        return response
+    
     @staticmethod
     async def _fallback_to_openrouter(
         user_id: str,
@@ -1124,6 +1151,128 @@ class AIService:
             logger.error("Streaming fallback also failed: %s", e)
             yield f"data: {json.dumps({'type': 'error', 'message': 'GOGGA AI is experiencing high demand. Please try again in a moment.'})}\n\n"
 
+    @staticmethod
+    async def _generate_free_stream(
+        user_id: str,
+        message: str,
+        history: list[MessageDict] | None,
+        raw_user_message: str | None = None,
+        conversation_id: str | None = None,
+    ):
+        """
+        FREE tier: OpenRouter SSE streaming.
+        
+        Emits the same event schema as the Cerebras stream (meta, content,
+        thinking_*, done). Usage comes from OpenRouter's final chunk.
+        
+        Yields:
+            SSE-formatted strings: "data: {json}\n\n"
+        """
+        from app.services.openrouter_service import openrouter_service
+        
+        layer = CognitiveLayer.FREE_TEXT
+        model_id = openrouter_service.model_qwen
+        
+        # Language detection on the raw message (no context injection)
+        request = {
+            "messages": [],
+            "metadata": {},
+            "session_id": language_session_id(user_id, conversation_id),
+        }
+        if history:
+            request["messages"].extend(history[-MAX_HISTORY_TURNS:])
+        request["messages"].append({"role": "user", "content": raw_user_message or message})
+        request = await run_plugins_before_request(request)
+        lang_intel = request.get("metadata", {}).get("language_intelligence", None)
+        
+        system_prompt, enhanced_message = AIService._prepare_free_prompt(message, lang_intel)
+        start_time = time.perf_counter()
+        
+        try:
+            yield f"data: {json.dumps({'type': 'meta', 'tier': 'free', 'layer': layer.value, 'model': model_id, 'thinking_mode': False})}\n\n"
+            
+            usage: dict[str, Any] = {}
+            full_content = ""
+            in_thinking = False
+            
+            async for event in openrouter_service.chat_free_stream(
+                message=enhanced_message,
+                system_prompt=system_prompt,
+                history=history,
+                user_id=user_id
+            ):
+                if content := event.get("content"):
+                    full_content += content
+                    events, in_thinking = stream_chunk_events(content, in_thinking)
+                    for sse_event in events:
+                        yield sse_event
+                elif fallback_model := event.get("fallback"):
+                    yield f"data: {json.dumps({'type': 'tool_log', 'level': 'info', 'message': '[>] Switching to backup model...', 'icon': 'refresh'})}\n\n"
+                    model_id = fallback_model
+                elif "usage" in event:
+                    usage = event["usage"] or {}
+                    model_id = event.get("model", model_id)
+            
+            latency = time.perf_counter() - start_time
+            main_response, thinking_block = parse_thinking_response(full_content)
+            
+            if not main_response.strip():
+                fallback_msg = "I apologize, but I couldn't generate a response. Please try again or rephrase your question."
+                logger.warning("OpenRouter returned empty stream | model=%s", model_id)
+                yield f"data: {json.dumps({'type': 'content', 'content': fallback_msg})}\n\n"
+            
+            input_tokens = usage.get("prompt_tokens", 0)
+            output_tokens = usage.get("completion_tokens", 0)
+            
+            cost_data = await track_usage(
+                user_id=user_id,
+                model=model_id,
+                layer=layer.value,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                tier="free"
+            )
+            
+            logger.info(
+                "FREE stream complete | model=%s | latency=%.2fs | tokens=%d/%d",
+                model_id, latency, input_tokens, output_tokens
+            )
+            
+            done_data = {
+                "type": "done",
+                "meta": {
+                    "tier": "free",
+                    "layer": layer.value,
+                    "model": model_id,
+                    "provider": "openrouter",
+                    "thinking_mode": False,
+                    "no_think": False,
+                    "latency_seconds": round(latency, 3),
+                    "tokens": {
+                        "input": input_tokens,
+                        "output": output_tokens
+                    },
+                    "cost_usd": cost_data["usd"],
+                    "cost_zar": cost_data["zar"],
+                    "has_thinking": thinking_block is not None
+                }
+            }
+            if lang_intel:
+                done_data["detected_language"] = {
+                    "code": lang_intel.get("code", "en"),
+                    "name": lang_intel.get("name", "English"),
+                    "confidence": lang_intel.get("confidence", 0),
+                }
+            yield f"data: {json.dumps(done_data)}\n\n"
+        
+        except Exception as e:
+            logger.error("FREE streaming error: %s", e)
+            error_response = {
+                "type": "error",
+                "error": "GOGGA AI encountered an issue. Please try again."
+            }
+            yield f"data: {json.dumps(error_response)}\n\n"
+
     @staticmethod
     async def generate_stream(
         user_id: str,
@@ -1133,9 +1282,10 @@ class AIService:
         thinking_mode: bool = False,
         append_no_think: bool = False,
         raw_user_message: str | None = None,
+        conversation_id: str | None = None,
     ):
         """
-        JIVE/JIGGA tier: Cerebras streaming response.
+        Tiered streaming response: Cerebras for JIVE/JIGGA, OpenRouter for FREE.
 
         Yields chunks of the response as Server-Sent Events (SSE) format.
 
@@ -1143,15 +1293,21 @@ class AIService:
             user_id: User identifier for tracking
             message: The user's message (may include context injection)
             history: Previous conversation history
-            layer: The cognitive layer (JIVE_DIRECT, JIGGA_THINK, etc.)
+            layer: The cognitive layer (FREE_TEXT, JIVE_DIRECT, JIGGA_THINK, etc.)
             thinking_mode: Use Qwen thinking settings (JIGGA)
             append_no_think: Append /no_think to message (JIGGA fast)
             raw_user_message: Original user message without context - used for language detection
+            conversation_id: Conversation ID (keys session language state)
 
         Yields:
             SSE-formatted strings: "data: {json}\n\n"
         """
-        import json
+        if layer == CognitiveLayer.FREE_TEXT:
+            async for chunk in AIService._generate_free_stream(
+                user_id, message, history, raw_user_message, conversation_id
+            ):
+                yield chunk
+            return
         
         config = tier_router.get_model_config(layer)
         model_id = config["model"]
@@ -1208,7 +1364,6 @@ class AIService:
             output_tokens = 0
             full_content = ""
             in_thinking = False
-            thinking_buffer = ""
             stream = None
             
             # Retry loop with key rotation for rate limits
@@ -1267,32 +1422,11 @@ class AIService:
                 if chunk.choices and chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
                     full_content += content
-                    content_lower = content.lower()
-                    
-                    # Detect reasoning tags - supports all OptiLLM/CePO formats
-                    # Works for: <think>, <thinking>, <reflection>, <plan>
-                    is_reasoning_start = any(tag in content_lower for tag in REASONING_OPEN_TAGS)
-                    is_reasoning_end = any(tag in content_lower for tag in REASONING_CLOSE_TAGS)
                     
-                    # Check for thinking/reasoning tags (JIGGA mode or any CePO/OptiLLM response)
-                    if thinking_mode or is_reasoning_start or in_thinking:
-                        # Detect start of thinking/reasoning block
-                        if is_reasoning_start and not in_thinking:
-                            in_thinking = True
-                            yield f"data: {json.dumps({'type': 'thinking_start'})}\n\n"
-                        
-                        # Detect end of thinking/reasoning block
-                        if is_reasoning_end and in_thinking:
-                            in_thinking = False
-                            yield f"data: {json.dumps({'type': 'thinking_end'})}\n\n"
-                        
-                        # Send content with appropriate type
-                        if in_thinking:
-                            yield f"data: {json.dumps({'type': 'thinking', 'content': content})}\n\n"
-                        else:
-                            yield f"data: {json.dumps({'type': 'content', 'content': content})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type': 'content', 'content': content})}\n\n"
+                    # Detect reasoning tags (JIGGA mode or any CePO/OptiLLM response)
+                    events, in_thinking = stream_chunk_events(content, in_thinking)
+                    for event in events:
+                        yield event
                 
                 # Track usage from final chunk
                 if hasattr(chunk, 'usage') and chunk.usage:
@@ -1374,6 +1508,7 @@ class AIService:
         tier: str = "jive",
         force_tool: str | None = None,  # ToolShed: Force specific tool by name
         raw_user_message: str | None = None,  # Original message for language detection
+        conversation_id: str | None = None,  # Keys session language state
     ):
         """
         Generate response with streaming tool execution logs.
@@ -1390,7 +1525,7 @@ class AIService:
         from app.tools.executor import execute_math_tool
         from app.tools.definitions import get_tools_for_tier
         from app.tools.math_definitions import ALL_MATH_TOOL_NAMES
-        from app.tools.search_executor import execute_search_tool, ALL_SEARCH_TOOL_NAMES
+        from app.tools.search_executor import execute_search_tools, ALL_SEARCH_TOOL_NAMES
         
         config = tier_router.get_model_config(layer)
         model_id = config["model"]
@@ -1402,7 +1537,11 @@ class AIService:
         message_for_detection = raw_user_message or message
         
         # Build request dict for plugin processing
-        request = {"messages": [], "metadata": {}}
+        request = {
+            "messages": [],
+            "metadata": {},
+            "session_id": language_session_id(user_id, conversation_id),
+        }
         if history:
             request["messages"].extend(history[-MAX_HISTORY_TURNS:])
         # Use raw message for detection to avoid context pollution
@@ -1558,43 +1697,30 @@ class AIService:
                 yield f"data: {json.dumps({'type': 'tool_start', 'tools': [tc['name'] for tc in search_tool_calls], 'tool_type': 'search'})}\n\n"
                 
                 for tc in search_tool_calls:
-                    tool_name = tc["name"]
-                    args = tc["arguments"]
-                    
-                    query_preview = args.get("query", "")[:50]
+                    query_preview = tc["arguments"].get("query", "")[:50]
                     search_log = {'type': 'tool_log', 'level': 'info', 'message': f'[>] Searching: {query_preview}...', 'icon': 'search'}
                     yield f"data: {json.dumps(search_log)}\n\n"
+                
+                # One fan-out for the whole turn: batched Serper request, each URL scraped once
+                tool_results = await execute_search_tools([(tc["name"], tc["arguments"]) for tc in search_tool_calls])
+                
+                for tc, result in zip(search_tool_calls, tool_results):
+                    if result.get("success"):
+                        count = result.get("results_count", result.get("places_count", 0))
+                        time_ms = result.get("search_time_ms", 0)
+                        success_log = {'type': 'tool_log', 'level': 'success', 'message': f'[+] Found {count} results in {time_ms}ms', 'icon': 'check'}
+                        yield f"data: {json.dumps(success_log)}\n\n"
+                    else:
+                        error_msg = result.get("error", "Unknown error")
+                        warn_log = {'type': 'tool_log', 'level': 'warning', 'message': f'[!] Search partial: {error_msg}', 'icon': 'warning'}
+                        yield f"data: {json.dumps(warn_log)}\n\n"
                     
-                    try:
-                        result = await execute_search_tool(tool_name, args)
-                        
-                        if result.get("success"):
-                            count = result.get("results_count", result.get("places_count", 0))
-                            time_ms = result.get("search_time_ms", 0)
-                            success_log = {'type': 'tool_log', 'level': 'success', 'message': f'[+] Found {count} results in {time_ms}ms', 'icon': 'check'}
-                            yield f"data: {json.dumps(success_log)}\n\n"
-                        else:
-                            error_msg = result.get("error", "Unknown error")
-                            warn_log = {'type': 'tool_log', 'level': 'warning', 'message': f'[!] Search partial: {error_msg}', 'icon': 'warning'}
-                            yield f"data: {json.dumps(warn_log)}\n\n"
-                        
-                        search_results.append({
-                            "tool_call_id": tc["id"],
-                            "role": "tool",
-                            "name": tool_name,
-                            "content": result.get("context", json.dumps(result))
-                        })
-                        
-                    except Exception as e:
-                        logger.error(f"Search tool {tool_name} failed: {e}")
-                        error_log = {'type': 'tool_log', 'level': 'error', 'message': f'[!] Search failed: {str(e)}', 'icon': 'error'}
-                        yield f"data: {json.dumps(error_log)}\n\n"
-                        search_results.append({
-                            "tool_call_id": tc["id"],
-                            "role": "tool",
-                            "name": tool_name,
-                            "content": f"[Search failed: {str(e)}]"
-                        })
+                    search_results.append({
+                        "tool_call_id": tc["id"],
+                        "role": "tool",
+                        "name": tc["name"],
+                        "content": result.get("context", json.dumps(result))
+                    })
                 
                 yield f"data: {json.dumps({'type': 'tool_complete', 'count': len(search_tool_calls), 'tool_type': 'search'})}\n\n"
             
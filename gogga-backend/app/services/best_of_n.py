@@ -0,0 +1,393 @@
+"""
+GOGGA Best-of-N - In-process parallel sampling with early stopping
+
+Replaces the CePO sidecar round trip. Instead of shipping the request to a
+separate container that runs its Best-of-N candidates mostly one after the
+other, the backend launches the candidates concurrently on the normal
+provider path and picks a winner locally.
+
+Design:
+- N adapts to prompt difficulty and current load; easy prompts get N=1,
+  so latency stays at a single call
+- Candidates run concurrently at slightly spread temperatures
+- Early stop: as soon as two finished candidates agree, we stop waiting for
+  the rest. Threaded SDK calls can't be cancelled, so stragglers still
+  count as in flight (and their usage is recorded) until they really finish
+- Winner picked with cheap local checks: agreement with the other candidates,
+  not truncated, not repetitive
+- Candidates carry the request's tools. The first candidate that asks for
+  a tool ends the run and is returned as is, exactly like a single
+  tool-enabled call: a tool round has no answer to vote on
+- Planning stays in the prompt (OptiLLM enhancements), no extra round trips
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Final, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Candidate i runs at base temperature + i * TEMPERATURE_STEP (capped)
+TEMPERATURE_STEP: Final[float] = 0.1
+MAX_TEMPERATURE: Final[float] = 1.0
+
+# Complex prompts shorter than this are usually one-liners (definitions,
+# single sums) where two samples are enough to confirm the answer
+SHORT_PROMPT_CHARS: Final[int] = 80
+
+# Load thresholds (fraction of max in-flight candidate calls)
+HIGH_LOAD: Final[float] = 0.75
+MODERATE_LOAD: Final[float] = 0.5
+
+# Share of answer_similarity decided by the final number when both answers have one
+NUMBER_WEIGHT: Final[float] = 0.5
+
+# Score weights
+AGREEMENT_WEIGHT: Final[float] = 0.5
+COMPLETE_WEIGHT: Final[float] = 0.25
+ORIGINALITY_WEIGHT: Final[float] = 0.25
+
+_THINK_BLOCK: Final[re.Pattern] = re.compile(r"<think(?:ing)?>.*?</think(?:ing)?>", re.DOTALL | re.IGNORECASE)
+_NUMBER: Final[re.Pattern] = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+_WORD: Final[re.Pattern] = re.compile(r"[a-z0-9]{3,}")
+
+# Produces one OpenAI-compatible completion at the given temperature
+Sampler = Callable[[float], Awaitable[Any]]
+
+
+@dataclass(slots=True)
+class Candidate:
+    """One finished sample."""
+    index: int
+    temperature: float
+    response: Any
+    content: str
+    answer: str
+    truncated: bool
+    wants_tools: bool
+    input_tokens: int
+    output_tokens: int
+    score: float = 0.0
+
+
+@dataclass
+class BestOfNResult:
+    """Outcome of a Best-of-N run."""
+    response: Any  # Winning provider response (OpenAI-compatible)
+    requested: int
+    completed: int
+    early_stopped: bool
+    input_tokens: int  # Summed over completed candidates (what we pay for)
+    output_tokens: int
+    latency_seconds: float
+    scores: list[float] = field(default_factory=list)
+    tool_call: bool = False  # Winner asked for a tool instead of answering
+
+    def to_meta(self) -> dict[str, Any]:
+        """Compact summary for response metadata."""
+        return {
+            "n": self.requested,
+            "completed": self.completed,
+            "early_stopped": self.early_stopped,
+            "tool_call": self.tool_call,
+            "scores": [round(s, 3) for s in self.scores],
+        }
+
+
+def _read_candidate(index: int, temperature: float, response: Any) -> Candidate:
+    choice = response.choices[0]
+    content = choice.message.content or ""
+    usage = getattr(response, "usage", None)
+    return Candidate(
+        index=index,
+        temperature=temperature,
+        response=response,
+        content=content,
+        answer=_THINK_BLOCK.sub("", content).strip(),
+        truncated=getattr(choice, "finish_reason", None) == "length",
+        wants_tools=bool(getattr(choice.message, "tool_calls", None)),
+        input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+    )
+
+
+def _content_words(text: str) -> set[str]:
+    return set(_WORD.findall(_NUMBER.sub(" ", text.lower())))
+
+
+def answer_similarity(a: str, b: str) -> float:
+    """
+    Cheap agreement between two answers (0.0 - 1.0).
+
+    Jaccard overlap of the content words. When both answers contain numbers
+    (maths, dates, amounts) the final number decides NUMBER_WEIGHT of the
+    score: a matching number with unrelated text is not agreement, and a
+    different number keeps otherwise similar answers apart.
+    """
+    if not a or not b:
+        return 0.0
+    numbers_a = _NUMBER.findall(a)
+    numbers_b = _NUMBER.findall(b)
+    words_a = _content_words(a)
+    words_b = _content_words(b)
+    if words_a or words_b:
+        overlap = len(words_a & words_b) / len(words_a | words_b)
+    elif numbers_a and numbers_b:
+        overlap = 1.0  # Bare numbers: only the numbers can agree
+    else:
+        overlap = 1.0 if a.strip().lower() == b.strip().lower() else 0.0
+    if not numbers_a or not numbers_b:
+        return overlap
+    same_number = numbers_a[-1].replace(",", "") == numbers_b[-1].replace(",", "")
+    return NUMBER_WEIGHT * same_number + (1 - NUMBER_WEIGHT) * overlap
+
+
+def repetition_ratio(text: str) -> float:
+    """Fraction of non-empty lines that are repeats (0.0 = no repetition)."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return 0.0
+    repeats = sum(count - 1 for count in Counter(lines).values())
+    return repeats / len(lines)
+
+
+def score_candidates(candidates: list[Candidate]) -> None:
+    """Score candidates in place with local checks only."""
+    for candidate in candidates:
+        if not candidate.answer:
+            candidate.score = 0.0
+            continue
+        others = [c for c in candidates if c is not candidate and c.answer]
+        agreement = (
+            sum(answer_similarity(candidate.answer, o.answer) for o in others) / len(others)
+            if others else 0.0
+        )
+        candidate.score = (
+            AGREEMENT_WEIGHT * agreement
+            + COMPLETE_WEIGHT * (0.0 if candidate.truncated else 1.0)
+            + ORIGINALITY_WEIGHT * (1.0 - repetition_ratio(candidate.answer))
+        )
+
+
+def _agreeing_pair(candidates: list[Candidate], threshold: float) -> bool:
+    usable = [c for c in candidates if c.answer and not c.truncated]
+    return any(
+        answer_similarity(a.answer, b.answer) >= threshold
+        for i, a in enumerate(usable)
+        for b in usable[i + 1:]
+    )
+
+
+class BestOfNOrchestrator:
+    """
+    Runs N concurrent samples and returns the best one.
+
+    Tracks in-flight candidate calls across requests so N shrinks under load.
+    """
+
+    def __init__(
+        self,
+        max_n: int = 3,
+        agreement_threshold: float = 0.6,
+        max_inflight: int = 24,
+        timeout_seconds: float = 120.0,
+    ) -> None:
+        """
+        Initialize the orchestrator.
+
+        Args:
+            max_n: Upper bound on candidates per request
+            agreement_threshold: Similarity at which two candidates "agree"
+            max_inflight: Candidate calls allowed in flight across all requests
+            timeout_seconds: Overall deadline per run
+        """
+        self.max_n = max_n
+        self.agreement_threshold = agreement_threshold
+        self.max_inflight = max_inflight
+        self.timeout_seconds = timeout_seconds
+
+        self._inflight = 0
+        self._stragglers: set[asyncio.Task] = set()  # Abandoned candidates still running
+        self._runs = 0
+        self._launched = 0
+        self._abandoned = 0
+        self._abandoned_input_tokens = 0
+        self._abandoned_output_tokens = 0
+        self._early_stops = 0
+        self._failed = 0
+
+    @property
+    def load(self) -> float:
+        """Fraction of candidate capacity currently in use."""
+        return self._inflight / self.max_inflight
+
+    def choose_n(self, message: str, is_complex: bool) -> int:
+        """
+        Pick N for a prompt.
+
+        Easy prompts get a single call. Complex prompts get up to max_n
+        (two for short ones), reduced when the backend is busy.
+        """
+        if not is_complex or self.max_n <= 1:
+            return 1
+
+        n = self.max_n if len(message) >= SHORT_PROMPT_CHARS else min(self.max_n, 2)
+        load = self.load
+        if load >= HIGH_LOAD:
+            n = 1
+        elif load >= MODERATE_LOAD:
+            n = min(n, 2)
+        return max(1, min(n, self.max_inflight - self._inflight))
+
+    async def _sample(self, sampler: Sampler, index: int, temperature: float) -> Candidate:
+        self._inflight += 1
+        try:
+            return _read_candidate(index, temperature, await sampler(temperature))
+        finally:
+            self._inflight -= 1
+
+    def _abandon(self, task: asyncio.Task) -> None:
+        """Stop waiting for a candidate; it stays in flight until its call returns."""
+        self._abandoned += 1
+        self._stragglers.add(task)
+        task.add_done_callback(self._straggler_done)
+
+    def _straggler_done(self, task: asyncio.Task) -> None:
+        self._stragglers.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            return
+        candidate = task.result()
+        # Paid for upstream even though nobody reads it
+        self._abandoned_input_tokens += candidate.input_tokens
+        self._abandoned_output_tokens += candidate.output_tokens
+
+    async def run(self, sampler: Sampler, n: int, temperature: float) -> BestOfNResult:
+        """
+        Launch n candidates concurrently and return the best.
+
+        Args:
+            sampler: Coroutine factory producing one completion at a temperature
+            n: Number of candidates
+            temperature: Base temperature (candidate 0); others are spread upward
+
+        Returns:
+            BestOfNResult with the winning response and summed usage
+
+        Raises:
+            RuntimeError: Every candidate failed
+            TimeoutError: No candidate finished before the deadline
+        """
+        start = time.perf_counter()
+        self._runs += 1
+
+        tasks = {
+            asyncio.create_task(
+                self._sample(sampler, i, min(temperature + i * TEMPERATURE_STEP, MAX_TEMPERATURE))
+            )
+            for i in range(n)
+        }
+        self._launched += n
+
+        finished: list[Candidate] = []
+        errors: list[BaseException] = []
+        pending = tasks
+        early_stopped = False
+        deadline = start + self.timeout_seconds
+
+        try:
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        self._failed += 1
+                    else:
+                        finished.append(task.result())
+
+                if pending and (
+                    any(c.wants_tools for c in finished)
+                    or _agreeing_pair(finished, self.agreement_threshold)
+                ):
+                    early_stopped = True
+                    self._early_stops += 1
+                    break
+        finally:
+            # Threaded SDK calls run to completion upstream whatever we do;
+            # leave them running so load and usage stay accurate
+            for task in pending:
+                self._abandon(task)
+
+        if not finished:
+            if errors:
+                raise RuntimeError(f"All {n} Best-of-N candidates failed") from errors[0]
+            raise TimeoutError(f"No Best-of-N candidate finished within {self.timeout_seconds:.0f}s")
+
+        finished.sort(key=lambda c: c.index)
+        score_candidates(finished)
+        tool_callers = [c for c in finished if c.wants_tools]
+        # A tool call wins outright; otherwise highest score, ties to the lowest temperature
+        winner = tool_callers[0] if tool_callers else max(finished, key=lambda c: (c.score, -c.index))
+        latency = time.perf_counter() - start
+
+        logger.info(
+            "[BestOfN] n=%d completed=%d early_stop=%s winner=%d score=%.2f tool_call=%s latency=%.2fs",
+            n, len(finished), early_stopped, winner.index, winner.score, bool(tool_callers), latency,
+        )
+
+        return BestOfNResult(
+            response=winner.response,
+            requested=n,
+            completed=len(finished),
+            early_stopped=early_stopped,
+            input_tokens=sum(c.input_tokens for c in finished),
+            output_tokens=sum(c.output_tokens for c in finished),
+            latency_seconds=latency,
+            scores=[c.score for c in finished],
+            tool_call=bool(tool_callers),
+        )
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get orchestrator statistics."""
+        return {
+            "inflight": self._inflight,
+            "load": round(self.load, 3),
+            "runs": self._runs,
+            "candidates_launched": self._launched,
+            "candidates_abandoned": self._abandoned,
+            "abandoned_running": len(self._stragglers),
+            "abandoned_tokens": {
+                "input": self._abandoned_input_tokens,
+                "output": self._abandoned_output_tokens,
+            },
+            "candidates_failed": self._failed,
+            "early_stops": self._early_stops,
+            "early_stop_rate": round(self._early_stops / self._runs, 3) if self._runs else 0.0,
+        }
+
+
+# Singleton instance
+_orchestrator: Optional[BestOfNOrchestrator] = None
+
+
+def get_best_of_n() -> BestOfNOrchestrator:
+    """Get the global Best-of-N orchestrator."""
+    global _orchestrator
+    if _orchestrator is None:
+        _orchestrator = BestOfNOrchestrator(
+            max_n=settings.BEST_OF_N_MAX,
+            agreement_threshold=settings.BEST_OF_N_AGREEMENT,
+            max_inflight=settings.BEST_OF_N_MAX_INFLIGHT,
+            timeout_seconds=settings.BEST_OF_N_TIMEOUT,
+        )
+    return _orchestrator
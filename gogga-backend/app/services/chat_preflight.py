@@ -0,0 +1,264 @@
+"""
+GOGGA Chat Preflight - Everything a chat request needs before the LLM call
+
+The preflight used to run serially: subscription verification (frontend
+round trip), CreditService.get_user_state (another round trip), history
+resolution, language detection plugins and intent classification. The two
+frontend lookups don't depend on the local steps, so their latency was
+simply added to time-to-first-token.
+
+Design:
+- Preflight starts I/O stages as tasks, runs local (CPU) stages on the
+  loop while they are in flight, then waits for the rest
+- The first stage to raise ends the preflight: pending stages are
+  cancelled and the error propagates (e.g. a 409 history conflict no
+  longer waits for the frontend lookups)
+- The credit stage reserves the estimated chat cost (credit_reservations)
+  instead of only checking it; the reservation is released if the
+  preflight fails after it was taken
+- Intent is classified speculatively with the requested tier; it is
+  re-classified only if the checks change the tier
+- Every stage is timed; the timings are returned in response meta
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from app.core.router import CognitiveLayer, UserTier, tier_router
+from app.services.credit_reservations import Reservation, estimate_chat_units, get_credit_reservations
+from app.services.credit_service import ActionType, DeductionSource
+from app.services.subscription_service import SubscriptionStatus, subscription_service
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Preflight:
+    """
+    Runs I/O stages concurrently with local stages and records per-stage timings.
+
+    Use as an async context manager; leaving the block cancels any stage
+    still pending (including after an error).
+    """
+
+    def __init__(self) -> None:
+        self.timings: dict[str, float] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._started = time.perf_counter()
+
+    async def __aenter__(self) -> "Preflight":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.cancel()
+        self.timings["total"] = self._elapsed_ms(self._started)
+
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    async def _timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[name] = self._elapsed_ms(start)
+
+    def start(self, name: str, awaitable: Awaitable[Any]) -> None:
+        """Start an I/O stage in the background."""
+        self._tasks[name] = asyncio.create_task(self._timed(name, awaitable), name=f"preflight-{name}")
+
+    def _raise_if_failed(self) -> None:
+        for task in self._tasks.values():
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+    async def run(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a local stage (sync or async), timed.
+
+        Yields once first so background stages get their requests on the wire,
+        and fails fast if one of them has already been rejected.
+        """
+        await asyncio.sleep(0)
+        self._raise_if_failed()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        finally:
+            self.timings[name] = self._elapsed_ms(start)
+
+    async def result(self, name: str) -> Any:
+        """Wait for one background stage."""
+        return await self._tasks[name]
+
+    def completed(self, name: str) -> Any:
+        """Result of a stage that finished successfully, else None."""
+        task = self._tasks.get(name)
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()
+
+    async def finish(self) -> dict[str, Any]:
+        """
+        Wait for all background stages.
+
+        Returns:
+            Stage name -> result
+
+        Raises:
+            The first stage error (the others are cancelled)
+        """
+        pending = [task for task in self._tasks.values() if not task.done()]
+        if pending:
+            await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+        self._raise_if_failed()
+        return {name: task.result() for name, task in self._tasks.items()}
+
+    def cancel(self) -> None:
+        """Cancel stages that are still running."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+
+@dataclass
+class ChatPreflight:
+    """Outcome of the chat preflight."""
+    requested_tier: UserTier
+    verified_tier: UserTier  # After subscription verification (billing tier)
+    tier: UserTier  # Tier to serve: after the credit check's FREE fallback
+    deduction_source: Optional[DeductionSource]
+    request: dict[str, Any]  # Plugin-enriched request (messages, metadata)
+    message: str  # Last user message after plugins
+    layer: CognitiveLayer
+    subscription: Optional[SubscriptionStatus] = None
+    history: Optional[list[dict[str, Any]]] = None  # Resolved history
+    reservation: Optional[Reservation] = None  # Estimated chat cost held until settle/release
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def language_intelligence(self) -> Optional[dict[str, Any]]:
+        return self.request.get("metadata", {}).get("language_intelligence")
+
+
+async def run_chat_preflight(
+    user_id: str,
+    message: str,
+    user_tier: UserTier,
+    history: list[dict[str, Any]] | Awaitable[Optional[list[dict[str, Any]]]] | None = None,
+    user_email: Optional[str] = None,
+    context_tokens: int = 0,
+    conversation_id: Optional[str] = None,
+    reserve_units: Optional[int] = None,
+) -> ChatPreflight:
+    """
+    Verify the subscription, reserve credits, resolve history, run plugins and classify intent.
+
+    Args:
+        user_id: User ID (credit lookup)
+        message: User message (as it will be sent to the model)
+        user_tier: Tier the frontend claims
+        history: Conversation history, or an awaitable resolving it
+        user_email: Verifies the subscription when set (paid tiers only)
+        context_tokens: Tokens in context (intent classification)
+        conversation_id: Keys the language detector's session state
+        reserve_units: 10K-token units to hold instead of the estimate from message
+
+    Returns:
+        ChatPreflight with the tier to serve, billing source, reservation, layer and timings
+    """
+    # Deferred: ai_service imports this module
+    from app.services.ai_service import MAX_HISTORY_TURNS, language_session_id, run_plugins_before_request
+
+    reservations = get_credit_reservations()
+    preflight = Preflight()
+    try:
+        async with preflight:
+            if user_email and user_tier != UserTier.FREE:
+                preflight.start("subscription", subscription_service.verify_subscription(user_email, user_tier))
+            # Resolved history is only known later; estimate from what we have now
+            units = reserve_units or estimate_chat_units(message, history if isinstance(history, list) else None)
+            preflight.start("credits", reservations.reserve(user_id, ActionType.CHAT_10K_TOKENS, units))
+            if inspect.isawaitable(history):
+                preflight.start("history", history)
+                history = await preflight.result("history")
+
+            request = {
+                "user_id": user_id,
+                "session_id": language_session_id(user_id, conversation_id),
+                "message": message,
+                "messages": [*(history or [])[-MAX_HISTORY_TURNS:], {"role": "user", "content": message}],
+                "history": history,
+                "user_tier": user_tier.value,
+                "metadata": {
+                    "original_message": message,
+                    "user_tier": user_tier.value,
+                    "context_tokens": context_tokens,
+                },
+            }
+            request = await preflight.run("plugins", run_plugins_before_request, request)
+
+            # Plugins may have modified the message
+            last_user_msg = next(
+                (msg["content"] for msg in reversed(request.get("messages", [])) if msg.get("role") == "user"),
+                message,
+            )
+            layer = await preflight.run("intent", tier_router.classify_intent, last_user_msg, user_tier, context_tokens)
+            results = await preflight.finish()
+    except BaseException:
+        reservations.release(preflight.completed("credits"))
+        raise
+
+    timings = preflight.timings
+    subscription: Optional[SubscriptionStatus] = results.get("subscription")
+    verified_tier = subscription.effective_tier if subscription else user_tier
+    if verified_tier != user_tier:
+        logger.info(
+            "Tier enforcement: %s → %s (credits: %d, status: %s)",
+            user_tier.value, verified_tier.value, subscription.credits_available, subscription.status,
+        )
+
+    # Checked against the estimate; settle() bills the real count
+    reservation: Reservation = results["credits"]
+    credit_check = reservation.check
+    deduction_source = credit_check.source
+    tier = verified_tier
+    if not credit_check.allowed:
+        # This shouldn't happen for chat (always falls back to FREE) but handle edge case
+        logger.warning(f"Credit check denied for chat: user={user_id}, reason={credit_check.reason}")
+        tier = UserTier.FREE
+        deduction_source = DeductionSource.FREE
+    elif credit_check.source == DeductionSource.FREE:
+        # Subscription exceeded, no credits → fallback to FREE tier
+        logger.info(f"Tier fallback to FREE: user={user_id}, original_tier={verified_tier.value}")
+        tier = UserTier.FREE
+
+    if tier != user_tier:
+        request["user_tier"] = request["metadata"]["user_tier"] = tier.value
+        start = time.perf_counter()
+        layer = tier_router.classify_intent(last_user_msg, tier, context_tokens)
+        timings["intent"] = round(timings["intent"] + (time.perf_counter() - start) * 1000, 2)
+
+    logger.debug("[Preflight] user=%s tier=%s layer=%s timings=%s", user_id, tier.value, layer.value, timings)
+    return ChatPreflight(
+        requested_tier=user_tier,
+        verified_tier=verified_tier,
+        tier=tier,
+        deduction_source=deduction_source,
+        request=request,
+        message=last_user_msg,
+        layer=layer,
+        subscription=subscription,
+        history=history,
+        reservation=reservation,
+        timings=timings,
+    )
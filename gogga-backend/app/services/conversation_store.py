@@ -0,0 +1,413 @@
+"""
+GOGGA Conversation Store - Server-Side Conversation State
+
+Lets clients send only the new message (a "delta") instead of the full
+history on every turn. The backend keeps the authoritative history per
+conversation and reconstructs it before inference.
+
+Design:
+- Keyed by conversation id, scoped to the owning user_id
+- SQLite file for persistence (survives restarts, no extra service)
+- In-memory LRU hot cache in front of SQLite for active conversations
+- Monotonic version number per conversation, bumped on every committed turn
+
+Protocol:
+1. Client sends conversation_id + conversation_version + message (no history)
+2. Server version matches → history is loaded from the store
+3. Server version differs (or conversation unknown) → ConversationVersionConflict,
+   client resends once with the full history, which becomes authoritative
+4. After the response, the turn is committed and the new version returned;
+   the commit is a compare-and-swap on the version the turn was generated
+   against, so of two concurrent delta requests only the first is kept
+5. A conversation id owned by another user is rejected (403), never reused
+
+Mirrors the shape of models.database.Conversation (uid + JSON messages)
+so the store can move to the main database without a protocol change.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Final, Optional
+
+from app.config import settings
+from app.core.exceptions import GoggaException
+
+logger = logging.getLogger(__name__)
+
+MessageDict = dict[str, str]
+
+_SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS conversation_state (
+    uid TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    messages TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class ConversationVersionConflict(GoggaException):
+    """Raised when a delta request does not match the stored conversation version."""
+
+    def __init__(self, conversation_id: str, client_version: int | None, server_version: int | None):
+        self.conversation_id = conversation_id
+        self.client_version = client_version
+        self.server_version = server_version
+        super().__init__(
+            "Conversation state out of date. Resend the request with the full history.",
+            status_code=409,
+        )
+
+
+class ConversationOwnershipError(GoggaException):
+    """Raised when a conversation id belongs to another user."""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        super().__init__("Conversation belongs to another user.", status_code=403)
+
+
+@dataclass
+class ConversationState:
+    """Authoritative history for one conversation."""
+    conversation_id: str
+    user_id: str
+    version: int
+    messages: list[MessageDict] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+
+
+class ConversationStore:
+    """
+    SQLite-backed conversation store with an in-memory LRU hot cache.
+
+    SQLite calls run in a worker thread so the event loop never blocks
+    on disk I/O. A single asyncio lock serialises commits, which keeps
+    version bumps atomic per process.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        cache_size: int = 2048,
+        max_messages: int = 100,
+    ) -> None:
+        """
+        Initialize the conversation store.
+
+        Args:
+            db_path: SQLite file path (":memory:" for tests)
+            cache_size: Maximum conversations kept in the hot cache
+            max_messages: Maximum messages retained per conversation
+        """
+        self.db_path = str(db_path)
+        self.cache_size = cache_size
+        self.max_messages = max_messages
+
+        self._cache: OrderedDict[str, ConversationState] = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+        self._hits = 0
+        self._misses = 0
+        self._conflicts = 0
+
+    # ------------------------------------------------------------------
+    # SQLite (runs in worker threads)
+    # ------------------------------------------------------------------
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Lazily open the SQLite connection and ensure the schema exists."""
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    def _load_row(self, conversation_id: str) -> ConversationState | None:
+        with self._db_lock:
+            row = self._get_conn().execute(
+                "SELECT uid, user_id, version, messages, updated_at "
+                "FROM conversation_state WHERE uid = ?",
+                (conversation_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return ConversationState(
+            conversation_id=row[0],
+            user_id=row[1],
+            version=row[2],
+            messages=json.loads(row[3]),
+            updated_at=row[4],
+        )
+
+    def _save_row(self, state: ConversationState, base_version: int | None) -> bool:
+        """
+        Write a committed turn if the stored row still matches.
+
+        base_version None overwrites the user's own row unconditionally
+        (client-supplied history is authoritative); otherwise the stored
+        version must equal base_version (0: no row yet). Rows owned by
+        another user are never touched.
+
+        Returns:
+            False if the row changed underneath us (or is not the user's)
+        """
+        payload = json.dumps(state.messages, separators=(",", ":"), ensure_ascii=False)
+        values = (state.conversation_id, state.user_id, state.version, payload, state.updated_at)
+        with self._db_lock:
+            conn = self._get_conn()
+            if base_version == 0:
+                cursor = conn.execute(
+                    "INSERT INTO conversation_state (uid, user_id, version, messages, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(uid) DO NOTHING",
+                    values,
+                )
+            elif base_version is not None:
+                cursor = conn.execute(
+                    "UPDATE conversation_state SET version = ?, messages = ?, updated_at = ? "
+                    "WHERE uid = ? AND user_id = ? AND version = ?",
+                    (state.version, payload, state.updated_at, state.conversation_id, state.user_id, base_version),
+                )
+            else:
+                cursor = conn.execute(
+                    "INSERT INTO conversation_state (uid, user_id, version, messages, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(uid) DO UPDATE SET version = excluded.version, "
+                    "messages = excluded.messages, updated_at = excluded.updated_at "
+                    "WHERE conversation_state.user_id = excluded.user_id",
+                    values,
+                )
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def _delete_row(self, conversation_id: str) -> None:
+        with self._db_lock:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM conversation_state WHERE uid = ?", (conversation_id,))
+            conn.commit()
+
+    # ------------------------------------------------------------------
+    # Hot cache
+    # ------------------------------------------------------------------
+
+    def _cache_put(self, state: ConversationState) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[state.conversation_id] = state
+        self._cache.move_to_end(state.conversation_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def _lookup(self, conversation_id: str) -> ConversationState | None:
+        """Stored state for a conversation, whoever owns it."""
+        state = self._cache.get(conversation_id)
+        if state is not None:
+            self._cache.move_to_end(conversation_id)
+            self._hits += 1
+        else:
+            self._misses += 1
+            state = await asyncio.to_thread(self._load_row, conversation_id)
+            if state is not None:
+                self._cache_put(state)
+        return state
+
+    async def get(self, conversation_id: str, user_id: str) -> ConversationState | None:
+        """
+        Get the stored state for a conversation owned by user_id.
+
+        Returns None if the conversation is unknown or owned by another user.
+        """
+        state = await self._lookup(conversation_id)
+        if state is None or state.user_id != user_id:
+            return None
+        return state
+
+    async def _owned(self, conversation_id: str, user_id: str) -> ConversationState | None:
+        """Like get(), but a conversation owned by another user raises."""
+        state = await self._lookup(conversation_id)
+        if state is not None and state.user_id != user_id:
+            logger.warning(
+                "[ConversationStore] User %s tried to use conversation %s owned by another user",
+                user_id, conversation_id[:12],
+            )
+            raise ConversationOwnershipError(conversation_id)
+        return state
+
+    async def resolve_history(
+        self,
+        conversation_id: str,
+        user_id: str,
+        client_version: int | None,
+        history: list[MessageDict] | None,
+    ) -> tuple[list[MessageDict], int | None]:
+        """
+        Reconstruct the history for a request.
+
+        A full history sent by the client is authoritative (this is the
+        fallback path after a conflict). Otherwise the stored history is
+        used when the client's version matches the server's.
+
+        Args:
+            conversation_id: Conversation identifier
+            user_id: Owning user
+            client_version: Last version the client received
+            history: Full history if the client sent it
+
+        Returns:
+            Tuple of (history, base_version). Pass base_version to
+            commit_turn; it is None when the client-supplied history was used.
+
+        Raises:
+            ConversationVersionConflict: Delta request against a missing or
+                newer/older server state
+            ConversationOwnershipError: The conversation id belongs to another user
+        """
+        state = await self._owned(conversation_id, user_id)
+        if history is not None:
+            return history, None
+
+        server_version = state.version if state else None
+
+        if state is None:
+            # A brand-new conversation starts at version 0 with no history
+            if client_version in (None, 0):
+                return [], 0
+        elif client_version == state.version:
+            return list(state.messages), state.version
+
+        self._conflicts += 1
+        logger.info(
+            "[ConversationStore] Version conflict: id=%s client=%s server=%s",
+            conversation_id[:12], client_version, server_version,
+        )
+        raise ConversationVersionConflict(conversation_id, client_version, server_version)
+
+    async def commit_turn(
+        self,
+        conversation_id: str,
+        user_id: str,
+        history: list[MessageDict],
+        user_message: str,
+        assistant_message: str,
+        base_version: int | None = None,
+    ) -> int:
+        """
+        Append a completed turn and bump the version.
+
+        Args:
+            conversation_id: Conversation identifier
+            user_id: Owning user
+            history: History the turn was generated against
+            user_message: The user's message for this turn
+            assistant_message: The assistant's final response
+            base_version: Version the history was resolved at (from
+                resolve_history); None when the client sent the full history
+
+        Returns:
+            The new conversation version
+
+        Raises:
+            ConversationVersionConflict: Another turn was committed since base_version
+            ConversationOwnershipError: The conversation id belongs to another user
+        """
+        async with self._lock:
+            current = await self._owned(conversation_id, user_id)
+            current_version = current.version if current else 0
+            if base_version is not None and base_version != current_version:
+                self._conflicts += 1
+                raise ConversationVersionConflict(conversation_id, base_version, current_version)
+            version = current_version + 1
+
+            messages = list(history)
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": assistant_message})
+            if len(messages) > self.max_messages:
+                messages = messages[-self.max_messages:]
+
+            state = ConversationState(
+                conversation_id=conversation_id,
+                user_id=user_id,
+                version=version,
+                messages=messages,
+            )
+            saved = await asyncio.to_thread(
+                self._save_row, state, current_version if base_version is not None else None,
+            )
+            if not saved:
+                # Another process committed (or claimed the id) first; re-read next time
+                self._cache.pop(conversation_id, None)
+                self._conflicts += 1
+                stored = await self._owned(conversation_id, user_id)
+                raise ConversationVersionConflict(
+                    conversation_id, base_version, stored.version if stored else None,
+                )
+            self._cache_put(state)
+
+        logger.debug(
+            "[ConversationStore] Committed: id=%s version=%d messages=%d",
+            conversation_id[:12], version, len(messages),
+        )
+        return version
+
+    async def delete(self, conversation_id: str, user_id: str) -> bool:
+        """Delete a conversation. Returns False if it is not owned by user_id."""
+        async with self._lock:
+            if await self.get(conversation_id, user_id) is None:
+                return False
+            self._cache.pop(conversation_id, None)
+            await asyncio.to_thread(self._delete_row, conversation_id)
+        return True
+
+    def get_stats(self) -> dict[str, int | float]:
+        """Get hot cache statistics."""
+        lookups = self._hits + self._misses
+        return {
+            "cached_conversations": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            "version_conflicts": self._conflicts,
+        }
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._cache.clear()
+
+
+# Singleton instance
+_conversation_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Get the global conversation store instance."""
+    global _conversation_store
+    if _conversation_store is None:
+        _conversation_store = ConversationStore(
+            db_path=settings.CONVERSATION_STORE_PATH,
+            cache_size=settings.CONVERSATION_CACHE_SIZE,
+            max_messages=settings.CONVERSATION_MAX_MESSAGES,
+        )
+    return _conversation_store
@@ -3,26 +3,20 @@ GOGGA Cost Tracker
 Calculates precise token costs based on model pricing tiers.
 Essential for unit economics analysis and subscription viability.
 
-Now persists usage to SQLite via frontend API for billing/analytics.
+Usage records go to the usage ledger (write-ahead log), which ships them
+to the frontend's SQLite in the background for billing/analytics.
 """
 import logging
-import ssl
 from typing import TypedDict, Final
-import httpx
 
 from app.config import settings
+from app.services.usage_ledger import get_usage_ledger
 
 
 logger = logging.getLogger(__name__)
 
 # Constants
 MILLION: Final[int] = 1_000_000
-FRONTEND_URL: Final[str] = settings.FRONTEND_URL if hasattr(settings, 'FRONTEND_URL') else "http://localhost:3000"
-
-# Create SSL context that doesn't verify certs (for self-signed Docker certs)
-_ssl_context = ssl.create_default_context()
-_ssl_context.check_hostname = False
-_ssl_context.verify_mode = ssl.CERT_NONE
 
 
 def _get_provider(model: str, layer: str) -> str:
@@ -149,26 +143,22 @@ async def track_usage(
     log_msg += f" | cost=${total_cost_usd:.6f} (R{total_cost_zar:.4f})"
     logger.info(log_msg)
     
-    # Persist to SQLite via frontend API
+    # Append to the usage ledger (shipped to the frontend in the background)
     try:
-        async with httpx.AsyncClient(timeout=5.0, verify=_ssl_context) as client:
-            await client.post(
-                f"{FRONTEND_URL}/api/usage/log",
-                json={
-                    "userId": user_id,
-                    "promptTokens": input_tokens,
-                    "completionTokens": output_tokens,
-                    "adjustedCompletionTokens": adjusted_output_tokens,
-                    "reasoningTokens": reasoning_tokens,
-                    "totalTokens": input_tokens + output_tokens,
-                    "model": model,
-                    "provider": _get_provider(model, layer),
-                    "endpoint": "chat",
-                    "tier": tier.upper(),
-                    "optillmLevel": optillm_level,
-                    "optillmMultiplier": optillm_multiplier,
-                }
-            )
+        get_usage_ledger().record({
+            "userId": user_id,
+            "promptTokens": input_tokens,
+            "completionTokens": output_tokens,
+            "adjustedCompletionTokens": adjusted_output_tokens,
+            "reasoningTokens": reasoning_tokens,
+            "totalTokens": input_tokens + output_tokens,
+            "model": model,
+            "provider": _get_provider(model, layer),
+            "endpoint": "chat",
+            "tier": tier.upper(),
+            "optillmLevel": optillm_level,
+            "optillmMultiplier": optillm_multiplier,
+        })
     except Exception as e:
         # Don't fail the request if usage logging fails
         logger.warning("Failed to persist usage to database: %s", e)
@@ -231,26 +221,22 @@ async def track_image_usage(
         user_id, tier, generator, image_count, total_cost_usd, total_cost_zar
     )
     
-    # Persist to SQLite via frontend API
+    # Append to the usage ledger (shipped to the frontend in the background)
     try:
         # Convert USD cost to ZAR cents for storage
         cost_zar_cents = int(total_cost_zar * 100)
         
-        async with httpx.AsyncClient(timeout=5.0, verify=_ssl_context) as client:
-            await client.post(
-                f"{FRONTEND_URL}/api/usage/log",
-                json={
-                    "userId": user_id,
-                    "promptTokens": 0,
-                    "completionTokens": 0,
-                    "totalTokens": 0,
-                    "costCents": cost_zar_cents,
-                    "model": generator,
-                    "provider": generator,
-                    "endpoint": "images",
-                    "tier": tier.upper(),
-                }
-            )
+        get_usage_ledger().record({
+            "userId": user_id,
+            "promptTokens": 0,
+            "completionTokens": 0,
+            "totalTokens": 0,
+            "costCents": cost_zar_cents,
+            "model": generator,
+            "provider": generator,
+            "endpoint": "images",
+            "tier": tier.upper(),
+        })
     except Exception as e:
         # Don't fail the request if usage logging fails
         logger.warning("Failed to persist image usage to database: %s", e)
@@ -303,25 +289,21 @@ async def track_imagen_usage(
         user_id, tier, operation, image_count, total_cost_usd, total_cost_zar
     )
     
-    # Persist to SQLite via frontend API
+    # Append to the usage ledger (shipped to the frontend in the background)
     try:
         cost_zar_cents = int(total_cost_zar * 100)
         
-        async with httpx.AsyncClient(timeout=5.0, verify=_ssl_context) as client:
-            await client.post(
-                f"{FRONTEND_URL}/api/usage/log",
-                json={
-                    "userId": user_id,
-                    "promptTokens": 0,
-                    "completionTokens": 0,
-                    "totalTokens": 0,
-                    "costCents": cost_zar_cents,
-                    "model": f"imagen-{operation}",
-                    "provider": "vertex-ai",
-                    "endpoint": "media/images",
-                    "tier": tier.upper(),
-                }
-            )
+        get_usage_ledger().record({
+            "userId": user_id,
+            "promptTokens": 0,
+            "completionTokens": 0,
+            "totalTokens": 0,
+            "costCents": cost_zar_cents,
+            "model": f"imagen-{operation}",
+            "provider": "vertex-ai",
+            "endpoint": "media/images",
+            "tier": tier.upper(),
+        })
     except Exception as e:
         logger.warning("Failed to persist Imagen usage: %s", e)
     
@@ -373,29 +355,25 @@ async def track_veo_usage(
         user_id, tier, duration_seconds, with_audio, total_cost_usd, total_cost_zar
     )
     
-    # Persist to SQLite via frontend API
+    # Append to the usage ledger (shipped to the frontend in the background)
     try:
         cost_zar_cents = int(total_cost_zar * 100)
         
-        async with httpx.AsyncClient(timeout=5.0, verify=_ssl_context) as client:
-            await client.post(
-                f"{FRONTEND_URL}/api/usage/log",
-                json={
-                    "userId": user_id,
-                    "promptTokens": 0,
-                    "completionTokens": 0,
-                    "totalTokens": 0,
-                    "costCents": cost_zar_cents,
-                    "model": f"veo-{'audio' if with_audio else 'video'}",
-                    "provider": "vertex-ai",
-                    "endpoint": "media/videos",
-                    "tier": tier.upper(),
-                    "metadata": {
-                        "duration_seconds": duration_seconds,
-                        "with_audio": with_audio
-                    }
-                }
-            )
+        get_usage_ledger().record({
+            "userId": user_id,
+            "promptTokens": 0,
+            "completionTokens": 0,
+            "totalTokens": 0,
+            "costCents": cost_zar_cents,
+            "model": f"veo-{'audio' if with_audio else 'video'}",
+            "provider": "vertex-ai",
+            "endpoint": "media/videos",
+            "tier": tier.upper(),
+            "metadata": {
+                "duration_seconds": duration_seconds,
+                "with_audio": with_audio
+            }
+        })
     except Exception as e:
         logger.warning("Failed to persist Veo usage: %s", e)
     
@@ -0,0 +1,337 @@
+"""
+GOGGA Credit Reservations - Hold estimated cost up front, settle actuals in batches
+
+The chat path used to check credits against a snapshot of the user's state
+and call CreditService.deduct_usage (a frontend round trip) after every
+response. Concurrent streams from the same user all passed the check
+against the same snapshot and could overdraw, and every request paid for
+the settlement call.
+
+Design:
+- reserve() checks the action against the user's state (entitlement
+  cache) MINUS everything this process holds or has settled but the
+  frontend hasn't applied yet, then holds the estimated cost. The check
+  and the hold happen without yielding, so concurrent requests see each
+  other's holds and cannot overspend
+- Chat estimates come from the input length plus a predicted output
+  length (CREDIT_RESERVE_OUTPUT_TOKENS), priced in 10K-token units
+- settle() swaps the hold for the actual amount and appends a settlement
+  record to a write-ahead ledger (see usage_ledger) that ships batches to
+  /api/internal/deduct-usage; record ids are the idempotency keys
+- release() drops a hold without charging (failed request, FREE source);
+  holds older than CREDIT_RESERVATION_TTL are released automatically
+- When the frontend acknowledges settlements, the user's cached state is
+  invalidated; a state lookup that overlaps an acknowledgement is retried
+  so settled amounts are never forgotten (they may be briefly counted
+  twice, which only errs on the side of the balance)
+"""
+
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field, replace
+from typing import Any, Final, Optional
+
+from app.config import settings
+from app.services.credit_service import (
+    CREDIT_COSTS,
+    ActionResult,
+    ActionType,
+    CreditService,
+    DeductionSource,
+    UsageState,
+)
+from app.services.entitlement_cache import get_entitlement_cache, usage_key
+from app.services.usage_ledger import UsageLedger
+
+logger = logging.getLogger(__name__)
+
+# UsageState counter and units per quantity for each action (mirrors check_action)
+ACTION_USAGE: Final[dict[ActionType, tuple[str, int]]] = {
+    ActionType.CHAT_10K_TOKENS: ("chat_tokens_used", 10_000),
+    ActionType.IMAGE_CREATE: ("images_used", 1),
+    ActionType.IMAGE_EDIT: ("image_edits_used", 1),
+    ActionType.UPSCALE: ("upscales_used", 1),
+    ActionType.VIDEO_SECOND: ("video_seconds_used", 1),
+    ActionType.GOGGA_TALK_MIN: ("gogga_talk_mins_used", 1),
+    ActionType.ICON_GENERATE: ("icons_used", 1),
+}
+
+# Retry a state lookup at most this often when settlements land during it
+STATE_RETRIES: Final[int] = 3
+
+
+def estimate_chat_units(message: str, history: Optional[list[dict[str, Any]]] = None) -> int:
+    """
+    Estimate chat cost in 10K-token units: input (~4 chars/token) plus predicted output.
+
+    History is counted as the model will see it (last MAX_HISTORY_TURNS turns).
+    """
+    from app.services.ai_service import MAX_HISTORY_TURNS
+
+    chars = len(message) + sum(len(str(m.get("content", ""))) for m in (history or [])[-MAX_HISTORY_TURNS:])
+    tokens = chars // 4 + settings.CREDIT_RESERVE_OUTPUT_TOKENS
+    return max(1, CreditService.calculate_token_credits(tokens))
+
+
+@dataclass(frozen=True)
+class _Charge:
+    """Credits and counter usage one reservation or settlement accounts for."""
+    credits: int = 0
+    counter: Optional[str] = None
+    amount: float = 0
+
+    @classmethod
+    def of(cls, action: ActionType, quantity: int, source: Optional[DeductionSource]) -> "_Charge":
+        if source == DeductionSource.CREDITS:
+            return cls(credits=CREDIT_COSTS[action] * quantity)
+        if source == DeductionSource.SUBSCRIPTION:
+            counter, per_unit = ACTION_USAGE[action]
+            return cls(counter=counter, amount=quantity * per_unit)
+        return cls()
+
+
+@dataclass
+class Reservation:
+    """Estimated cost held for one request."""
+    id: str
+    user_id: str
+    action: ActionType
+    quantity: int
+    check: ActionResult
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def source(self) -> Optional[DeductionSource]:
+        return self.check.source
+
+
+@dataclass
+class _Account:
+    held: dict[str, tuple[Reservation, _Charge]] = field(default_factory=dict)
+    unsettled: dict[str, _Charge] = field(default_factory=dict)  # Settled here, not applied by the frontend yet
+    generation: int = 0  # Bumped whenever the frontend applies settlements
+    lookups: int = 0  # State lookups in flight (the account must outlive them)
+
+    def charges(self) -> list[_Charge]:
+        return [charge for _, charge in self.held.values()] + list(self.unsettled.values())
+
+
+def apply_charges(state: UsageState, charges: list[_Charge]) -> UsageState:
+    """The user's state as it will be once every charge is applied."""
+    updates: dict[str, Any] = {"credit_balance": state.credit_balance}
+    for charge in charges:
+        updates["credit_balance"] -= charge.credits
+        if charge.counter:
+            updates[charge.counter] = updates.get(charge.counter, getattr(state, charge.counter)) + charge.amount
+    return replace(state, **updates)
+
+
+class CreditReservations:
+    """
+    Per-user credit holds on top of the cached frontend state, with batched settlement.
+
+    reserve() / settle() / release() never call the frontend for anything
+    but the (cached) state lookup; settlements ship in the background.
+    """
+
+    def __init__(self, ledger: UsageLedger, reservation_ttl: float = 600.0) -> None:
+        """
+        Initialize reservations.
+
+        Args:
+            ledger: Settlement ledger (shipping to /api/internal/deduct-usage)
+            reservation_ttl: Seconds before an unsettled hold is released
+        """
+        self.ledger = ledger
+        self.ledger.on_acknowledged = self._on_acknowledged
+        self.reservation_ttl = reservation_ttl
+        self._accounts: dict[str, _Account] = {}
+        self._seeded = False
+
+        self._reserved = 0
+        self._denied = 0
+        self._settled = 0
+        self._released = 0
+        self._expired = 0
+
+    def _seed(self) -> None:
+        """Settlements replayed from the log still count against their users."""
+        if self._seeded:
+            return
+        self._seeded = True
+        for record in self.ledger.pending_records():
+            charge = _Charge.of(ActionType(record["action"]), record["quantity"], DeductionSource(record["source"]))
+            self._accounts.setdefault(record["userId"], _Account()).unsettled[record["id"]] = charge
+
+    def _account(self, user_id: str) -> _Account:
+        self._seed()
+        return self._accounts.setdefault(user_id, _Account())
+
+    def _forget_if_idle(self, user_id: str) -> None:
+        account = self._accounts.get(user_id)
+        if account is not None and not account.held and not account.unsettled and not account.lookups:
+            del self._accounts[user_id]
+
+    def _expire_holds(self, account: _Account) -> None:
+        cutoff = time.monotonic() - self.reservation_ttl
+        for reservation_id, (reservation, _) in list(account.held.items()):
+            if reservation.created_at < cutoff:
+                del account.held[reservation_id]
+                self._expired += 1
+                logger.warning("[CreditReservations] Released expired hold %s for %s", reservation_id, reservation.user_id)
+
+    async def available_state(self, user_id: str) -> UsageState:
+        """User's state minus local holds and settlements the frontend hasn't applied."""
+        account = self._account(user_id)
+        account.lookups += 1
+        try:
+            for _ in range(STATE_RETRIES):
+                generation = account.generation
+                state = await CreditService.get_user_state(user_id)
+                if account.generation == generation:
+                    break
+        finally:
+            account.lookups -= 1
+        self._expire_holds(account)
+        available = apply_charges(state, account.charges())
+        self._forget_if_idle(user_id)
+        return available
+
+    async def reserve(self, user_id: str, action: ActionType, quantity: int = 1) -> Reservation:
+        """
+        Check an action against the available state and hold its estimated cost.
+
+        Args:
+            user_id: User ID
+            action: Action type
+            quantity: Estimated units (see estimate_chat_units)
+
+        Returns:
+            Reservation whose check says whether, and from which source, the action is paid
+        """
+        state = await self.available_state(user_id)
+        # No awaits from here on: check and hold are atomic with respect to other requests
+        check = CreditService.check_action(state, action, quantity)
+        reservation = Reservation(id=uuid.uuid4().hex, user_id=user_id, action=action, quantity=quantity, check=check)
+        if not check.allowed:
+            self._denied += 1
+            self._forget_if_idle(user_id)
+            return reservation
+        self._account(user_id).held[reservation.id] = (reservation, _Charge.of(action, quantity, check.source))
+        self._reserved += 1
+        return reservation
+
+    def release(self, reservation: Optional[Reservation]) -> None:
+        """Drop a hold without charging."""
+        if reservation is None:
+            return
+        account = self._accounts.get(reservation.user_id)
+        if account is not None and account.held.pop(reservation.id, None) is not None:
+            self._released += 1
+            self._forget_if_idle(reservation.user_id)
+
+    def settle(
+        self,
+        reservation: Reservation,
+        quantity: int,
+        *,
+        idempotency_key: Optional[str] = None,
+        request_id: Optional[str] = None,
+        model: Optional[str] = None,
+        provider: Optional[str] = None,
+        tier: Optional[str] = None,
+        duration_ms: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """
+        Replace the hold with the actual amount and queue the settlement.
+
+        The source decided at reservation time is kept, so an estimate that
+        ran short overdraws by at most one request.
+
+        Returns:
+            Dict with settlementId (the idempotency key) and creditsDeducted
+        """
+        account = self._account(reservation.user_id)
+        account.held.pop(reservation.id, None)
+        charge = _Charge.of(reservation.action, quantity, reservation.source)
+        if quantity <= 0 or reservation.source in (None, DeductionSource.FREE):
+            self._forget_if_idle(reservation.user_id)
+            return {"settlementId": None, "creditsDeducted": 0}
+
+        record_id = self.ledger.record({
+            "id": idempotency_key or f"{reservation.action.value}:{reservation.user_id}:{reservation.id}",
+            "userId": reservation.user_id,
+            "action": reservation.action.value,
+            "quantity": quantity,
+            "source": reservation.source.value,
+            "requestId": request_id,
+            "model": model,
+            "provider": provider,
+            "tier": tier,
+            "durationMs": duration_ms,
+        })
+        account.unsettled[record_id] = charge
+        self._settled += 1
+        return {"settlementId": record_id, "creditsDeducted": charge.credits}
+
+    def _on_acknowledged(self, records: list[dict[str, Any]]) -> None:
+        """Frontend applied these settlements: its state now includes them."""
+        cache = get_entitlement_cache()
+        for record in records:
+            user_id = record.get("userId")
+            account = self._accounts.get(user_id)
+            if account is None:
+                continue
+            account.unsettled.pop(record["id"], None)
+            account.generation += 1
+            cache.invalidate(usage_key(user_id))
+            self._forget_if_idle(user_id)
+
+    async def start(self) -> None:
+        """Replay unshipped settlements and start shipping."""
+        await self.ledger.start()
+        self._seed()
+
+    async def stop(self) -> None:
+        """Ship what's left and sync the log."""
+        await self.ledger.stop()
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get reservation and settlement statistics."""
+        holds = [charge for account in self._accounts.values() for _, charge in account.held.values()]
+        return {
+            "accounts": len(self._accounts),
+            "holds": len(holds),
+            "held_credits": sum(charge.credits for charge in holds),
+            "unsettled": sum(len(account.unsettled) for account in self._accounts.values()),
+            "reserved": self._reserved,
+            "denied": self._denied,
+            "settled": self._settled,
+            "released": self._released,
+            "expired": self._expired,
+            "ledger": self.ledger.get_stats(),
+        }
+
+
+# Singleton instance
+_credit_reservations: Optional[CreditReservations] = None
+
+
+def get_credit_reservations() -> CreditReservations:
+    """Get the global credit reservations."""
+    global _credit_reservations
+    if _credit_reservations is None:
+        _credit_reservations = CreditReservations(
+            ledger=UsageLedger(
+                wal_dir=settings.CREDIT_SETTLEMENT_DIR,
+                endpoint=f"{settings.FRONTEND_URL}/api/internal/deduct-usage",
+                batch_size=settings.USAGE_LEDGER_BATCH_SIZE,
+                fsync_interval=settings.USAGE_LEDGER_FSYNC_INTERVAL,
+                ship_interval=settings.USAGE_LEDGER_SHIP_INTERVAL,
+                max_backoff=settings.USAGE_LEDGER_MAX_BACKOFF,
+                headers={"X-Internal-Key": settings.INTERNAL_API_KEY},
+            ),
+            reservation_ttl=settings.CREDIT_RESERVATION_TTL,
+        )
+    return _credit_reservations
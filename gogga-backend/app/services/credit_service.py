@@ -18,6 +18,7 @@ from typing import Optional, Literal
 import httpx
 
 from app.config import settings
+from app.services.entitlement_cache import get_entitlement_cache, usage_key
 
 
 class ActionType(str, Enum):
@@ -148,16 +149,14 @@ class CreditService:
         Fetch user's current usage state from frontend API.
         
         The frontend (Next.js) owns the Prisma database, so we call
-        its internal API to get current usage values.
+        its internal API to get current usage values. Results are cached
+        briefly (see entitlement_cache); deductions invalidate them.
         """
-        client = await cls._get_client()
         try:
-            response = await client.get(
-                f"{settings.FRONTEND_URL}/api/internal/user-usage/{user_id}",
-                headers={"X-Internal-Key": settings.INTERNAL_API_KEY},
+            data = await get_entitlement_cache().get_or_load(
+                usage_key(user_id),
+                lambda: cls._fetch_user_state(user_id),
             )
-            response.raise_for_status()
-            data = response.json()
             
             return UsageState(
                 tier=data.get("tier", "FREE"),
@@ -185,6 +184,17 @@ class CreditService:
                 icons_used=0,
             )
     
+    @classmethod
+    async def _fetch_user_state(cls, user_id: str) -> dict:
+        """Fetch the raw usage payload from the frontend (raises on failure)."""
+        client = await cls._get_client()
+        response = await client.get(
+            f"{settings.FRONTEND_URL}/api/internal/user-usage/{user_id}",
+            headers={"X-Internal-Key": settings.INTERNAL_API_KEY},
+        )
+        response.raise_for_status()
+        return response.json()
+    
     @classmethod
     def check_action(
         cls,
@@ -374,6 +384,8 @@ class CreditService:
             )
             response.raise_for_status()
             data = response.json()
+            # Balance and usage counters changed; next preflight re-fetches
+            get_entitlement_cache().invalidate(usage_key(user_id))
             return {
                 "success": True,
                 "eventId": data.get("eventId"),
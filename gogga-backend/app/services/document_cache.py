@@ -0,0 +1,543 @@
+"""
+GOGGA Parsed Document Cache - Content-addressed extraction results
+
+Users re-upload the same payslips, leases and spreadsheet exports over and
+over, and ask about each one several times. Every upload used to pay for
+extraction, cleaning, language detection and DocumentClassifier from
+scratch, although the bytes were identical.
+
+Design:
+- Keyed by sha256 of the uploaded bytes, so a renamed or re-sent file hits
+  the same entry, and any edit is a different document
+- Stores the cleaned text, page offsets, detected language,
+  DocumentClassifier domain/intent classification and token count
+- Entries are compressed (zstd where available, else zlib) in one SQLite
+  file; PARSER_VERSION invalidates entries when extraction changes
+- Disk budget: least recently used entries are evicted once the stored
+  bytes exceed DOCUMENT_CACHE_MAX_BYTES, and freed pages are returned to
+  the filesystem (incremental vacuum)
+- Concurrent uploads of the same bytes share one parse (single-flight)
+
+Extraction covers PDF (pypdf, optional), DOCX and XLSX (stdlib zip + XML)
+and plain text/CSV/Markdown.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+import zlib
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Final, Optional
+from xml.etree import ElementTree
+
+from app.config import settings
+from app.core.compression import ZSTD_AVAILABLE, compress, decompress
+from app.core.exceptions import GoggaException
+from app.services.passage_ranker import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+    PdfReader = None  # type: ignore
+
+# Bump when extraction or cleaning changes; older entries are re-parsed
+PARSER_VERSION: Final[int] = 1
+
+# Language detection and classification look at the start of the text
+LANGUAGE_SAMPLE_CHARS: Final[int] = 5000
+CLASSIFY_SAMPLE_CHARS: Final[int] = 20_000
+
+# Zip members (DOCX/XLSX XML) may not inflate beyond this (zip bombs)
+MAX_XML_BYTES: Final[int] = 200 * 1024 * 1024
+
+# Workbook limits: Excel's own grid (XFD, 1,048,576 rows), a sheet count,
+# and a budget for cells including the blanks padded in before sparse cells
+MAX_XLSX_COLUMNS: Final[int] = 16_384
+MAX_XLSX_ROWS: Final[int] = 1_048_576
+MAX_XLSX_SHEETS: Final[int] = 256
+MAX_XLSX_CELLS: Final[int] = 5_000_000
+
+# Evicted rows are deleted in batches of this size
+EVICT_BATCH: Final[int] = 64
+
+PAGE_SEPARATOR: Final[str] = "\n\n"
+
+_W: Final[str] = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_S: Final[str] = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL: Final[str] = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL: Final[str] = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_CONTROL_CHARS: Final[re.Pattern] = re.compile(r"[\x00-\x08\x0b\x0e-\x1f\x7f]")
+_HYPHENATED_BREAK: Final[re.Pattern] = re.compile(r"(\w)-\n(\w)")
+_SPACE_RUNS: Final[re.Pattern] = re.compile(r"[ \u00a0]{2,}")  # Tabs are kept (sheet columns)
+_BLANK_RUNS: Final[re.Pattern] = re.compile(r"\n{3,}")
+_CELL_COLUMN: Final[re.Pattern] = re.compile(r"[A-Z]+")
+
+_SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS parsed_documents (
+    sha256 TEXT PRIMARY KEY,
+    parser_version INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parsed_documents_accessed ON parsed_documents (accessed_at);
+"""
+
+
+class UnsupportedDocumentError(GoggaException):
+    """Raised when uploaded bytes cannot be turned into text."""
+
+    def __init__(self, message: str):
+        super().__init__(message, status_code=415)
+
+
+@dataclass(slots=True)
+class ParsedDocument:
+    """Extracted text plus what was learnt about it."""
+    sha256: str
+    kind: str  # pdf, docx, xlsx, text
+    text: str
+    page_offsets: list[int]  # Character offset where each page/sheet starts
+    language: str
+    language_confidence: float
+    classification: dict[str, Any]
+    token_count: int
+    source_bytes: int
+    parse_ms: float = 0.0
+    parser_version: int = PARSER_VERSION
+    filename: str = field(default="", compare=False)
+
+    @property
+    def pages(self) -> int:
+        return len(self.page_offsets)
+
+    def page_text(self, page: int) -> str:
+        """Text of one page (0-based)."""
+        start = self.page_offsets[page]
+        end = self.page_offsets[page + 1] - len(PAGE_SEPARATOR) if page + 1 < self.pages else len(self.text)
+        return self.text[start:end]
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+def clean_text(text: str) -> str:
+    """Normalise line endings and whitespace, re-join hyphenated line breaks."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_CHARS.sub("", text)
+    text = _HYPHENATED_BREAK.sub(r"\1\2", text)
+    text = _SPACE_RUNS.sub(" ", text)
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return _BLANK_RUNS.sub("\n\n", text).strip()
+
+
+class _NoDTDTreeBuilder(ElementTree.TreeBuilder):
+    """Tree builder that stops the parse at a DOCTYPE, before any entity is declared."""
+
+    def doctype(self, name: str, pubid: Optional[str], system: Optional[str]) -> None:
+        raise UnsupportedDocumentError("Documents with a DTD are not accepted")
+
+
+def _read_xml(archive: zipfile.ZipFile, name: str) -> ElementTree.Element:
+    info = archive.getinfo(name)
+    if info.file_size > MAX_XML_BYTES:
+        raise UnsupportedDocumentError(f"{name} inflates to {info.file_size:,} bytes")
+    parser = ElementTree.XMLParser(target=_NoDTDTreeBuilder())
+    parser.feed(archive.read(info))
+    return parser.close()
+
+
+def _extract_pdf(data: bytes) -> list[str]:
+    if not PYPDF_AVAILABLE:
+        raise UnsupportedDocumentError("PDF extraction is not available (pypdf not installed)")
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        raise UnsupportedDocumentError(f"Unreadable PDF: {e}") from e
+
+
+def _extract_docx(archive: zipfile.ZipFile) -> list[str]:
+    """Paragraph text, split into pages on explicit and last-rendered page breaks."""
+    body = _read_xml(archive, "word/document.xml")
+    pages: list[list[str]] = [[]]
+    for paragraph in body.iter(f"{_W}p"):
+        line: list[str] = []
+        for node in paragraph.iter():
+            if node.tag == f"{_W}t":
+                line.append(node.text or "")
+            elif node.tag == f"{_W}tab":
+                line.append("\t")
+            elif node.tag == f"{_W}lastRenderedPageBreak" or (
+                node.tag == f"{_W}br" and node.get(f"{_W}type") == "page"
+            ):
+                pages[-1].append("".join(line))
+                pages.append([])
+                line = []
+            elif node.tag == f"{_W}br":
+                line.append("\n")
+        pages[-1].append("".join(line))
+    return ["\n".join(page) for page in pages]
+
+
+def _cell_column(reference: str) -> int:
+    """0-based column of a cell reference ("C7" -> 2); beyond XFD is rejected."""
+    column = 0
+    match = _CELL_COLUMN.match(reference)
+    for char in match.group(0)[:4] if match else "A":
+        column = column * 26 + ord(char) - 64
+    if column > MAX_XLSX_COLUMNS:
+        raise UnsupportedDocumentError(f"Cell {reference[:16]} is outside the sheet grid")
+    return column - 1
+
+
+def _extract_xlsx(archive: zipfile.ZipFile) -> list[str]:
+    """One page per sheet: a '# Sheet: name' line, then tab-separated rows."""
+    shared: list[str] = []
+    if "xl/sharedStrings.xml" in archive.namelist():
+        for item in _read_xml(archive, "xl/sharedStrings.xml").iter(f"{_S}si"):
+            shared.append("".join(t.text or "" for t in item.iter(f"{_S}t")))
+
+    targets = {
+        rel.get("Id"): rel.get("Target", "").lstrip("/")
+        for rel in _read_xml(archive, "xl/_rels/workbook.xml.rels").iter(f"{_PKG_REL}Relationship")
+    }
+    sheets = list(_read_xml(archive, "xl/workbook.xml").iter(f"{_S}sheet"))
+    if len(sheets) > MAX_XLSX_SHEETS:
+        raise UnsupportedDocumentError(f"Workbook has {len(sheets):,} sheets (max {MAX_XLSX_SHEETS})")
+    pages = []
+    budget = MAX_XLSX_CELLS
+    for sheet in sheets:
+        target = targets.get(sheet.get(f"{_REL}id"), "")
+        path = target if target.startswith("xl/") else f"xl/{target}"
+        if path not in archive.namelist():
+            continue
+        rows = [f"# Sheet: {sheet.get('name', '')}"]
+        for row_count, row in enumerate(_read_xml(archive, path).iter(f"{_S}row"), 1):
+            if row_count > MAX_XLSX_ROWS:
+                raise UnsupportedDocumentError(f"Sheet has more than {MAX_XLSX_ROWS:,} rows")
+            cells: list[str] = []
+            for cell in row.iter(f"{_S}c"):
+                kind = cell.get("t")
+                if kind == "inlineStr":
+                    value = "".join(t.text or "" for t in cell.iter(f"{_S}t"))
+                else:
+                    raw = cell.findtext(f"{_S}v") or ""
+                    value = shared[int(raw)] if kind == "s" and raw.isdigit() and int(raw) < len(shared) else raw
+                padding = max(0, _cell_column(reference) - len(cells)) if (reference := cell.get("r")) else 0
+                budget -= padding + 1
+                if budget < 0:
+                    raise UnsupportedDocumentError(f"Workbook has more than {MAX_XLSX_CELLS:,} cells")
+                cells.extend([""] * padding)
+                cells.append(value.replace("\t", " ").replace("\n", " "))
+            if any(cells):
+                rows.append("\t".join(cells).rstrip("\t"))
+        pages.append("\n".join(rows))
+    return pages
+
+
+def _extract_text(data: bytes) -> list[str]:
+    if data[:4096].count(b"\x00") > 0:
+        raise UnsupportedDocumentError("Unsupported binary format")
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("cp1252", errors="replace")
+    return text.split("\f")
+
+
+def extract_pages(data: bytes) -> tuple[str, list[str]]:
+    """Detect the format from the bytes and return (kind, raw page texts)."""
+    if data.startswith(b"%PDF"):
+        return "pdf", _extract_pdf(data)
+    if data.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                names = set(archive.namelist())
+                if "word/document.xml" in names:
+                    return "docx", _extract_docx(archive)
+                if "xl/workbook.xml" in names:
+                    return "xlsx", _extract_xlsx(archive)
+        except (zipfile.BadZipFile, ElementTree.ParseError, KeyError) as e:
+            raise UnsupportedDocumentError(f"Unreadable Office document: {e}") from e
+        raise UnsupportedDocumentError("Unsupported archive format")
+    return "text", _extract_text(data)
+
+
+def _classify(text: str) -> tuple[str, float, dict[str, Any]]:
+    from app.services.language_batch import get_batch_language_detector
+    from app.tools.document_classifier import DocumentClassifier
+
+    language = get_batch_language_detector().detect([text[:LANGUAGE_SAMPLE_CHARS]])[0]
+    profile = DocumentClassifier.classify(text[:CLASSIFY_SAMPLE_CHARS], language.code)
+    classification = {
+        "domain": profile.domain.value,
+        "intent": profile.intent.value,
+        "complexity": profile.complexity.value,
+        "document_type": profile.document_type,
+        "confidence": profile.confidence,
+        "triggers": list(profile.triggers_matched),
+    }
+    return language.code, language.confidence, classification
+
+
+def parse_document(data: bytes, filename: str = "", sha256: Optional[str] = None) -> ParsedDocument:
+    """
+    Extract, clean and classify a document (no caching).
+
+    Raises:
+        UnsupportedDocumentError: Unknown format or unreadable file
+    """
+    start = time.perf_counter()
+    kind, raw_pages = extract_pages(data)
+
+    offsets: list[int] = []
+    pages: list[str] = []
+    position = 0
+    for page in raw_pages:
+        offsets.append(position)
+        cleaned = clean_text(page)
+        pages.append(cleaned)
+        position += len(cleaned) + len(PAGE_SEPARATOR)
+    text = PAGE_SEPARATOR.join(pages)
+    if not text.strip():
+        raise UnsupportedDocumentError("No text found (scanned documents need OCR)")
+
+    language, confidence, classification = _classify(text)
+    return ParsedDocument(
+        sha256=sha256 or content_hash(data),
+        kind=kind,
+        text=text,
+        page_offsets=offsets,
+        language=language,
+        language_confidence=confidence,
+        classification=classification,
+        token_count=estimate_tokens(text),
+        source_bytes=len(data),
+        parse_ms=round((time.perf_counter() - start) * 1000, 2),
+        filename=filename,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+def _encode(document: ParsedDocument) -> tuple[str, bytes]:
+    payload = json.dumps(document.to_dict(), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if ZSTD_AVAILABLE:
+        return "zstd", compress(payload, level=6)
+    return "zlib", zlib.compress(payload, 6)
+
+
+def _decode(codec: str, payload: bytes) -> ParsedDocument:
+    raw = decompress(payload) if codec == "zstd" else zlib.decompress(payload)
+    return ParsedDocument(**json.loads(raw))
+
+
+class DocumentCache:
+    """
+    SQLite-backed, content-addressed store of parsed documents under a disk budget.
+
+    Parsing and SQLite calls are blocking; the async wrapper runs them in
+    a worker thread and coalesces concurrent parses of the same bytes.
+    """
+
+    def __init__(self, db_path: str | Path, max_bytes: int = 512 * 1024 * 1024) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: SQLite file path (":memory:" for tests)
+            max_bytes: Budget for stored (compressed) entries
+        """
+        self.db_path = str(db_path)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._stored_bytes = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._parse_ms = 0.0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # Must precede table creation to take effect on a new file
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+            self._stored_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(stored_bytes), 0) FROM parsed_documents"
+            ).fetchone()[0]
+        return self._conn
+
+    def get(self, sha256: str) -> Optional[ParsedDocument]:
+        """Cached parse for a content hash (refreshes its recency)."""
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute(
+                "SELECT codec, payload FROM parsed_documents WHERE sha256 = ? AND parser_version = ?",
+                (sha256, PARSER_VERSION),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE parsed_documents SET accessed_at = ? WHERE sha256 = ?", (time.time(), sha256))
+            conn.commit()
+        return _decode(*row)
+
+    def put(self, document: ParsedDocument) -> bool:
+        """Store a parse. Returns False if the entry alone exceeds the budget."""
+        codec, payload = _encode(document)
+        if len(payload) > self.max_bytes:
+            logger.info("[DocCache] %s not cached: %d bytes exceeds the budget", document.sha256[:12], len(payload))
+            return False
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            old = conn.execute(
+                "SELECT stored_bytes FROM parsed_documents WHERE sha256 = ?", (document.sha256,)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO parsed_documents "
+                "(sha256, parser_version, codec, payload, stored_bytes, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (document.sha256, PARSER_VERSION, codec, payload, len(payload), now, now),
+            )
+            self._stored_bytes += len(payload) - (old[0] if old else 0)
+            self._evict(conn)
+            conn.commit()
+        return True
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used entries until the budget holds (caller holds the lock)."""
+        evicted = 0
+        while self._stored_bytes > self.max_bytes:
+            rows = conn.execute(
+                "SELECT sha256, stored_bytes FROM parsed_documents ORDER BY accessed_at LIMIT ?",
+                (EVICT_BATCH,),
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for sha256, size in rows:
+                victims.append((sha256,))
+                self._stored_bytes -= size
+                if self._stored_bytes <= self.max_bytes:
+                    break
+            conn.executemany("DELETE FROM parsed_documents WHERE sha256 = ?", victims)
+            evicted += len(victims)
+        if evicted:
+            self._evictions += evicted
+            conn.execute("PRAGMA incremental_vacuum")
+            logger.info("[DocCache] Evicted %d entries (%d bytes stored)", evicted, self._stored_bytes)
+
+    def parse(self, data: bytes, filename: str = "", sha256: Optional[str] = None) -> tuple[ParsedDocument, bool]:
+        """
+        Parsed document for these bytes, from the cache when possible.
+
+        Returns:
+            (document, cached)
+
+        Raises:
+            UnsupportedDocumentError: Unknown format or unreadable file
+        """
+        sha256 = sha256 or content_hash(data)
+        if (document := self.get(sha256)) is not None:
+            self._hits += 1
+            document.filename = filename or document.filename
+            return document, True
+
+        self._misses += 1
+        document = parse_document(data, filename, sha256)
+        self._parse_ms += document.parse_ms
+        self.put(document)
+        logger.info(
+            "[DocCache] Parsed %s %s: %d pages, %d tokens in %.0fms",
+            document.kind, sha256[:12], document.pages, document.token_count, document.parse_ms,
+        )
+        return document, False
+
+    async def parse_async(self, data: bytes, filename: str = "") -> tuple[ParsedDocument, bool]:
+        """parse() in a worker thread; concurrent calls for the same bytes share one parse."""
+        sha256 = await asyncio.to_thread(content_hash, data)
+        future = self._inflight.get(sha256)
+        if future is not None:
+            self._coalesced += 1
+            document, _ = await asyncio.shield(future)
+            return document, True
+
+        future = asyncio.ensure_future(asyncio.to_thread(self.parse, data, filename, sha256))
+        self._inflight[sha256] = future
+        future.add_done_callback(lambda _: self._inflight.pop(sha256, None))
+        return await asyncio.shield(future)
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            entries = self._get_conn().execute("SELECT COUNT(*) FROM parsed_documents").fetchone()[0]
+        lookups = self._hits + self._misses
+        return {
+            "entries": entries,
+            "stored_bytes": self._stored_bytes,
+            "max_bytes": self.max_bytes,
+            "codec": "zstd" if ZSTD_AVAILABLE else "zlib",
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            "evictions": self._evictions,
+            "avg_parse_ms": round(self._parse_ms / self._misses, 2) if self._misses else 0.0,
+            "pdf_available": PYPDF_AVAILABLE,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_document_cache: Optional[DocumentCache] = None
+
+
+def get_document_cache() -> DocumentCache:
+    """Get the global parsed-document cache."""
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache(
+            db_path=settings.DOCUMENT_CACHE_PATH,
+            max_bytes=settings.DOCUMENT_CACHE_MAX_BYTES,
+        )
+    return _document_cache
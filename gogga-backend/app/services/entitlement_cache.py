@@ -0,0 +1,238 @@
+"""
+GOGGA Entitlement Cache - Short-lived cache of subscription and credit lookups
+
+Every paid request used to call the frontend twice before any LLM work:
+SubscriptionService.verify_subscription (GET /api/subscription) and
+CreditService.get_user_state (GET /api/internal/user-usage). Both are
+serial round trips on the path to the first token, and a bursty user
+repeats them dozens of times a minute.
+
+Design:
+- Entries live for ENTITLEMENT_CACHE_TTL seconds (in-process LRU, bounded)
+- Single-flight: concurrent misses for the same key share ONE lookup
+- Invalidation: the frontend calls POST /entitlements/invalidate after a
+  payment, tier change or credit adjustment; the backend drops a user's
+  usage entry itself after recording a deduction
+- Stale-on-error: when a lookup fails, an expired entry younger than
+  ENTITLEMENT_STALE_TTL is served instead, and the failing lookup is not
+  retried for ERROR_RETRY_SECONDS so a frontend outage doesn't add a
+  timeout to every request
+- Raw frontend payloads are cached; callers build fresh objects from them
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Final, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# While the frontend is failing, serve the stale entry this long before trying again
+ERROR_RETRY_SECONDS: Final[float] = 5.0
+
+SUBSCRIPTION_PREFIX: Final[str] = "subscription:"
+USAGE_PREFIX: Final[str] = "usage:"
+
+
+def subscription_key(email: str) -> str:
+    """Cache key of a user's subscription (looked up by email)."""
+    return f"{SUBSCRIPTION_PREFIX}{email.strip().lower()}"
+
+
+def usage_key(user_id: str) -> str:
+    """Cache key of a user's usage and credit state (looked up by id)."""
+    return f"{USAGE_PREFIX}{user_id}"
+
+
+@dataclass
+class _Entry:
+    value: Any
+    fetched_at: float
+    fresh_until: float
+
+
+class EntitlementCache:
+    """
+    TTL cache with single-flight loading and stale-on-error.
+
+    get_or_load() returns a fresh entry, joins a lookup already in flight,
+    or runs the loader. A loader that raises falls back to a stale entry
+    when one is recent enough; otherwise the error propagates.
+    """
+
+    def __init__(self, ttl: float = 30.0, stale_ttl: float = 300.0, max_entries: int = 10_000) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds an entry is served without re-fetching
+            stale_ttl: Seconds after fetching that an entry may still be served on error
+            max_entries: LRU bound
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._stale_served = 0
+        self._errors = 0
+        self._invalidations = 0
+
+    def _fresh(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry.fresh_until:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, value: Any) -> None:
+        now = time.monotonic()
+        self._entries[key] = _Entry(value, now, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Get a cached value or load it once for all concurrent callers.
+
+        Args:
+            key: Cache key (see subscription_key / usage_key)
+            loader: Async function fetching the value; raises on failure
+
+        Returns:
+            Cached, freshly loaded, or (on loader failure) stale value
+
+        Raises:
+            Whatever the loader raised, when no usable stale entry exists
+        """
+        entry = self._fresh(key)
+        if entry is not None:
+            self._hits += 1
+            return entry.value
+
+        leader = self._inflight.get(key)
+        if leader is not None:
+            self._coalesced += 1
+            try:
+                return await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise  # We were cancelled ourselves
+                # The leading lookup was cancelled; take over
+                return await self.get_or_load(key, loader)
+
+        self._misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            try:
+                value = await loader()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                value = self._stale_or_raise(key, e)
+            else:
+                # Invalidated while loading: the result may predate the change, don't keep it
+                if self._inflight.get(key) is future:
+                    self._store(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved; waiters (if any) re-raise it
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _stale_or_raise(self, key: str, error: Exception) -> Any:
+        self._errors += 1
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None or now - entry.fetched_at > self.stale_ttl:
+            raise error
+        entry.fresh_until = now + ERROR_RETRY_SECONDS
+        self._stale_served += 1
+        logger.warning(
+            "[EntitlementCache] Lookup for %s failed, serving %.0fs-old entry: %s",
+            key, now - entry.fetched_at, error,
+        )
+        return entry.value
+
+    def invalidate(self, *keys: str) -> int:
+        """
+        Drop cached entries (and detach lookups in flight, so the next caller re-fetches).
+
+        Returns:
+            Number of entries dropped
+        """
+        dropped = 0
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                dropped += 1
+            self._inflight.pop(key, None)
+        self._invalidations += 1
+        return dropped
+
+    def invalidate_user(self, user_id: Optional[str] = None, email: Optional[str] = None) -> int:
+        """Drop a user's subscription and usage entries."""
+        keys = []
+        if user_id:
+            keys.append(usage_key(user_id))
+        if email:
+            keys.append(subscription_key(email))
+        return self.invalidate(*keys)
+
+    def clear(self) -> None:
+        """Drop everything."""
+        self._entries.clear()
+        self._inflight.clear()
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict with size, hit/miss counts, single-flight savings and stale serves
+        """
+        lookups = self._hits + self._misses + self._coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "stale_served": self._stale_served,
+            "errors": self._errors,
+            "invalidations": self._invalidations,
+            "hit_rate": round((self._hits + self._coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Singleton instance
+_entitlement_cache: Optional[EntitlementCache] = None
+
+
+def get_entitlement_cache() -> EntitlementCache:
+    """Get the global entitlement cache."""
+    global _entitlement_cache
+    if _entitlement_cache is None:
+        _entitlement_cache = EntitlementCache(
+            ttl=settings.ENTITLEMENT_CACHE_TTL,
+            stale_ttl=settings.ENTITLEMENT_STALE_TTL,
+            max_entries=settings.ENTITLEMENT_CACHE_MAX_ENTRIES,
+        )
+    return _entitlement_cache
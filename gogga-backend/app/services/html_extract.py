@@ -0,0 +1,263 @@
+"""
+GOGGA HTML Extraction - Main-content text from scraped pages, off the event loop
+
+The scraper used to build a full BeautifulSoup tree for every page on the
+event loop, then throw away everything past MAX_CONTENT_CHARS. This module
+replaces that with a single streaming pass:
+
+- html.parser tokenizer with no tree building; skipped subtrees (scripts,
+  navigation, headers, footers, forms...) are never materialized
+- Text is grouped into blocks (paragraphs, list items, headings, cells)
+  with the share of link text in each
+- Main content: blocks inside <main>/<article> if the page has them, then
+  containers whose class/id looks like content, otherwise the whole body
+- Boilerplate removal: link-heavy blocks (menus, tag clouds, "related"
+  lists) and stray fragments outside the main content are dropped
+- Parsing stops once enough main content has been collected
+
+Large pages are extracted in a worker process pool (started from the fork
+server, see process_pool) so the event loop is never blocked; small pages
+are extracted inline, where IPC would cost more than the parse.
+"""
+
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Final, Optional
+
+from app.config import settings
+from app.services.process_pool import WorkerPool, register_preload
+
+logger = logging.getLogger(__name__)
+
+# Pages up to this many characters are extracted inline
+INLINE_EXTRACT_CHARS: Final[int] = 64_000
+
+# HTML is fed to the parser in chunks so it can stop early
+FEED_CHUNK_CHARS: Final[int] = 32_000
+
+# Blocks whose text is mostly link text are navigation, not content
+MAX_LINK_DENSITY: Final[float] = 0.5
+
+# Outside <main>/<article>, blocks shorter than this (in words) are dropped
+MIN_BLOCK_WORDS: Final[int] = 4
+
+SKIP_TAGS: Final[frozenset[str]] = frozenset({
+    "script", "style", "noscript", "iframe", "svg", "template", "nav",
+    "header", "footer", "aside", "form", "button", "select",
+})
+VOID_TAGS: Final[frozenset[str]] = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr",
+})
+BLOCK_TAGS: Final[frozenset[str]] = frozenset({
+    "p", "div", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6",
+    "article", "section", "main", "td", "th", "tr", "table", "pre",
+    "blockquote", "dd", "dt", "figcaption", "br", "hr", "body",
+})
+HEADING_TAGS: Final[frozenset[str]] = frozenset({"h1", "h2", "h3", "h4", "h5", "h6"})
+MAIN_TAGS: Final[frozenset[str]] = frozenset({"main", "article"})
+
+HTML_CONTENT_TYPES: Final[frozenset[str]] = frozenset({"text/html", "application/xhtml+xml"})
+
+_CONTENT_HINT: Final[re.Pattern] = re.compile(r"content|article|post|entry|story|body", re.IGNORECASE)
+_WHITESPACE: Final[re.Pattern] = re.compile(r"\s+")
+
+
+def is_html_content_type(content_type: str) -> bool:
+    """True for HTML media types (and a missing header, which is usually HTML)."""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return not media_type or media_type in HTML_CONTENT_TYPES
+
+
+@dataclass(slots=True)
+class Block:
+    """A run of text between block-level tags."""
+    text: str
+    link_chars: int
+    in_main: bool
+    in_content: bool
+    heading: bool
+
+    @property
+    def link_density(self) -> float:
+        return self.link_chars / len(self.text) if self.text else 0.0
+
+
+class _BlockParser(HTMLParser):
+    """Streaming tokenizer that collects text blocks (no tree)."""
+
+    def __init__(self, stop_after_main_chars: int) -> None:
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[Block] = []
+        self.done = False
+        self._stop_after = stop_after_main_chars
+        self._main_chars = 0
+
+        self._skip: list[str] = []  # Open skipped elements
+        self._stack: list[tuple[str, bool]] = []  # (tag, is content container)
+        self._main_depth = 0
+        self._content_depth = 0
+        self._link_depth = 0
+        self._heading_depth = 0
+
+        self._parts: list[str] = []
+        self._link_chars = 0
+        self._block_heading = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        if self._skip:
+            if tag == self._skip[-1] or (tag in SKIP_TAGS and tag not in VOID_TAGS):
+                self._skip.append(tag)
+            return
+        if tag in SKIP_TAGS:
+            self._flush()
+            self._skip.append(tag)
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+
+        is_content = False
+        if tag in MAIN_TAGS:
+            self._main_depth += 1
+        elif not self._main_depth:
+            hint = " ".join(v for k, v in attrs if k in ("class", "id") and v)
+            if hint and _CONTENT_HINT.search(hint):
+                is_content = True
+                self._content_depth += 1
+        if tag == "a":
+            self._link_depth += 1
+        elif tag in HEADING_TAGS:
+            self._heading_depth += 1
+        self._stack.append((tag, is_content))
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._skip:
+            if tag == self._skip[-1]:
+                self._skip.pop()
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+
+        # Close the nearest matching open element (tolerates sloppy HTML)
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                for open_tag, is_content in self._stack[i:]:
+                    self._close(open_tag, is_content)
+                del self._stack[i:]
+                break
+
+    def _close(self, tag: str, is_content: bool) -> None:
+        if tag in MAIN_TAGS:
+            self._main_depth -= 1
+        if is_content:
+            self._content_depth -= 1
+        if tag == "a":
+            self._link_depth -= 1
+        elif tag in HEADING_TAGS:
+            self._heading_depth -= 1
+
+    def handle_data(self, data: str) -> None:
+        if self._skip or self.done:
+            return
+        if self._link_depth:
+            self._link_chars += len(data.strip())
+        if self._heading_depth:
+            self._block_heading = True
+        self._parts.append(data)
+
+    def _flush(self) -> None:
+        if not self._parts:
+            return
+        text = _WHITESPACE.sub(" ", "".join(self._parts)).strip()
+        if text:
+            in_main = self._main_depth > 0
+            self.blocks.append(Block(
+                text=text,
+                link_chars=min(self._link_chars, len(text)),
+                in_main=in_main,
+                in_content=self._content_depth > 0,
+                heading=self._block_heading,
+            ))
+            if in_main:
+                self._main_chars += len(text)
+                if self._main_chars >= self._stop_after:
+                    self.done = True
+        self._parts = []
+        self._link_chars = 0
+        self._block_heading = False
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+
+def select_main_blocks(blocks: list[Block]) -> list[Block]:
+    """Pick main-content blocks and drop boilerplate."""
+    if any(b.in_main for b in blocks):
+        candidates = [b for b in blocks if b.in_main]
+    elif any(b.in_content for b in blocks):
+        candidates = [b for b in blocks if b.in_content]
+    else:
+        candidates = blocks
+    in_container = candidates is not blocks
+
+    selected = []
+    for block in candidates:
+        if block.link_density > MAX_LINK_DENSITY:
+            continue
+        if not in_container and not block.heading and len(block.text.split()) < MIN_BLOCK_WORDS:
+            continue
+        selected.append(block)
+    return selected or candidates
+
+
+def extract_main_text(html: str, max_chars: int) -> str:
+    """
+    Extract the main text of an HTML page.
+
+    Args:
+        html: Page HTML
+        max_chars: Truncate the result to this many characters ("..." appended)
+
+    Returns:
+        Whitespace-normalized main-content text
+    """
+    parser = _BlockParser(stop_after_main_chars=max_chars * 2)
+    for start in range(0, len(html), FEED_CHUNK_CHARS):
+        parser.feed(html[start:start + FEED_CHUNK_CHARS])
+        if parser.done:
+            break
+    parser.close()
+
+    text = " ".join(block.text for block in select_main_blocks(parser.blocks))
+    if len(text) > max_chars:
+        text = text[:max_chars] + "..."
+    return text
+
+
+# -----------------------------------------------------------------------------
+# Worker pool
+# -----------------------------------------------------------------------------
+
+_pool = WorkerPool("HTMLExtract", settings.SCRAPE_EXTRACT_WORKERS or min(4, os.cpu_count() or 1))
+
+register_preload(__name__)
+
+
+async def extract_main_text_async(html: str, max_chars: int) -> str:
+    """extract_main_text() off the event loop (inline for small pages)."""
+    if len(html) <= INLINE_EXTRACT_CHARS:
+        return extract_main_text(html, max_chars)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool.get(), extract_main_text, html, max_chars)
+
+
+def shutdown_extract_pool() -> None:
+    """Stop the extraction workers (application shutdown)."""
+    _pool.shutdown()
@@ -0,0 +1,173 @@
+"""
+GOGGA Batch Language Detection - Worker process pool for bulk labelling
+
+Analytics, usage reconciliation and document import jobs need language
+labels for tens of thousands of texts. The per-message plugin on the
+request path is the wrong tool for that: it keeps session state, and
+running 100k detections on the event loop would stall every chat.
+
+Design:
+- Language profiles, inverted indexes and the text feature automaton are
+  compiled at import; this module is preloaded into the fork server (see
+  process_pool), so workers share those structures copy-on-write and
+  nothing is re-compiled or pickled per task
+- Texts go to workers in chunks; results come back in input order
+- Small batches run inline, where pool start-up would dominate
+- Detection is stateless (no session stickiness); each worker keeps its
+  own detection cache, so repeated texts are cheap. Inline batches from
+  several threads share one detector under a lock (its cache is not
+  thread-safe)
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Final, Optional
+
+from app.config import settings
+from app.plugins.language_detector import (
+    LANGUAGE_PROFILES,
+    DetectionResult,
+    LanguageDetectorPlugin,
+)
+from app.services.process_pool import WorkerPool, register_preload
+
+logger = logging.getLogger(__name__)
+
+# Batches up to this size are detected in-process
+INLINE_MAX: Final[int] = 2000
+
+# (code, confidence, method) - compact result shipped back from workers
+CompactResult = tuple[str, float, str]
+
+# Detector used inside worker processes (and for inline batches)
+_local_detector: Optional[LanguageDetectorPlugin] = None
+_local_lock = threading.Lock()
+
+register_preload(__name__)
+
+
+def _get_local_detector() -> LanguageDetectorPlugin:
+    global _local_detector
+    if _local_detector is None:
+        _local_detector = LanguageDetectorPlugin()
+    return _local_detector
+
+
+def _detect_chunk(texts: list[str]) -> list[CompactResult]:
+    """Worker entry point: detect one chunk of texts."""
+    results = []
+    with _local_lock:
+        detector = _get_local_detector()
+        for text in texts:
+            result = detector.detect_cached(text or "")
+            results.append((result.code, result.confidence, result.method))
+    return results
+
+
+def _expand(compact: CompactResult) -> DetectionResult:
+    code, confidence, method = compact
+    profile = LANGUAGE_PROFILES[code]
+    return DetectionResult(
+        code=code,
+        name=profile.name,
+        confidence=confidence,
+        family=profile.family,
+        is_hybrid=False,  # Set in __post_init__
+        method=method,
+    )
+
+
+class BatchLanguageDetector:
+    """
+    Detects languages for lists of texts on a process pool.
+
+    The pool is created on first use and reused, so workers start once
+    rather than per batch.
+    """
+
+    def __init__(self, workers: int = 0, chunk_size: int = 1000) -> None:
+        """
+        Initialize the batch detector.
+
+        Args:
+            workers: Worker processes (0 = CPU count)
+            chunk_size: Texts per worker task
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = WorkerPool("LangBatch", self.workers)
+
+        self._batches = 0
+        self._texts = 0
+        self._seconds = 0.0
+
+    def detect(self, texts: list[str]) -> list[DetectionResult]:
+        """
+        Detect the language of every text.
+
+        Blocking; call from a worker thread (asyncio.to_thread) on the
+        request path.
+
+        Args:
+            texts: Texts to label
+
+        Returns:
+            One DetectionResult per text, in input order
+        """
+        start = time.perf_counter()
+
+        if len(texts) <= INLINE_MAX or self.workers == 1:
+            compact = _detect_chunk(texts)
+        else:
+            chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+            compact = []
+            # map() yields chunk results in submission order
+            for chunk_result in self._pool.get().map(_detect_chunk, chunks):
+                compact.extend(chunk_result)
+
+        elapsed = time.perf_counter() - start
+        self._batches += 1
+        self._texts += len(texts)
+        self._seconds += elapsed
+        logger.info(
+            "[LangBatch] %d texts in %.2fs (%.0f texts/s)",
+            len(texts), elapsed, len(texts) / elapsed if elapsed else 0.0,
+        )
+        return [_expand(c) for c in compact]
+
+    def get_stats(self) -> dict:
+        """Get batch detection statistics."""
+        return {
+            "workers": self.workers,
+            "pool_started": self._pool.started,
+            "batches": self._batches,
+            "texts": self._texts,
+            "texts_per_second": round(self._texts / self._seconds, 1) if self._seconds else 0.0,
+        }
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        self._pool.shutdown()
+
+
+# Singleton instance
+_batch_detector: Optional[BatchLanguageDetector] = None
+
+
+def get_batch_language_detector() -> BatchLanguageDetector:
+    """Get the global batch language detector."""
+    global _batch_detector
+    if _batch_detector is None:
+        _batch_detector = BatchLanguageDetector(
+            workers=settings.LANGUAGE_BATCH_WORKERS,
+            chunk_size=settings.LANGUAGE_BATCH_CHUNK_SIZE,
+        )
+    return _batch_detector
+
+
+def shutdown_batch_language_detector() -> None:
+    """Stop the worker pool (application shutdown)."""
+    if _batch_detector is not None:
+        _batch_detector.close()
@@ -0,0 +1,387 @@
+"""
+GOGGA Legal Corpus - Local full-text index of South African legislation
+
+legal_search used to go to the web for every question, so answers about
+the Constitution, the BCEA, the LRA, the CPA or POPIA waited on Serper,
+hit rate limits and depended on how well a government site scraped.
+
+This module keeps an SQLite FTS5 index of a legislation corpus:
+- Bundled corpus in app/data/legal/, one Markdown file per Act (front
+  matter with act name, aliases and URL; "## <number>. <title>" per section)
+- Files dropped into LEGAL_CORPUS_DROP_DIR are indexed too; a dropped file
+  with the same name as a bundled one replaces it (e.g. the full official
+  text)
+- Section-level chunks, ranked with FTS5 bm25 (act names and aliases
+  weigh more than body text)
+- Incremental sync: only files whose size, mtime and content hash changed
+  are re-indexed; deleted files are removed. Sync runs on first use, then
+  at most every LEGAL_CORPUS_SYNC_SECONDS
+- Queries take milliseconds and run in a worker thread
+
+search() also reports how much of the query the best section covers;
+legal_search only falls back to the web when that recall is weak.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Final, Optional
+
+from app.config import settings
+from app.services.passage_ranker import STOPWORDS, tokenize
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_CORPUS_DIR: Final[Path] = Path(__file__).resolve().parent.parent / "data" / "legal"
+CORPUS_SUFFIXES: Final[tuple[str, ...]] = (".md", ".txt")
+
+# Words that say "this is a legal question" but not which provision it is about
+QUERY_STOPWORDS: Final[frozenset[str]] = STOPWORDS | frozenset({
+    "south", "africa", "african", "sa", "law", "laws", "legal", "legally", "legislation",
+    "about", "under", "tell", "explain", "please", "much", "many", "long", "need", "know",
+    "if", "allowed", "get", "should", "must", "may",
+})
+
+# bm25 column weights: act, aliases, section, title, body
+BM25_WEIGHTS: Final[tuple[float, ...]] = (4.0, 4.0, 2.0, 3.0, 1.0)
+
+_SECTION_HEADING: Final[re.Pattern] = re.compile(r"^##\s+(\d+[A-Za-z]*)\.?\s+(.+?)\s*$")
+_QUERY_TERM: Final[re.Pattern] = re.compile(r"[a-z0-9]+")
+
+_SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS corpus_files (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    sections INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5(
+    act, aliases, section, title, body,
+    file UNINDEXED, url UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+
+@dataclass(slots=True)
+class LegalSection:
+    """One section of an Act."""
+    act: str
+    section: str
+    title: str
+    body: str
+    url: str = ""
+    score: float = 0.0
+
+    @property
+    def citation(self) -> str:
+        return f"{self.act}, section {self.section}"
+
+
+@dataclass(slots=True)
+class LegalSearchResult:
+    """Ranked sections plus how well the best one covers the query."""
+    query: str
+    sections: list[LegalSection] = field(default_factory=list)
+    coverage: float = 0.0
+    elapsed_ms: float = 0.0
+    min_coverage: float = 0.6
+
+    @property
+    def strong(self) -> bool:
+        """True if the local corpus answers the query (no web fallback needed)."""
+        return bool(self.sections) and self.coverage >= self.min_coverage
+
+    def format_for_llm(self) -> str:
+        """Same layout as SearchService.format_for_llm, for legal_search results."""
+        parts = [
+            "[SA LEGAL SEARCH RESULTS]",
+            "Note: These are search results, not legal advice. Verify with official sources.",
+            f"Query: {self.query}",
+            f"Results: {len(self.sections)} sections from the local legislation index",
+            "",
+        ]
+        for i, section in enumerate(self.sections, 1):
+            parts.extend([
+                f"--- Result {i} ---",
+                f"Title: {section.citation} ({section.title})",
+                f"URL: {section.url}",
+                f"Content: {section.body}",
+                "",
+            ])
+        parts.append("[END SEARCH RESULTS]")
+        return "\n".join(parts)
+
+
+def parse_corpus_file(text: str) -> tuple[dict[str, str], list[tuple[str, str, str]]]:
+    """
+    Parse a corpus file into front matter and sections.
+
+    Returns:
+        (meta, [(section number, title, body), ...])
+    """
+    meta: dict[str, str] = {}
+    lines = text.splitlines()
+    if lines and lines[0].strip() == "---":
+        for i, line in enumerate(lines[1:], 1):
+            if line.strip() == "---":
+                lines = lines[i + 1:]
+                break
+            key, _, value = line.partition(":")
+            meta[key.strip().lower()] = value.strip()
+
+    sections: list[tuple[str, str, str]] = []
+    number = title = None
+    body: list[str] = []
+    for line in lines:
+        match = _SECTION_HEADING.match(line)
+        if match:
+            if number is not None:
+                sections.append((number, title, "\n".join(body).strip()))
+            number, title, body = match.group(1), match.group(2), []
+        elif number is not None:
+            body.append(line)
+    if number is not None:
+        sections.append((number, title, "\n".join(body).strip()))
+    return meta, sections
+
+
+def query_terms(query: str) -> list[str]:
+    """Distinct query words worth matching (order kept)."""
+    seen: dict[str, None] = {}
+    for term in _QUERY_TERM.findall(query.lower()):
+        if term not in QUERY_STOPWORDS and (len(term) > 1 or term.isdigit()):
+            seen.setdefault(term, None)
+    return list(seen)
+
+
+class LegalCorpus:
+    """
+    SQLite FTS5 index over the bundled and dropped-in legislation files.
+
+    SQLite calls are serialised with a lock; the async wrappers run them
+    in a worker thread so the event loop never blocks.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        corpus_dirs: list[Path],
+        min_coverage: float = 0.6,
+        sync_interval: float = 300.0,
+        limit: int = 5,
+    ) -> None:
+        """
+        Initialize the corpus.
+
+        Args:
+            db_path: SQLite index file (":memory:" for tests)
+            corpus_dirs: Directories to index; later ones override earlier ones by file name
+            min_coverage: Query coverage of the best section needed to skip the web
+            sync_interval: Minimum seconds between automatic incremental syncs
+            limit: Default number of sections returned
+        """
+        self.db_path = str(db_path)
+        self.corpus_dirs = [Path(d) for d in corpus_dirs]
+        self.min_coverage = min_coverage
+        self.sync_interval = sync_interval
+        self.limit = limit
+
+        self._db_lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._last_sync = 0.0
+
+        self._searches = 0
+        self._strong = 0
+        self._search_ms = 0.0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Lazily open the SQLite connection and ensure the schema exists."""
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    def _corpus_files(self) -> dict[str, Path]:
+        files: dict[str, Path] = {}
+        for directory in self.corpus_dirs:
+            if directory.is_dir():
+                for path in sorted(directory.iterdir()):
+                    if path.suffix.lower() in CORPUS_SUFFIXES and path.is_file():
+                        files[path.name] = path
+        return files
+
+    def sync(self) -> dict[str, int]:
+        """
+        Bring the index up to date with the corpus directories.
+
+        Returns:
+            Counts of files indexed, unchanged and removed
+        """
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0}
+        files = self._corpus_files()
+        with self._db_lock:
+            conn = self._get_conn()
+            known = {
+                row[0]: row[1:]
+                for row in conn.execute("SELECT name, path, mtime, size, sha256 FROM corpus_files")
+            }
+            for name, path in files.items():
+                stat = path.stat()
+                row = known.get(name)
+                if row and row[0] == str(path) and row[1] == stat.st_mtime and row[2] == stat.st_size:
+                    counts["unchanged"] += 1
+                    continue
+                data = path.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()
+                if row and row[0] == str(path) and row[3] == digest:
+                    # Touched but identical
+                    conn.execute(
+                        "UPDATE corpus_files SET mtime = ?, size = ? WHERE name = ?",
+                        (stat.st_mtime, stat.st_size, name),
+                    )
+                    counts["unchanged"] += 1
+                    continue
+                self._index_file(conn, name, path, data, digest, stat)
+                counts["indexed"] += 1
+
+            for name in known.keys() - files.keys():
+                conn.execute("DELETE FROM sections WHERE file = ?", (name,))
+                conn.execute("DELETE FROM corpus_files WHERE name = ?", (name,))
+                counts["removed"] += 1
+            conn.commit()
+        self._last_sync = time.time()
+
+        if counts["indexed"] or counts["removed"]:
+            logger.info(
+                "[LegalCorpus] Synced: %d indexed, %d unchanged, %d removed",
+                counts["indexed"], counts["unchanged"], counts["removed"],
+            )
+        return counts
+
+    @staticmethod
+    def _index_file(
+        conn: sqlite3.Connection,
+        name: str,
+        path: Path,
+        data: bytes,
+        digest: str,
+        stat: Any,
+    ) -> None:
+        meta, sections = parse_corpus_file(data.decode("utf-8", errors="replace"))
+        act = meta.get("act") or path.stem.replace("_", " ").title()
+        conn.execute("DELETE FROM sections WHERE file = ?", (name,))
+        conn.executemany(
+            "INSERT INTO sections (act, aliases, section, title, body, file, url) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (act, meta.get("aliases", ""), number, title, body, name, meta.get("url", ""))
+                for number, title, body in sections
+            ],
+        )
+        conn.execute(
+            "INSERT INTO corpus_files (name, path, mtime, size, sha256, sections) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET path = excluded.path, mtime = excluded.mtime, "
+            "size = excluded.size, sha256 = excluded.sha256, sections = excluded.sections",
+            (name, str(path), stat.st_mtime, stat.st_size, digest, len(sections)),
+        )
+
+    def search(self, query: str, limit: Optional[int] = None) -> LegalSearchResult:
+        """
+        Rank sections against a query.
+
+        Args:
+            query: Legal question or keywords
+            limit: Maximum sections (default: self.limit)
+
+        Returns:
+            LegalSearchResult; .strong tells whether the web can be skipped
+        """
+        start = time.perf_counter()
+        if time.time() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+        result = LegalSearchResult(query=query, min_coverage=self.min_coverage)
+        terms = query_terms(query)
+        if terms:
+            match = " OR ".join(f'"{term}"' for term in terms)
+            with self._db_lock:
+                rows = self._get_conn().execute(
+                    "SELECT act, aliases, section, title, body, url, bm25(sections, ?, ?, ?, ?, ?) AS rank "
+                    "FROM sections WHERE sections MATCH ? ORDER BY rank LIMIT ?",
+                    (*BM25_WEIGHTS, match, limit or self.limit),
+                ).fetchall()
+            result.sections = [
+                LegalSection(act=act, section=section, title=title, body=body, url=url, score=-rank)
+                for act, _, section, title, body, url, rank in rows
+            ]
+            if rows:
+                # Share of the query's (stemmed) terms the best section contains
+                wanted = set(tokenize(" ".join(terms)))
+                act, aliases, section, title, body, _, _ = rows[0]
+                found = set(tokenize(f"{act} {aliases} {section} {title} {body}"))
+                result.coverage = len(wanted & found) / len(wanted) if wanted else 0.0
+
+        result.elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        self._searches += 1
+        self._strong += result.strong
+        self._search_ms += result.elapsed_ms
+        return result
+
+    async def search_async(self, query: str, limit: Optional[int] = None) -> LegalSearchResult:
+        """search() in a worker thread."""
+        return await asyncio.to_thread(self.search, query, limit)
+
+    async def sync_async(self) -> dict[str, int]:
+        """sync() in a worker thread."""
+        return await asyncio.to_thread(self.sync)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Index size and local hit rate."""
+        with self._db_lock:
+            files, sections = self._get_conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(sections), 0) FROM corpus_files"
+            ).fetchone()
+        return {
+            "files": files,
+            "sections": sections,
+            "searches": self._searches,
+            "answered_locally": self._strong,
+            "local_rate": round(self._strong / self._searches, 3) if self._searches else 0.0,
+            "avg_search_ms": round(self._search_ms / self._searches, 2) if self._searches else 0.0,
+            "last_sync": self._last_sync,
+        }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_legal_corpus: LegalCorpus | None = None
+
+
+def get_legal_corpus() -> LegalCorpus:
+    """Get the global legal corpus instance."""
+    global _legal_corpus
+    if _legal_corpus is None:
+        _legal_corpus = LegalCorpus(
+            db_path=settings.LEGAL_CORPUS_INDEX_PATH,
+            corpus_dirs=[BUNDLED_CORPUS_DIR, Path(settings.LEGAL_CORPUS_DROP_DIR)],
+            min_coverage=settings.LEGAL_CORPUS_MIN_COVERAGE,
+            sync_interval=settings.LEGAL_CORPUS_SYNC_SECONDS,
+        )
+    return _legal_corpus
@@ -0,0 +1,407 @@
+"""
+GOGGA Long Document QA - Map-reduce answers over the whole document
+
+/chat used to cut messages over 50,000 characters down by keeping the first
+five lines and as many following lines as fit, then telling the model the
+rest was "[DATA TRUNCATED]". Questions about the second half of a contract
+or a spreadsheet export were answered from the first half, and the one
+call still carried ~12k tokens of prefill.
+
+Long messages are answered map-reduce style instead (the pattern of
+Qwen-Agent's parallel doc QA):
+- The message is split into the question (short leading/trailing
+  paragraphs) and the document
+- The document is cut into parts of ~LONG_DOC_CHUNK_TOKENS on line
+  boundaries; tabular data repeats its header row in every part
+- Early filtering: for targeted questions, parts with no BM25 overlap with
+  the question (or far below the best part) are skipped before any call.
+  Whole-document requests ("summarise", "list all") map every part
+- Map: one short call per part, concurrently under a shared concurrency
+  cap; each returns {"res": "ans"|"none", "content": ...} and "none" parts
+  are dropped
+- Reduce: one call merges the findings into a single answer citing
+  "[Part N]"; findings that exceed the reduce budget are merged in rounds
+- Parts that fail are named in a coverage note rather than silently lost
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Final, Literal, Optional
+
+from app.config import settings
+from app.services.passage_ranker import CHARS_PER_TOKEN, Passage, estimate_tokens, score_passages, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Leading/trailing paragraphs up to this size are treated as the question
+QUESTION_MAX_CHARS: Final[int] = 2000
+
+# Requests that need every part, whatever the lexical overlap
+_WHOLE_DOCUMENT: Final[re.Pattern] = re.compile(
+    r"\b(summar\w*|overview|gist|tl;?dr|outline|all|every|each|entire|whole|list|count|"
+    r"how many|total|compare|translate|rewrite|proofread|extract)\b",
+    re.IGNORECASE,
+)
+_TABLE_DELIMITERS: Final[tuple[str, ...]] = (",", "\t", "|", ";")
+_THINK_BLOCK: Final[re.Pattern] = re.compile(r"<think(?:ing)?>.*?</think(?:ing)?>", re.DOTALL | re.IGNORECASE)
+_JSON_OBJECT: Final[re.Pattern] = re.compile(r"\{.*\}", re.DOTALL)
+
+MAP_SYSTEM_PROMPT: Final[str] = (
+    "You read one part of a longer document and extract what is relevant to the user's question. "
+    "Reply with JSON only: {\"res\": \"ans\", \"content\": \"...\"} with the relevant facts, figures "
+    "and short quotes from this part, or {\"res\": \"none\", \"content\": \"\"} if this part has "
+    "nothing relevant. Use only this part; do not answer from general knowledge."
+)
+
+REDUCE_SYSTEM_PROMPT: Final[str] = (
+    "You answer a question about a long document from findings extracted from its numbered parts. "
+    "Merge them into one complete answer, resolve overlaps, and cite the parts you rely on as "
+    "[Part N]. Use only the findings. Reply in the language of the question."
+)
+
+# (model, messages, max_tokens) -> OpenAI-compatible completion
+Completer = Callable[[str, list[dict[str, str]], int], Awaitable[Any]]
+
+PartStatus = Literal["pending", "skipped", "none", "answer", "failed"]
+
+
+@dataclass(slots=True)
+class DocumentPart:
+    """A token-bounded slice of the document."""
+    number: int  # 1-based, used for citations
+    start: int  # Character offset in the document
+    text: str
+    score: float = 0.0
+    status: PartStatus = "pending"
+    finding: str = ""
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+@dataclass(slots=True)
+class LongDocAnswer:
+    """Merged answer plus what was read to produce it."""
+    answer: str
+    thinking: Optional[str]
+    parts: list[DocumentPart]
+    usage: dict[str, list[int]] = field(default_factory=dict)  # model -> [input, output]
+    latency_seconds: float = 0.0
+
+    def count(self, status: PartStatus) -> int:
+        return sum(1 for part in self.parts if part.status == status)
+
+    def coverage(self) -> dict[str, Any]:
+        """Per-status part counts for response metadata."""
+        return {
+            "parts": len(self.parts),
+            "mapped": len(self.parts) - self.count("skipped"),
+            "relevant": self.count("answer"),
+            "skipped": self.count("skipped"),
+            "failed": [part.number for part in self.parts if part.status == "failed"],
+            "calls": sum(1 for part in self.parts if part.status != "skipped"),
+        }
+
+
+def split_question(message: str) -> tuple[str, str]:
+    """
+    Separate the instruction from the pasted document.
+
+    The question is the first paragraph when it is short, plus a short
+    final paragraph that asks something. Without a short first paragraph,
+    the first five lines are used (the old truncation's assumption).
+    """
+    paragraphs = re.split(r"\n\s*\n", message.strip())
+    question: list[str] = []
+    if len(paragraphs) > 1 and len(paragraphs[0]) <= QUESTION_MAX_CHARS:
+        question.append(paragraphs.pop(0).strip())
+    if len(paragraphs) > 1 and len(paragraphs[-1]) <= QUESTION_MAX_CHARS and paragraphs[-1].rstrip().endswith("?"):
+        question.append(paragraphs.pop().strip())
+    if question:
+        return "\n\n".join(question), "\n\n".join(paragraphs)
+
+    lines = message.strip().split("\n")
+    return "\n".join(lines[:5])[:QUESTION_MAX_CHARS], "\n".join(lines[5:])
+
+
+def _table_header(lines: list[str]) -> Optional[str]:
+    """The first line, if the document looks like delimited rows."""
+    if len(lines) < 3:
+        return None
+    for delimiter in _TABLE_DELIMITERS:
+        columns = lines[0].count(delimiter)
+        if columns >= 2 and lines[1].count(delimiter) == columns and lines[2].count(delimiter) == columns:
+            return lines[0]
+    return None
+
+
+def split_document(document: str, chunk_tokens: int) -> list[DocumentPart]:
+    """Cut the document into parts of about chunk_tokens on line boundaries."""
+    lines = document.split("\n")
+    header = _table_header(lines)
+    header_tokens = estimate_tokens(header) + 1 if header else 0
+    budget = max(chunk_tokens - header_tokens, 1)
+
+    parts: list[DocumentPart] = []
+    current: list[str] = []
+    used = start = offset = 0
+
+    def flush() -> None:
+        nonlocal current, used
+        text = "\n".join(current).strip()
+        if text:
+            if header and parts:
+                text = f"{header}\n{text}"
+            parts.append(DocumentPart(number=len(parts) + 1, start=start, text=text))
+        current, used = [], 0
+
+    for line in lines:
+        # Hard-wrap single lines longer than a part (minified text, one-line exports)
+        width = budget * CHARS_PER_TOKEN
+        pieces = [line[i:i + width] for i in range(0, len(line), width)] or [""]
+        for piece in pieces:
+            tokens = estimate_tokens(piece) + 1
+            if current and used + tokens > budget:
+                flush()
+            if not current:
+                start = offset
+            current.append(piece)
+            used += tokens
+            offset += len(piece)
+        offset += 1  # The newline
+    flush()
+    return parts
+
+
+def needs_every_part(question: str) -> bool:
+    """Summaries, lists and totals cannot skip parts."""
+    return bool(_WHOLE_DOCUMENT.search(question)) or not tokenize(question)
+
+
+def select_parts(question: str, parts: list[DocumentPart], min_relative_score: float) -> None:
+    """Mark parts that cannot contribute to a targeted question as skipped."""
+    if needs_every_part(question):
+        return
+    passages = [Passage(source=part.number, position=0, text=part.text) for part in parts]
+    score_passages(question, passages)
+    best = max((p.score for p in passages), default=0.0)
+    if best <= 0:
+        # No lexical overlap anywhere (other language, paraphrase): read everything
+        return
+    for part, passage in zip(parts, passages):
+        part.score = passage.score
+        if passage.score <= 0 or passage.score < best * min_relative_score:
+            part.status = "skipped"
+
+
+def parse_finding(content: str) -> Optional[str]:
+    """Relevant content from a map reply, or None when the part had nothing."""
+    content = _THINK_BLOCK.sub("", content).strip()
+    if match := _JSON_OBJECT.search(content):
+        try:
+            reply = json.loads(match.group(0))
+        except ValueError:
+            reply = None
+        if isinstance(reply, dict):
+            text = str(reply.get("content") or "").strip()
+            return text if reply.get("res") != "none" and text else None
+    # Free text: keep it unless the model just said there was nothing
+    if not content or content.strip('"\'.').lower() in {"none", "n/a", "nothing relevant"}:
+        return None
+    return content
+
+
+async def _default_completer(model: str, messages: list[dict[str, str]], max_tokens: int) -> Any:
+    from app.services.ai_service import call_llm_with_retry
+    return await call_llm_with_retry(
+        model, messages, temperature=0.2, top_p=0.95, max_tokens=max_tokens, context="Long document QA",
+    )
+
+
+class LongDocumentQA:
+    """
+    Map-reduce question answering over documents too long for one prompt.
+
+    The concurrency cap is shared by all requests, so one huge upload
+    cannot take every provider key at once.
+    """
+
+    def __init__(
+        self,
+        map_model: str,
+        chunk_tokens: int = 6000,
+        max_concurrency: int = 8,
+        map_max_tokens: int = 600,
+        reduce_max_tokens: int = 4096,
+        reduce_input_tokens: int = 24_000,
+        min_relative_score: float = 0.1,
+        completer: Optional[Completer] = None,
+    ) -> None:
+        """
+        Initialize the pipeline.
+
+        Args:
+            map_model: Model for the per-part calls (fast and cheap)
+            chunk_tokens: Target part size in estimated tokens
+            max_concurrency: Map calls in flight across all requests
+            map_max_tokens: Completion budget per map call
+            reduce_max_tokens: Completion budget for the final answer
+            reduce_input_tokens: Findings per reduce call before merging in rounds
+            min_relative_score: Targeted questions skip parts scoring below this share of the best
+            completer: LLM call (default: call_llm_with_retry)
+        """
+        self.map_model = map_model
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.map_max_tokens = map_max_tokens
+        self.reduce_max_tokens = reduce_max_tokens
+        self.reduce_input_tokens = reduce_input_tokens
+        self.min_relative_score = min_relative_score
+        self._complete = completer or _default_completer
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self._runs = 0
+        self._parts = 0
+        self._skipped = 0
+        self._map_calls = 0
+        self._failed = 0
+
+    async def _call(self, model: str, messages: list[dict[str, str]], max_tokens: int, usage: dict[str, list[int]]) -> str:
+        response = await self._complete(model, messages, max_tokens)
+        totals = usage.setdefault(model, [0, 0])
+        if response.usage is not None:
+            totals[0] += response.usage.prompt_tokens
+            totals[1] += response.usage.completion_tokens
+        return response.choices[0].message.content or ""
+
+    async def _map(self, question: str, part: DocumentPart, total: int, usage: dict[str, list[int]]) -> None:
+        messages = [
+            {"role": "system", "content": MAP_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Part {part.number} of {total}:\n{part.text}\n\nQuestion: {question} /no_think"},
+        ]
+        async with self._semaphore:
+            try:
+                content = await self._call(self.map_model, messages, self.map_max_tokens, usage)
+            except Exception as e:
+                logger.warning("[LongDoc] Part %d/%d failed: %s", part.number, total, e)
+                part.status = "failed"
+                return
+        finding = parse_finding(content)
+        part.status = "answer" if finding else "none"
+        part.finding = finding or ""
+
+    async def _reduce(self, question: str, findings: list[str], model: str, usage: dict[str, list[int]]) -> str:
+        # Findings beyond one call's budget are merged in rounds (still citing parts)
+        while len(findings) > 1 and estimate_tokens("\n\n".join(findings)) > self.reduce_input_tokens:
+            batches: list[list[str]] = [[]]
+            used = 0
+            for finding in findings:
+                tokens = estimate_tokens(finding)
+                if batches[-1] and used + tokens > self.reduce_input_tokens:
+                    batches.append([])
+                    used = 0
+                batches[-1].append(finding)
+                used += tokens
+            if len(batches) == len(findings):
+                break  # Every finding fills a call on its own; merging cannot shrink further
+            findings = list(await asyncio.gather(*(
+                self._merge(question, batch, model, self.map_max_tokens * 2, usage) for batch in batches
+            )))
+        return await self._merge(question, findings, model, self.reduce_max_tokens, usage)
+
+    async def _merge(self, question: str, findings: list[str], model: str, max_tokens: int, usage: dict[str, list[int]]) -> str:
+        messages = [
+            {"role": "system", "content": REDUCE_SYSTEM_PROMPT},
+            {"role": "user", "content": "Findings:\n\n" + "\n\n".join(findings) + f"\n\nQuestion: {question}"},
+        ]
+        async with self._semaphore:
+            return await self._call(model, messages, max_tokens, usage)
+
+    async def answer(self, message: str, reduce_model: Optional[str] = None) -> LongDocAnswer:
+        """
+        Answer a message that carries a long document.
+
+        Args:
+            message: The full user message (question plus pasted document)
+            reduce_model: Model for the final answer (default: map model)
+
+        Returns:
+            LongDocAnswer with the merged answer and per-part coverage
+
+        Raises:
+            RuntimeError: Every mapped part failed
+        """
+        start = time.perf_counter()
+        self._runs += 1
+        question, document = split_question(message)
+        parts = split_document(document, self.chunk_tokens)
+        select_parts(question, parts, self.min_relative_score)
+        mapped = [part for part in parts if part.status != "skipped"]
+        usage: dict[str, list[int]] = {}
+
+        await asyncio.gather(*(self._map(question, part, len(parts), usage) for part in mapped))
+
+        failed = [part.number for part in mapped if part.status == "failed"]
+        self._parts += len(parts)
+        self._skipped += len(parts) - len(mapped)
+        self._map_calls += len(mapped)
+        self._failed += len(failed)
+        if mapped and len(failed) == len(mapped):
+            raise RuntimeError(f"All {len(mapped)} document parts failed")
+
+        findings = [f"[Part {part.number}] {part.finding}" for part in parts if part.status == "answer"]
+        thinking: Optional[str] = None
+        if findings:
+            raw = await self._reduce(question, findings, reduce_model or self.map_model, usage)
+            thinking_blocks = _THINK_BLOCK.findall(raw)
+            answer = _THINK_BLOCK.sub("", raw).strip()
+            if thinking_blocks:
+                thinking = "\n\n".join(re.sub(r"</?think(?:ing)?>", "", block).strip() for block in thinking_blocks)
+        else:
+            answer = f"I read {len(mapped)} of the document's {len(parts)} parts and none of them answer this question."
+            if len(mapped) < len(parts):
+                answer += " The parts I skipped do not mention any of the question's terms."
+        if failed:
+            answer += f"\n\n_Note: part(s) {', '.join(map(str, failed))} of {len(parts)} could not be read._"
+
+        latency = time.perf_counter() - start
+        logger.info(
+            "[LongDoc] parts=%d mapped=%d relevant=%d failed=%d latency=%.2fs",
+            len(parts), len(mapped), len(findings), len(failed), latency,
+        )
+        return LongDocAnswer(answer=answer, thinking=thinking, parts=parts, usage=usage, latency_seconds=latency)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get pipeline statistics."""
+        return {
+            "runs": self._runs,
+            "parts": self._parts,
+            "parts_skipped": self._skipped,
+            "map_calls": self._map_calls,
+            "map_failures": self._failed,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+# Singleton instance
+_long_doc_qa: Optional[LongDocumentQA] = None
+
+
+def get_long_doc_qa() -> LongDocumentQA:
+    """Get the global long-document QA pipeline."""
+    global _long_doc_qa
+    if _long_doc_qa is None:
+        _long_doc_qa = LongDocumentQA(
+            map_model=settings.MODEL_JIVE,
+            chunk_tokens=settings.LONG_DOC_CHUNK_TOKENS,
+            max_concurrency=settings.LONG_DOC_MAX_CONCURRENCY,
+            map_max_tokens=settings.LONG_DOC_MAP_MAX_TOKENS,
+            reduce_max_tokens=settings.LONG_DOC_REDUCE_MAX_TOKENS,
+            min_relative_score=settings.LONG_DOC_MIN_RELATIVE_SCORE,
+        )
+    return _long_doc_qa
@@ -10,9 +10,10 @@ This is completely separate from Cerebras (JIVE/JIGGA text) and DeepInfra (JIVE/
 """
 
 import httpx
+import json
 import logging
 import time
-from typing import Any
+from typing import Any, AsyncIterator
 
 from app.config import get_settings
 
@@ -22,6 +23,13 @@ settings = get_settings()
 # OpenRouter API endpoint
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
+# Sent to a fallback model when the primary dies mid-answer
+CONTINUE_PROMPT = "Continue exactly where you stopped. Do not repeat anything you already wrote."
+
+
+class OpenRouterStreamError(Exception):
+    """Raised when OpenRouter reports an error inside an SSE stream."""
+
 
 class OpenRouterService:
     """
@@ -41,6 +49,10 @@ class OpenRouterService:
         self.api_key = settings.OPENROUTER_API_KEY
         self.model_qwen = settings.OPENROUTER_MODEL_QWEN  # Qwen 3 235B FREE
         self.model_longcat = settings.OPENROUTER_MODEL_LONGCAT
+        # Free tier models tried in order when the primary model fails
+        self.free_fallback_models = [
+            m for m in settings.OPENROUTER_FREE_FALLBACK_MODELS if m != self.model_qwen
+        ]
         self._client: httpx.AsyncClient | None = None
     
     async def _get_client(self) -> httpx.AsyncClient:
@@ -102,6 +114,70 @@ class OpenRouterService:
             "model": model
         }
     
+    async def _chat_completion_stream(
+        self,
+        model: str,
+        messages: list[dict[str, str]],
+        max_tokens: int = 2048,
+        temperature: float = 0.7
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Stream a chat completion from OpenRouter (SSE).
+        
+        Yields:
+            {"content": str} for each text delta, then a final
+            {"usage": dict, "model": str} once the stream ends.
+            
+        Raises:
+            httpx.HTTPError: Connection or HTTP status failure
+            OpenRouterStreamError: Error reported inside the stream
+        """
+        client = await self._get_client()
+        usage: dict[str, Any] = {}
+        
+        async with client.stream(
+            "POST",
+            "/chat/completions",
+            json={
+                "model": model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stream": True,
+                "stream_options": {"include_usage": True},
+            }
+        ) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                # Blank separators and ": OPENROUTER PROCESSING" keep-alive comments
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    logger.debug("OpenRouter stream: skipping malformed chunk %r", data[:80])
+                    continue
+                
+                if error := chunk.get("error"):
+                    message = error.get("message", "unknown error") if isinstance(error, dict) else str(error)
+                    raise OpenRouterStreamError(message)
+                
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                
+                for choice in chunk.get("choices") or []:
+                    if content := (choice.get("delta") or {}).get("content"):
+                        yield {"content": content}
+                    if choice.get("finish_reason") == "error":
+                        raise OpenRouterStreamError("generation aborted by provider")
+        
+        yield {"usage": usage, "model": model}
+    
     # =========================================================================
     # TEXT CHAT (FREE TIER)
     # =========================================================================
@@ -168,6 +244,69 @@ class OpenRouterService:
             }
         }
     
+    async def chat_free_stream(
+        self,
+        message: str,
+        system_prompt: str,
+        history: list[dict[str, str]] | None = None,
+        user_id: str | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        FREE tier streaming chat with free-model fallback.
+        
+        If the primary model errors before any text arrives, the next free
+        model is used transparently. If it errors mid-answer, the fallback is
+        asked to continue from the partial text so nothing is repeated.
+        
+        Yields:
+            {"content": str} text deltas,
+            {"fallback": model} when switching models,
+            {"usage": dict, "model": str} as the final event
+        """
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        if history:
+            messages.extend(history[-10:])  # Last 10 messages
+        
+        messages.append({"role": "user", "content": message})
+        
+        logger.info(
+            "FREE stream | user=%s | prompt=%s",
+            user_id or "anonymous",
+            message[:50] + "..." if len(message) > 50 else message
+        )
+        
+        models = [self.model_qwen, *self.free_fallback_models]
+        emitted: list[str] = []
+        
+        for index, model in enumerate(models):
+            request_messages = messages
+            if emitted:
+                request_messages = messages + [
+                    {"role": "assistant", "content": "".join(emitted)},
+                    {"role": "user", "content": CONTINUE_PROMPT},
+                ]
+            
+            try:
+                async for event in self._chat_completion_stream(
+                    model=model,
+                    messages=request_messages,
+                    max_tokens=2048,
+                    temperature=0.7
+                ):
+                    if "content" in event:
+                        emitted.append(event["content"])
+                    yield event
+                return
+            except (httpx.HTTPError, OpenRouterStreamError) as e:
+                if index == len(models) - 1:
+                    raise
+                logger.warning(
+                    "FREE stream: %s failed after %d chunks (%s), falling back to %s",
+                    model, len(emitted), e, models[index + 1]
+                )
+                yield {"fallback": models[index + 1]}
+    
     # =========================================================================
     # PROMPT ENHANCEMENT (ALL TIERS)
     # =========================================================================
@@ -52,6 +52,8 @@ from dataclasses import dataclass, field
 from enum import Enum
 from typing import Final
 
+from app.core.text_features import extract_features, register_vocabulary
+
 logger = logging.getLogger(__name__)
 
 
@@ -283,6 +285,28 @@ def enhance_user_message(
     return enhanced
 
 
+# Phrases suggesting the request benefits from planning mode
+PLANNING_INDICATORS: Final[frozenset[str]] = frozenset({
+    # Multi-step indicators
+    "step by step", "how do i", "how to", "explain how",
+    "walk me through", "guide me through", "process for",
+    
+    # Complex analysis
+    "analyze", "compare and contrast", "evaluate",
+    "pros and cons", "trade-offs", "implications",
+    
+    # Architecture/design
+    "design a", "architect", "system design", "structure",
+    "implement a", "build a", "create a system",
+    
+    # Legal/compliance
+    "legal", "compliance", "regulation", "contract",
+    "policy", "procedure", "requirements",
+})
+
+register_vocabulary("optillm.planning", PLANNING_INDICATORS)
+
+
 def should_use_planning(message: str) -> bool:
     """
     Detect if a message would benefit from planning mode.
@@ -299,26 +323,7 @@ def should_use_planning(message: str) -> bool:
     Returns:
         True if planning mode would help
     """
-    planning_indicators = {
-        # Multi-step indicators
-        "step by step", "how do i", "how to", "explain how",
-        "walk me through", "guide me through", "process for",
-        
-        # Complex analysis
-        "analyze", "compare and contrast", "evaluate",
-        "pros and cons", "trade-offs", "implications",
-        
-        # Architecture/design
-        "design a", "architect", "system design", "structure",
-        "implement a", "build a", "create a system",
-        
-        # Legal/compliance
-        "legal", "compliance", "regulation", "contract",
-        "policy", "procedure", "requirements",
-    }
-    
-    message_lower = message.lower()
-    return any(indicator in message_lower for indicator in planning_indicators)
+    return extract_features(message).any("optillm.planning")
 
 
 def parse_enhanced_response(content: str) -> dict[str, str]:
@@ -0,0 +1,227 @@
+"""
+GOGGA Passage Ranker - BM25 passage selection for search context packing
+
+format_for_llm() used to paste every scraped page in result order until
+MAX_TOTAL_CONTEXT ran out, so the synthesis call paid for cookie banners,
+"related stories" and the same syndicated article three times over.
+
+This module packs search context by relevance instead:
+- Splits scraped pages into passages of ~PASSAGE_WORDS words on sentence
+  boundaries
+- Scores every passage against the query with BM25 (the response's
+  passages are the corpus), with optional per-term boosts - by default
+  the domain keywords the router's text-feature vocabularies found in the
+  query
+- Drops passages that score far below the best one and near-duplicates
+  of passages already selected (word-shingle Jaccard), across sources
+- Greedily packs the best passages into a token budget; each passage keeps
+  the index of the result it came from, so citations survive
+"""
+
+import logging
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Final, Mapping
+
+from app.core.text_features import extract_features
+
+logger = logging.getLogger(__name__)
+
+# Passage size (words); sentences are never split
+PASSAGE_WORDS: Final[int] = 80
+
+# BM25 parameters (standard values)
+BM25_K1: Final[float] = 1.2
+BM25_B: Final[float] = 0.75
+
+# Passages scoring below this share of the best passage are noise
+MIN_RELATIVE_SCORE: Final[float] = 0.25
+
+# Extra weight for query terms that the router recognises as domain keywords
+ROUTER_BOOST: Final[float] = 1.0
+
+# Passages sharing this share of word 3-grams with a selected one are duplicates
+DUPLICATE_JACCARD: Final[float] = 0.6
+SHINGLE_SIZE: Final[int] = 3
+
+# Rough token estimate, same as SearchResult.content_tokens
+CHARS_PER_TOKEN: Final[int] = 4
+
+STOPWORDS: Final[frozenset[str]] = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "has", "have", "how", "i", "in", "is", "it", "its", "me", "my", "of", "on", "or",
+    "so", "that", "the", "their", "there", "this", "to", "was", "what", "when", "where",
+    "which", "who", "why", "will", "with", "you", "your",
+})
+
+_SUFFIXES: Final[tuple[str, ...]] = ("ments", "ment", "ings", "ing", "ers", "er", "ed", "als", "al", "s")
+
+_TOKEN_PATTERN: Final[re.Pattern] = re.compile(r"[a-z0-9]+")
+_SENTENCE_END: Final[re.Pattern] = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Light suffix stripping so 'employer'/'employment' and 'dismissal'/'dismissed' meet."""
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4 and not token.endswith("ss"):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, stemmed terms without stopwords or single letters."""
+    return [
+        stem(token)
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+@dataclass(slots=True)
+class Passage:
+    """A run of sentences from one search result."""
+    source: int  # Result number (1-based), used for citations
+    position: int  # Order within the source
+    text: str
+    terms: list[str] = field(default_factory=list, repr=False)
+    score: float = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+@dataclass(slots=True)
+class PackedContext:
+    """Selected passages plus what packing saved."""
+    passages: list[Passage]
+    tokens_in: int
+    tokens_out: int
+    duplicates: int = 0
+
+    @property
+    def reduction(self) -> float:
+        return 1 - self.tokens_out / self.tokens_in if self.tokens_in else 0.0
+
+    def for_source(self, source: int) -> list[Passage]:
+        """Selected passages from one result, in document order."""
+        return sorted((p for p in self.passages if p.source == source), key=lambda p: p.position)
+
+
+def split_passages(text: str, source: int, words: int = PASSAGE_WORDS) -> list[Passage]:
+    """Split text into passages of about `words` words on sentence boundaries."""
+    passages: list[Passage] = []
+    current: list[str] = []
+    count = 0
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if not sentence:
+            continue
+        current.append(sentence)
+        count += len(sentence.split())
+        if count >= words:
+            passages.append(Passage(source=source, position=len(passages), text=" ".join(current)))
+            current, count = [], 0
+    if current:
+        passages.append(Passage(source=source, position=len(passages), text=" ".join(current)))
+    return passages
+
+
+def router_boosts(query: str) -> dict[str, float]:
+    """Boost the terms of router keywords (text-feature vocabularies) found in the query."""
+    features = extract_features(query)
+    boosts: dict[str, float] = {}
+    for pattern in features.hits:
+        if features.has(pattern):
+            for term in tokenize(pattern):
+                boosts[term] = ROUTER_BOOST
+    return boosts
+
+
+def score_passages(query: str, passages: list[Passage], boosts: Mapping[str, float] | None = None) -> None:
+    """Set BM25 scores in place, using the passages themselves as the corpus."""
+    if not passages:
+        return
+    for passage in passages:
+        passage.terms = tokenize(passage.text)
+
+    weights = Counter(tokenize(query))
+    for term, boost in (boosts or {}).items():
+        if term in weights:
+            weights[term] *= 1 + boost
+
+    n = len(passages)
+    avg_len = sum(len(p.terms) for p in passages) / n or 1.0
+    df = Counter(term for p in passages for term in set(p.terms) if term in weights)
+    idf = {term: math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5)) for term in weights}
+
+    for passage in passages:
+        tf = Counter(term for term in passage.terms if term in weights)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(passage.terms) / avg_len)
+        passage.score = sum(
+            weights[term] * idf[term] * count * (BM25_K1 + 1) / (count + norm)
+            for term, count in tf.items()
+        )
+
+
+def _shingles(terms: list[str]) -> frozenset[tuple[str, ...]]:
+    if len(terms) < SHINGLE_SIZE:
+        return frozenset({tuple(terms)})
+    return frozenset(tuple(terms[i:i + SHINGLE_SIZE]) for i in range(len(terms) - SHINGLE_SIZE + 1))
+
+
+def pack_passages(
+    query: str,
+    sources: Mapping[int, str],
+    token_budget: int,
+    boosts: Mapping[str, float] | None = None,
+) -> PackedContext:
+    """
+    Select the most relevant passages from scraped pages within a token budget.
+
+    Args:
+        query: The search query
+        sources: Page text by result number
+        token_budget: Maximum estimated tokens of selected passage text
+        boosts: Extra weight per query term (default: router_boosts(query))
+
+    Returns:
+        PackedContext with passages in score order
+    """
+    passages = [p for source, text in sources.items() for p in split_passages(text, source)]
+    score_passages(query, passages, router_boosts(query) if boosts is None else boosts)
+    threshold = max((p.score for p in passages), default=0.0) * MIN_RELATIVE_SCORE
+    ranked = sorted(
+        (p for p in passages if p.score > 0 and p.score >= threshold),
+        key=lambda p: (-p.score, p.source, p.position),
+    )
+
+    selected: list[Passage] = []
+    seen: list[frozenset] = []
+    used = duplicates = 0
+    for passage in ranked:
+        if used + passage.tokens > token_budget:
+            continue
+        shingles = _shingles(passage.terms)
+        if any(len(shingles & other) / len(shingles | other) >= DUPLICATE_JACCARD for other in seen):
+            duplicates += 1
+            continue
+        selected.append(passage)
+        seen.append(shingles)
+        used += passage.tokens
+
+    return PackedContext(
+        passages=selected,
+        tokens_in=sum(estimate_tokens(text) for text in sources.values()),
+        tokens_out=used,
+        duplicates=duplicates,
+    )
@@ -0,0 +1,93 @@
+"""
+GOGGA Process Pools - CPU-bound worker processes started safely from the API server
+
+Batch language detection and HTML extraction push CPU-heavy work to
+worker processes. Those pools are created lazily, from worker threads,
+inside a uvicorn process that already runs the event loop, the default
+thread pool and the scheduler. Forking that process copies whatever
+locks other threads hold at that instant (logging, the allocator, SQLite,
+OpenSSL) into the child, where nobody will ever release them.
+
+Design:
+- Workers start from the "forkserver" (or "spawn" where that is missing),
+  never by forking the server process itself
+- The fork server is a clean single-threaded process; modules registered
+  with register_preload() are imported there once, so workers fork from
+  it with compiled tables already in memory (copy-on-write)
+- WorkerPool creates its executor on first use under a lock and can be
+  shut down and restarted; it is safe to call from any thread
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Modules imported by the fork server before it forks any worker
+_preload: set[str] = set()
+
+
+def register_preload(*modules: str) -> None:
+    """
+    Have the fork server import these modules before starting workers.
+
+    Only takes effect if registered before the first pool starts (the
+    fork server is shared and started once); later workers import what
+    they need on first use.
+    """
+    _preload.update(modules)
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    """Start method for worker pools: forkserver, else spawn."""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    if context.get_start_method() == "forkserver":
+        context.set_forkserver_preload(sorted(_preload))
+    return context
+
+
+class WorkerPool:
+    """
+    A lazily started ProcessPoolExecutor that never forks the server process.
+
+    The executor is created on first get() and reused until shutdown().
+    """
+
+    def __init__(self, name: str, workers: int) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            name: Log tag for the pool
+            workers: Worker processes
+        """
+        self.name = name
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    def get(self) -> ProcessPoolExecutor:
+        """The executor, started on first use."""
+        with self._lock:
+            if self._executor is None:
+                context = pool_context()
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(
+                    "[%s] Started %d workers (%s)", self.name, self.workers, context.get_start_method()
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Stop the workers; the next get() starts a fresh executor."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
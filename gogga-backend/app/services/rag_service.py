@@ -0,0 +1,1016 @@
+"""
+GOGGA RAG Service - Embedded hybrid retrieval over uploaded documents
+
+The backend had no retrieval layer: document questions pasted the whole
+document into the prompt, and /chat cut anything over 50,000 characters.
+
+This module indexes uploaded documents per user and returns the chunks
+relevant to a question:
+- Chunks of ~RAG_CHUNK_WORDS words on sentence boundaries
+  (passage_ranker.split_passages)
+- BM25 over an append-only, segmented inverted index; each segment is a
+  set of .npy arrays opened memory-mapped, and small segments are merged
+  once there are more than RAG_MAX_SEGMENTS
+- Embeddings quantized to int8 (one scale per row) in a memory-mapped
+  matrix. Namespaces above RAG_EXACT_SCAN_CHUNKS pre-select candidates by
+  sign-bit Hamming distance and rescore them exactly from the int8 rows
+- Reciprocal rank fusion of both rankings (k=60, as in Qwen-Agent's
+  hybrid_search)
+- One directory per user namespace (hashed user id), so users never share
+  an index and deleting a namespace deletes its files
+- Embeddings from a small CPU model through fastembed when it is
+  installed (RAG_EMBED_MODEL), otherwise from a deterministic
+  feature-hashing embedder (word and sub-word overlap, no model download)
+
+Deleted documents are tombstoned; a namespace is compacted once more than
+half of its chunks are dead.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Final, Iterator, Optional, Protocol
+
+import numpy as np
+
+from app.config import settings
+from app.services.passage_ranker import BM25_B, BM25_K1, split_passages, tokenize
+
+logger = logging.getLogger(__name__)
+
+try:
+    from fastembed import TextEmbedding
+    FASTEMBED_AVAILABLE = True
+except ImportError:
+    TextEmbedding = None  # type: ignore
+    FASTEMBED_AVAILABLE = False
+
+# Reciprocal rank fusion constant
+RRF_K: Final[int] = 60
+
+# Each ranking contributes this many candidates per requested result (at least MIN_CANDIDATES)
+CANDIDATES_PER_RESULT: Final[int] = 5
+MIN_CANDIDATES: Final[int] = 50
+
+# Query terms in more than this share of chunks are only scored for chunks that match a
+# rarer term (exact MaxScore-style pruning; falls back to full scoring when it cannot prove the top)
+COMMON_TERM_SHARE: Final[float] = 0.05
+
+# Rows per block in the exact int8 scan (keeps the float32 copy in cache)
+SCAN_BLOCK_ROWS: Final[int] = 1024
+
+# Hashing embedder: dimensions, weight of a word's character trigrams (together) relative
+# to the word itself, and the seed of the fixed rotation applied to the hashed features
+HASHING_DIM: Final[int] = 384
+TRIGRAM_WEIGHT: Final[float] = 1.0
+HASHING_SEED: Final[int] = 20240601
+
+INDEX_FORMAT: Final[int] = 1
+SEARCH_MODES: Final[tuple[str, ...]] = ("hybrid", "keyword", "semantic")
+
+_SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    chunks INTEGER NOT NULL,
+    chars INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_id);
+"""
+
+
+# =============================================================================
+# Embedders
+# =============================================================================
+
+class Embedder(Protocol):
+    name: str
+    dim: int
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """L2-normalised float32 vectors, one row per text."""
+        ...
+
+
+@lru_cache(maxsize=65536)
+def _hashed_features(token: str, dim: int) -> tuple[tuple[int, ...], tuple[float, ...]]:
+    """Signed hash buckets for a token and its character trigrams."""
+    features = [(token, 1.0)]
+    padded = f"#{token}#"
+    grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    features.extend(("\x00" + gram, TRIGRAM_WEIGHT / math.sqrt(len(grams))) for gram in grams)
+    indices, values = [], []
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode())
+        indices.append(h % dim)
+        values.append(weight if (h // dim) & 1 else -weight)
+    return tuple(indices), tuple(values)
+
+
+class HashingEmbedder:
+    """
+    Feature-hashing embedder (stemmed words plus character trigrams).
+
+    Deterministic and model-free: similarity is lexical and sub-word
+    (typos, inflections), not semantic. The sparse hashed features are
+    multiplied by a fixed random orthogonal matrix, which keeps cosines
+    but spreads every vector over all dimensions, so the sign bits behave
+    like SimHash for the Hamming pre-selection. The rotation's fingerprint
+    is part of the name, so an index built with a different one (another
+    NumPy/LAPACK build) is re-embedded rather than silently mismatched.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        rng = np.random.default_rng(HASHING_SEED)
+        self._rotation = np.linalg.qr(rng.standard_normal((dim, dim)))[0].astype(np.float32)
+        fingerprint = hashlib.sha256(self._rotation.astype(np.float16).tobytes()).hexdigest()[:8]
+        self.name = f"hashing-v1-{fingerprint}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices: list[int] = []
+            values: list[float] = []
+            for token, count in Counter(tokenize(text)).items():
+                token_indices, token_values = _hashed_features(token, self.dim)
+                weight = 1.0 + math.log(count)
+                indices.extend(token_indices)
+                values.extend(v * weight for v in token_values)
+            if indices:
+                vectors[row] = np.bincount(indices, weights=values, minlength=self.dim)
+        return _normalize(vectors @ self._rotation)
+
+
+class FastEmbedEmbedder:
+    """Small ONNX sentence-embedding model on CPU (fastembed)."""
+
+    def __init__(self, model_name: str):
+        self.name = model_name
+        self._model = TextEmbedding(model_name=model_name)
+        self.dim = int(self.embed(["dimension probe"]).shape[1])
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return _normalize(np.asarray(list(self._model.embed(texts)), dtype=np.float32))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def create_embedder(model_name: str = "") -> Embedder:
+    """fastembed model when configured and installed, else the hashing embedder."""
+    if model_name and FASTEMBED_AVAILABLE:
+        try:
+            return FastEmbedEmbedder(model_name)
+        except Exception as e:
+            logger.warning("[RAG] Embedding model %s unavailable (%s), using hashing embedder", model_name, e)
+    elif model_name:
+        logger.info("[RAG] fastembed not installed, using hashing embedder")
+    return HashingEmbedder()
+
+
+def quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with one float32 scale per row."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def sign_bits(vectors: np.ndarray) -> np.ndarray:
+    """Sign bit per dimension, packed into uint64 words (for Hamming pre-selection)."""
+    packed = np.packbits(vectors > 0, axis=1)
+    pad = -packed.shape[1] % 8
+    if pad:
+        packed = np.pad(packed, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+# =============================================================================
+# Lexical segments
+# =============================================================================
+
+@lru_cache(maxsize=262144)
+def term_hash(term: str) -> int:
+    """Stable 64-bit id for an index term."""
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+
+
+@dataclass(slots=True)
+class Segment:
+    """Postings for a run of chunk ids: sorted term hashes, offsets, chunk ids and term counts."""
+    name: str
+    terms: np.ndarray
+    offsets: np.ndarray
+    ids: np.ndarray
+    tfs: np.ndarray
+
+    @property
+    def postings(self) -> int:
+        return len(self.ids)
+
+    def lookup(self, term: int) -> tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(self.terms, term))
+        if i == len(self.terms) or self.terms[i] != term:
+            return self.ids[:0], self.tfs[:0]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.ids[start:end], self.tfs[start:end]
+
+    def triples(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(term, chunk id, tf) per posting, for merging."""
+        return np.repeat(self.terms, np.diff(self.offsets)), np.asarray(self.ids), np.asarray(self.tfs)
+
+
+def build_segment(name: str, terms: np.ndarray, ids: np.ndarray, tfs: np.ndarray) -> Segment:
+    """Group (term, chunk id, tf) triples into a segment."""
+    order = np.lexsort((ids, terms))
+    terms, ids, tfs = terms[order], ids[order], tfs[order]
+    unique, starts = np.unique(terms, return_index=True)
+    offsets = np.append(starts, len(terms)).astype(np.int64)
+    return Segment(name, unique.astype(np.uint64), offsets, ids.astype(np.uint32), tfs.astype(np.uint16))
+
+
+def _segment_files(directory: Path) -> dict[str, Path]:
+    return {part: directory / f"{part}.npy" for part in ("terms", "offsets", "ids", "tfs")}
+
+
+def save_segment(directory: Path, segment: Segment) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    for part, path in _segment_files(directory).items():
+        np.save(path, getattr(segment, part))
+
+
+def load_segment(directory: Path) -> Segment:
+    arrays = {part: np.load(path, mmap_mode="r") for part, path in _segment_files(directory).items()}
+    return Segment(directory.name, **arrays)
+
+
+# =============================================================================
+# Namespace index
+# =============================================================================
+
+@dataclass(slots=True)
+class RetrievedChunk:
+    """A chunk returned by search()."""
+    doc_id: str
+    title: str
+    ordinal: int
+    text: str
+    score: float
+    keyword_rank: Optional[int] = None
+    vector_rank: Optional[int] = None
+
+
+@dataclass(slots=True)
+class RetrievalResult:
+    """Ranked chunks for one query."""
+    query: str
+    mode: str
+    chunks: list[RetrievedChunk] = field(default_factory=list)
+    searched_chunks: int = 0
+    elapsed_ms: float = 0.0
+
+    def format_for_llm(self) -> str:
+        """Chunks with document citations, in the layout of the search tools."""
+        parts = [
+            "[DOCUMENT SEARCH RESULTS]",
+            f"Query: {self.query}",
+            f"Results: {len(self.chunks)} passages from your documents",
+            "",
+        ]
+        for i, chunk in enumerate(self.chunks, 1):
+            parts.extend([
+                f"--- Result {i} ---",
+                f"Document: {chunk.title or chunk.doc_id} (part {chunk.ordinal + 1})",
+                f"Content: {chunk.text}",
+                "",
+            ])
+        parts.append("[END SEARCH RESULTS]")
+        return "\n".join(parts)
+
+
+class NamespaceIndex:
+    """
+    One user's documents: chunk text in SQLite, vectors and postings in
+    memory-mapped files, all under one directory.
+
+    Chunk ids are dense (0..count-1) and double as row numbers in the
+    vector, scale, sign and length files. Appends write the files first
+    and the manifest last, so a crash mid-append is rolled back on open.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        embedder: Embedder,
+        chunk_words: int = 200,
+        exact_scan_chunks: int = 100_000,
+        rescore_candidates: int = 2000,
+        max_segments: int = 8,
+    ):
+        self.path = Path(path)
+        self.embedder = embedder
+        self.chunk_words = chunk_words
+        self.exact_scan_chunks = exact_scan_chunks
+        self.rescore_candidates = rescore_candidates
+        self.max_segments = max_segments
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path / "chunks.db", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+        self._manifest = self._load_manifest()
+        self._segments: list[Segment] | None = None
+        self._arrays: dict[str, np.ndarray] | None = None
+        self._recover()
+        if self._manifest["embedder"] != embedder.name or self._manifest["dim"] != embedder.dim:
+            self._reembed()
+
+    # -- files -----------------------------------------------------------------
+
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    @property
+    def count(self) -> int:
+        return self._manifest["count"]
+
+    @property
+    def _sign_files(self) -> list[str]:
+        # One file per 64-bit word of sign bits: the Hamming scan reads each word contiguously
+        return [f"signs{word}.u64" for word in range(math.ceil(self._manifest["dim"] / 64))]
+
+    @property
+    def _row_bytes(self) -> dict[str, int]:
+        return {
+            "vectors.i8": self._manifest["dim"],
+            "scales.f32": 4,
+            **{name: 8 for name in self._sign_files},
+            "lengths.u32": 4,
+            "alive.u8": 1,
+        }
+
+    def _vector_rows(self, vectors: np.ndarray) -> dict[str, np.ndarray]:
+        """Per-row file contents derived from unit vectors."""
+        quantized, scales = quantize(vectors)
+        signs = sign_bits(vectors)
+        rows = {"vectors.i8": quantized, "scales.f32": scales}
+        rows.update({name: signs[:, word] for word, name in enumerate(self._sign_files)})
+        return rows
+
+    def _load_manifest(self) -> dict[str, Any]:
+        path = self._file("manifest.json")
+        if path.exists():
+            return json.loads(path.read_text())
+        return {
+            "format": INDEX_FORMAT,
+            "embedder": self.embedder.name,
+            "dim": self.embedder.dim,
+            "count": 0,
+            "dead": 0,
+            "total_terms": 0,
+            "segments": [],
+            "next_segment": 0,
+        }
+
+    def _save_manifest(self) -> None:
+        tmp = self._file("manifest.json.tmp")
+        tmp.write_text(json.dumps(self._manifest))
+        os.replace(tmp, self._file("manifest.json"))
+
+    def _recover(self) -> None:
+        """Drop anything written after the last manifest (interrupted append)."""
+        count = self.count
+        for name, row_bytes in self._row_bytes.items():
+            path = self._file(name)
+            if path.exists() and path.stat().st_size > count * row_bytes:
+                os.truncate(path, count * row_bytes)
+        self._conn.execute("DELETE FROM chunks WHERE id >= ?", (count,))
+        self._conn.execute(
+            "DELETE FROM documents WHERE chunks > 0 AND doc_id NOT IN (SELECT DISTINCT doc_id FROM chunks)"
+        )
+        self._conn.commit()
+        known = set(self._manifest["segments"])
+        for directory in self.path.glob("seg_*"):
+            if directory.name not in known:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _array(self, name: str) -> np.ndarray:
+        if self._arrays is None:
+            self._arrays = {}
+        if name not in self._arrays:
+            dtype = {"i8": np.int8, "f32": np.float32, "u64": np.uint64, "u32": np.uint32, "u8": np.uint8}[name.rsplit(".", 1)[1]]
+            columns = self._row_bytes[name] // np.dtype(dtype).itemsize
+            if self.count == 0:
+                array = np.zeros((0, columns), dtype=dtype)
+            else:
+                array = np.memmap(self._file(name), dtype=dtype, mode="r", shape=(self.count, columns))
+            self._arrays[name] = array if columns > 1 else array.reshape(-1)
+        return self._arrays[name]
+
+    def _segments_loaded(self) -> list[Segment]:
+        if self._segments is None:
+            self._segments = [load_segment(self.path / name) for name in self._manifest["segments"]]
+        return self._segments
+
+    def _invalidate(self) -> None:
+        self._arrays = None
+        self._segments = None
+
+    # -- writes ----------------------------------------------------------------
+
+    def add(
+        self,
+        doc_id: str,
+        chunks: list[str],
+        title: str = "",
+        vectors: Optional[np.ndarray] = None,
+    ) -> int:
+        """
+        Append a document's chunks (replacing an existing document with the same id).
+
+        Args:
+            doc_id: Document id, unique within the namespace
+            chunks: Chunk texts
+            title: Display title used in citations
+            vectors: Precomputed embeddings (default: embed the chunks)
+
+        Returns:
+            Number of chunks added
+        """
+        if vectors is None:
+            vectors = self.embedder.embed(chunks) if chunks else np.zeros((0, self.embedder.dim), np.float32)
+        elif vectors.shape != (len(chunks), self._manifest["dim"]):
+            raise ValueError(f"Expected vectors of shape {(len(chunks), self._manifest['dim'])}, got {vectors.shape}")
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            self.delete(doc_id, commit=False)
+            start = self.count
+            ids = np.arange(start, start + len(chunks), dtype=np.uint32)
+
+            term_ids: list[int] = []
+            chunk_ids: list[int] = []
+            tfs: list[int] = []
+            lengths = np.zeros(len(chunks), dtype=np.uint32)
+            for i, text in enumerate(chunks):
+                counts = Counter(tokenize(text))
+                lengths[i] = sum(counts.values())
+                for term, tf in counts.items():
+                    term_ids.append(term_hash(term))
+                    chunk_ids.append(start + i)
+                    tfs.append(tf)
+
+            rows = self._vector_rows(vectors)
+            rows["lengths.u32"] = lengths
+            rows["alive.u8"] = np.ones(len(chunks), dtype=np.uint8)
+            for name, data in rows.items():
+                with open(self._file(name), "ab") as f:
+                    f.write(np.ascontiguousarray(data).tobytes())
+
+            if term_ids:
+                name = f"seg_{self._manifest['next_segment']:06d}"
+                self._manifest["next_segment"] += 1
+                save_segment(self.path / name, build_segment(
+                    name,
+                    np.array(term_ids, dtype=np.uint64),
+                    np.array(chunk_ids, dtype=np.uint32),
+                    np.minimum(tfs, np.iinfo(np.uint16).max),
+                ))
+                self._manifest["segments"].append(name)
+
+            self._conn.executemany(
+                "INSERT INTO chunks (id, doc_id, ordinal, text) VALUES (?, ?, ?, ?)",
+                [(int(chunk_id), doc_id, i, text) for i, (chunk_id, text) in enumerate(zip(ids, chunks))],
+            )
+            self._conn.execute(
+                "INSERT INTO documents (doc_id, title, chunks, chars, added_at) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, title, len(chunks), sum(len(c) for c in chunks), time.time()),
+            )
+            self._conn.commit()
+            self._manifest["count"] += len(chunks)
+            self._manifest["total_terms"] += int(lengths.sum())
+            self._save_manifest()
+            self._invalidate()
+
+            if len(self._manifest["segments"]) > self.max_segments:
+                self._merge_segments()
+        return len(chunks)
+
+    def add_text(self, doc_id: str, text: str, title: str = "") -> int:
+        """Chunk a document on sentence boundaries and add it."""
+        chunks = [p.text for p in split_passages(text, source=0, words=self.chunk_words)]
+        return self.add(doc_id, chunks, title)
+
+    def delete(self, doc_id: str, commit: bool = True) -> bool:
+        """Tombstone a document's chunks. Returns False if the document is unknown."""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM chunks WHERE doc_id = ?", (doc_id,))]
+            found = self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount > 0
+            if ids:
+                alive = np.memmap(self._file("alive.u8"), dtype=np.uint8, mode="r+", shape=(self.count,))
+                alive[ids] = 0
+                alive.flush()
+                del alive
+                self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+                self._manifest["dead"] += len(ids)
+            if commit and found:
+                self._conn.commit()
+                self._save_manifest()
+                self._invalidate()
+                if self._manifest["dead"] * 2 > self.count:
+                    self.compact()
+            return found
+
+    def _merge_segments(self) -> None:
+        """Merge the smallest segments into one until at most max_segments remain."""
+        segments = sorted(self._segments_loaded(), key=lambda s: s.postings)
+        merge = segments[:len(segments) - self.max_segments + 1]
+        if len(merge) < 2:
+            merge = segments[:2]
+        self._replace_segments(merge, remap=None)
+        logger.debug("[RAG] Merged %d segments in %s", len(merge), self.path.name)
+
+    def _replace_segments(self, segments: list[Segment], remap: Optional[np.ndarray]) -> None:
+        """Replace segments with one merged segment; remap maps old chunk ids to new (-1 = dropped)."""
+        parts = [segment.triples() for segment in segments]
+        terms = np.concatenate([p[0] for p in parts])
+        ids = np.concatenate([p[1] for p in parts]).astype(np.int64)
+        tfs = np.concatenate([p[2] for p in parts])
+        if remap is not None:
+            ids = remap[ids]
+            keep = ids >= 0
+            terms, ids, tfs = terms[keep], ids[keep], tfs[keep]
+
+        replaced = {segment.name for segment in segments}
+        names = [name for name in self._manifest["segments"] if name not in replaced]
+        if len(terms):
+            name = f"seg_{self._manifest['next_segment']:06d}"
+            self._manifest["next_segment"] += 1
+            save_segment(self.path / name, build_segment(name, terms, ids, tfs))
+            names.append(name)
+        self._manifest["segments"] = names
+        self._save_manifest()
+        self._invalidate()
+        for name in replaced:
+            shutil.rmtree(self.path / name, ignore_errors=True)
+
+    def compact(self) -> None:
+        """Drop tombstoned chunks from every file and renumber the survivors."""
+        with self._lock:
+            alive = self._array("alive.u8").astype(bool)
+            keep = np.flatnonzero(alive)
+            remap = np.full(self.count, -1, dtype=np.int64)
+            remap[keep] = np.arange(len(keep))
+
+            for name in self._row_bytes:
+                data = np.asarray(self._array(name))[keep]
+                tmp = self._file(name + ".tmp")
+                tmp.write_bytes(np.ascontiguousarray(data).tobytes())
+            for old, new in zip(keep.tolist(), range(len(keep))):
+                if old != new:
+                    self._conn.execute("UPDATE chunks SET id = ? WHERE id = ?", (new, old))
+            self._conn.commit()
+
+            lengths = np.asarray(self._array("lengths.u32"))
+            self._manifest["total_terms"] = int(lengths[keep].sum())
+            self._manifest["count"] = len(keep)
+            self._manifest["dead"] = 0
+            self._invalidate()
+            for name in self._row_bytes:
+                os.replace(self._file(name + ".tmp"), self._file(name))
+            self._replace_segments(self._segments_loaded(), remap)
+            logger.info("[RAG] Compacted %s: %d live chunks", self.path.name, len(keep))
+
+    def _reembed(self) -> None:
+        """Re-embed stored chunk text after the embedding model changed."""
+        rows = self._conn.execute("SELECT id, text FROM chunks ORDER BY id").fetchall()
+        dim = self.embedder.dim
+        vectors = np.zeros((self.count, dim), dtype=np.float32)
+        for start in range(0, len(rows), 256):
+            batch = rows[start:start + 256]
+            vectors[[r[0] for r in batch]] = self.embedder.embed([r[1] for r in batch])
+        for path in self.path.glob("signs*.u64"):
+            path.unlink()
+        self._manifest.update(embedder=self.embedder.name, dim=dim)
+        for name, data in self._vector_rows(vectors).items():
+            self._file(name).write_bytes(np.ascontiguousarray(data).tobytes())
+        self._save_manifest()
+        self._invalidate()
+        logger.info("[RAG] Re-embedded %d chunks in %s with %s", len(rows), self.path.name, self.embedder.name)
+
+    # -- reads -----------------------------------------------------------------
+
+    def keyword_rank(self, query: str, depth: int) -> tuple[np.ndarray, np.ndarray]:
+        """BM25 top-`depth` chunk ids and scores (live chunks with score > 0)."""
+        n = self.count
+        query_terms = Counter(term_hash(t) for t in tokenize(query))
+        empty = np.zeros(0, np.int64), np.zeros(0)
+        if not n or not query_terms:
+            return empty
+
+        # (df, weight * idf, postings per segment), rarest first
+        terms = []
+        for term, weight in query_terms.items():
+            postings = [segment.lookup(term) for segment in self._segments_loaded()]
+            df = sum(len(ids) for ids, _ in postings)
+            if df:
+                terms.append((df, weight * math.log(1 + (n - df + 0.5) / (df + 0.5)), postings))
+        if not terms:
+            return empty
+        terms.sort(key=lambda t: t[0])
+
+        rare = [t for t in terms if t[0] <= n * COMMON_TERM_SHARE]
+        common = terms[len(rare):]
+        if rare and common:
+            ids, scores = self._bm25_scores(rare)
+            for _, idf, postings in common:
+                for posting_ids, tfs in postings:
+                    if len(posting_ids):
+                        at = np.minimum(np.searchsorted(posting_ids, ids), len(posting_ids) - 1)
+                        hit = posting_ids[at] == ids
+                        scores[hit] += self._bm25_term(idf, tfs[at[hit]], ids[hit])
+            ids, scores = self._live(ids, scores)
+            order, values = _top(scores, depth, positive=True)
+            # A chunk matching only common terms scores at most this much
+            ceiling = sum(idf * (BM25_K1 + 1) for _, idf, _ in common)
+            if len(values) == depth and values[-1] >= ceiling:
+                return ids[order], values
+
+        ids, scores = self._live(*self._bm25_scores(terms))
+        order, values = _top(scores, depth, positive=True)
+        return ids[order], values
+
+    def _bm25_term(self, idf: float, tfs: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        tf = tfs.astype(np.float32)
+        avg_len = self._manifest["total_terms"] / self.count or 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._array("lengths.u32")[ids] / avg_len)
+        return idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    def _bm25_scores(self, terms: list) -> tuple[np.ndarray, np.ndarray]:
+        """Summed BM25 scores of every chunk matching any of the terms."""
+        all_ids, all_scores = [], []
+        for _, idf, postings in terms:
+            for ids, tfs in postings:
+                if len(ids):
+                    all_ids.append(ids)
+                    all_scores.append(self._bm25_term(idf, tfs, ids))
+        ids, scores = np.concatenate(all_ids), np.concatenate(all_scores)
+        if len(ids) > self.count // 8:
+            dense = np.bincount(ids, weights=scores, minlength=self.count)
+            matched = np.flatnonzero(dense)
+            return matched, dense[matched]
+        matched, inverse = np.unique(ids, return_inverse=True)
+        return matched, np.bincount(inverse, weights=scores)
+
+    def _live(self, ids: np.ndarray, scores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if not self._manifest["dead"]:
+            return ids, scores
+        keep = self._array("alive.u8")[ids] != 0
+        return ids[keep], scores[keep]
+
+    def vector_rank(self, query_vector: np.ndarray, depth: int) -> tuple[np.ndarray, np.ndarray]:
+        """Cosine top-`depth` chunk ids and scores from the int8 vectors."""
+        n = self.count
+        if not n:
+            return np.zeros(0, np.int64), np.zeros(0)
+        vectors, scales = self._array("vectors.i8"), self._array("scales.f32")
+        alive = self._array("alive.u8")
+        query_vector = query_vector.astype(np.float32)
+
+        if n <= self.exact_scan_chunks:
+            scores = np.empty(n, dtype=np.float32)
+            for start in range(0, n, SCAN_BLOCK_ROWS):
+                block = vectors[start:start + SCAN_BLOCK_ROWS]
+                np.matmul(block.astype(np.float32), query_vector, out=scores[start:start + len(block)])
+            scores *= scales
+            scores[alive == 0] = -np.inf
+            return _top(scores, depth)
+
+        # Hamming pre-selection on sign bits, exact rescoring of the candidates
+        distances = np.zeros(n, dtype=np.uint16)
+        for name, word in zip(self._sign_files, sign_bits(query_vector[None, :])[0]):
+            distances += np.bitwise_count(self._array(name) ^ word)
+        if self._manifest["dead"]:
+            distances[alive == 0] = np.iinfo(np.uint16).max
+        # Smallest distance that admits rescore_candidates rows (histogram instead of a partition)
+        threshold = int(np.searchsorted(np.cumsum(np.bincount(distances)), self.rescore_candidates))
+        candidates = np.flatnonzero(distances <= threshold)
+        scores = (vectors[candidates].astype(np.float32) @ query_vector) * scales[candidates]
+        scores[alive[candidates] == 0] = -np.inf
+        ids, top_scores = _top(scores, depth)
+        return candidates[ids], top_scores
+
+    def search(self, query: str, limit: int = 5, mode: str = "hybrid") -> RetrievalResult:
+        """
+        Rank chunks against a query.
+
+        Args:
+            query: Question or keywords
+            limit: Maximum chunks returned
+            mode: "hybrid" (RRF of both rankings), "keyword" (BM25) or "semantic" (vectors)
+
+        Returns:
+            RetrievalResult with chunks in rank order
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        start = time.perf_counter()
+        depth = max(limit * CANDIDATES_PER_RESULT, MIN_CANDIDATES)
+        with self._lock:
+            result = RetrievalResult(query=query, mode=mode, searched_chunks=self.count - self._manifest["dead"])
+            rankings: dict[str, np.ndarray] = {}
+            if mode in ("hybrid", "keyword"):
+                rankings["keyword"] = self.keyword_rank(query, depth)[0]
+            if mode in ("hybrid", "semantic"):
+                query_vector = self.embedder.embed([query])[0]
+                rankings["vector"] = self.vector_rank(query_vector, depth)[0]
+
+            fused: dict[int, float] = {}
+            ranks: dict[str, dict[int, int]] = {}
+            for name, ids in rankings.items():
+                ranks[name] = {}
+                for rank, chunk_id in enumerate(ids.tolist(), 1):
+                    ranks[name][chunk_id] = rank
+                    fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+            top = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            rows = self._chunk_rows([chunk_id for chunk_id, _ in top])
+
+        for chunk_id, score in top:
+            if chunk_id in rows:
+                doc_id, ordinal, text, title = rows[chunk_id]
+                result.chunks.append(RetrievedChunk(
+                    doc_id=doc_id, title=title, ordinal=ordinal, text=text, score=round(score, 6),
+                    keyword_rank=ranks.get("keyword", {}).get(chunk_id),
+                    vector_rank=ranks.get("vector", {}).get(chunk_id),
+                ))
+        result.elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    def _chunk_rows(self, ids: list[int]) -> dict[int, tuple[str, int, str, str]]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self._conn.execute(
+            "SELECT c.id, c.doc_id, c.ordinal, c.text, d.title FROM chunks c "
+            f"JOIN documents d ON d.doc_id = c.doc_id WHERE c.id IN ({placeholders})",
+            ids,
+        ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def documents(self) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, title, chunks, chars, added_at FROM documents ORDER BY added_at"
+            ).fetchall()
+        return [
+            {"doc_id": doc_id, "title": title, "chunks": chunks, "chars": chars, "added_at": added_at}
+            for doc_id, title, chunks, chars, added_at in rows
+        ]
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            disk = sum(p.stat().st_size for p in self.path.rglob("*") if p.is_file())
+            return {
+                "documents": documents,
+                "chunks": self.count - self._manifest["dead"],
+                "dead_chunks": self._manifest["dead"],
+                "segments": len(self._manifest["segments"]),
+                "embedder": self._manifest["embedder"],
+                "dim": self._manifest["dim"],
+                "disk_bytes": disk,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._invalidate()
+            self._conn.close()
+
+
+def _top(scores: np.ndarray, depth: int, positive: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the `depth` highest scores, best first."""
+    if depth < len(scores):
+        candidates = np.argpartition(-scores, depth)[:depth]
+    else:
+        candidates = np.arange(len(scores))
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    values = scores[candidates]
+    keep = values > 0 if positive else np.isfinite(values)
+    return candidates[keep], values[keep]
+
+
+# =============================================================================
+# Service
+# =============================================================================
+
+class RagService:
+    """
+    Per-user document indexes under one root directory.
+
+    Open namespaces are kept in a small LRU; writes and searches for one
+    user are serialised by that namespace's lock, and the async wrappers
+    run them in a worker thread.
+
+    Callers hold an index through namespace() for as long as they use it.
+    Only idle indexes are evicted or deleted, so an index is never closed
+    under a caller and each namespace has exactly one live NamespaceIndex
+    (one writer of its manifest and segments).
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        embedder: Optional[Embedder] = None,
+        max_open: int = 64,
+        chunk_words: int = 200,
+        exact_scan_chunks: int = 100_000,
+        rescore_candidates: int = 2000,
+        max_segments: int = 8,
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            root: Directory holding one sub-directory per namespace
+            embedder: Embedding model (default: create_embedder(settings.RAG_EMBED_MODEL))
+            max_open: Namespaces kept open
+            chunk_words: Target chunk size in words
+            exact_scan_chunks: Namespaces up to this size are scanned exactly
+            rescore_candidates: Hamming candidates rescored above that size
+            max_segments: Lexical segments per namespace before merging
+        """
+        self.root = Path(root)
+        self._embedder = embedder
+        self.max_open = max_open
+        self._options = dict(
+            chunk_words=chunk_words,
+            exact_scan_chunks=exact_scan_chunks,
+            rescore_candidates=rescore_candidates,
+            max_segments=max_segments,
+        )
+        self._open: OrderedDict[str, NamespaceIndex] = OrderedDict()
+        self._users: dict[str, int] = {}  # Callers holding each open namespace
+        self._deleting: set[str] = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)  # Notified when a namespace is released
+        self._searches = 0
+        self._search_ms = 0.0
+
+    @property
+    def embedder(self) -> Embedder:
+        if self._embedder is None:
+            self._embedder = create_embedder(settings.RAG_EMBED_MODEL)
+            logger.info("[RAG] Embedder: %s (%d dims)", self._embedder.name, self._embedder.dim)
+        return self._embedder
+
+    @staticmethod
+    def namespace_id(user_id: str) -> str:
+        """Directory name for a user's namespace (no user id on disk)."""
+        return hashlib.sha256(f"gogga-rag:{user_id}".encode()).hexdigest()[:32]
+
+    @contextmanager
+    def namespace(self, user_id: str) -> Iterator[NamespaceIndex]:
+        """Open (or create) a user's index and hold it for the block."""
+        key = self.namespace_id(user_id)
+        with self._idle:
+            while key in self._deleting:
+                self._idle.wait()
+            index = self._open.get(key)
+            if index is None:
+                index = NamespaceIndex(self.root / key, self.embedder, **self._options)
+                self._open[key] = index
+            self._open.move_to_end(key)
+            self._users[key] = self._users.get(key, 0) + 1
+            self._evict_idle()
+        try:
+            yield index
+        finally:
+            with self._idle:
+                self._users[key] -= 1
+                if not self._users[key]:
+                    del self._users[key]
+                    self._evict_idle()
+                    self._idle.notify_all()
+
+    def _evict_idle(self) -> None:
+        """Close least recently used idle indexes beyond max_open (lock held)."""
+        for key in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            if key not in self._users:
+                self._open.pop(key).close()
+
+    def add_document(self, user_id: str, text: str, title: str = "", doc_id: Optional[str] = None) -> dict[str, Any]:
+        """Chunk, embed and index a document. Re-using a doc_id replaces that document."""
+        doc_id = doc_id or uuid.uuid4().hex
+        start = time.perf_counter()
+        with self.namespace(user_id) as index:
+            chunks = index.add_text(doc_id, text, title)
+        elapsed = round((time.perf_counter() - start) * 1000, 2)
+        logger.info("[RAG] Indexed %s: %d chunks in %.0fms", doc_id, chunks, elapsed)
+        return {"doc_id": doc_id, "title": title, "chunks": chunks, "chars": len(text), "elapsed_ms": elapsed}
+
+    def delete_document(self, user_id: str, doc_id: str) -> bool:
+        with self.namespace(user_id) as index:
+            return index.delete(doc_id)
+
+    def list_documents(self, user_id: str) -> list[dict[str, Any]]:
+        with self.namespace(user_id) as index:
+            return index.documents()
+
+    def search(self, user_id: str, query: str, limit: int = 5, mode: str = "hybrid") -> RetrievalResult:
+        with self.namespace(user_id) as index:
+            result = index.search(query, limit, mode)
+        self._searches += 1
+        self._search_ms += result.elapsed_ms
+        return result
+
+    def delete_namespace(self, user_id: str) -> None:
+        """
+        Delete all of a user's documents and index files.
+
+        Waits for callers still holding the namespace; new callers wait for
+        the delete and then start from an empty index.
+        """
+        key = self.namespace_id(user_id)
+        with self._idle:
+            self._deleting.add(key)
+            try:
+                while key in self._users:
+                    self._idle.wait()
+                index = self._open.pop(key, None)
+                if index is not None:
+                    index.close()
+                shutil.rmtree(self.root / key, ignore_errors=True)
+            finally:
+                self._deleting.discard(key)
+                self._idle.notify_all()
+
+    async def add_document_async(self, user_id: str, text: str, title: str = "", doc_id: Optional[str] = None) -> dict[str, Any]:
+        """add_document() in a worker thread."""
+        return await asyncio.to_thread(self.add_document, user_id, text, title, doc_id)
+
+    async def search_async(self, user_id: str, query: str, limit: int = 5, mode: str = "hybrid") -> RetrievalResult:
+        """search() in a worker thread."""
+        return await asyncio.to_thread(self.search, user_id, query, limit, mode)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            "embedder": self._embedder.name if self._embedder else None,
+            "open_namespaces": len(self._open),
+            "namespaces_in_use": len(self._users),
+            "searches": self._searches,
+            "avg_search_ms": round(self._search_ms / self._searches, 2) if self._searches else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for index in self._open.values():
+                index.close()
+            self._open.clear()
+
+
+_rag_service: RagService | None = None
+
+
+def get_rag_service() -> RagService:
+    """Get the global RAG service instance."""
+    global _rag_service
+    if _rag_service is None:
+        _rag_service = RagService(
+            root=settings.RAG_INDEX_DIR,
+            max_open=settings.RAG_OPEN_NAMESPACES,
+            chunk_words=settings.RAG_CHUNK_WORDS,
+            exact_scan_chunks=settings.RAG_EXACT_SCAN_CHUNKS,
+            rescore_candidates=settings.RAG_RESCORE_CANDIDATES,
+            max_segments=settings.RAG_MAX_SEGMENTS,
+        )
+    return _rag_service
@@ -0,0 +1,229 @@
+"""
+GOGGA Search Cache - Byte-budgeted, compressed result cache
+
+SearchService used to keep results in a plain dict: full scraped page
+content per entry, no size bound, and expired entries only removed when
+someone happened to read them. Memory grew until the worker restarted.
+
+This cache:
+- Stores payloads as JSON, Zstandard-compressed (core/compression.py)
+  when zstd is available and the payload is big enough to benefit
+- Keeps total stored bytes under a budget, evicting least recently used
+  entries first; entries that have been read get a second chance (their
+  hit count halves), so popular results outlive one-off queries
+- Tracks a soft (fresh) and hard (expiry) TTL per entry for
+  stale-while-revalidate
+- Sweeps expired entries periodically (piggybacked on writes)
+- Reports bytes, entries, hit rate, evictions and compression ratio
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Final, Optional
+
+from app.core.compression import DEFAULT_CONFIG, compress, decompress, is_zstd_available
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry cost beyond the payload (key, entry object, dict slot)
+ENTRY_OVERHEAD_BYTES: Final[int] = 160
+
+
+@dataclass(slots=True)
+class CachedValue:
+    """Decoded cache entry with its soft/hard TTL."""
+    data: Any
+    fresh_until: float
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.fresh_until
+
+
+@dataclass(slots=True)
+class _Entry:
+    blob: bytes
+    compressed: bool
+    raw_size: int
+    fresh_until: float
+    expires_at: float
+    hits: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.blob) + ENTRY_OVERHEAD_BYTES
+
+
+class SearchCache:
+    """
+    Byte-budgeted TTL cache of JSON-serializable values.
+
+    Not thread-safe; used from the event loop.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        sweep_interval: float = 60.0,
+        level: int = DEFAULT_CONFIG.level,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Budget for stored payloads plus per-entry overhead
+            sweep_interval: Seconds between expired-entry sweeps
+            level: Zstandard compression level
+            encode: Converts a value to JSON-serializable data before storing
+            decode: Rebuilds the value from the stored JSON data
+        """
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.level = level
+        self._encode = encode
+        self._decode = decode
+        self._compress = is_zstd_available()
+
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._raw_bytes = 0
+        self._last_sweep = time.time()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+        self._rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[CachedValue]:
+        """Get an entry (fresh or stale) unless past its hard TTL."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        if time.time() >= entry.expires_at:
+            self._remove(key)
+            self._expired += 1
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self._hits += 1
+        payload = decompress(entry.blob) if entry.compressed else entry.blob
+        return CachedValue(
+            data=self._decode(json.loads(payload)),
+            fresh_until=entry.fresh_until,
+            expires_at=entry.expires_at,
+        )
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: Optional[float] = None) -> bool:
+        """
+        Store a value.
+
+        Args:
+            key: Cache key
+            value: Value to store (JSON-serializable after encode)
+            ttl: Seconds the value is fresh
+            stale_ttl: Seconds it may be served stale (hard TTL; defaults to ttl)
+
+        Returns:
+            False if the value alone exceeds the byte budget
+        """
+        now = time.time()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+        payload = json.dumps(self._encode(value), separators=(",", ":"), default=str).encode("utf-8")
+        compressed = self._compress and len(payload) >= DEFAULT_CONFIG.min_size
+        entry = _Entry(
+            blob=compress(payload, self.level) if compressed else payload,
+            compressed=compressed,
+            raw_size=len(payload),
+            fresh_until=now + ttl,
+            expires_at=now + max(ttl, stale_ttl or ttl),
+        )
+
+        if key in self._entries:
+            self._remove(key)
+        if entry.size > self.max_bytes:
+            self._rejected += 1
+            return False
+
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._raw_bytes += entry.raw_size
+        self._evict()
+        return True
+
+    def delete(self, key: str) -> None:
+        """Remove an entry if present."""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._entries.clear()
+        self._bytes = 0
+        self._raw_bytes = 0
+
+    def sweep(self) -> int:
+        """Drop entries past their hard TTL. Returns how many were removed."""
+        now = time.time()
+        self._last_sweep = now
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self._expired += len(expired)
+        return len(expired)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        self._raw_bytes -= entry.raw_size
+
+    def _evict(self) -> None:
+        """Evict from the LRU end until under budget; read entries get a second chance."""
+        second_chances = len(self._entries)
+        while self._bytes > self.max_bytes:
+            key, entry = next(iter(self._entries.items()))
+            if entry.hits and second_chances > 0:
+                entry.hits //= 2
+                second_chances -= 1
+                self._entries.move_to_end(key)
+                continue
+            self._remove(key)
+            self._evictions += 1
+
+    def _stored_bytes(self) -> int:
+        return self._bytes - len(self._entries) * ENTRY_OVERHEAD_BYTES
+
+    def get_stats(self) -> dict[str, Any]:
+        """Cache statistics (O(1))."""
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "raw_bytes": self._raw_bytes,
+            "compression_ratio": round(self._stored_bytes() / self._raw_bytes, 3) if self._raw_bytes else 1.0,
+            "compressed": self._compress,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            "evictions": self._evictions,
+            "expired": self._expired,
+            "rejected": self._rejected,
+        }
@@ -3,15 +3,15 @@ GOGGA Search Service - Enterprise Web Search with Serper.dev + Async Scraping
 
 Features:
 - Serper.dev Google Search API integration
-- Async web scraping with httpx + BeautifulSoup
-- Rate limiting and caching
-- Token-aware content truncation for LLM processing
+- Async web scraping with httpx (streamed, size-capped) + off-loop text extraction
+- Rate limiting and caching (stale-while-revalidate per query class)
+- BM25 passage packing into a token budget for LLM processing
 - SA-specific search optimization (geo, language)
 
 Architecture:
 1. Serper.dev → Get top N search results
 2. Async scrape → Fetch full page content in parallel
-3. Clean & truncate → Prepare for LLM context
+3. Clean & rank passages → Prepare for LLM context
 4. Return structured results → Ready for Qwen processing
 """
 import asyncio
@@ -19,15 +19,17 @@ import hashlib
 import logging
 import re
 import time
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime, timedelta
 from typing import Any, Final
-from urllib.parse import urlparse
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import httpx
-from bs4 import BeautifulSoup
 
 from app.config import settings
+from app.services.html_extract import extract_main_text, extract_main_text_async, is_html_content_type
+from app.services.passage_ranker import CHARS_PER_TOKEN, pack_passages
+from app.services.search_cache import CachedValue, SearchCache
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +42,51 @@ MAX_CONTENT_CHARS: Final[int] = 8000  # Per page, ~2000 tokens
 MAX_TOTAL_CONTEXT: Final[int] = 32000  # Total context for LLM
 CACHE_TTL_SECONDS: Final[int] = 3600  # 1 hour cache
 
+# search() keyword defaults (search_many fills requests with these)
+SEARCH_DEFAULTS: Final[dict[str, Any]] = {
+    "location": "South Africa",
+    "country": "za",
+    "language": "en",
+    "num_results": 10,
+    "time_filter": None,
+    "scrape_pages": True,
+}
+
+# Stale-while-revalidate TTLs per query class: (soft, hard) seconds.
+# Past the soft TTL the cached result is served and refreshed in the
+# background; past the hard TTL the caller waits for a fresh fetch.
+SEARCH_TTLS: Final[dict[str, tuple[int, int]]] = {
+    "news": (300, 3600),        # Headlines, scores, load shedding stages
+    "price": (900, 6 * 3600),   # Prices, specials, exchange rates
+    "legal": (24 * 3600, 7 * 24 * 3600),  # Acts and judgments rarely change
+    "general": (CACHE_TTL_SECONDS, 4 * 3600),
+}
+
+# Scraped pages stay cached (for conditional revalidation) this long after
+# their fresh TTL; without validators they are simply downloaded again
+PAGE_STALE_TTL_SECONDS: Final[int] = 24 * 3600
+
+# Query parameters that never change page content
+_TRACKING_PARAMS: Final[frozenset[str]] = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid",
+})
+
+_NEWS_PATTERN: Final[re.Pattern] = re.compile(
+    r"\b(news|latest|today|tonight|yesterday|breaking|live|current|update[sd]?|"
+    r"score|results?|load.?shedding|stage \d|weather|this week)\b",
+    re.IGNORECASE,
+)
+_PRICE_PATTERN: Final[re.Pattern] = re.compile(
+    r"\b(price[sd]?|cost[s]?|cheap(est)?|specials?|deals?|buy|sale|"
+    r"exchange rate|petrol|fuel|rand|zar|usd)\b|\bR\s?\d",
+    re.IGNORECASE,
+)
+_LEGAL_PATTERN: Final[re.Pattern] = re.compile(
+    r"\b(act|section|constitution|court|judgment|case law|legislation|"
+    r"regulations?|ccma|saflii|bylaws?)\b|site:(saflii|lawlibrary|justice\.gov)",
+    re.IGNORECASE,
+)
+
 # Rate limiting
 SERPER_RATE_LIMIT: Final[int] = 100  # requests per minute
 SCRAPE_RATE_LIMIT: Final[int] = 30   # scrapes per minute per domain
@@ -72,11 +119,53 @@ class SearchResponse:
     metadata: dict = field(default_factory=dict)
 
 
-@dataclass
-class CacheEntry:
-    """Cache entry with TTL."""
-    data: Any
-    expires_at: float
+def _encode_cached(data: Any) -> Any:
+    """SearchResponse -> JSON-ready dict (other values pass through)."""
+    if isinstance(data, SearchResponse):
+        return {"__search_response__": asdict(data)}
+    return data
+
+
+def _decode_cached(data: Any) -> Any:
+    if isinstance(data, dict) and "__search_response__" in data:
+        fields = data["__search_response__"]
+        fields["results"] = [SearchResult(**r) for r in fields["results"]]
+        return SearchResponse(**fields)
+    return data
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize a URL for page caching.
+    
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters (utm_*, fbclid, ...), and sorts the remaining query.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and (scheme, parsed.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parsed.port}"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ))
+    return urlunparse((scheme, host, parsed.path or "/", "", query, ""))
+
+
+def classify_query(query: str, time_filter: str | None = None) -> str:
+    """
+    Pick the freshness class of a search query (see SEARCH_TTLS).
+    
+    Day/week time filters always count as news.
+    """
+    if time_filter in ("qdr:h", "qdr:d", "qdr:w") or _NEWS_PATTERN.search(query):
+        return "news"
+    if _PRICE_PATTERN.search(query):
+        return "price"
+    if _LEGAL_PATTERN.search(query):
+        return "legal"
+    return "general"
 
 
 class SearchService:
@@ -86,7 +175,7 @@ class SearchService:
     Features:
     - Google search via Serper.dev API
     - Parallel async page scraping
-    - In-memory caching with TTL
+    - In-memory caching with stale-while-revalidate
     - Rate limiting per domain
     - Content cleaning and token truncation
     """
@@ -104,7 +193,25 @@ class SearchService:
         if self._initialized:
             return
         self._initialized = True
-        self._cache: dict[str, CacheEntry] = {}
+        self._cache = SearchCache(
+            max_bytes=settings.SEARCH_CACHE_MAX_BYTES,
+            sweep_interval=settings.SEARCH_CACHE_SWEEP_SECONDS,
+            encode=_encode_cached,
+            decode=_decode_cached,
+        )
+        self._fetches: dict[str, asyncio.Task] = {}  # One Serper fetch per key
+        # Extracted page text by canonical URL, shared across queries
+        self._pages = SearchCache(
+            max_bytes=settings.PAGE_CACHE_MAX_BYTES,
+            sweep_interval=settings.SEARCH_CACHE_SWEEP_SECONDS,
+        )
+        self._page_counts = {
+            "hits": 0, "revalidated": 0, "downloads": 0, "bytes_saved": 0, "ms_saved": 0,
+            "truncated": 0, "skipped_non_html": 0,
+        }
+        self._fanout_counts = {"batches": 0, "queries": 0, "serper_requests": 0, "urls": 0, "unique_urls": 0}
+        self._packing_counts = {"packed": 0, "tokens_in": 0, "tokens_out": 0, "duplicates": 0}
+        self._cache_counts = {"fresh": 0, "stale": 0, "miss": 0, "refreshes": 0, "refresh_failures": 0}
         self._rate_limits: dict[str, list[float]] = {}
         self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_SCRAPES)
         logger.info("SearchService initialized")
@@ -128,21 +235,55 @@ class SearchService:
         key_data = f"{query}:{sorted(kwargs.items())}"
         return hashlib.md5(key_data.encode()).hexdigest()
     
+    def _get_entry(self, key: str) -> CachedValue | None:
+        """Get cache entry (fresh or stale) unless past its hard TTL."""
+        return self._cache.get(key)
+    
     def _get_cached(self, key: str) -> Any | None:
-        """Get cached value if not expired."""
-        if key in self._cache:
-            entry = self._cache[key]
-            if time.time() < entry.expires_at:
-                return entry.data
-            del self._cache[key]
-        return None
-    
-    def _set_cache(self, key: str, data: Any, ttl: int = CACHE_TTL_SECONDS) -> None:
-        """Set cache with TTL."""
-        self._cache[key] = CacheEntry(
-            data=data,
-            expires_at=time.time() + ttl,
-        )
+        """Get cached value if still fresh."""
+        entry = self._get_entry(key)
+        return entry.data if entry is not None and entry.is_fresh else None
+    
+    def _set_cache(
+        self,
+        key: str,
+        data: Any,
+        ttl: int = CACHE_TTL_SECONDS,
+        stale_ttl: int | None = None,
+    ) -> None:
+        """
+        Set cache with TTL.
+        
+        Args:
+            key: Cache key
+            data: Value to cache
+            ttl: Seconds the value is fresh
+            stale_ttl: Seconds it may be served stale (hard TTL; defaults to ttl)
+        """
+        self._cache.set(key, data, ttl=ttl, stale_ttl=stale_ttl)
+    
+    def get_cache_stats(self) -> dict[str, Any]:
+        """Search cache statistics (memory, fresh/stale hits, refreshes, context packing)."""
+        counts = self._cache_counts
+        packing = self._packing_counts
+        lookups = counts["fresh"] + counts["stale"] + counts["miss"]
+        return {
+            **self._cache.get_stats(),
+            "hits_fresh": counts["fresh"],
+            "hits_stale": counts["stale"],
+            "misses": counts["miss"],
+            "hit_rate": round((counts["fresh"] + counts["stale"]) / lookups, 3) if lookups else 0.0,
+            "background_refreshes": counts["refreshes"],
+            "refresh_failures": counts["refresh_failures"],
+            "fetches_in_flight": len(self._fetches),
+            "pages": {**self._pages.get_stats(), **self._page_counts},
+            "fanout": self._fanout_counts.copy(),
+            "packing": {
+                **self._packing_counts,
+                "token_reduction": round(1 - packing["tokens_out"] / packing["tokens_in"], 3)
+                if packing["tokens_in"] else 0.0,
+            },
+        }
     
     def _check_rate_limit(self, domain: str, limit: int = SCRAPE_RATE_LIMIT) -> bool:
         """Check if domain is rate limited."""
@@ -176,6 +317,11 @@ class SearchService:
         """
         Perform Google search via Serper.dev and optionally scrape results.
         
+        Cached per query class (classify_query): fresh results are returned
+        as-is; stale ones are returned immediately (metadata["stale"]) while
+        one background fetch refreshes them; past the hard TTL the caller
+        waits. Concurrent callers for the same key share one fetch.
+        
         Args:
             query: Search query
             location: Geographic location for results
@@ -188,20 +334,145 @@ class SearchService:
         Returns:
             SearchResponse with results and metadata
         """
-        start_time = time.perf_counter()
-        
-        # Check cache
-        cache_key = self._get_cache_key(
-            query, location=location, country=country, 
-            language=language, num_results=num_results, 
-            time_filter=time_filter, scrape_pages=scrape_pages
+        params = dict(
+            query=query, location=location, country=country,
+            language=language, num_results=num_results,
+            time_filter=time_filter, scrape_pages=scrape_pages,
         )
-        cached = self._get_cached(cache_key)
-        if cached:
-            logger.info(f"Cache hit for query: {query[:50]}...")
-            cached.cached = True
+        query_class = classify_query(query, time_filter)
+        cache_key = self._params_key(params)
+        
+        cached = self._serve_cached(cache_key, query_class, params)
+        if cached is not None:
             return cached
         
+        # Miss (or past the hard TTL): wait for a fetch, joining one in flight
+        fetch = self._fetches.get(cache_key) or self._start_fetch(cache_key, query_class, params)
+        return await asyncio.shield(fetch)
+    
+    async def search_many(self, requests: list[dict[str, Any]]) -> list[SearchResponse]:
+        """
+        Run several searches together (e.g. all search tool calls of one turn).
+        
+        Cached and in-flight queries are served exactly as search() would.
+        The remaining misses go to Serper in one batch request (concurrent
+        single requests if batching is disabled or fails); their results
+        are merged by canonical URL, every unique URL is scraped once, and
+        each query gets its own SearchResponse, cached under its own key.
+        
+        Args:
+            requests: search() keyword arguments, one dict per query
+            
+        Returns:
+            One SearchResponse per request, in order
+        """
+        waits: list[Any] = []
+        misses: dict[str, tuple[str, dict[str, Any]]] = {}
+        for request in requests:
+            params = {**SEARCH_DEFAULTS, **request}
+            query_class = classify_query(params["query"], params["time_filter"])
+            cache_key = self._params_key(params)
+            cached = self._serve_cached(cache_key, query_class, params)
+            if cached is not None:
+                waits.append(cached)
+            elif cache_key in self._fetches:
+                waits.append(self._fetches[cache_key])
+            else:
+                misses.setdefault(cache_key, (query_class, params))
+                waits.append(cache_key)
+        
+        tasks: dict[str, asyncio.Task] = {}
+        if misses:
+            batch = asyncio.create_task(self._fetch_many(misses))
+            for cache_key in misses:
+                task = tasks[cache_key] = asyncio.create_task(self._batch_item(batch, cache_key))
+                self._fetches[cache_key] = task
+                task.add_done_callback(lambda t, key=cache_key: self._fetch_done(key, t))
+        
+        responses = []
+        for wait in waits:
+            if isinstance(wait, str):
+                wait = tasks[wait]
+            if isinstance(wait, SearchResponse):
+                responses.append(wait)
+            else:
+                responses.append(await asyncio.shield(wait))
+        return responses
+    
+    @staticmethod
+    async def _batch_item(batch: asyncio.Task, cache_key: str) -> SearchResponse:
+        return (await batch)[cache_key]
+    
+    def _params_key(self, params: dict[str, Any]) -> str:
+        rest = {k: v for k, v in params.items() if k != "query"}
+        return self._get_cache_key(params["query"], **rest)
+    
+    def _serve_cached(
+        self,
+        cache_key: str,
+        query_class: str,
+        params: dict[str, Any],
+    ) -> SearchResponse | None:
+        """Fresh or stale cached response (stale ones trigger a background refresh)."""
+        entry = self._get_entry(cache_key)
+        if entry is None:
+            self._cache_counts["miss"] += 1
+            return None
+        if entry.is_fresh:
+            self._cache_counts["fresh"] += 1
+            logger.info(f"Cache hit for query: {params['query'][:50]}...")
+            return replace(entry.data, cached=True)
+        
+        # Stale: serve now, refresh in the background (once per key)
+        self._cache_counts["stale"] += 1
+        if cache_key not in self._fetches:
+            self._cache_counts["refreshes"] += 1
+            self._start_fetch(cache_key, query_class, params)
+        logger.info(f"Stale cache hit ({query_class}), refreshing: {params['query'][:50]}...")
+        return replace(
+            entry.data, cached=True, metadata={**entry.data.metadata, "stale": True},
+        )
+    
+    def _start_fetch(self, cache_key: str, query_class: str, params: dict[str, Any]) -> asyncio.Task:
+        """Launch the single fetch for a key; it caches its result when done."""
+        task = asyncio.create_task(self._fetch_and_cache(cache_key, query_class, params))
+        self._fetches[cache_key] = task
+        task.add_done_callback(lambda t: self._fetch_done(cache_key, t))
+        return task
+    
+    def _fetch_done(self, cache_key: str, task: asyncio.Task) -> None:
+        if self._fetches.get(cache_key) is task:
+            del self._fetches[cache_key]
+        if not task.cancelled() and task.exception() is not None and cache_key in self._cache:
+            # Background refresh failed; keep serving the stale entry
+            self._cache_counts["refresh_failures"] += 1
+            logger.warning(f"Background search refresh failed: {task.exception()}")
+    
+    async def _fetch_and_cache(
+        self,
+        cache_key: str,
+        query_class: str,
+        params: dict[str, Any],
+    ) -> SearchResponse:
+        response = await self._fetch(**params)
+        response.metadata["query_class"] = query_class
+        soft_ttl, hard_ttl = SEARCH_TTLS[query_class]
+        self._set_cache(cache_key, response, ttl=soft_ttl, stale_ttl=hard_ttl)
+        return response
+    
+    async def _fetch(
+        self,
+        query: str,
+        location: str,
+        country: str,
+        language: str,
+        num_results: int,
+        time_filter: str | None,
+        scrape_pages: bool,
+    ) -> SearchResponse:
+        """Serper search plus scraping (uncached)."""
+        start_time = time.perf_counter()
+        
         # Call Serper.dev
         search_results, credits = await self._serper_search(
             query=query,
@@ -219,46 +490,135 @@ class SearchService:
             search_results = await self._scrape_results(search_results)
         scrape_time = int((time.perf_counter() - scrape_start) * 1000)
         
-        # Build response
+        return self._build_response(
+            dict(query=query, location=location, country=country, language=language, time_filter=time_filter,
+                 scrape_pages=scrape_pages),
+            search_results, credits, search_time, scrape_time,
+        )
+    
+    @staticmethod
+    def _build_response(
+        params: dict[str, Any],
+        results: list[SearchResult],
+        credits: int,
+        search_time: int,
+        scrape_time: int,
+    ) -> SearchResponse:
         response = SearchResponse(
-            query=query,
-            results=search_results,
-            total_results=len(search_results),
+            query=params["query"],
+            results=results,
+            total_results=len(results),
             search_time_ms=search_time,
             scrape_time_ms=scrape_time,
             cached=False,
             credits_used=credits,
             metadata={
-                "location": location,
-                "country": country,
-                "language": language,
-                "time_filter": time_filter,
-                "scraped": scrape_pages,
+                "location": params["location"],
+                "country": params["country"],
+                "language": params["language"],
+                "time_filter": params["time_filter"],
+                "scraped": params["scrape_pages"],
             },
         )
         
-        # Cache response
-        self._set_cache(cache_key, response)
-        
         logger.info(
-            f"Search completed: query='{query[:30]}...', results={len(search_results)}, "
+            f"Search completed: query='{params['query'][:30]}...', results={len(results)}, "
             f"search={search_time}ms, scrape={scrape_time}ms"
         )
         
         return response
     
-    async def _serper_search(
+    async def _fetch_many(
         self,
+        misses: dict[str, tuple[str, dict[str, Any]]],
+    ) -> dict[str, SearchResponse]:
+        """Batched Serper search, one scrape per unique URL, responses cached per query."""
+        start_time = time.perf_counter()
+        searches = await self._serper_batch([params for _, params in misses.values()])
+        search_time = int((time.perf_counter() - start_time) * 1000)
+        
+        # Merge result sets by canonical URL so each page is scraped once
+        unique: dict[str, SearchResult] = {}
+        total_urls = 0
+        for (_, params), (results, _) in zip(misses.values(), searches):
+            if params["scrape_pages"]:
+                total_urls += len(results)
+                for result in results:
+                    unique.setdefault(canonical_url(result.url), result)
+        
+        scrape_start = time.perf_counter()
+        scraped = {
+            canonical_url(result.url): result
+            for result in (await self._scrape_results(list(unique.values())) if unique else [])
+        }
+        scrape_time = int((time.perf_counter() - scrape_start) * 1000)
+        
+        counts = self._fanout_counts
+        counts["batches"] += 1
+        counts["queries"] += len(misses)
+        counts["urls"] += total_urls
+        counts["unique_urls"] += len(unique)
+        
+        # Attribute scraped pages back to every query that returned them
+        responses = {}
+        for (cache_key, (query_class, params)), (results, credits) in zip(misses.items(), searches):
+            if params["scrape_pages"]:
+                results = [
+                    replace(
+                        scraped[canonical_url(r.url)],
+                        url=r.url, title=r.title, snippet=r.snippet, position=r.position, date=r.date,
+                    )
+                    for r in results
+                ]
+            response = self._build_response(params, results, credits, search_time, scrape_time)
+            response.metadata["query_class"] = query_class
+            response.metadata["fanout"] = len(misses)
+            soft_ttl, hard_ttl = SEARCH_TTLS[query_class]
+            self._set_cache(cache_key, response, ttl=soft_ttl, stale_ttl=hard_ttl)
+            responses[cache_key] = response
+        return responses
+    
+    async def _serper_batch(self, params_list: list[dict[str, Any]]) -> list[tuple[list[SearchResult], int]]:
+        """
+        Serper results for several queries.
+        
+        Uses one batch request (Serper accepts a JSON array of queries) when
+        enabled; falls back to concurrent single requests.
+        """
+        if len(params_list) > 1 and settings.SEARCH_SERPER_BATCH:
+            payloads = [self._serper_payload(**self._serper_args(params)) for params in params_list]
+            try:
+                client = await self._get_client()
+                self._fanout_counts["serper_requests"] += 1
+                response = await client.post(
+                    SERPER_API_URL, json=payloads, headers=self._serper_headers(), timeout=SERPER_TIMEOUT,
+                )
+                response.raise_for_status()
+                data = response.json()
+                if isinstance(data, list) and len(data) == len(payloads):
+                    return [self._parse_serper(item) for item in data]
+                logger.warning("Serper batch returned an unexpected shape, falling back to single requests")
+            except Exception as e:
+                logger.warning(f"Serper batch request failed, falling back to single requests: {e}")
+        
+        self._fanout_counts["serper_requests"] += len(params_list)
+        return list(await asyncio.gather(*(
+            self._serper_search(**self._serper_args(params)) for params in params_list
+        )))
+    
+    @staticmethod
+    def _serper_args(params: dict[str, Any]) -> dict[str, Any]:
+        return {k: v for k, v in params.items() if k != "scrape_pages"}
+    
+    @staticmethod
+    def _serper_payload(
         query: str,
         location: str,
         country: str,
         language: str,
         num_results: int,
         time_filter: str | None,
-    ) -> tuple[list[SearchResult], int]:
-        """Call Serper.dev API."""
-        client = await self._get_client()
-        
+    ) -> dict[str, Any]:
         payload = {
             "q": query,
             "location": location,
@@ -269,17 +629,49 @@ class SearchService:
         
         if time_filter:
             payload["tbs"] = time_filter
-        
-        headers = {
+        return payload
+    
+    @staticmethod
+    def _serper_headers() -> dict[str, str]:
+        return {
             "X-API-KEY": settings.SERPER_API_KEY,
             "Content-Type": "application/json",
         }
+    
+    @staticmethod
+    def _parse_serper(data: dict[str, Any]) -> tuple[list[SearchResult], int]:
+        results = []
+        for item in data.get("organic", []):
+            results.append(SearchResult(
+                url=item.get("link", ""),
+                title=item.get("title", ""),
+                snippet=item.get("snippet", ""),
+                position=item.get("position", 0),
+                date=item.get("date"),
+            ))
+        
+        credits = data.get("credits", 1)
+        return results, credits
+    
+    async def _serper_search(
+        self,
+        query: str,
+        location: str,
+        country: str,
+        language: str,
+        num_results: int,
+        time_filter: str | None,
+    ) -> tuple[list[SearchResult], int]:
+        """Call Serper.dev API."""
+        client = await self._get_client()
+        
+        payload = self._serper_payload(query, location, country, language, num_results, time_filter)
         
         try:
             response = await client.post(
                 SERPER_API_URL,
                 json=payload,
-                headers=headers,
+                headers=self._serper_headers(),
                 timeout=SERPER_TIMEOUT,
             )
             response.raise_for_status()
@@ -293,18 +685,7 @@ class SearchService:
             raise
         
         # Parse results
-        results = []
-        for item in data.get("organic", []):
-            results.append(SearchResult(
-                url=item.get("link", ""),
-                title=item.get("title", ""),
-                snippet=item.get("snippet", ""),
-                position=item.get("position", 0),
-                date=item.get("date"),
-            ))
-        
-        credits = data.get("credits", 1)
-        return results, credits
+        return self._parse_serper(data)
     
     async def _scrape_results(
         self,
@@ -330,8 +711,22 @@ class SearchService:
         return final_results
     
     async def _scrape_page(self, result: SearchResult) -> SearchResult:
-        """Scrape a single page with rate limiting."""
+        """
+        Scrape a single page with rate limiting.
+        
+        Pages are cached by canonical URL: a fresh copy is reused without
+        any request, and a stale copy with ETag/Last-Modified is revalidated
+        with a conditional GET (304 = reuse the cached text).
+        """
         async with self._semaphore:
+            page_key = canonical_url(result.url)
+            page = self._pages.get(page_key)
+            if page is not None and page.is_fresh:
+                self._page_counts["hits"] += 1
+                self._page_counts["bytes_saved"] += page.data["bytes"]
+                self._page_counts["ms_saved"] += page.data["fetch_ms"]
+                return self._apply_content(result, page.data["content"])
+            
             domain = urlparse(result.url).netloc
             
             # Check rate limit
@@ -344,16 +739,52 @@ class SearchService:
                 result.scrape_error = "Skipped (non-scrapeable)"
                 return result
             
+            headers = {}
+            if page is not None:
+                if page.data.get("etag"):
+                    headers["If-None-Match"] = page.data["etag"]
+                if page.data.get("last_modified"):
+                    headers["If-Modified-Since"] = page.data["last_modified"]
+            
             try:
                 client = await self._get_client()
-                response = await client.get(result.url)
-                response.raise_for_status()
+                start = time.perf_counter()
+                async with client.stream("GET", result.url, headers=headers) as response:
+                    if response.status_code == 304 and page is not None:
+                        # Unchanged: keep the cached text, restart its fresh TTL
+                        elapsed_ms = int((time.perf_counter() - start) * 1000)
+                        self._page_counts["revalidated"] += 1
+                        self._page_counts["bytes_saved"] += page.data["bytes"]
+                        self._page_counts["ms_saved"] += max(0, page.data["fetch_ms"] - elapsed_ms)
+                        self._store_page(page_key, page.data)
+                        return self._apply_content(result, page.data["content"])
+                    
+                    response.raise_for_status()
+                    
+                    # Don't download bodies we can't extract text from
+                    content_type = response.headers.get("content-type", "")
+                    if not is_html_content_type(content_type):
+                        self._page_counts["skipped_non_html"] += 1
+                        result.scrape_error = f"Skipped ({content_type.split(';')[0].strip()})"
+                        return result
+                    
+                    body = await self._read_capped(response, settings.SCRAPE_MAX_BYTES)
+                    elapsed_ms = int((time.perf_counter() - start) * 1000)
+                    etag = response.headers.get("etag")
+                    last_modified = response.headers.get("last-modified")
+                    html = body.decode(response.charset_encoding or "utf-8", errors="replace")
                 
-                # Parse and clean content
-                content = self._extract_content(response.text)
-                result.full_content = content
-                result.scrape_success = True
-                result.content_tokens = len(content) // 4  # Rough token estimate
+                # Parse and clean content (worker pool for large pages)
+                content = await extract_main_text_async(html, MAX_CONTENT_CHARS)
+                self._page_counts["downloads"] += 1
+                self._store_page(page_key, {
+                    "content": content,
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "bytes": len(body),
+                    "fetch_ms": elapsed_ms,
+                })
+                return self._apply_content(result, content)
                 
             except httpx.TimeoutException:
                 result.scrape_error = "Timeout"
@@ -364,6 +795,35 @@ class SearchService:
             
             return result
     
+    def _store_page(self, page_key: str, data: dict[str, Any]) -> None:
+        # Pages with validators outlive their fresh TTL so they can be revalidated
+        has_validator = bool(data.get("etag") or data.get("last_modified"))
+        self._pages.set(
+            page_key,
+            data,
+            ttl=settings.PAGE_CACHE_TTL_SECONDS,
+            stale_ttl=PAGE_STALE_TTL_SECONDS if has_validator else None,
+        )
+    
+    async def _read_capped(self, response: httpx.Response, max_bytes: int) -> bytes:
+        """Read a streamed body, stopping at max_bytes (the rest is never downloaded)."""
+        chunks: list[bytes] = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                self._page_counts["truncated"] += 1
+                break
+        return b"".join(chunks)[:max_bytes]
+    
+    @staticmethod
+    def _apply_content(result: SearchResult, content: str) -> SearchResult:
+        result.full_content = content
+        result.scrape_success = True
+        result.content_tokens = len(content) // 4  # Rough token estimate
+        return result
+    
     def _should_skip_url(self, url: str) -> bool:
         """Check if URL should be skipped (PDFs, videos, etc.)."""
         skip_extensions = [".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip", ".mp4", ".mp3"]
@@ -382,41 +842,31 @@ class SearchService:
         return False
     
     def _extract_content(self, html: str) -> str:
-        """Extract and clean text content from HTML."""
-        soup = BeautifulSoup(html, "html.parser")
-        
-        # Remove unwanted elements
-        for element in soup(["script", "style", "nav", "header", "footer", "aside", "iframe", "noscript"]):
-            element.decompose()
-        
-        # Extract text from main content areas
-        main_content = soup.find("main") or soup.find("article") or soup.find(class_=re.compile(r"content|article|post|body"))
-        
-        if main_content:
-            text = main_content.get_text(separator=" ", strip=True)
-        else:
-            # Fallback to body
-            text = soup.get_text(separator=" ", strip=True)
-        
-        # Clean whitespace
-        text = re.sub(r"\s+", " ", text)
-        text = text.strip()
-        
-        # Truncate to max chars
-        if len(text) > MAX_CONTENT_CHARS:
-            text = text[:MAX_CONTENT_CHARS] + "..."
-        
-        return text
+        """Extract and clean main-content text from HTML."""
+        return extract_main_text(html, MAX_CONTENT_CHARS)
     
     def format_for_llm(
         self,
         response: SearchResponse,
         include_full_content: bool = True,
         max_total_chars: int = MAX_TOTAL_CONTEXT,
+        query: str | None = None,
+        boosts: dict[str, float] | None = None,
     ) -> str:
         """
         Format search results for LLM context injection.
         
+        Scraped content is packed by relevance: the BM25-best passages for
+        the query (within SEARCH_CONTEXT_TOKENS), listed under the result
+        they came from.
+        
+        Args:
+            response: Search response
+            include_full_content: Include scraped passages
+            max_total_chars: Hard cap on the formatted context
+            query: Query to rank passages against (default: response.query)
+            boosts: Per-term ranking boosts (default: router keywords in the query)
+        
         Returns a structured text format optimized for Qwen processing.
         """
         parts = [
@@ -429,6 +879,25 @@ class SearchService:
         
         current_chars = sum(len(p) for p in parts)
         
+        packed = None
+        if include_full_content:
+            sources = {
+                i: result.full_content
+                for i, result in enumerate(response.results, 1)
+                if result.full_content and result.scrape_success
+            }
+            if sources:
+                header_chars = sum(len(r.title) + len(r.url) + len(r.snippet) + 64 for r in response.results)
+                budget = min(
+                    settings.SEARCH_CONTEXT_TOKENS,
+                    max(0, max_total_chars - current_chars - header_chars) // CHARS_PER_TOKEN,
+                )
+                packed = pack_passages(query or response.query, sources, budget, boosts)
+                self._packing_counts["packed"] += 1
+                self._packing_counts["tokens_in"] += packed.tokens_in
+                self._packing_counts["tokens_out"] += packed.tokens_out
+                self._packing_counts["duplicates"] += packed.duplicates
+        
         for i, result in enumerate(response.results, 1):
             # Build result block
             result_parts = [
@@ -441,8 +910,9 @@ class SearchService:
             if result.date:
                 result_parts.append(f"Date: {result.date}")
             
-            if include_full_content and result.full_content and result.scrape_success:
-                result_parts.append(f"Content: {result.full_content}")
+            passages = packed.for_source(i) if packed else []
+            if passages:
+                result_parts.append("Content: " + " [...] ".join(p.text for p in passages))
             
             result_parts.append("")  # Blank line between results
             
@@ -627,7 +1097,11 @@ class SearchService:
         if self._client:
             await self._client.aclose()
             self._client = None
+        for task in self._fetches.values():
+            task.cancel()
+        self._fetches.clear()
         self._cache.clear()
+        self._pages.clear()
         logger.info("SearchService closed")
 
 
@@ -0,0 +1,285 @@
+"""
+GOGGA Stream Replay - Resumable SSE Generations
+
+Mobile users on flaky networks drop connections mid-answer. Instead of
+re-running (and re-paying for) the whole generation, each streamed
+generation runs as a background task that writes into a bounded replay
+buffer. HTTP responses are just subscribers to that buffer.
+
+Design:
+- Every SSE event gets an id "<generation_id>:<seq>"
+- Per-generation replay buffer in memory, capped in bytes (oldest dropped)
+- Generation keeps running after a disconnect for a grace period; it is
+  cancelled only if nobody reconnects in time
+- Finished generations stay replayable for a TTL, then get swept
+- Reconnect with Last-Event-ID → missed events, then the live tail
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Final, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL_SECONDS: Final[float] = 15.0
+
+
+@dataclass(slots=True)
+class ReplayEvent:
+    """A buffered SSE event."""
+    seq: int
+    data: str
+    size: int
+
+
+def parse_last_event_id(last_event_id: str | None) -> tuple[str | None, int]:
+    """
+    Parse a Last-Event-ID header value.
+
+    Returns:
+        Tuple of (generation_id or None, last seen sequence number)
+    """
+    if not last_event_id:
+        return None, 0
+    generation_id, _, seq = last_event_id.rpartition(":")
+    try:
+        return (generation_id or None), max(0, int(seq))
+    except ValueError:
+        return None, 0
+
+
+class GenerationStream:
+    """
+    One in-flight (or recently finished) streamed generation.
+
+    The producer appends raw SSE chunks ("data: {...}\\n\\n"); subscribers
+    receive them re-emitted with an "id:" line so browsers and fetch-based
+    clients can resume with Last-Event-ID.
+    """
+
+    def __init__(self, generation_id: str, user_id: str, max_bytes: int) -> None:
+        self.generation_id = generation_id
+        self.user_id = user_id
+        self.max_bytes = max_bytes
+
+        self._events: deque[ReplayEvent] = deque()
+        self._bytes = 0
+        self._next_seq = 1
+        self._cond = asyncio.Condition()
+
+        self.done = False
+        self.cancelled = False
+        self.created_at = time.monotonic()
+        self.finished_at: float | None = None
+        self.subscribers = 0
+        self.last_detached_at = time.monotonic()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    @property
+    def first_seq(self) -> int:
+        return self._events[0].seq if self._events else self._next_seq
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._bytes
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.generation_id}:{seq}"
+
+    async def append(self, data: str) -> None:
+        """Buffer one SSE chunk and wake subscribers."""
+        size = len(data)
+        async with self._cond:
+            self._events.append(ReplayEvent(self._next_seq, data, size))
+            self._next_seq += 1
+            self._bytes += size
+            # Byte cap: drop the oldest events, always keep the newest one
+            while self._bytes > self.max_bytes and len(self._events) > 1:
+                self._bytes -= self._events.popleft().size
+            self._cond.notify_all()
+
+    async def finish(self, cancelled: bool = False) -> None:
+        """Mark the generation as complete."""
+        async with self._cond:
+            self.done = True
+            self.cancelled = cancelled
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def _format(self, event: ReplayEvent) -> str:
+        return f"id: {self.event_id(event.seq)}\n{event.data}"
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncIterator[str]:
+        """
+        Yield buffered events after `after_seq`, then follow the live tail.
+
+        Ends when the generation is finished and fully delivered.
+        """
+        self.subscribers += 1
+        try:
+            seq = after_seq
+            while True:
+                async with self._cond:
+                    await self._cond.wait_for(lambda: self.last_seq > seq or self.done)
+                    gap = None
+                    if seq + 1 < self.first_seq:
+                        # Events were evicted by the byte cap before this subscriber
+                        # read them (resumed too late, or fell behind while live)
+                        gap = {"type": "replay_gap", "missed_from": seq + 1, "resumed_at": self.first_seq}
+                        seq = self.first_seq - 1
+                    pending = list(itertools.islice(self._events, seq + 1 - self.first_seq, None))
+                    finished = self.done
+
+                if gap:
+                    yield f"data: {json.dumps(gap)}\n\n"
+                for event in pending:
+                    yield self._format(event)
+                    seq = event.seq
+
+                if finished and seq >= self.last_seq:
+                    return
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self.last_detached_at = time.monotonic()
+
+
+class StreamReplayRegistry:
+    """
+    Registry of resumable generations.
+
+    Owns the background producer tasks so a client disconnect does not
+    cancel the upstream LLM stream.
+    """
+
+    def __init__(
+        self,
+        buffer_bytes: int = 512_000,
+        ttl_seconds: float = 300.0,
+        grace_seconds: float = 60.0,
+    ) -> None:
+        """
+        Initialize the registry.
+
+        Args:
+            buffer_bytes: Replay buffer cap per generation
+            ttl_seconds: How long finished generations stay replayable
+            grace_seconds: How long a generation keeps running with no client attached
+        """
+        self.buffer_bytes = buffer_bytes
+        self.ttl_seconds = ttl_seconds
+        self.grace_seconds = grace_seconds
+
+        self._streams: dict[str, GenerationStream] = {}
+        self._sweeper: asyncio.Task | None = None
+
+        self._started = 0
+        self._resumed = 0
+        self._abandoned = 0
+
+    def start(self, source: AsyncIterator[str], user_id: str) -> GenerationStream:
+        """
+        Start pumping `source` into a new replayable generation.
+
+        Args:
+            source: Async iterator of SSE chunks ("data: {...}\\n\\n")
+            user_id: Owner, checked on resume
+
+        Returns:
+            The GenerationStream (subscribe to it for the HTTP response)
+        """
+        stream = GenerationStream(uuid.uuid4().hex, user_id, self.buffer_bytes)
+        stream.task = asyncio.create_task(self._pump(stream, source))
+        self._streams[stream.generation_id] = stream
+        self._started += 1
+        self._ensure_sweeper()
+        return stream
+
+    def get(self, generation_id: str, user_id: str) -> GenerationStream | None:
+        """Get a generation owned by user_id, or None if unknown/expired."""
+        stream = self._streams.get(generation_id)
+        if stream is None or stream.user_id != user_id:
+            return None
+        self._resumed += 1
+        return stream
+
+    async def _pump(self, stream: GenerationStream, source: AsyncIterator[str]) -> None:
+        cancelled = False
+        try:
+            async for chunk in source:
+                await stream.append(chunk)
+        except asyncio.CancelledError:
+            cancelled = True
+            logger.info(
+                "[StreamReplay] Generation %s abandoned after %.0fs without a client",
+                stream.generation_id[:12], self.grace_seconds,
+            )
+        except Exception as e:
+            logger.error("[StreamReplay] Generation %s failed: %s", stream.generation_id[:12], e)
+            error = {"type": "error", "error": "GOGGA AI encountered an issue. Please try again."}
+            await stream.append(f"data: {json.dumps(error)}\n\n")
+        finally:
+            await stream.finish(cancelled=cancelled)
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self) -> None:
+        while self._streams:
+            await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+            self.sweep()
+
+    def sweep(self) -> None:
+        """Cancel abandoned generations and drop expired finished ones."""
+        now = time.monotonic()
+        for generation_id, stream in list(self._streams.items()):
+            if stream.done:
+                if now - (stream.finished_at or now) > self.ttl_seconds:
+                    del self._streams[generation_id]
+            elif (
+                stream.subscribers == 0
+                and now - stream.last_detached_at > self.grace_seconds
+                and stream.task is not None
+            ):
+                self._abandoned += 1
+                stream.task.cancel()
+
+    def get_stats(self) -> dict[str, int]:
+        """Get registry statistics."""
+        return {
+            "active": sum(1 for s in self._streams.values() if not s.done),
+            "replayable": len(self._streams),
+            "buffered_bytes": sum(s.buffered_bytes for s in self._streams.values()),
+            "started": self._started,
+            "resumed": self._resumed,
+            "abandoned": self._abandoned,
+        }
+
+
+# Singleton instance
+_stream_registry: Optional[StreamReplayRegistry] = None
+
+
+def get_stream_registry() -> StreamReplayRegistry:
+    """Get the global stream replay registry."""
+    global _stream_registry
+    if _stream_registry is None:
+        _stream_registry = StreamReplayRegistry(
+            buffer_bytes=settings.STREAM_REPLAY_BUFFER_BYTES,
+            ttl_seconds=settings.STREAM_REPLAY_TTL_SECONDS,
+            grace_seconds=settings.STREAM_DISCONNECT_GRACE_SECONDS,
+        )
+    return _stream_registry
@@ -2,8 +2,9 @@
 GOGGA Subscription Verification Service
 
 Verifies user subscription status and credits before processing requests.
-Calls the frontend API to get real-time subscription data since the
-database is managed by the Next.js frontend (Prisma/SQLite).
+Calls the frontend API to get subscription data since the database is
+managed by the Next.js frontend (Prisma/SQLite). Lookups are cached for a
+few seconds (see entitlement_cache) and invalidated by the frontend on change.
 
 This is the backend enforcement layer - frontend-only enforcement can be bypassed!
 """
@@ -15,6 +16,7 @@ import httpx
 
 from app.config import settings
 from app.core.router import UserTier
+from app.services.entitlement_cache import get_entitlement_cache, subscription_key
 
 logger = logging.getLogger(__name__)
 
@@ -77,37 +79,10 @@ class SubscriptionService:
             )
         
         try:
-            client = await self._get_client()
-            response = await client.get(
-                f"{self._frontend_url}/api/subscription",
-                params={"email": user_email},
-                headers={"Authorization": f"Bearer {settings.INTERNAL_API_KEY}"},
+            data = await get_entitlement_cache().get_or_load(
+                subscription_key(user_email),
+                lambda: self._fetch_subscription(user_email),
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return self._determine_effective_tier(data, requested_tier)
-            elif response.status_code == 404:
-                # No subscription found - default to FREE
-                logger.warning("No subscription found for %s, defaulting to FREE", user_email)
-                return SubscriptionStatus(
-                    tier="FREE",
-                    status="none",
-                    credits_available=0,
-                    images_available=0,
-                    effective_tier=UserTier.FREE,
-                )
-            else:
-                logger.error("Subscription check failed: %d - %s", response.status_code, response.text[:200])
-                # On error, trust the frontend tier to avoid blocking users
-                return SubscriptionStatus(
-                    tier=requested_tier.value.upper(),
-                    status="unknown",
-                    credits_available=-1,  # Unknown
-                    images_available=-1,
-                    effective_tier=requested_tier,
-                )
-                
         except httpx.ConnectError:
             # Frontend not reachable - trust the request tier
             logger.warning("Frontend not reachable for subscription check, trusting request tier")
@@ -118,6 +93,16 @@ class SubscriptionService:
                 images_available=-1,
                 effective_tier=requested_tier,
             )
+        except httpx.HTTPStatusError as e:
+            logger.error("Subscription check failed: %d - %s", e.response.status_code, e.response.text[:200])
+            # On error, trust the frontend tier to avoid blocking users
+            return SubscriptionStatus(
+                tier=requested_tier.value.upper(),
+                status="unknown",
+                credits_available=-1,  # Unknown
+                images_available=-1,
+                effective_tier=requested_tier,
+            )
         except Exception as e:
             logger.exception("Subscription verification error: %s", e)
             # On error, trust the frontend tier
@@ -128,6 +113,39 @@ class SubscriptionService:
                 images_available=-1,
                 effective_tier=requested_tier,
             )
+
+        if data is None:
+            # No subscription found - default to FREE
+            logger.warning("No subscription found for %s, defaulting to FREE", user_email)
+            return SubscriptionStatus(
+                tier="FREE",
+                status="none",
+                credits_available=0,
+                images_available=0,
+                effective_tier=UserTier.FREE,
+            )
+        return self._determine_effective_tier(data, requested_tier)
+    
+    async def _fetch_subscription(self, user_email: str) -> Optional[dict]:
+        """
+        Fetch subscription data from the frontend.
+        
+        Returns:
+            Subscription payload, or None if the user has no subscription
+            
+        Raises:
+            httpx.HTTPError: Frontend unreachable or returned an error
+        """
+        client = await self._get_client()
+        response = await client.get(
+            f"{self._frontend_url}/api/subscription",
+            params={"email": user_email},
+            headers={"Authorization": f"Bearer {settings.INTERNAL_API_KEY}"},
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
     
     def _determine_effective_tier(self, data: dict, requested_tier: UserTier) -> SubscriptionStatus:
         """
@@ -2,61 +2,153 @@
 GOGGA Tool Result Cache Service
 
 RECOMMENDATION #9: Cache tool results to reduce duplicate API calls.
-- Redis-backed cache with 5-minute TTL
-- Cache key based on tool name + arguments hash
-- Async cache operations for non-blocking performance
+
+Two tiers:
+- In-process LRU (bounded, per worker) answers hot keys without a network hop
+- Optional shared Redis (TOOL_CACHE_REDIS_URL) so workers reuse each other's results
+
+Plus:
+- Single-flight: concurrent misses for the same key share ONE execution
+  (ten identical web_search calls -> one Serper request)
+- Namespaced keys: tool:<tool_name>:<arguments hash>
+- Per-tool TTLs (TOOL_TTLS), falling back to TOOL_CACHE_TTL_SECONDS
+- Counter-based stats (no key scans)
+- Failed results (success=False / error) and stale search results are never cached
+
+Results are stored as JSON, so callers always get JSON values back
+(tuples become lists, unknown types become strings), cached or not.
 """
 
+import asyncio
 import hashlib
 import json
 import logging
-from typing import Any, Optional
-from datetime import timedelta
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Final, Optional
+
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Every key lives under this namespace (clear_all scans it)
+KEY_PREFIX: Final[str] = "tool:"
+
+# Per-tool TTLs in seconds (everything else uses the default TTL)
+TOOL_TTLS: Final[dict[str, int]] = {
+    "web_search": 300,
+    "shopping_search": 300,  # Prices move
+    "legal_search": 3600,
+    "places_search": 1800,
+    "weather": 600,
+    "math_statistics": 3600,  # Deterministic
+    "math_financial": 3600,
+    "math_sa_tax": 3600,
+    "math_probability": 3600,
+    "math_conversion": 3600,
+    "math_fraud_analysis": 3600,
+}
+
+# Results pulled from Redis stay in the local tier at most this long, so a
+# promoted entry outlives its Redis TTL by no more than this
+PROMOTED_TTL_SECONDS: Final[float] = 60.0
+
+# After a Redis error, skip the shared tier for this long
+REMOTE_RETRY_SECONDS: Final[float] = 30.0
+
+ExecuteFunc = Callable[[], Awaitable[Any]]
+
+
+def is_cacheable(result: Any) -> bool:
+    """
+    Only successful, current results are worth caching.
+
+    Stale search results (served while the search service refreshes them)
+    are passed through, so the next call picks up the refreshed copy.
+    Anything that isn't JSON-native (e.g. a dataclass, which would be
+    stored as its repr string) is never cached.
+    """
+    if isinstance(result, dict):
+        return (
+            result.get("success") is not False
+            and not result.get("error")
+            and result.get("stale") is not True
+        )
+    return isinstance(result, (list, str, int, float))
+
 
 class ToolResultCache:
     """
     Cache for tool execution results.
 
     Reduces duplicate API calls for:
-    - Web searches (same query within 5 minutes)
+    - Web, legal, shopping and places searches (Serper)
+    - Weather lookups (Open-Meteo)
     - Math calculations (same operation, same data)
-    - Chart data generation
     """
 
-    def __init__(self, ttl_seconds: int = 300):
+    def __init__(
+        self,
+        ttl_seconds: int = 300,
+        max_entries: int = 2048,
+        redis_url: str = "",
+        redis: Any = None,
+    ):
         """
         Initialize tool result cache.
 
         Args:
-            ttl_seconds: Time-to-live for cached results (default: 5 minutes)
+            ttl_seconds: Default time-to-live for cached results
+            max_entries: Entries kept in the in-process LRU (0 = no local tier)
+            redis_url: Shared Redis tier (empty = in-process only)
+            redis: Ready-made async Redis client (overrides redis_url; tests)
         """
         self.ttl_seconds = ttl_seconds
-        self._redis = None
+        self.max_entries = max_entries
+        self.redis_url = redis_url
+        self._redis = redis
+        self._remote_configured = redis is not None or bool(redis_url)
+        self._remote_down_until = 0.0
         self._cache_enabled = True
 
+        # key -> (expires_at monotonic, JSON payload)
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+        self._hits_local = 0
+        self._hits_remote = 0
+        self._misses = 0
+        self._executions = 0
+        self._coalesced = 0
+        self._sets = 0
+        self._remote_errors = 0
+
     def _get_redis(self):
-        """Lazy load Redis client."""
+        """Lazy load the Redis client (None while the shared tier is off or down)."""
+        if not self._remote_configured or time.monotonic() < self._remote_down_until:
+            return None
         if self._redis is None:
             try:
                 import redis.asyncio as redis
                 self._redis = redis.from_url(
-                    "redis://localhost:6379/0",
+                    self.redis_url,
                     encoding="utf-8",
                     decode_responses=True
                 )
                 logger.info("[ToolCache] Redis client initialized")
             except ImportError:
-                logger.warning("[ToolCache] Redis not available, cache disabled")
-                self._cache_enabled = False
+                logger.warning("[ToolCache] Redis not installed, shared tier disabled")
+                self._remote_configured = False
             except Exception as e:
-                logger.warning(f"[ToolCache] Redis connection failed: {e}")
-                self._cache_enabled = False
+                self._remote_failed(e)
 
         return self._redis
 
+    def _remote_failed(self, error: Exception) -> None:
+        self._remote_errors += 1
+        self._remote_down_until = time.monotonic() + REMOTE_RETRY_SECONDS
+        logger.warning(f"[ToolCache] Redis unavailable, using local tier for {REMOTE_RETRY_SECONDS:.0f}s: {error}")
+
     def _generate_cache_key(self, tool_name: str, arguments: dict[str, Any]) -> str:
         """
         Generate cache key from tool name and arguments.
@@ -66,13 +158,71 @@ class ToolResultCache:
             arguments: Tool arguments
 
         Returns:
-            Cache key (SHA256 hash)
+            Namespaced cache key (tool:<tool_name>:<SHA256 prefix>)
         """
         # Normalize arguments for consistent hashing
         normalized = json.dumps(arguments, sort_keys=True, default=str)
-        key_string = f"tool:{tool_name}:{normalized}"
+        digest = hashlib.sha256(normalized.encode()).hexdigest()[:32]
+
+        return f"{KEY_PREFIX}{tool_name}:{digest}"
 
-        return hashlib.sha256(key_string.encode()).hexdigest()[:32]
+    def ttl_for(self, tool_name: str) -> int:
+        """TTL for a tool's results."""
+        return TOOL_TTLS.get(tool_name, self.ttl_seconds)
+
+    def _local_get(self, key: str) -> Optional[str]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry[1]
+
+    def _local_set(self, key: str, payload: str, ttl: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._local[key] = (time.monotonic() + ttl, payload)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        """Local tier, then Redis (promoting hits). Counts hits and misses."""
+        payload = self._local_get(key)
+        if payload is not None:
+            self._hits_local += 1
+            return payload
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                payload = await redis.get(key)
+            except Exception as e:
+                self._remote_failed(e)
+                payload = None
+            if payload is not None:
+                self._hits_remote += 1
+                self._local_set(key, payload, min(PROMOTED_TTL_SECONDS, self.ttl_seconds))
+                return payload
+
+        self._misses += 1
+        return None
+
+    async def _store(self, key: str, payload: str, ttl: int) -> bool:
+        self._local_set(key, payload, ttl)
+        self._sets += 1
+
+        redis = self._get_redis()
+        if redis is None:
+            return self.max_entries > 0
+        try:
+            await redis.setex(key, ttl, payload)
+            return True
+        except Exception as e:
+            self._remote_failed(e)
+            return self.max_entries > 0
 
     async def get(self, tool_name: str, arguments: dict[str, Any]) -> Optional[Any]:
         """
@@ -88,30 +238,21 @@ class ToolResultCache:
         if not self._cache_enabled:
             return None
 
-        try:
-            redis = self._get_redis()
-            if redis is None:
-                return None
-
-            cache_key = self._generate_cache_key(tool_name, arguments)
-            cached = await redis.get(cache_key)
-
-            if cached:
-                logger.debug(f"[ToolCache] HIT: {tool_name} (key: {cache_key[:16]}...)")
-                return json.loads(cached)
-            else:
-                logger.debug(f"[ToolCache] MISS: {tool_name} (key: {cache_key[:16]}...)")
-                return None
-
-        except Exception as e:
-            logger.error(f"[ToolCache] Get failed: {e}")
+        cache_key = self._generate_cache_key(tool_name, arguments)
+        payload = await self._lookup(cache_key)
+        if payload is None:
+            logger.debug(f"[ToolCache] MISS: {cache_key}")
             return None
 
+        logger.debug(f"[ToolCache] HIT: {cache_key}")
+        return json.loads(payload)
+
     async def set(
         self,
         tool_name: str,
         arguments: dict[str, Any],
-        result: Any
+        result: Any,
+        ttl_seconds: Optional[int] = None,
     ) -> bool:
         """
         Cache tool result.
@@ -120,6 +261,7 @@ class ToolResultCache:
             tool_name: Name of the tool
             arguments: Tool arguments
             result: Result to cache
+            ttl_seconds: Override the tool's TTL
 
         Returns:
             True if cached successfully, False otherwise
@@ -128,28 +270,78 @@ class ToolResultCache:
             return False
 
         try:
-            redis = self._get_redis()
-            if redis is None:
-                return False
-
-            cache_key = self._generate_cache_key(tool_name, arguments)
-            value = json.dumps(result, default=str)
-
-            await redis.setex(
-                cache_key,
-                self.ttl_seconds,
-                value
-            )
-
-            logger.debug(
-                f"[ToolCache] SET: {tool_name} (key: {cache_key[:16]}..., TTL: {self.ttl_seconds}s)"
-            )
-            return True
-
-        except Exception as e:
+            payload = json.dumps(result, default=str)
+        except (TypeError, ValueError) as e:
             logger.error(f"[ToolCache] Set failed: {e}")
             return False
 
+        cache_key = self._generate_cache_key(tool_name, arguments)
+        ttl = ttl_seconds or self.ttl_for(tool_name)
+        logger.debug(f"[ToolCache] SET: {cache_key} (TTL: {ttl}s)")
+        return await self._store(cache_key, payload, ttl)
+
+    async def get_or_execute(
+        self,
+        tool_name: str,
+        arguments: dict[str, Any],
+        execute_func: ExecuteFunc,
+        ttl_seconds: Optional[int] = None,
+    ) -> Any:
+        """
+        Return the cached result, or execute the tool once and cache it.
+
+        Concurrent calls for the same key wait for the first caller's
+        execution instead of running their own. If that execution raises,
+        every waiter gets the exception.
+
+        Args:
+            tool_name: Name of the tool
+            arguments: Tool arguments
+            execute_func: Async function producing the result on a miss
+            ttl_seconds: Override the tool's TTL
+
+        Returns:
+            Tool result (JSON values)
+        """
+        if not self._cache_enabled:
+            return await execute_func()
+
+        cache_key = self._generate_cache_key(tool_name, arguments)
+
+        leader = self._inflight.get(cache_key)
+        if leader is not None:
+            self._coalesced += 1
+            try:
+                return json.loads(await asyncio.shield(leader))
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise  # We were cancelled ourselves
+                # The leading call was cancelled; take over
+                return await self.get_or_execute(tool_name, arguments, execute_func, ttl_seconds)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            payload = await self._lookup(cache_key)
+            if payload is None:
+                self._executions += 1
+                result = await execute_func()
+                payload = json.dumps(result, default=str)
+                if is_cacheable(result):
+                    await self._store(cache_key, payload, ttl_seconds or self.ttl_for(tool_name))
+            future.set_result(payload)
+            return json.loads(payload)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved; waiters (if any) re-raise it
+            raise
+        finally:
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+
     async def delete(self, tool_name: str, arguments: dict[str, Any]) -> bool:
         """
         Delete cached tool result.
@@ -161,83 +353,67 @@ class ToolResultCache:
         Returns:
             True if deleted successfully, False otherwise
         """
-        if not self._cache_enabled:
-            return False
+        cache_key = self._generate_cache_key(tool_name, arguments)
+        self._local.pop(cache_key, None)
 
+        redis = self._get_redis()
+        if redis is None:
+            return True
         try:
-            redis = self._get_redis()
-            if redis is None:
-                return False
-
-            cache_key = self._generate_cache_key(tool_name, arguments)
             await redis.delete(cache_key)
-
-            logger.debug(f"[ToolCache] DELETE: {tool_name} (key: {cache_key[:16]}...)")
+            logger.debug(f"[ToolCache] DELETE: {cache_key}")
             return True
-
         except Exception as e:
-            logger.error(f"[ToolCache] Delete failed: {e}")
+            self._remote_failed(e)
             return False
 
     async def clear_all(self) -> bool:
         """
-        Clear all cached tool results.
+        Clear all cached tool results (both tiers).
 
         Returns:
             True if cleared successfully, False otherwise
         """
-        if not self._cache_enabled:
-            return False
+        self._local.clear()
 
+        redis = self._get_redis()
+        if redis is None:
+            return True
         try:
-            redis = self._get_redis()
-            if redis is None:
-                return False
-
-            # Find all keys matching "tool:*" pattern
-            keys = []
-            async for key in redis.scan_iter("tool:*"):
-                keys.append(key)
-
+            keys = [key async for key in redis.scan_iter(f"{KEY_PREFIX}*")]
             if keys:
                 await redis.delete(*keys)
-                logger.info(f"[ToolCache] Cleared {len(keys)} cached results")
-
+            logger.info(f"[ToolCache] Cleared {len(keys)} shared results")
             return True
-
         except Exception as e:
-            logger.error(f"[ToolCache] Clear all failed: {e}")
+            self._remote_failed(e)
             return False
 
-    async def get_stats(self) -> dict[str, Any]:
+    def get_stats(self) -> dict[str, Any]:
         """
-        Get cache statistics.
+        Get cache statistics (counters only; no key scans).
 
         Returns:
-            Dict with cache stats (keys, memory usage, hit rate)
+            Dict with tier sizes, hit/miss counts and single-flight savings
         """
-        if not self._cache_enabled:
-            return {"enabled": False}
-
-        try:
-            redis = self._get_redis()
-            if redis is None:
-                return {"enabled": False}
-
-            # Count tool cache keys
-            key_count = 0
-            async for key in redis.scan_iter("tool:*"):
-                key_count += 1
-
-            return {
-                "enabled": True,
-                "ttl_seconds": self.ttl_seconds,
-                "key_count": key_count,
-            }
-
-        except Exception as e:
-            logger.error(f"[ToolCache] Get stats failed: {e}")
-            return {"enabled": False, "error": str(e)}
+        lookups = self._hits_local + self._hits_remote + self._misses
+        return {
+            "enabled": self._cache_enabled,
+            "remote_configured": self._remote_configured,
+            "remote_available": self._remote_configured and time.monotonic() >= self._remote_down_until,
+            "local_entries": len(self._local),
+            "max_entries": self.max_entries,
+            "default_ttl_seconds": self.ttl_seconds,
+            "hits_local": self._hits_local,
+            "hits_remote": self._hits_remote,
+            "misses": self._misses,
+            "hit_rate": round((self._hits_local + self._hits_remote) / lookups, 3) if lookups else 0.0,
+            "executions": self._executions,
+            "coalesced": self._coalesced,
+            "sets": self._sets,
+            "remote_errors": self._remote_errors,
+            "inflight": len(self._inflight),
+        }
 
     def enable(self):
         """Enable caching."""
@@ -258,17 +434,22 @@ def get_tool_result_cache() -> ToolResultCache:
     """Get the global tool result cache instance."""
     global _tool_cache
     if _tool_cache is None:
-        _tool_cache = ToolResultCache(ttl_seconds=300)  # 5 minutes
+        _tool_cache = ToolResultCache(
+            ttl_seconds=settings.TOOL_CACHE_TTL_SECONDS,
+            max_entries=settings.TOOL_CACHE_MAX_ENTRIES,
+            redis_url=settings.TOOL_CACHE_REDIS_URL,
+        )
     return _tool_cache
 
 
 async def cached_tool_call(
     tool_name: str,
     arguments: dict[str, Any],
-    execute_func: callable
+    execute_func: ExecuteFunc,
+    ttl_seconds: Optional[int] = None,
 ) -> Any:
     """
-    Execute tool with caching.
+    Execute tool with caching and single-flight.
 
     Usage:
         result = await cached_tool_call(
@@ -279,23 +460,13 @@ async def cached_tool_call(
 
     Args:
         tool_name: Name of the tool
-        arguments: Tool arguments
+        arguments: Tool arguments (everything the result depends on)
         execute_func: Async function to execute if cache miss
+        ttl_seconds: Override the tool's TTL
 
     Returns:
         Tool result (from cache or freshly executed)
     """
-    cache = get_tool_result_cache()
-
-    # Try cache first
-    cached_result = await cache.get(tool_name, arguments)
-    if cached_result is not None:
-        return cached_result
-
-    # Cache miss - execute tool
-    result = await execute_func()
-
-    # Cache the result
-    await cache.set(tool_name, arguments, result)
-
-    return result
+    return await get_tool_result_cache().get_or_execute(
+        tool_name, arguments, execute_func, ttl_seconds
+    )
@@ -0,0 +1,415 @@
+"""
+GOGGA Usage Ledger - Write-ahead log for usage records, shipped in batches
+
+cost_tracker used to POST every usage record to the frontend inside the
+request, on a fresh httpx client (new connection, new TLS handshake) per
+record. A slow frontend added its latency to every chat, image and video
+response, and a frontend restart silently dropped the records in flight.
+
+Design:
+- record() appends the record to an on-disk log and returns at once;
+  fsync is batched (group commit every USAGE_LEDGER_FSYNC_INTERVAL)
+- Every record carries an id; the frontend stores it as the usage row id
+  and skips ids it has already seen, so resending is harmless
+- A background task ships pending records in batches over one shared
+  client, retrying with exponential backoff while the frontend is down
+- A record the frontend refuses (listed as rejected, or a 4xx for the
+  batch) is dropped and counted; one it could not store this time
+  (listed as failed) stays pending at the back of the queue, so a bad
+  record never holds up the ones behind it
+- Acknowledged ids are appended to the log as ack lines; log segments
+  are rotated by size and deleted, oldest first, once fully acknowledged
+- On startup the log is replayed: records without an ack are shipped
+  again, so nothing is lost and nothing is counted twice
+"""
+
+import asyncio
+import json
+import logging
+import os
+import ssl
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Final, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rotate the active segment after this many bytes
+SEGMENT_BYTES: Final[int] = 4 * 1024 * 1024
+
+# First retry delay after a failed shipment (doubles up to max_backoff)
+RETRY_SECONDS: Final[float] = 1.0
+
+# Client errors that say nothing about the records (auth, routing, throttling): retried
+RETRY_STATUSES: Final[frozenset[int]] = frozenset({401, 403, 404, 408, 429})
+
+SEGMENT_PREFIX: Final[str] = "usage-"
+SEGMENT_SUFFIX: Final[str] = ".wal"
+
+# Self-signed certificates on the internal Docker network
+_ssl_context = ssl.create_default_context()
+_ssl_context.check_hostname = False
+_ssl_context.verify_mode = ssl.CERT_NONE
+
+
+def _segment_seq(path: Path) -> int:
+    return int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def _fsync_fd(fd: int) -> None:
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class UsageLedger:
+    """
+    Durable, asynchronous usage log with batched delivery to the frontend.
+
+    record() is cheap and never waits on the network. start() replays the
+    log and launches the sync and shipping tasks; stop() makes a last
+    delivery attempt and syncs the log.
+    """
+
+    def __init__(
+        self,
+        wal_dir: str | Path,
+        endpoint: str,
+        batch_size: int = 200,
+        fsync_interval: float = 0.05,
+        ship_interval: float = 1.0,
+        max_backoff: float = 60.0,
+        timeout: float = 10.0,
+        segment_bytes: int = SEGMENT_BYTES,
+        headers: Optional[dict[str, str]] = None,
+        on_acknowledged: Optional[Callable[[list[dict[str, Any]]], None]] = None,
+    ) -> None:
+        """
+        Initialize the ledger.
+
+        Args:
+            wal_dir: Directory of log segments
+            endpoint: Frontend URL accepting {"records": [...]}
+            batch_size: Records per shipment
+            fsync_interval: Group-commit window for fsync (seconds)
+            ship_interval: Wait for more records before shipping a partial batch (seconds)
+            max_backoff: Longest delay between failed shipments (seconds)
+            timeout: HTTP timeout per shipment (seconds)
+            segment_bytes: Segment size before rotation
+            headers: Extra HTTP headers per shipment (e.g. X-Internal-Key)
+            on_acknowledged: Called with the records the frontend has acknowledged
+        """
+        self.wal_dir = Path(wal_dir)
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.ship_interval = ship_interval
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.segment_bytes = segment_bytes
+        self.headers = headers or {}
+        self.on_acknowledged = on_acknowledged
+
+        self._pending: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._record_segment: dict[str, int] = {}
+        self._segment_pending: dict[int, set[str]] = {}
+        self._file = None
+        self._seq = 0
+        self._segment_size = 0
+        self._opened = False
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tasks: list[asyncio.Task] = []
+        self._dirty: Optional[asyncio.Event] = None
+        self._has_pending: Optional[asyncio.Event] = None
+
+        self._recorded = 0
+        self._replayed = 0
+        self._shipped = 0
+        self._rejected = 0
+        self._batches = 0
+        self._failures = 0
+        self._syncs = 0
+        self._last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Log segments
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.wal_dir / f"{SEGMENT_PREFIX}{seq:08d}{SEGMENT_SUFFIX}"
+
+    def _open(self) -> None:
+        """Replay existing segments, then start a fresh one."""
+        if self._opened:
+            return
+        self.wal_dir.mkdir(parents=True, exist_ok=True)
+        acked: set[str] = set()
+        records: list[tuple[int, dict[str, Any]]] = []
+        segments = sorted(self.wal_dir.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"), key=_segment_seq)
+        for path in segments:
+            seq = _segment_seq(path)
+            self._segment_pending.setdefault(seq, set())
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write at the end of a segment
+                    if "r" in entry:
+                        records.append((seq, entry["r"]))
+                    elif "a" in entry:
+                        acked.update(entry["a"])
+
+        for seq, record in records:
+            if record["id"] not in acked and record["id"] not in self._pending:
+                self._track(seq, record)
+        self._replayed = len(self._pending)
+        if self._replayed:
+            logger.info("[UsageLedger] Replayed %d unshipped records from %d segments", self._replayed, len(segments))
+
+        self._seq = max(self._segment_pending, default=0) + 1
+        self._start_segment()
+        self._opened = True
+        self._collect_segments()
+
+    def _start_segment(self) -> None:
+        self._file = open(self._segment_path(self._seq), "ab")
+        self._segment_pending.setdefault(self._seq, set())
+        self._segment_size = 0
+
+    def _write(self, entry: dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+        self._file.write(line)
+        self._segment_size += len(line)
+        if self._segment_size >= self.segment_bytes:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._seq += 1
+            self._start_segment()
+
+    def _track(self, seq: int, record: dict[str, Any]) -> None:
+        self._pending[record["id"]] = record
+        self._record_segment[record["id"]] = seq
+        self._segment_pending.setdefault(seq, set()).add(record["id"])
+
+    def _collect_segments(self) -> None:
+        """Delete fully acknowledged segments, oldest first, up to the active one."""
+        for seq in sorted(self._segment_pending):
+            if seq >= self._seq or self._segment_pending[seq]:
+                break
+            self._segment_path(seq).unlink(missing_ok=True)
+            del self._segment_pending[seq]
+
+    def sync(self) -> None:
+        """Flush and fsync the active segment (blocking)."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._syncs += 1
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def record(self, payload: dict[str, Any]) -> str:
+        """
+        Append a usage record and return its id. Does not wait for disk or network.
+
+        The record is durable after the next group commit (fsync_interval).
+        """
+        self._open()
+        record = {
+            **payload,
+            "id": payload.get("id") or uuid.uuid4().hex,
+            "recordedAt": payload.get("recordedAt") or datetime.now(timezone.utc).isoformat(),
+        }
+        self._write({"r": record})
+        self._track(self._seq, record)
+        self._recorded += 1
+        if self._dirty is not None:
+            self._dirty.set()
+            self._has_pending.set()
+        return record["id"]
+
+    def acknowledge(self, ids: list[str]) -> None:
+        """Mark records as delivered (logged as an ack line)."""
+        records = [record for record_id in ids if (record := self._pending.pop(record_id, None)) is not None]
+        if not records:
+            return
+        acked = [record["id"] for record in records]
+        for record_id in acked:
+            self._segment_pending[self._record_segment.pop(record_id)].discard(record_id)
+        self._write({"a": acked})
+        self._collect_segments()
+        if self.on_acknowledged is not None:
+            self.on_acknowledged(records)
+
+    def pending_records(self) -> list[dict[str, Any]]:
+        """Records not yet acknowledged (including those replayed from the log)."""
+        self._open()
+        return list(self._pending.values())
+
+    async def ship_once(self) -> int:
+        """
+        Ship one batch of pending records.
+
+        Returns:
+            Number of records acknowledged (stored, duplicate or rejected)
+
+        Raises:
+            httpx.HTTPError: Frontend unreachable, returned a server error,
+                or could not store any record of the batch
+        """
+        batch = list(islice(self._pending.values(), self.batch_size))
+        if not batch:
+            return 0
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, verify=_ssl_context)
+        response = await self._client.post(self.endpoint, json={"records": batch}, headers=self.headers)
+        if response.is_server_error or response.status_code in RETRY_STATUSES:
+            response.raise_for_status()
+
+        ids = [record["id"] for record in batch]
+        if response.is_client_error:
+            # The frontend refused the payload itself; resending it can never succeed
+            rejected, failed = ids, []
+        else:
+            body = response.json() if response.content else {}
+            rejected, failed = body.get("rejected", []), body.get("failed", [])
+
+        # Rejected records (bad payloads) would block the queue forever; drop them loudly
+        if rejected:
+            self._rejected += len(rejected)
+            logger.error(
+                "[UsageLedger] Frontend rejected %d records (HTTP %d): %s",
+                len(rejected), response.status_code, rejected[:5],
+            )
+        # Failed records are retried later, behind everything else
+        retry = {record_id for record_id in failed if record_id in self._pending}
+        for record_id in retry:
+            self._pending.move_to_end(record_id)
+        done = [record_id for record_id in ids if record_id not in retry]
+        self.acknowledge(done)
+        self._shipped += len(done) - len(rejected)
+        self._batches += 1
+        if not done:
+            raise httpx.HTTPError(f"Frontend could not store any of {len(ids)} records")
+        return len(done)
+
+    # ------------------------------------------------------------------
+    # Background tasks
+    # ------------------------------------------------------------------
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.fsync_interval)  # Group commit window
+            self._dirty.clear()
+            self._file.flush()
+            # fsync a duplicate descriptor off the loop; rotation may close the original
+            await asyncio.to_thread(_fsync_fd, os.dup(self._file.fileno()))
+            self._syncs += 1
+
+    async def _ship_loop(self) -> None:
+        backoff = RETRY_SECONDS
+        while True:
+            if not self._pending:
+                self._has_pending.clear()
+                await self._has_pending.wait()
+            if len(self._pending) < self.batch_size:
+                await asyncio.sleep(self.ship_interval)
+            try:
+                await self.ship_once()
+                backoff = RETRY_SECONDS
+            except Exception as e:
+                self._failures += 1
+                self._last_error = str(e)
+                logger.warning(
+                    "[UsageLedger] Shipping %d pending records failed (retry in %.0fs): %s",
+                    len(self._pending), backoff, e,
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    async def start(self) -> None:
+        """Replay the log and start syncing and shipping in the background."""
+        if self._tasks:
+            return
+        await asyncio.to_thread(self._open)
+        self._dirty = asyncio.Event()
+        self._has_pending = asyncio.Event()
+        if self._pending:
+            self._has_pending.set()
+        self._tasks = [
+            asyncio.create_task(self._sync_loop(), name="usage-ledger-sync"),
+            asyncio.create_task(self._ship_loop(), name="usage-ledger-ship"),
+        ]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Stop the background tasks, try a last delivery, and sync the log."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._dirty = self._has_pending = None
+
+        deadline = time.monotonic() + timeout
+        try:
+            while self._pending and time.monotonic() < deadline:
+                await asyncio.wait_for(self.ship_once(), timeout=max(deadline - time.monotonic(), 0.1))
+        except Exception as e:
+            logger.warning("[UsageLedger] %d records left for the next start: %s", len(self._pending), e)
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+        self._opened = False
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get ledger statistics."""
+        return {
+            "pending": len(self._pending),
+            "recorded": self._recorded,
+            "replayed": self._replayed,
+            "shipped": self._shipped,
+            "rejected": self._rejected,
+            "batches": self._batches,
+            "failures": self._failures,
+            "syncs": self._syncs,
+            "segments": len(self._segment_pending),
+            "last_error": self._last_error,
+        }
+
+
+# Singleton instance
+_usage_ledger: Optional[UsageLedger] = None
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Get the global usage ledger."""
+    global _usage_ledger
+    if _usage_ledger is None:
+        _usage_ledger = UsageLedger(
+            wal_dir=settings.USAGE_LEDGER_DIR,
+            endpoint=f"{settings.FRONTEND_URL}/api/usage/log",
+            batch_size=settings.USAGE_LEDGER_BATCH_SIZE,
+            fsync_interval=settings.USAGE_LEDGER_FSYNC_INTERVAL,
+            ship_interval=settings.USAGE_LEDGER_SHIP_INTERVAL,
+            max_backoff=settings.USAGE_LEDGER_MAX_BACKOFF,
+        )
+    return _usage_ledger
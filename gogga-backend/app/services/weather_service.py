@@ -9,6 +9,8 @@ import httpx
 from typing import Any
 from dataclasses import dataclass
 
+from app.services.tool_result_cache import cached_tool_call
+
 logger = logging.getLogger(__name__)
 
 # Open-Meteo API (free, no API key needed)
@@ -207,8 +209,12 @@ async def handle_weather_tool_call(location: str) -> dict[str, Any]:
         }
     
     try:
-        # Fetch weather
-        data = await fetch_weather(loc.lat, loc.lon)
+        # Fetch weather (cached per location; forecasts change slowly)
+        data = await cached_tool_call(
+            "weather",
+            {"lat": loc.lat, "lon": loc.lon},
+            lambda: fetch_weather(loc.lat, loc.lon),
+        )
         
         # Format for AI text response
         text_response = format_weather_for_ai(data, loc.name)
@@ -4,6 +4,8 @@ Gogga Document Classifier - Multi-dimensional Document Classification
 Classifies document requests using:
 - Weighted trigger matching for domain detection
 - Pattern matching for intent detection
+- Trigger lookups served from the shared single-pass text features
+  (core/text_features.py); short triggers like 'nca' or 'cv' must start a word
 - Multi-factor complexity assessment
 - Automatic 235B routing for African languages and complex requests
 """
@@ -13,6 +15,7 @@ from __future__ import annotations
 import re
 from typing import ClassVar
 
+from app.core.text_features import TextFeatures, extract_features, register_vocabulary
 from app.tools.document_definitions import (
     DocumentComplexity,
     DocumentDomain,
@@ -154,6 +157,12 @@ class DocumentClassifier:
         ),
     }
 
+    # Compiled once per intent (all patterns of an intent OR-ed together)
+    INTENT_REGEX: ClassVar[dict[DocumentIntent, re.Pattern]] = {
+        intent: re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+        for intent, patterns in INTENT_PATTERNS.items()
+    }
+
     # =========================================================================
     # 235B MANDATORY TRIGGERS
     # =========================================================================
@@ -244,23 +253,23 @@ class DocumentClassifier:
         Returns:
             Immutable DocumentProfile with all classification details
         """
-        content_lower = content.lower()
+        features = extract_features(content)
         
         # Step 1: Domain detection with weighted scoring
-        domain, confidence, triggers = cls._detect_domain(content_lower)
+        domain, confidence, triggers = cls._detect_domain(features)
         
         # Step 2: Intent detection
-        intent = cls._detect_intent(content_lower)
+        intent = cls._detect_intent(features)
         
         # Step 3: Complexity assessment
-        complexity = cls._assess_complexity(content_lower, domain, language_code)
+        complexity = cls._assess_complexity(features, domain, language_code)
         
         # Step 4: Specific document type
-        doc_type = cls._infer_document_type(content_lower, domain)
+        doc_type = cls._infer_document_type(features, domain)
         
         # Step 5: 235B requirement check
         requires_235b = cls._check_235b_requirement(
-            content_lower, complexity, language_code
+            features, complexity, language_code
         )
         
         # Step 6: Reasoning mode determination
@@ -280,7 +289,7 @@ class DocumentClassifier:
 
     @classmethod
     def _detect_domain(
-        cls, content: str
+        cls, features: TextFeatures
     ) -> tuple[DocumentDomain, float, list[str]]:
         """Detect domain using weighted trigger matching"""
         scores: dict[DocumentDomain, float] = {}
@@ -290,7 +299,7 @@ class DocumentClassifier:
             score = 0.0
             matches: list[str] = []
             for trigger, weight in triggers.items():
-                if trigger in content:
+                if trigger in features.hits and features.has(trigger):
                     score += weight
                     matches.append(trigger)
             if score > 0:
@@ -307,23 +316,22 @@ class DocumentClassifier:
         return best_domain, confidence, matched.get(best_domain, [])
 
     @classmethod
-    def _detect_intent(cls, content: str) -> DocumentIntent:
+    def _detect_intent(cls, features: TextFeatures) -> DocumentIntent:
         """Detect user intent from patterns"""
-        for intent, patterns in cls.INTENT_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, content, re.IGNORECASE):
-                    return intent
+        for intent, regex in cls.INTENT_REGEX.items():
+            if features.search(regex):
+                return intent
         return DocumentIntent.CREATE
 
     @classmethod
     def _assess_complexity(
-        cls, content: str, domain: DocumentDomain, language: str
+        cls, features: TextFeatures, domain: DocumentDomain, language: str
     ) -> DocumentComplexity:
         """Assess complexity from multiple factors"""
         
         # Check explicit hints
         for complexity, hints in cls.COMPLEXITY_HINTS.items():
-            if any(hint in content for hint in hints):
+            if any(features.has(hint) for hint in hints):
                 return complexity
         
         # Domain-based defaults for high-stakes
@@ -338,22 +346,22 @@ class DocumentClassifier:
         return DocumentComplexity.SIMPLE
 
     @classmethod
-    def _infer_document_type(cls, content: str, domain: DocumentDomain) -> str:
+    def _infer_document_type(cls, features: TextFeatures, domain: DocumentDomain) -> str:
         """Infer specific document type within domain"""
         patterns = cls.DOCUMENT_TYPE_PATTERNS.get(domain, {})
         for doc_type, triggers in patterns.items():
-            if any(t in content for t in triggers):
+            if any(features.has(t) for t in triggers):
                 return doc_type
         return "general"
 
     @classmethod
     def _check_235b_requirement(
-        cls, content: str, complexity: DocumentComplexity, language: str
+        cls, features: TextFeatures, complexity: DocumentComplexity, language: str
     ) -> bool:
         """Determine if 235B model is required"""
         
         # Mandatory triggers always require 235B
-        if any(trigger in content for trigger in cls.MANDATORY_235B):
+        if features.any("document.mandatory_235b"):
             return True
         
         # African languages require 235B for quality
@@ -385,3 +393,24 @@ class DocumentClassifier:
             return True
         
         return False
+
+
+# Register trigger vocabularies with the shared text feature automaton
+register_vocabulary(
+    "document.domain",
+    (t for triggers in DocumentClassifier.DOMAIN_TRIGGERS.values() for t in triggers),
+)
+register_vocabulary("document.mandatory_235b", DocumentClassifier.MANDATORY_235B)
+register_vocabulary(
+    "document.complexity",
+    (h for hints in DocumentClassifier.COMPLEXITY_HINTS.values() for h in hints),
+)
+register_vocabulary(
+    "document.type",
+    (
+        t
+        for patterns in DocumentClassifier.DOCUMENT_TYPE_PATTERNS.values()
+        for triggers in patterns.values()
+        for t in triggers
+    ),
+)
@@ -651,6 +651,17 @@ def execute_create_chart(
 # Math Tool Execution
 # =============================================================================
 
+# Pure functions of their arguments (and tier), safe to serve from cache
+CACHEABLE_MATH_TOOLS = {
+    "math_statistics",
+    "math_financial",
+    "math_sa_tax",
+    "math_probability",
+    "math_conversion",
+    "math_fraud_analysis",
+}
+
+
 async def execute_math_tool(
     tool_name: str,
     arguments: dict[str, Any],
@@ -659,6 +670,9 @@ async def execute_math_tool(
     """
     Execute a math tool using MathService.
     
+    Deterministic tools (CACHEABLE_MATH_TOOLS) go through the tool result
+    cache; python_execute, sequential_think and math_delegate always run.
+    
     Args:
         tool_name: Name of the math tool (math_statistics, math_financial, etc.)
         arguments: Tool arguments
@@ -667,6 +681,57 @@ async def execute_math_tool(
     Returns:
         Tool execution result with display_type for frontend rendering
     """
+    if tool_name in CACHEABLE_MATH_TOOLS:
+        from app.services.tool_result_cache import cached_tool_call
+
+        async def run() -> dict[str, Any]:
+            return _math_result_dict(await _run_math_tool(tool_name, arguments, tier))
+
+        return await cached_tool_call(
+            tool_name,
+            {"arguments": arguments, "tier": tier.lower()},
+            run,
+        )
+    return _math_result_dict(await _run_math_tool(tool_name, arguments, tier))
+
+
+def _plain(value: Any) -> Any:
+    """Recursively convert numpy scalars/arrays to JSON-native values."""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if hasattr(value, "tolist"):  # numpy scalar or array
+        return value.tolist()
+    return value
+
+
+def _math_result_dict(result: Any) -> Any:
+    """
+    MathResult -> plain dict (the shape the tools endpoint renders).
+
+    MathService returns dataclasses; callers and the JSON tool cache need
+    dicts, otherwise a cached hit comes back as the dataclass repr string.
+    """
+    from app.services.math_service import MathResult
+
+    if not isinstance(result, MathResult):
+        return result
+    return {
+        "type": "math",  # Required for frontend to render MathResultDisplay
+        "success": result.success,
+        "data": _plain(result.data),
+        "display_type": result.display_type,
+        "error": result.error,
+    }
+
+
+async def _run_math_tool(
+    tool_name: str,
+    arguments: dict[str, Any],
+    tier: str
+) -> dict[str, Any]:
+    """Run a math tool (uncached)."""
     from app.services.math_service import get_math_service
     
     service = get_math_service()
@@ -4,15 +4,94 @@ GOGGA Search Tool Executor - Handles search tool calls from AI
 This module executes search tool calls from the AI and returns
 formatted results ready for LLM context injection.
 """
+import asyncio
 import logging
 from typing import Any
 
+from app.services.legal_corpus import LegalSearchResult, get_legal_corpus
 from app.services.search_service import get_search_service, SearchResponse
+from app.services.tool_result_cache import cached_tool_call
 from app.tools.search_definitions import parse_time_filter
 
 logger = logging.getLogger(__name__)
 
 
+# -----------------------------------------------------------------------------
+# search() arguments per tool (shared by the executors and the fan-out planner)
+# -----------------------------------------------------------------------------
+
+def web_search_params(
+    query: str,
+    num_results: int = 5,
+    time_filter: str = "any",
+    scrape_content: bool = True,
+    language: str = "en",
+) -> dict[str, Any]:
+    return {
+        "query": query,
+        "num_results": min(num_results, 10),
+        "time_filter": parse_time_filter(time_filter),
+        "scrape_pages": scrape_content,
+        "language": language,
+    }
+
+
+def legal_search_params(
+    query: str,
+    case_law: bool = True,
+    legislation: bool = True,
+    time_filter: str = "any",
+) -> dict[str, Any]:
+    # Enhance query for legal context
+    enhanced_query = query
+    
+    # Add site filters for SA legal sources
+    legal_sites = []
+    if case_law:
+        legal_sites.extend([
+            "saflii.org",
+            "lawlibrary.org.za",
+            "justice.gov.za",
+            "ccma.org.za",
+        ])
+    if legislation:
+        legal_sites.extend([
+            "gov.za",
+            "parliament.gov.za",
+        ])
+    
+    # Build site-restricted query
+    if legal_sites:
+        site_filter = " OR ".join(f"site:{s}" for s in legal_sites[:3])
+        enhanced_query = f"{query} ({site_filter})"
+    
+    return {
+        "query": enhanced_query,
+        "num_results": 8,  # More results for legal research
+        "time_filter": parse_time_filter(time_filter),
+        "scrape_pages": True,
+        "language": "en",
+    }
+
+
+def shopping_search_params(query: str, num_results: int = 5) -> dict[str, Any]:
+    # Enhance query for shopping context
+    return {
+        "query": f"{query} price South Africa ZAR buy",
+        "num_results": min(num_results, 10),
+        "time_filter": parse_time_filter("month"),  # Recent prices only
+        "scrape_pages": True,
+        "language": "en",
+    }
+
+
+SEARCH_PARAM_BUILDERS = {
+    "web_search": web_search_params,
+    "legal_search": legal_search_params,
+    "shopping_search": shopping_search_params,
+}
+
+
 async def execute_web_search(
     query: str,
     num_results: int = 5,
@@ -36,13 +115,9 @@ async def execute_web_search(
     service = get_search_service()
     
     try:
-        response = await service.search(
-            query=query,
-            num_results=min(num_results, 10),
-            time_filter=parse_time_filter(time_filter),
-            scrape_pages=scrape_content,
-            language=language,
-        )
+        response = await service.search(**web_search_params(
+            query, num_results, time_filter, scrape_content, language,
+        ))
         
         # Format for LLM
         context = service.format_for_llm(response, include_full_content=scrape_content)
@@ -54,6 +129,7 @@ async def execute_web_search(
             "search_time_ms": response.search_time_ms,
             "scrape_time_ms": response.scrape_time_ms,
             "cached": response.cached,
+            "stale": response.metadata.get("stale", False),
             "credits_used": response.credits_used,
         }
         
@@ -71,49 +147,31 @@ async def execute_legal_search(
     case_law: bool = True,
     legislation: bool = True,
     time_filter: str = "any",
+    local: LegalSearchResult | None = None,
 ) -> dict[str, Any]:
     """
     Execute legal search tool call.
     
-    Enhances the query with SA legal context and searches
-    legal databases and resources.
-    """
-    service = get_search_service()
-    
-    # Enhance query for legal context
-    enhanced_query = query
+    Legislation questions are answered from the local SA legislation
+    index when it covers the query well; otherwise the query is
+    enhanced with SA legal context and searched on the web (legal
+    databases and resources).
     
-    # Add site filters for SA legal sources
-    legal_sites = []
-    if case_law:
-        legal_sites.extend([
-            "saflii.org",
-            "lawlibrary.org.za",
-            "justice.gov.za",
-            "ccma.org.za",
-        ])
-    if legislation:
-        legal_sites.extend([
-            "gov.za",
-            "parliament.gov.za",
-        ])
+    local is the index lookup for this query if the caller already did
+    it (execute_search_tools plans with it), so it isn't queried twice.
+    """
+    if local is None and legislation:
+        local = await _search_local_legislation(query)
+    if local is not None and local.strong:
+        return _local_legal_result(local)
     
-    # Build site-restricted query
-    if legal_sites:
-        site_filter = " OR ".join(f"site:{s}" for s in legal_sites[:3])
-        enhanced_query = f"{query} ({site_filter})"
+    service = get_search_service()
     
     try:
-        response = await service.search(
-            query=enhanced_query,
-            num_results=8,  # More results for legal research
-            time_filter=parse_time_filter(time_filter),
-            scrape_pages=True,
-            language="en",
-        )
+        response = await service.search(**legal_search_params(query, case_law, legislation, time_filter))
         
-        # Format with legal context header
-        context = service.format_for_llm(response, include_full_content=True)
+        # Format with legal context header (rank passages against the user's query, not the site filters)
+        context = service.format_for_llm(response, include_full_content=True, query=query)
         context = context.replace(
             "[WEB SEARCH RESULTS]",
             "[SA LEGAL SEARCH RESULTS]\nNote: These are search results, not legal advice. Verify with official sources."
@@ -125,10 +183,14 @@ async def execute_legal_search(
             "results_count": response.total_results,
             "search_time_ms": response.search_time_ms,
             "cached": response.cached,
+            "stale": response.metadata.get("stale", False),
         }
         
     except Exception as e:
         logger.error(f"Legal search failed: {e}")
+        if local is not None and local.sections:
+            # Weak local matches beat no answer at all
+            return _local_legal_result(local)
         return {
             "success": False,
             "error": str(e),
@@ -136,6 +198,26 @@ async def execute_legal_search(
         }
 
 
+async def _search_local_legislation(query: str) -> LegalSearchResult | None:
+    try:
+        return await get_legal_corpus().search_async(query)
+    except Exception as e:
+        logger.warning(f"Local legislation index unavailable: {e}")
+        return None
+
+
+def _local_legal_result(local: LegalSearchResult) -> dict[str, Any]:
+    return {
+        "success": True,
+        "context": local.format_for_llm(),
+        "results_count": len(local.sections),
+        "search_time_ms": local.elapsed_ms,
+        "cached": False,
+        "stale": False,
+        "source": "local",
+    }
+
+
 async def execute_shopping_search(
     query: str,
     num_results: int = 5,
@@ -147,20 +229,11 @@ async def execute_shopping_search(
     """
     service = get_search_service()
     
-    # Enhance query for shopping context
-    shopping_query = f"{query} price South Africa ZAR buy"
-    
     try:
-        response = await service.search(
-            query=shopping_query,
-            num_results=min(num_results, 10),
-            time_filter=parse_time_filter("month"),  # Recent prices only
-            scrape_pages=True,
-            language="en",
-        )
+        response = await service.search(**shopping_search_params(query, num_results))
         
         # Format with shopping context
-        context = service.format_for_llm(response, include_full_content=True)
+        context = service.format_for_llm(response, include_full_content=True, query=query)
         context = context.replace(
             "[WEB SEARCH RESULTS]",
             "[SA SHOPPING RESULTS]\nNote: Prices may have changed. Check retailer sites for current pricing."
@@ -172,6 +245,7 @@ async def execute_shopping_search(
             "results_count": response.total_results,
             "search_time_ms": response.search_time_ms,
             "cached": response.cached,
+            "stale": response.metadata.get("stale", False),
         }
         
     except Exception as e:
@@ -229,13 +303,19 @@ ALL_SEARCH_TOOL_NAMES = {"web_search", "legal_search", "shopping_search", "place
 async def execute_search_tool(
     tool_name: str,
     arguments: dict[str, Any],
+    planned: dict[str, Any] | None = None,
 ) -> dict[str, Any]:
     """
     Execute any search tool by name.
     
+    Results go through the tool result cache, so identical concurrent
+    calls share one Serper request.
+    
     Args:
         tool_name: Name of the tool (web_search, legal_search, shopping_search, places_search)
         arguments: Tool arguments
+        planned: Extra executor arguments worked out while planning
+            (not part of the cache key)
         
     Returns:
         Tool execution result
@@ -255,4 +335,56 @@ async def execute_search_tool(
             "context": f"[Error: Unknown tool '{tool_name}']",
         }
     
-    return await executor(**arguments)
+    return await cached_tool_call(tool_name, arguments, lambda: executor(**arguments, **(planned or {})))
+
+
+async def execute_search_tools(calls: list[tuple[str, dict[str, Any]]]) -> list[dict[str, Any]]:
+    """
+    Execute several search tool calls from one turn together.
+    
+    The web, legal and shopping searches are planned first: one
+    search_many() fan-out sends them to Serper as a batch, scrapes every
+    unique URL once and caches a response per query. Legal searches the
+    local legislation index answers are left out of the fan-out, and the
+    index lookup is handed to the legal executor rather than repeated.
+    Each call then runs through execute_search_tool() as usual and is
+    formatted from that response (or from the tool cache).
+    
+    Args:
+        calls: (tool_name, arguments) per tool call
+        
+    Returns:
+        One tool result per call, in order (failures as error results)
+    """
+    requests = []
+    planned: list[dict[str, Any] | None] = [None] * len(calls)
+    for i, (tool_name, arguments) in enumerate(calls):
+        builder = SEARCH_PARAM_BUILDERS.get(tool_name)
+        if builder is None:
+            continue
+        if tool_name == "legal_search" and arguments.get("legislation", True):
+            local = await _search_local_legislation(arguments.get("query", ""))
+            if local is not None:
+                planned[i] = {"local": local}
+            if local is not None and local.strong:
+                continue  # Answered from the local legislation index
+        try:
+            requests.append(builder(**arguments))
+        except TypeError:
+            continue  # Bad arguments; the executor reports them
+    
+    if len(requests) > 1:
+        try:
+            await get_search_service().search_many(requests)
+        except Exception as e:
+            logger.warning(f"Search fan-out failed, running calls individually: {e}")
+    
+    results = await asyncio.gather(
+        *(execute_search_tool(tool_name, arguments, planned[i]) for i, (tool_name, arguments) in enumerate(calls)),
+        return_exceptions=True,
+    )
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error(f"Search tool {calls[i][0]} failed: {result}")
+            results[i] = {"success": False, "error": str(result), "context": f"[Search failed: {str(result)}]"}
+    return results
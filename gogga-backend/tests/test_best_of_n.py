@@ -0,0 +1,237 @@
+"""
+Tests for GOGGA Best-of-N (in-process parallel sampling, early stopping)
+
+Run with: pytest tests/test_best_of_n.py -v
+Benchmark: pytest tests/test_best_of_n.py -v -s -m slow
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.best_of_n import (
+    BestOfNOrchestrator,
+    answer_similarity,
+    repetition_ratio,
+)
+
+
+def completion(content: str, finish_reason: str = "stop", prompt: int = 100, output: int = 50):
+    """Minimal OpenAI-compatible completion."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+        usage=SimpleNamespace(prompt_tokens=prompt, completion_tokens=output),
+    )
+
+
+def scripted(answers: list[tuple[float, str]] | list[tuple[float, str, str]]):
+    """Sampler returning answers[i] (after a delay) for the i-th call."""
+    calls = {"n": 0, "cancelled": 0}
+
+    async def sampler(temperature: float):
+        i = calls["n"]
+        calls["n"] += 1
+        delay, content, *rest = answers[i]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            calls["cancelled"] += 1
+            raise
+        if content is None:
+            raise RuntimeError("rate limited")
+        return completion(content, *rest)
+
+    return sampler, calls
+
+
+class TestLocalChecks:
+
+    def test_matching_final_number_needs_matching_context(self):
+        assert answer_similarity("So the VAT is R1,500", "The VAT is 1500") == 1.0
+        assert answer_similarity("391", "391") == 1.0
+        # Same number, different answer: not enough to stop early
+        assert answer_similarity("The Act was signed in 1996", "Eskom was restructured in 1996") < 0.6
+        # Different number keeps near-identical wording apart
+        assert answer_similarity("The total is 391", "The total is 390") == 0.5
+
+    def test_word_overlap(self):
+        assert answer_similarity("the quick brown fox", "the quick brown fox") == 1.0
+        assert answer_similarity("load shedding stage six", "braai with friends") == 0.0
+
+    def test_repetition(self):
+        assert repetition_ratio("a\nb\nc") == 0.0
+        assert repetition_ratio("same\nsame\nsame\nsame") == 0.75
+
+
+class TestChooseN:
+
+    def test_easy_prompt_is_single_call(self):
+        assert BestOfNOrchestrator(max_n=3).choose_n("hi", is_complex=False) == 1
+
+    def test_complex_prompt_gets_max_n(self):
+        assert BestOfNOrchestrator(max_n=3).choose_n("x" * 200, is_complex=True) == 3
+
+    def test_short_complex_prompt_gets_two(self):
+        assert BestOfNOrchestrator(max_n=3).choose_n("What is 17 * 23?", is_complex=True) == 2
+
+    def test_high_load_collapses_to_one(self):
+        orchestrator = BestOfNOrchestrator(max_n=3, max_inflight=4)
+        orchestrator._inflight = 3
+        assert orchestrator.choose_n("x" * 200, is_complex=True) == 1
+
+
+class TestRun:
+
+    async def test_early_stop_leaves_slow_candidate_accounted(self):
+        release = asyncio.Event()
+        sampler, calls = scripted([
+            (0.01, "The answer is 391."),
+            (0.02, "17 x 23 = 391, so the answer is 391"),
+            (0.0, "Something else entirely"),
+        ])
+
+        async def gated(temperature: float):
+            if calls["n"] == 2:
+                await release.wait()  # A threaded SDK call we can't interrupt
+            return await sampler(temperature)
+
+        orchestrator = BestOfNOrchestrator()
+        result = await orchestrator.run(gated, n=3, temperature=0.6)
+        assert result.early_stopped
+        assert result.completed == 2
+        # Only finished candidates are billed to the request
+        assert (result.input_tokens, result.output_tokens) == (200, 100)
+        # The straggler still counts against load until its call returns
+        assert orchestrator._inflight == 1
+        assert orchestrator.get_stats()["abandoned_running"] == 1
+
+        release.set()
+        for _ in range(100):
+            if orchestrator._inflight == 0:
+                break
+            await asyncio.sleep(0.001)
+        stats = orchestrator.get_stats()
+        assert orchestrator._inflight == 0 and calls["cancelled"] == 0
+        assert stats["candidates_abandoned"] == 1 and stats["abandoned_running"] == 0
+        assert stats["abandoned_tokens"] == {"input": 100, "output": 50}
+
+    async def test_winner_avoids_truncated_and_repetitive(self):
+        sampler, _ = scripted([
+            (0.01, "Stage 4 means 4 hours off.\nStage 4 means 4 hours off.\nStage 4 means 4 hours off."),
+            (0.01, "Stage 4 rotates blocks so each area loses about four hours daily.", "length"),
+            (0.01, "Under stage 4 each area loses roughly four hours per day in rotating blocks."),
+        ])
+        result = await BestOfNOrchestrator(agreement_threshold=1.1).run(sampler, n=3, temperature=0.6)
+        assert not result.early_stopped
+        assert "roughly four hours" in result.response.choices[0].message.content
+
+    async def test_failed_candidates_are_tolerated(self):
+        sampler, _ = scripted([(0.01, None), (0.01, "Yebo, 42.")])
+        result = await BestOfNOrchestrator().run(sampler, n=2, temperature=0.6)
+        assert result.completed == 1
+        assert result.response.choices[0].message.content == "Yebo, 42."
+
+    async def test_all_failed_raises(self):
+        sampler, _ = scripted([(0.0, None), (0.0, None)])
+        with pytest.raises(RuntimeError):
+            await BestOfNOrchestrator().run(sampler, n=2, temperature=0.6)
+
+    async def test_temperatures_are_spread(self):
+        seen = []
+
+        async def sampler(temperature: float):
+            seen.append(temperature)
+            return completion("same answer")
+
+        await BestOfNOrchestrator().run(sampler, n=3, temperature=0.6)
+        assert sorted(round(t, 2) for t in seen) == [0.6, 0.7, 0.8]
+
+
+class TestCerebrasIntegration:
+    """Best-of-N on the production path: generate_response with tools enabled."""
+
+    PROMPT = "Explain how the Consumer Protection Act applies to a defective fridge bought on credit " * 2
+
+    @pytest.fixture
+    def paid_user(self, tmp_path, monkeypatch):
+        """JIGGA subscriber with room left; settlements stay in a local ledger."""
+        from app.services import credit_reservations
+        from app.services.credit_reservations import CreditReservations
+        from app.services.credit_service import CreditService, UsageState
+        from app.services.usage_ledger import UsageLedger
+
+        state = UsageState("JIGGA", 0, 0, 0, 0, 0, 0, 0.0, 0)
+        monkeypatch.setattr(CreditService, "get_user_state", AsyncMock(return_value=state))
+        ledger = UsageLedger(tmp_path / "wal", "http://frontend.invalid/api/internal/deduct-usage")
+        monkeypatch.setattr(credit_reservations, "_credit_reservations", CreditReservations(ledger))
+
+    async def generate(self, sample: AsyncMock, track: AsyncMock) -> dict:
+        from app.core.router import UserTier
+        from app.services import ai_service as ai_module
+
+        with patch.object(ai_module.AIService, "_sample_cerebras", sample), \
+             patch.object(ai_module, "track_usage", track), \
+             patch.object(ai_module, "get_best_of_n", return_value=BestOfNOrchestrator(max_n=3)):
+            return await ai_module.AIService.generate_response("u1", self.PROMPT, user_tier=UserTier.JIGGA)
+
+    async def test_complex_request_uses_best_of_n(self, paid_user):
+        sample = AsyncMock(side_effect=[
+            completion("<think>plan</think>Section 12 applies.", output=80),
+            completion("<think>plan</think>Section 12 applies here.", output=90),
+            completion("<think>plan</think>Section 12 applies, see above.", output=70),
+        ])
+        track = AsyncMock(return_value={"usd": 0.0, "zar": 0.0})
+        result = await self.generate(sample, track)
+
+        assert result["meta"]["best_of_n"]["n"] == 3
+        assert result["meta"]["provider"] == "cerebras"
+        assert result["thinking"] == "plan"
+        # Candidates carry the tier's tools
+        assert sample.call_args.args[0]["tools"]
+        # Every completed candidate is billed
+        completed = result["meta"]["best_of_n"]["completed"]
+        assert track.call_args.kwargs["output_tokens"] == {2: 170, 3: 240}[completed]
+
+    async def test_tool_call_candidate_is_the_single_call(self, paid_user):
+        tool_call = SimpleNamespace(
+            id="call_1", function=SimpleNamespace(name="generate_image", arguments='{"prompt": "fridge"}'),
+        )
+        wants_tool = completion("")
+        wants_tool.choices[0].message.tool_calls = [tool_call]
+        sample = AsyncMock(side_effect=[
+            wants_tool,
+            completion("Section 12 applies."),
+            completion("Section 12 applies here."),
+        ])
+        result = await self.generate(sample, AsyncMock(return_value={"usd": 0.0, "zar": 0.0}))
+
+        assert result["meta"]["best_of_n"]["tool_call"] is True
+        assert result["tool_calls"] == [{"id": "call_1", "name": "generate_image", "arguments": {"prompt": "fridge"}}]
+
+
+@pytest.mark.slow
+class TestBestOfNBenchmark:
+    """Latency: concurrent early-stopping vs sequential sampling."""
+
+    async def test_concurrent_vs_sequential(self):
+        delays = [0.05, 0.06, 0.30]
+
+        async def sequential():
+            for delay in delays:
+                await asyncio.sleep(delay)
+
+        start = time.perf_counter()
+        await sequential()
+        sequential_ms = (time.perf_counter() - start) * 1000
+
+        sampler, _ = scripted([(d, "Answer: 391") for d in delays])
+        start = time.perf_counter()
+        result = await BestOfNOrchestrator().run(sampler, n=3, temperature=0.6)
+        concurrent_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n   N=3 | sequential: {sequential_ms:.0f}ms | concurrent+early stop: {concurrent_ms:.0f}ms"
+              f" (single call ~{delays[0] * 1000:.0f}ms)")
+        assert result.early_stopped
+        assert concurrent_ms < sequential_ms / 3
@@ -0,0 +1,253 @@
+"""
+Tests for GOGGA Chat Preflight (concurrent subscription/credit checks and local stages)
+
+Run with: pytest tests/test_chat_preflight.py -v
+Benchmark: pytest tests/test_chat_preflight.py -v -s -m slow
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.router import CognitiveLayer, UserTier, tier_router
+from app.services import ai_service as ai_module
+from app.services import entitlement_cache
+from app.services.chat_preflight import Preflight, run_chat_preflight
+from app.services.credit_service import CreditService, DeductionSource
+from app.services.entitlement_cache import EntitlementCache
+from app.services.subscription_service import subscription_service
+
+LOOKUP_SECONDS = 0.05
+PLUGIN_SECONDS = 0.04
+
+
+class StubFrontend:
+    """Subscription and user-usage endpoints that answer once the gate opens (after delay)."""
+
+    def __init__(self, status: str = "active", credits: int = 500, usage: dict | None = None):
+        self.subscription = {"tier": "JIGGA", "status": status, "credits": {"available": credits},
+                             "images": {"limit": 200, "used": 0}}
+        self.usage = usage or {"tier": "JIGGA", "creditBalance": credits, "usageChatTokens": 0}
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.delay = 0.0
+        self.events: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        try:
+            await self.gate.wait()
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(request.url.path)
+            raise
+        self.events.append(f"answered {request.url.path}")
+        if request.url.path == "/api/subscription":
+            return httpx.Response(200, json=self.subscription)
+        return httpx.Response(200, json=self.usage)
+
+
+@pytest.fixture
+def frontend(monkeypatch):
+    frontend = StubFrontend()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(frontend.handler))
+    monkeypatch.setattr(CreditService, "_client", client)
+    monkeypatch.setattr(subscription_service, "_client", client)
+    monkeypatch.setattr(entitlement_cache, "_entitlement_cache", EntitlementCache())
+    return frontend
+
+
+class TestPreflight:
+
+    @pytest.mark.asyncio
+    async def test_io_overlaps_local_work(self):
+        events = []
+        release = asyncio.Event()
+
+        async def lookup():
+            events.append("lookup started")
+            await release.wait()
+            events.append("lookup finished")
+            return "ok"
+
+        def cpu():
+            events.append("cpu")
+            release.set()
+
+        async with Preflight() as preflight:
+            preflight.start("lookup", lookup())
+            await preflight.run("cpu", cpu)
+            results = await asyncio.wait_for(preflight.finish(), 5)
+        assert results == {"lookup": "ok"}
+        assert events == ["lookup started", "cpu", "lookup finished"]
+        assert set(preflight.timings) == {"lookup", "cpu", "total"}
+
+    @pytest.mark.asyncio
+    async def test_first_rejection_cancels_the_rest(self):
+        events = []
+
+        async def lookup():
+            try:
+                await asyncio.Event().wait()  # Never answers
+            except asyncio.CancelledError:
+                events.append("lookup cancelled")
+                raise
+
+        async def reject():
+            await asyncio.sleep(0)
+            events.append("history rejected")
+            raise HTTPException(status_code=409, detail="conflict")
+
+        with pytest.raises(HTTPException):
+            async with Preflight() as preflight:
+                preflight.start("lookup", lookup())
+                preflight.start("history", reject())
+                await asyncio.wait_for(preflight.finish(), 5)
+        await asyncio.sleep(0)
+        assert events == ["history rejected", "lookup cancelled"]
+
+    @pytest.mark.asyncio
+    async def test_local_stage_fails_fast_after_rejection(self):
+        async def reject():
+            raise ValueError("bad")
+
+        ran = []
+        with pytest.raises(ValueError):
+            async with Preflight() as preflight:
+                preflight.start("check", reject())
+                await asyncio.sleep(0)
+                await preflight.run("cpu", ran.append, 1)
+        assert ran == []
+
+
+class TestChatPreflight:
+
+    @pytest.mark.asyncio
+    async def test_plugins_run_while_frontend_lookups_are_in_flight(self, frontend):
+        """The frontend only answers after the plugins ran: a serial preflight would never finish."""
+        frontend.gate.clear()
+
+        async def plugins(request):
+            frontend.events.append("plugins")
+            frontend.gate.set()
+            request["metadata"]["language_intelligence"] = {"code": "zu", "name": "isiZulu"}
+            return request
+
+        with patch.object(ai_module, "run_plugins_before_request", plugins):
+            result = await asyncio.wait_for(run_chat_preflight(
+                "u1", "Sawubona, ngicela usizo ngentela yami.", UserTier.JIGGA, user_email="thabo@example.co.za",
+            ), 5)
+
+        assert result.tier == UserTier.JIGGA and result.deduction_source == DeductionSource.SUBSCRIPTION
+        assert result.language_intelligence["code"] == "zu"
+        assert frontend.events[0] == "plugins"
+        assert sorted(frontend.events[1:]) == ["answered /api/internal/user-usage/u1", "answered /api/subscription"]
+        assert {"subscription", "credits", "plugins", "intent", "total"} <= set(result.timings)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_subscription_reclassifies_for_free(self, frontend):
+        frontend.subscription["status"] = "cancelled"
+        result = await run_chat_preflight("u1", "Explain section 25 of the Constitution in depth",
+                                          UserTier.JIGGA, user_email="thabo@example.co.za")
+        assert result.verified_tier == result.tier == UserTier.FREE
+        assert result.layer == CognitiveLayer.FREE_TEXT
+        assert result.request["user_tier"] == result.request["metadata"]["user_tier"] == "free"
+
+    @pytest.mark.asyncio
+    async def test_exhausted_credits_fall_back_to_free_but_bill_verified_tier(self, frontend):
+        frontend.usage = {"tier": "JIVE", "creditBalance": 0, "usageChatTokens": 10**12}
+        result = await run_chat_preflight("u1", "Hello", UserTier.JIVE)
+        assert result.subscription is None  # No email: nothing to verify
+        assert result.verified_tier == UserTier.JIVE
+        assert result.tier == UserTier.FREE and result.deduction_source == DeductionSource.FREE
+
+    @pytest.mark.asyncio
+    async def test_history_conflict_short_circuits_frontend_lookups(self, frontend):
+        async def conflict():
+            raise HTTPException(status_code=409, detail="stale")
+
+        frontend.gate.clear()  # Lookups never answer: the conflict alone must end the preflight
+        with pytest.raises(HTTPException) as exc:
+            await asyncio.wait_for(run_chat_preflight(
+                "u1", "Next", UserTier.JIGGA, history=conflict(), user_email="thabo@example.co.za",
+            ), 5)
+        assert exc.value.status_code == 409
+        await asyncio.sleep(0)
+        assert frontend.events == []
+        assert sorted(frontend.cancelled) == ["/api/internal/user-usage/u1", "/api/subscription"]
+
+
+class TestChatEndpoint:
+
+    @pytest.mark.asyncio
+    async def test_chat_passes_preflight_and_reports_timings(self, frontend):
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        generate = AsyncMock(return_value={"response": "Yebo", "meta": {}})
+        with patch.object(chat_endpoint.ai_service, "generate_response", generate), \
+             patch.object(chat_endpoint.posthog_service, "track_chat_message"):
+            response = await chat_endpoint.chat(TieredChatRequest(
+                message="Sawubona", user_id="u1", user_tier=UserTier.JIGGA,
+                user_email="thabo@example.co.za",
+            ))
+
+        preflight = generate.call_args.kwargs["preflight"]
+        assert generate.call_args.kwargs["user_tier"] == preflight.verified_tier == UserTier.JIGGA
+        assert response.meta["preflight_ms"] is preflight.timings
+        assert {"subscription", "credits", "total"} <= set(response.meta["preflight_ms"])
+
+    @pytest.mark.asyncio
+    async def test_paid_user_without_credits_gets_truncation_not_map_reduce(self, frontend):
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        frontend.usage = {"tier": "JIVE", "creditBalance": 0, "usageChatTokens": 10**12}
+        message = "Summarise this ledger.\n" + "".join(f"Row {i}: R{i * 7} paid to supplier {i}\n" for i in range(2000))
+        generate = AsyncMock(return_value={"response": "Yebo", "meta": {}})
+        long_doc = MagicMock()
+        with patch.object(chat_endpoint, "get_long_doc_qa", long_doc), \
+             patch.object(chat_endpoint.ai_service, "generate_response", generate), \
+             patch.object(chat_endpoint.posthog_service, "track_chat_message"):
+            await chat_endpoint.chat(TieredChatRequest(message=message, user_id="u1", user_tier=UserTier.JIVE))
+
+        long_doc.assert_not_called()
+        assert generate.call_args.kwargs["preflight"].tier == UserTier.FREE
+        assert "[DATA TRUNCATED" in generate.call_args.kwargs["message"]
+
+
+@pytest.mark.slow
+class TestPreflightBenchmark:
+    """TTFT: serial lookups (old order) vs the concurrent preflight, on a stubbed frontend."""
+
+    @pytest.mark.asyncio
+    async def test_ttft_improvement_against_stub_frontend(self, frontend):
+        frontend.delay = LOOKUP_SECONDS
+        message = "Sawubona, ngicela usizo ngentela yami."
+
+        async def slow_plugins(request):
+            """Language detection stand-in: blocks the loop like CPU work does."""
+            time.sleep(PLUGIN_SECONDS)
+            request["metadata"]["language_intelligence"] = {"code": "zu", "name": "isiZulu"}
+            return request
+
+        with patch.object(ai_module, "run_plugins_before_request", slow_plugins):
+            start = time.perf_counter()
+            await subscription_service.verify_subscription("thabo@example.co.za", UserTier.JIGGA)
+            await CreditService.get_user_state("u1")
+            await slow_plugins({"metadata": {}})
+            tier_router.classify_intent(message, UserTier.JIGGA, 0)
+            serial_ms = (time.perf_counter() - start) * 1000
+
+            entitlement_cache.get_entitlement_cache().clear()
+            start = time.perf_counter()
+            result = await run_chat_preflight("u1", message, UserTier.JIGGA, user_email="thabo@example.co.za")
+            concurrent_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n   {LOOKUP_SECONDS * 1000:.0f}ms lookups, {PLUGIN_SECONDS * 1000:.0f}ms plugins"
+              f" | serial: {serial_ms:.0f}ms | concurrent preflight: {concurrent_ms:.0f}ms | stages: {result.timings}")
+        assert result.tier == UserTier.JIGGA and result.language_intelligence["code"] == "zu"
+        assert concurrent_ms < serial_ms
@@ -0,0 +1,291 @@
+"""
+Tests for GOGGA Conversation Store (server-side conversation state)
+
+Run with: pytest tests/test_conversation_store.py -v
+Benchmark: pytest tests/test_conversation_store.py -v -s -m slow
+"""
+import json
+import time
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.conversation_store import (
+    ConversationOwnershipError,
+    ConversationStore,
+    ConversationVersionConflict,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Fresh file-backed store per test."""
+    s = ConversationStore(db_path=tmp_path / "conversations.db", cache_size=4, max_messages=6)
+    yield s
+    s.close()
+
+
+class TestResolveHistory:
+    """Delta reconstruction and version matching."""
+
+    async def test_new_conversation_starts_empty(self, store):
+        history, version = await store.resolve_history("c1", "u1", None, None)
+        assert history == []
+        assert version == 0
+
+    async def test_full_history_is_authoritative(self, store):
+        full = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+        history, version = await store.resolve_history("c1", "u1", 7, full)
+        assert history == full
+        assert version is None
+
+    async def test_delta_after_commit(self, store):
+        v1 = await store.commit_turn("c1", "u1", [], "Hello", "Howzit!")
+        assert v1 == 1
+        history, version = await store.resolve_history("c1", "u1", 1, None)
+        assert version == 1
+        assert history == [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Howzit!"},
+        ]
+
+    async def test_stale_version_conflicts(self, store):
+        await store.commit_turn("c1", "u1", [], "a", "b")
+        await store.commit_turn("c1", "u1", [], "c", "d")
+        with pytest.raises(ConversationVersionConflict) as exc:
+            await store.resolve_history("c1", "u1", 1, None)
+        assert exc.value.server_version == 2
+        assert exc.value.status_code == 409
+
+    async def test_unknown_conversation_with_version_conflicts(self, store):
+        with pytest.raises(ConversationVersionConflict) as exc:
+            await store.resolve_history("missing", "u1", 3, None)
+        assert exc.value.server_version is None
+
+    async def test_other_users_conversation_is_rejected(self, store):
+        await store.commit_turn("c1", "owner", [], "secret", "reply")
+        assert await store.get("c1", "intruder") is None
+        with pytest.raises(ConversationOwnershipError) as exc:
+            await store.resolve_history("c1", "intruder", 1, None)
+        assert exc.value.status_code == 403
+        with pytest.raises(ConversationOwnershipError):
+            await store.resolve_history("c1", "intruder", None, [{"role": "user", "content": "hi"}])
+
+
+class TestCommit:
+    """Compare-and-swap commits and ownership."""
+
+    async def test_commit_cannot_take_over_another_users_conversation(self, store):
+        await store.commit_turn("c1", "owner", [], "secret", "reply")
+        for base_version in (None, 0, 1):
+            with pytest.raises(ConversationOwnershipError):
+                await store.commit_turn("c1", "intruder", [], "mine now", "ok", base_version=base_version)
+        state = await store.get("c1", "owner")
+        assert state.version == 1 and state.messages[0]["content"] == "secret"
+
+    async def test_concurrent_deltas_keep_the_first_turn(self, store):
+        await store.commit_turn("c1", "u1", [], "q0", "a0")
+        history, base = await store.resolve_history("c1", "u1", 1, None)
+        await store.commit_turn("c1", "u1", history, "first", "a1", base_version=base)
+        with pytest.raises(ConversationVersionConflict) as exc:
+            await store.commit_turn("c1", "u1", history, "second", "a2", base_version=base)
+        assert exc.value.server_version == 2
+        state = await store.get("c1", "u1")
+        assert [m["content"] for m in state.messages] == ["q0", "a0", "first", "a1"]
+
+    async def test_compare_and_swap_across_processes(self, tmp_path):
+        path = tmp_path / "conv.db"
+        first, second = ConversationStore(db_path=path), ConversationStore(db_path=path)
+        await first.commit_turn("c1", "u1", [], "q0", "a0")
+        _, base = await second.resolve_history("c1", "u1", 1, None)
+        await first.commit_turn("c1", "u1", [], "first", "a1", base_version=1)
+        with pytest.raises(ConversationVersionConflict):
+            await second.commit_turn("c1", "u1", [], "second", "a2", base_version=base)
+        assert (await ConversationStore(db_path=path).get("c1", "u1")).messages[0]["content"] == "first"
+        first.close()
+        second.close()
+
+    async def test_new_conversation_claimed_concurrently(self, tmp_path):
+        path = tmp_path / "conv.db"
+        first, second = ConversationStore(db_path=path), ConversationStore(db_path=path)
+        _, base = await second.resolve_history("c1", "u2", None, None)
+        await first.commit_turn("c1", "u1", [], "q", "a", base_version=0)
+        with pytest.raises(ConversationOwnershipError):
+            await second.commit_turn("c1", "u2", [], "q", "a", base_version=base)
+        first.close()
+        second.close()
+
+
+class TestPersistence:
+    """SQLite persistence and hot cache behaviour."""
+
+    async def test_survives_new_store_instance(self, tmp_path):
+        path = tmp_path / "conv.db"
+        first = ConversationStore(db_path=path)
+        await first.commit_turn("c1", "u1", [], "Sawubona", "Yebo!")
+        first.close()
+
+        second = ConversationStore(db_path=path)
+        state = await second.get("c1", "u1")
+        second.close()
+        assert state is not None
+        assert state.version == 1
+        assert state.messages[0]["content"] == "Sawubona"
+
+    async def test_history_is_capped(self, store):
+        history: list[dict[str, str]] = []
+        for i in range(5):
+            await store.commit_turn("c1", "u1", history, f"q{i}", f"a{i}")
+            history, _ = await store.resolve_history("c1", "u1", i + 1, None)
+        assert len(history) == 6
+        assert history[-1]["content"] == "a4"
+
+    async def test_lru_eviction_falls_back_to_sqlite(self, store):
+        for i in range(6):
+            await store.commit_turn(f"c{i}", "u1", [], "q", "a")
+        assert store.get_stats()["cached_conversations"] == 4
+        state = await store.get("c0", "u1")
+        assert state is not None
+        assert store.get_stats()["misses"] >= 1
+
+    async def test_delete(self, store):
+        await store.commit_turn("c1", "u1", [], "q", "a")
+        assert await store.delete("c1", "other") is False
+        assert await store.delete("c1", "u1") is True
+        assert await store.get("c1", "u1") is None
+
+
+class TestChatEndpointDeltas:
+    """Endpoint wiring: delta requests, conflicts and commits."""
+
+    async def test_delta_request_uses_stored_history(self, store):
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        await store.commit_turn("c1", "u1", [], "Hello", "Howzit!")
+        generate = AsyncMock(return_value={"response": "Lekker", "meta": {}})
+
+        with patch.object(chat_endpoint, "get_conversation_store", return_value=store), \
+             patch.object(chat_endpoint.ai_service, "generate_response", generate), \
+             patch.object(chat_endpoint.posthog_service, "track_chat_message"):
+            response = await chat_endpoint.chat(TieredChatRequest(
+                message="How are you?", user_id="u1",
+                conversation_id="c1", conversation_version=1,
+            ))
+
+        sent_history = generate.call_args.kwargs["history"]
+        assert [m["content"] for m in sent_history] == ["Hello", "Howzit!"]
+        assert response.meta["conversation"]["version"] == 2
+
+    async def test_version_mismatch_returns_409(self, store):
+        from fastapi import HTTPException
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        await store.commit_turn("c1", "u1", [], "Hello", "Howzit!")
+        with patch.object(chat_endpoint, "get_conversation_store", return_value=store):
+            with pytest.raises(HTTPException) as exc:
+                await chat_endpoint._resolve_history(TieredChatRequest(
+                    message="Next", user_id="u1",
+                    conversation_id="c1", conversation_version=0,
+                ))
+        assert exc.value.status_code == 409
+        assert exc.value.detail["server_version"] == 1
+
+    async def test_foreign_conversation_returns_403(self, store):
+        from fastapi import HTTPException
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        await store.commit_turn("c1", "owner", [], "secret", "reply")
+        with patch.object(chat_endpoint, "get_conversation_store", return_value=store):
+            with pytest.raises(HTTPException) as exc:
+                await chat_endpoint._resolve_history(TieredChatRequest(
+                    message="Next", user_id="intruder", conversation_id="c1",
+                ))
+        assert exc.value.status_code == 403
+
+    async def test_stream_commits_and_emits_version(self, store):
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        async def events():
+            yield f"data: {json.dumps({'type': 'meta'})}\n\n"
+            yield f"data: {json.dumps({'type': 'thinking', 'content': 'hmm'})}\n\n"
+            yield f"data: {json.dumps({'type': 'content', 'content': '</think>Eish, '})}\n\n"
+            yield f"data: {json.dumps({'type': 'content', 'content': 'load shedding.'})}\n\n"
+            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+
+        request = TieredChatRequest(message="Power?", user_id="u1", conversation_id="c9")
+        with patch.object(chat_endpoint, "get_conversation_store", return_value=store):
+            out = [e async for e in chat_endpoint._stream_with_conversation(events(), request, [])]
+
+        final = json.loads(out[-1][len("data: "):])
+        assert final == {"type": "conversation", "conversation_id": "c9", "version": 1}
+        state = await store.get("c9", "u1")
+        assert state.messages[-1]["content"] == "Eish, load shedding."
+
+    async def test_stream_answer_does_not_depend_on_serialisation(self, store):
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        async def events():
+            yield "id: g1:1\ndata: " + json.dumps({"content": "Howzit", "type": "content"}) + "\n\n"
+            yield "data:" + json.dumps({"type": "content", "content": " bru"}, separators=(",", ":")) + "\n\n"
+            yield ": keepalive\n\n"
+            yield "data: " + json.dumps({"type": "done"}) + "\n\n"
+
+        request = TieredChatRequest(message="Hi", user_id="u1", conversation_id="c10")
+        with patch.object(chat_endpoint, "get_conversation_store", return_value=store):
+            [e async for e in chat_endpoint._stream_with_conversation(events(), request, [])]
+        assert (await store.get("c10", "u1")).messages[-1]["content"] == "Howzit bru"
+
+    async def test_stream_error_skips_commit(self, store):
+        from app.api.v1.endpoints import chat as chat_endpoint
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        async def events():
+            yield "data:" + json.dumps({"type": "content", "content": "Half"}, separators=(",", ":")) + "\n\n"
+            yield "data:" + json.dumps({"error": "upstream", "type": "error"}, separators=(",", ":")) + "\n\n"
+
+        request = TieredChatRequest(message="Hi", user_id="u1", conversation_id="c11")
+        with patch.object(chat_endpoint, "get_conversation_store", return_value=store):
+            out = [e async for e in chat_endpoint._stream_with_conversation(events(), request, [])]
+        assert len(out) == 2
+        assert await store.get("c11", "u1") is None
+
+
+@pytest.mark.slow
+class TestDeltaBenchmark:
+    """Request size and parse time: full history vs delta at 50+ turns."""
+
+    def test_payload_and_parse_time(self):
+        from app.api.v1.endpoints.chat import TieredChatRequest
+
+        turns = 60
+        history = []
+        for i in range(turns):
+            history.append({"role": "user", "content": f"Question {i}: " + "how does load shedding affect my business? " * 4})
+            history.append({"role": "assistant", "content": f"Answer {i}: " + "Stage 2 means two hours off per day. " * 20})
+
+        full_body = json.dumps({"message": "And stage 6?", "user_id": "u1", "history": history}).encode()
+        delta_body = json.dumps({
+            "message": "And stage 6?", "user_id": "u1",
+            "conversation_id": "c1", "conversation_version": turns,
+        }).encode()
+
+        iterations = 200
+        start = time.perf_counter()
+        for _ in range(iterations):
+            TieredChatRequest.model_validate_json(full_body)
+        full_us = (time.perf_counter() - start) / iterations * 1e6
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            TieredChatRequest.model_validate_json(delta_body)
+        delta_us = (time.perf_counter() - start) / iterations * 1e6
+
+        print(f"\n   {turns} turns | full: {len(full_body):,} bytes, {full_us:.0f}μs parse"
+              f" | delta: {len(delta_body):,} bytes, {delta_us:.0f}μs parse")
+        assert len(delta_body) * 50 < len(full_body)
+        assert delta_us < full_us
@@ -0,0 +1,227 @@
+"""
+Tests for GOGGA Credit Reservations (local holds, batched settlement)
+
+Run with: pytest tests/test_credit_reservations.py -v
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.api.v1.endpoints import chat as chat_endpoint
+from app.config import settings
+from app.core.router import CognitiveLayer, UserTier
+from app.services import ai_service as ai_module
+from app.services import credit_reservations, entitlement_cache
+from app.services.chat_preflight import run_chat_preflight
+from app.services.credit_reservations import CreditReservations, estimate_chat_units
+from app.services.credit_service import ActionType, CreditService, DeductionSource
+from app.services.entitlement_cache import EntitlementCache
+from app.services.usage_ledger import UsageLedger
+
+ENDPOINT = "https://frontend:3000/api/internal/deduct-usage"
+
+
+class FakeFrontend:
+    """user-usage plus an idempotent deduct-usage that applies batches."""
+
+    def __init__(self, credits: int = 3, chat_tokens: int = 10**12, tier: str = "JIVE"):
+        self.user = {"tier": tier, "creditBalance": credits, "usageChatTokens": chat_tokens}
+        self.applied: set[str] = set()
+        self.posts: list[int] = []
+        self.lookups = 0
+        self.delay = 0.0
+        self.headers: list[str] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/api/internal/user-usage/"):
+            self.lookups += 1
+            await asyncio.sleep(self.delay)
+            return httpx.Response(200, json=dict(self.user))
+        records = json.loads(request.content)["records"]
+        self.posts.append(len(records))
+        self.headers.append(request.headers.get("x-internal-key"))
+        for record in records:
+            if record["id"] in self.applied:
+                continue
+            self.applied.add(record["id"])
+            if record["source"] == "credits":
+                self.user["creditBalance"] -= record["quantity"]
+            else:
+                self.user["usageChatTokens"] += record["quantity"] * 10_000
+        return httpx.Response(200, json={"success": True, "results": {}, "rejected": []})
+
+
+@pytest.fixture
+def frontend(monkeypatch):
+    frontend = FakeFrontend()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(frontend.handler))
+    monkeypatch.setattr(CreditService, "_client", client)
+    monkeypatch.setattr(entitlement_cache, "_entitlement_cache", EntitlementCache())
+    frontend.client = client
+    return frontend
+
+
+def make_reservations(tmp_path, frontend, **kwargs) -> CreditReservations:
+    ledger = UsageLedger(tmp_path, ENDPOINT, batch_size=50, fsync_interval=0.001, ship_interval=0.001,
+                         headers={"X-Internal-Key": "k"})
+    ledger._client = frontend.client
+    return CreditReservations(ledger, **kwargs)
+
+
+class TestReservations:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_reserves_cannot_overspend(self, tmp_path, frontend):
+        frontend.delay = 0.02
+        reservations = make_reservations(tmp_path, frontend)
+        results = await asyncio.gather(
+            *(reservations.reserve("u1", ActionType.CHAT_10K_TOKENS) for _ in range(6))
+        )
+        sources = [r.source for r in results]
+        assert sources.count(DeductionSource.CREDITS) == 3
+        assert sources.count(DeductionSource.FREE) == 3
+        assert frontend.lookups == 1  # Burst shares one cached lookup
+        assert reservations.get_stats()["held_credits"] == 3
+
+    @pytest.mark.asyncio
+    async def test_release_returns_the_hold(self, tmp_path, frontend):
+        reservations = make_reservations(tmp_path, frontend)
+        first = await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS, 3)
+        assert first.source == DeductionSource.CREDITS
+        assert (await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS)).source == DeductionSource.FREE
+        reservations.release(first)
+        assert (await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS)).source == DeductionSource.CREDITS
+
+    @pytest.mark.asyncio
+    async def test_abandoned_hold_expires(self, tmp_path, frontend):
+        reservations = make_reservations(tmp_path, frontend, reservation_ttl=0.01)
+        await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS, 3)
+        await asyncio.sleep(0.02)
+        assert (await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS)).source == DeductionSource.CREDITS
+        assert reservations.get_stats()["expired"] == 1
+
+    @pytest.mark.asyncio
+    async def test_settled_amount_counts_until_frontend_applies_it(self, tmp_path, frontend):
+        reservations = make_reservations(tmp_path, frontend)
+        reservation = await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS, 3)
+        settlement = reservations.settle(reservation, 2, idempotency_key="chat:u1:r1", request_id="r1")
+        assert settlement == {"settlementId": "chat:u1:r1", "creditsDeducted": 2}
+        assert frontend.posts == []  # Nothing on the request path
+
+        state = await reservations.available_state("u1")
+        assert state.credit_balance == 1
+
+        assert await reservations.ledger.ship_once() == 1
+        assert frontend.user["creditBalance"] == 1 and frontend.headers == ["k"]
+        state = await reservations.available_state("u1")
+        assert state.credit_balance == 1  # Re-fetched after the ack, not double counted
+        assert frontend.lookups == 2
+        assert reservations.get_stats()["accounts"] == 0
+
+    @pytest.mark.asyncio
+    async def test_settlements_ship_in_one_batch(self, tmp_path, frontend):
+        frontend.user["creditBalance"] = 100
+        reservations = make_reservations(tmp_path, frontend)
+        held = [await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS) for _ in range(5)]
+        for i, reservation in enumerate(held):
+            reservations.settle(reservation, 1, idempotency_key=f"chat:u1:r{i}")
+        await reservations.start()
+        for _ in range(100):
+            if not reservations.ledger._pending:
+                break
+            await asyncio.sleep(0.01)
+        await reservations.stop()
+        assert frontend.posts == [5]
+        assert frontend.user["creditBalance"] == 95
+
+    @pytest.mark.asyncio
+    async def test_subscription_usage_is_held_too(self, tmp_path, frontend):
+        frontend.user.update(tier="JIGGA", usageChatTokens=0, creditBalance=0)
+        reservations = make_reservations(tmp_path, frontend)
+        limit = CreditService.get_tier_limit("JIGGA", "chat_tokens") // 10_000
+        big = await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS, limit)
+        assert big.source == DeductionSource.SUBSCRIPTION
+        assert (await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS)).source == DeductionSource.FREE
+
+    @pytest.mark.asyncio
+    async def test_replayed_settlements_still_count(self, tmp_path, frontend):
+        reservations = make_reservations(tmp_path, frontend)
+        reservation = await reservations.reserve("u1", ActionType.CHAT_10K_TOKENS, 2)
+        reservations.settle(reservation, 2, idempotency_key="chat:u1:r1")
+        reservations.ledger.sync()
+
+        restarted = make_reservations(tmp_path, frontend)
+        assert (await restarted.available_state("u1")).credit_balance == 1
+
+    def test_estimate_covers_input_and_predicted_output(self):
+        assert estimate_chat_units("Hi") == 1
+        history = [{"role": "user", "content": "x" * 40_000}]
+        assert estimate_chat_units("Hi", history) == 2
+
+
+class TestChatSettlement:
+
+    @pytest.mark.asyncio
+    async def test_generate_response_settles_actual_units(self, tmp_path, frontend, monkeypatch):
+        frontend.user["creditBalance"] = 10
+        reservations = make_reservations(tmp_path, frontend)
+        monkeypatch.setattr(credit_reservations, "_credit_reservations", reservations)
+
+        preflight = await run_chat_preflight("u1", "Sawubona", UserTier.JIVE)
+        assert preflight.reservation.source == DeductionSource.CREDITS
+        answer = {"response": "Yebo", "meta": {"total_tokens": 25_000, "model": "qwen-3-32b"}}
+        with patch.object(ai_module.AIService, "_generate_cerebras", return_value=answer):
+            response = await ai_module.AIService.generate_response(
+                "u1", "Sawubona", user_tier=UserTier.JIVE, request_id="r1",
+                force_layer=CognitiveLayer.JIVE_TEXT, preflight=preflight,
+            )
+
+        billing = response["meta"]["billing"]
+        assert billing["credits_deducted"] == 3 and billing["event_id"] == "chat:u1:r1"
+        assert reservations.get_stats()["holds"] == 0
+        assert reservations.ledger.pending_records()[0]["quantity"] == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_generation_releases_the_hold(self, tmp_path, frontend, monkeypatch):
+        reservations = make_reservations(tmp_path, frontend)
+        monkeypatch.setattr(credit_reservations, "_credit_reservations", reservations)
+
+        preflight = await run_chat_preflight("u1", "Sawubona", UserTier.JIVE)
+        assert reservations.get_stats()["holds"] == 1
+        with patch.object(ai_module.AIService, "_generate_cerebras", side_effect=RuntimeError("down")):
+            with pytest.raises(RuntimeError):
+                await ai_module.AIService.generate_response(
+                    "u1", "Sawubona", user_tier=UserTier.JIVE,
+                    force_layer=CognitiveLayer.JIVE_TEXT, preflight=preflight,
+                )
+        assert reservations.get_stats()["holds"] == 0
+        assert reservations.ledger.pending_records() == []
+
+    @pytest.mark.asyncio
+    async def test_long_document_settles_map_and_reduce(self, tmp_path, frontend, monkeypatch):
+        frontend.user["creditBalance"] = 100
+        reservations = make_reservations(tmp_path, frontend)
+        monkeypatch.setattr(credit_reservations, "_credit_reservations", reservations)
+        message = "Summarise.\n" + "Clause 1. The tenant pays rent monthly.\n" * 2_400
+        answer = SimpleNamespace(
+            answer="Rent is monthly.", thinking=None, latency_seconds=1.0,
+            usage={settings.MODEL_JIVE: (27_000, 2_500), settings.MODEL_JIGGA_235B: (1_500, 400)},
+            coverage=lambda: {"parts": 12},
+        )
+        qa = SimpleNamespace(answer=AsyncMock(return_value=answer))
+        with patch.object(chat_endpoint, "get_long_doc_qa", return_value=qa), \
+             patch.object(chat_endpoint, "track_usage", AsyncMock(return_value={"usd": 0.0, "zar": 0.0})), \
+             patch.object(chat_endpoint.posthog_service, "track_chat_message"):
+            response = await chat_endpoint.chat(chat_endpoint.TieredChatRequest(
+                message=message, user_id="u1", user_tier=UserTier.JIVE,
+            ))
+
+        billing = response.meta["billing"]
+        assert billing["token_units"] == 4 and billing["credits_deducted"] == 4
+        assert billing["estimated_units"] == estimate_chat_units(message)  # Held for the whole document
+        assert reservations.get_stats()["holds"] == 0
+        assert reservations.ledger.pending_records()[0]["quantity"] == 4
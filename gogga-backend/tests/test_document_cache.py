@@ -0,0 +1,228 @@
+"""
+Tests for GOGGA Parsed Document Cache (content-addressed extraction results)
+
+Run with: pytest tests/test_document_cache.py -v
+"""
+import asyncio
+import io
+import os
+import zipfile
+
+import pytest
+from fastapi import UploadFile
+
+from app.services import document_cache
+from app.services.document_cache import (
+    DocumentCache,
+    UnsupportedDocumentError,
+    clean_text,
+    content_hash,
+    parse_document,
+)
+
+LEASE = (
+    "RESIDENTIAL LEASE AGREEMENT\n\n"
+    "This agreement is entered into between the landlord and the tenant. The tenant shall pay a "
+    "deposit which the landlord must invest in an interest-bearing account. Either party may "
+    "terminate this contract with one calendar month written notice. Any dispute is subject to "
+    "the jurisdiction of the Rental Housing Tribunal.\n"
+)
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+S = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+
+def make_docx(pages: list[list[str]]) -> bytes:
+    """Minimal DOCX: one paragraph per line, explicit page breaks between pages."""
+    body = []
+    for i, lines in enumerate(pages):
+        for line in lines:
+            body.append(f"<w:p><w:r><w:t>{line}</w:t></w:r></w:p>")
+        if i < len(pages) - 1:
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    xml = f'<?xml version="1.0"?><w:document xmlns:w="{W}"><w:body>{"".join(body)}</w:body></w:document>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", xml)
+    return buffer.getvalue()
+
+
+def make_xlsx(rows: str = "") -> bytes:
+    """Minimal XLSX with shared strings, an inline string and a skipped column (or the given rows)."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("xl/workbook.xml", (
+            f'<workbook xmlns="{S}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Budget" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        archive.writestr("xl/_rels/workbook.xml.rels", (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>'
+        ))
+        archive.writestr("xl/sharedStrings.xml", f'<sst xmlns="{S}"><si><t>Item</t></si><si><t>Electricity</t></si></sst>')
+        archive.writestr("xl/worksheets/sheet1.xml", (
+            f'<worksheet xmlns="{S}"><sheetData>'
+            + (rows or
+               '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="C1" t="inlineStr"><is><t>Amount</t></is></c></row>'
+               '<row r="2"><c r="A2" t="s"><v>1</v></c><c r="C2"><v>1450.5</v></c></row>')
+            + '</sheetData></worksheet>'
+        ))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = DocumentCache(tmp_path / "documents.db")
+    yield cache
+    cache.close()
+
+
+class TestExtraction:
+
+    def test_docx_pages_and_offsets(self):
+        document = parse_document(make_docx([["Page one text."], ["Page two text.", "More."]]))
+        assert document.kind == "docx"
+        assert document.pages == 2
+        assert document.page_text(0) == "Page one text."
+        assert document.page_text(1) == "Page two text.\nMore."
+
+    def test_xlsx_rows_keep_columns(self):
+        document = parse_document(make_xlsx())
+        assert document.kind == "xlsx"
+        assert document.text == "# Sheet: Budget\nItem\t\tAmount\nElectricity\t\t1450.5"
+
+    def test_text_with_form_feeds_and_legacy_encoding(self):
+        document = parse_document("Eerste bladsy – huur\fTweede bladsy".encode("cp1252"))
+        assert document.kind == "text"
+        assert document.pages == 2
+        assert document.page_text(0) == "Eerste bladsy – huur"
+
+    def test_cleaning(self):
+        assert clean_text("agree-\nment  between\r\n\n\n\nparties\x00  ") == "agreement between\n\nparties"
+
+    def test_classification_language_and_tokens(self):
+        document = parse_document(LEASE.encode())
+        assert document.language == "en"
+        assert document.classification["domain"] == "legal"
+        assert document.token_count == len(document.text) // 4
+
+    @pytest.mark.parametrize("data", [b"\x89PNG\r\n\x1a\n\x00\x00", b"PK\x03\x04garbage", b"   \n\n  "])
+    def test_unsupported(self, data):
+        with pytest.raises(UnsupportedDocumentError):
+            parse_document(data)
+
+    def test_dtd_is_rejected_wherever_it_appears(self):
+        prolog = "<!--" + "x" * 10_000 + "-->"
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("word/document.xml", (
+                f'<?xml version="1.0"?>{prolog}<!DOCTYPE d [<!ENTITY a "{"a" * 100}">]>'
+                f'<w:document xmlns:w="{W}"><w:body><w:p><w:r><w:t>&a;</w:t></w:r></w:p></w:body></w:document>'
+            ))
+        with pytest.raises(UnsupportedDocumentError, match="DTD"):
+            parse_document(buffer.getvalue())
+        assert parse_document(make_docx([["Hello"]])).text == "Hello"
+
+    def test_xlsx_grid_limits(self, monkeypatch):
+        last_column = parse_document(make_xlsx('<row r="1"><c r="A1"><v>1</v></c><c r="XFD1"><v>2</v></c></row>'))
+        assert last_column.text.endswith("\t2")
+        with pytest.raises(UnsupportedDocumentError, match="outside the sheet grid"):
+            parse_document(make_xlsx('<row r="1"><c r="XFE1"><v>1</v></c></row>'))
+        with pytest.raises(UnsupportedDocumentError, match="outside the sheet grid"):
+            parse_document(make_xlsx('<row r="1"><c r="ZZZZZZZZZZZZ1"><v>1</v></c></row>'))
+
+        monkeypatch.setattr(document_cache, "MAX_XLSX_CELLS", 100_000)
+        sparse = "".join(f'<row r="{i}"><c r="XFD{i}"><v>{i}</v></c></row>' for i in range(1, 10))
+        with pytest.raises(UnsupportedDocumentError, match="cells"):
+            parse_document(make_xlsx(sparse))
+        monkeypatch.setattr(document_cache, "MAX_XLSX_ROWS", 1)
+        with pytest.raises(UnsupportedDocumentError, match="rows"):
+            parse_document(make_xlsx())
+        monkeypatch.setattr(document_cache, "MAX_XLSX_SHEETS", 0)
+        with pytest.raises(UnsupportedDocumentError, match="sheets"):
+            parse_document(make_xlsx())
+
+    @pytest.mark.skipif(document_cache.PYPDF_AVAILABLE, reason="pypdf installed")
+    def test_pdf_needs_pypdf(self):
+        with pytest.raises(UnsupportedDocumentError, match="pypdf"):
+            parse_document(b"%PDF-1.7\n...")
+
+
+class TestCache:
+
+    def test_repeat_upload_is_a_hit(self, cache, monkeypatch):
+        data = make_docx([[LEASE]])
+        first, cached = cache.parse(data, "lease.docx")
+        assert not cached
+
+        monkeypatch.setattr(document_cache, "parse_document", lambda *a: pytest.fail("re-parsed"))
+        second, cached = cache.parse(data, "renamed.docx")
+        assert cached
+        assert second.text == first.text and second.classification == first.classification
+        assert second.filename == "renamed.docx"
+
+    def test_survives_restart(self, cache, tmp_path):
+        data = LEASE.encode()
+        cache.parse(data)
+        cache.close()
+        reopened = DocumentCache(tmp_path / "documents.db")
+        assert reopened.get(content_hash(data)).language == "en"
+        assert reopened.get_stats()["stored_bytes"] == cache.get_stats()["stored_bytes"] > 0
+
+    def test_entries_are_compressed(self, cache):
+        document, _ = cache.parse((LEASE * 200).encode())
+        assert cache.get_stats()["stored_bytes"] < len(document.text) / 10
+
+    def test_parser_version_bump_reparses(self, cache, monkeypatch):
+        data = LEASE.encode()
+        cache.parse(data)
+        monkeypatch.setattr(document_cache, "PARSER_VERSION", document_cache.PARSER_VERSION + 1)
+        assert cache.get(content_hash(data)) is None
+        assert cache.parse(data)[1] is False
+
+    def test_eviction_keeps_recent_entries_within_budget(self, tmp_path):
+        cache = DocumentCache(tmp_path / "documents.db", max_bytes=60_000)
+        # Random hex compresses ~2x, so each entry stores ~10KB
+        payloads = [os.urandom(10_000).hex().encode() for _ in range(10)]
+        cache.parse(payloads[0])
+        for data in payloads[1:]:
+            cache.parse(data)
+            cache.get(content_hash(payloads[0]))  # Keep the first one hot
+        stats = cache.get_stats()
+        assert stats["stored_bytes"] <= 60_000
+        assert stats["evictions"] > 0
+        assert cache.get(content_hash(payloads[0])) is not None
+        assert cache.get(content_hash(payloads[1])) is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_uploads_share_one_parse(self, cache):
+        data = make_docx([[LEASE]])
+        results = await asyncio.gather(*(cache.parse_async(data) for _ in range(5)))
+        assert {document.sha256 for document, _ in results} == {content_hash(data)}
+        stats = cache.get_stats()
+        assert stats["misses"] == 1 and stats["coalesced"] == 4
+
+
+class TestUploadEndpoint:
+
+    @pytest.mark.asyncio
+    async def test_reupload_skips_parse_and_index(self, cache, tmp_path, monkeypatch):
+        from app.api.v1.endpoints import rag
+        from app.services.rag_service import HashingEmbedder, RagService
+
+        service = RagService(tmp_path / "rag", embedder=HashingEmbedder())
+        monkeypatch.setattr(rag, "get_document_cache", lambda: cache)
+        monkeypatch.setattr(rag, "get_rag_service", lambda: service)
+        data = make_docx([[LEASE], ["Annexure A: inventory of the flat."]])
+
+        def upload():
+            return rag.upload_document("user-1", UploadFile(io.BytesIO(data), filename="lease.docx"), title="")
+
+        first = await upload()
+        second = await upload()
+        assert not first["cached"] and second["cached"]
+        assert first["document"]["doc_id"] == second["document"]["doc_id"] == first["sha256"][:32]
+        assert len(service.list_documents("user-1")) == 1
+        assert service.search("user-1", "deposit interest").chunks[0].title == "lease.docx"
+        service.close()
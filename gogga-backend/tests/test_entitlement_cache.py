@@ -0,0 +1,231 @@
+"""
+Tests for GOGGA Entitlement Cache (subscription and credit lookups)
+
+Run with: pytest tests/test_entitlement_cache.py -v
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.core.router import UserTier
+from app.services import entitlement_cache
+from app.services.credit_service import ActionType, CreditService, DeductionSource
+from app.services.entitlement_cache import EntitlementCache, subscription_key, usage_key
+from app.services.subscription_service import SubscriptionService
+
+SUBSCRIPTION = {"tier": "JIGGA", "status": "active", "credits": {"available": 500}, "images": {"limit": 200, "used": 3}}
+USAGE = {"tier": "JIVE", "creditBalance": 120, "usageChatTokens": 5000}
+
+
+class FakeFrontend:
+    """Counts lookups per path; can fail or be slow."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: dict[str, int] = {}
+        self.status = 200
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.calls[path] = self.calls.get(path, 0) + 1
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return httpx.Response(self.status)
+        if path == "/api/subscription":
+            return httpx.Response(200, json=SUBSCRIPTION)
+        return httpx.Response(200, json=USAGE)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = EntitlementCache(ttl=30, stale_ttl=300)
+    monkeypatch.setattr(entitlement_cache, "_entitlement_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def frontend(monkeypatch):
+    frontend = FakeFrontend()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(frontend.handler))
+    monkeypatch.setattr(CreditService, "_client", client)
+    return frontend
+
+
+def subscriptions(frontend: FakeFrontend) -> SubscriptionService:
+    service = SubscriptionService()
+    service._client = CreditService._client
+    return service
+
+
+class TestCache:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_lookup(self, cache):
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            return {"tier": "JIVE"}
+
+        results = await asyncio.gather(*(cache.get_or_load("usage:u1", load) for _ in range(10)))
+        assert calls == 1 and all(r == {"tier": "JIVE"} for r in results)
+        assert cache.get_stats()["coalesced"] == 9
+        assert await cache.get_or_load("usage:u1", load) == {"tier": "JIVE"}
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_is_refetched(self, cache):
+        cache.ttl = 0
+        values = iter([1, 2])
+
+        async def load():
+            return next(values)
+
+        assert await cache.get_or_load("k", load) == 1
+        assert await cache.get_or_load("k", load) == 2
+
+    @pytest.mark.asyncio
+    async def test_stale_served_on_error_then_backs_off(self, cache):
+        cache.ttl = 0
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            if calls > 1:
+                raise httpx.ConnectError("frontend down")
+            return "cached"
+
+        assert await cache.get_or_load("k", load) == "cached"
+        assert await cache.get_or_load("k", load) == "cached"
+        assert await cache.get_or_load("k", load) == "cached"
+        assert calls == 2  # Third call didn't wait on the failing frontend again
+        assert cache.get_stats()["stale_served"] == 1
+
+    @pytest.mark.asyncio
+    async def test_error_without_usable_entry_raises(self, cache):
+        async def fail():
+            raise httpx.ConnectError("frontend down")
+
+        with pytest.raises(httpx.ConnectError):
+            await cache.get_or_load("k", fail)
+
+        cache.stale_ttl = 0
+        cache._store("old", "value")
+        cache._entries["old"].fresh_until = 0
+        await asyncio.sleep(0.001)
+        with pytest.raises(httpx.ConnectError):
+            await cache.get_or_load("old", fail)
+
+    @pytest.mark.asyncio
+    async def test_invalidate_during_lookup_discards_result(self, cache):
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.02)
+            return "before change"
+
+        task = asyncio.create_task(cache.get_or_load("usage:u1", slow))
+        await started.wait()
+        cache.invalidate_user(user_id="u1")
+        assert await task == "before change"
+
+        async def fresh():
+            return "after change"
+
+        assert await cache.get_or_load("usage:u1", fresh) == "after change"
+
+    def test_lru_bound(self, cache):
+        cache.max_entries = 2
+        for key in "abc":
+            cache._store(key, key)
+        assert list(cache._entries) == ["b", "c"]
+
+    def test_keys_normalise_email(self):
+        assert subscription_key(" Thabo@Example.co.za ") == "subscription:thabo@example.co.za"
+        assert usage_key("u1") == "usage:u1"
+
+
+class TestServices:
+
+    @pytest.mark.asyncio
+    async def test_burst_of_requests_hits_frontend_once(self, cache, frontend):
+        frontend.delay = 0.02
+        service = subscriptions(frontend)
+        results = await asyncio.gather(
+            *(service.verify_subscription("thabo@example.co.za", UserTier.JIGGA) for _ in range(5)),
+            *(CreditService.get_user_state("u1") for _ in range(5)),
+        )
+        assert frontend.calls == {"/api/subscription": 1, "/api/internal/user-usage/u1": 1}
+        assert results[0].effective_tier == UserTier.JIGGA and results[0].images_available == 197
+        assert results[-1].credit_balance == 120
+
+    @pytest.mark.asyncio
+    async def test_effective_tier_uses_each_callers_requested_tier(self, cache, frontend):
+        service = subscriptions(frontend)
+        await service.verify_subscription("thabo@example.co.za", UserTier.JIGGA)
+        status = await service.verify_subscription("thabo@example.co.za", UserTier.JIVE)
+        assert status.effective_tier == UserTier.JIGGA
+        assert frontend.calls["/api/subscription"] == 1
+
+    @pytest.mark.asyncio
+    async def test_usage_state_is_not_shared_between_callers(self, cache, frontend):
+        first = await CreditService.get_user_state("u1")
+        first.credit_balance = 0
+        assert (await CreditService.get_user_state("u1")).credit_balance == 120
+
+    @pytest.mark.asyncio
+    async def test_outage_keeps_paid_tier_from_stale_entry(self, cache, frontend):
+        service = subscriptions(frontend)
+        await service.verify_subscription("thabo@example.co.za", UserTier.JIGGA)
+        await CreditService.get_user_state("u1")
+        cache.ttl = 0
+        for entry in cache._entries.values():
+            entry.fresh_until = 0
+
+        frontend.status = 503
+        status = await service.verify_subscription("thabo@example.co.za", UserTier.JIGGA)
+        state = await CreditService.get_user_state("u1")
+        assert status.status == "active" and status.credits_available == 500
+        assert state.tier == "JIVE" and state.credit_balance == 120
+
+    @pytest.mark.asyncio
+    async def test_outage_without_cache_keeps_old_fallbacks(self, cache, frontend):
+        frontend.status = 503
+        status = await subscriptions(frontend).verify_subscription("new@example.co.za", UserTier.JIVE)
+        assert status.status == "unknown" and status.effective_tier == UserTier.JIVE
+        assert (await CreditService.get_user_state("new")).tier == "FREE"
+
+    @pytest.mark.asyncio
+    async def test_deduction_invalidates_usage(self, cache, frontend):
+        await CreditService.get_user_state("u1")
+        result = await CreditService.deduct_usage("u1", ActionType.CHAT_10K_TOKENS, 1, DeductionSource.CREDITS)
+        assert result["success"]
+        await CreditService.get_user_state("u1")
+        assert frontend.calls["/api/internal/user-usage/u1"] == 2
+
+
+class TestInvalidateEndpoint:
+
+    def test_frontend_hook_drops_user_entries(self, cache):
+        from app.main import app
+
+        cache._store(usage_key("u1"), USAGE)
+        cache._store(subscription_key("thabo@example.co.za"), SUBSCRIPTION)
+        cache._store(usage_key("u2"), USAGE)
+        client = TestClient(app)
+        body = {"userId": "u1", "email": "Thabo@example.co.za"}
+
+        assert client.post("/api/v1/entitlements/invalidate", json=body).status_code == 403
+        response = client.post(
+            "/api/v1/entitlements/invalidate", json=body,
+            headers={"X-Internal-Key": settings.INTERNAL_API_KEY},
+        )
+        assert response.json() == {"success": True, "dropped": 2}
+        assert list(cache._entries) == [usage_key("u2")]
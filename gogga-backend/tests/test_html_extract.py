@@ -0,0 +1,159 @@
+"""
+Tests for streaming main-content HTML extraction
+
+Run with: pytest tests/test_html_extract.py -v
+Benchmark: pytest tests/test_html_extract.py -v -s -m slow
+"""
+import os
+import random
+import re
+import time
+
+import pytest
+from bs4 import BeautifulSoup
+
+from app.services import html_extract
+from app.services.html_extract import extract_main_text, extract_main_text_async, is_html_content_type
+
+SENTENCES = [
+    "The Constitutional Court handed down judgment on the matter on Thursday.",
+    "Eskom said stage two load shedding would continue until further notice.",
+    "Residents of Soweto gathered outside the municipal offices in protest.",
+    "The Reserve Bank kept the repo rate unchanged at its latest meeting.",
+    "Analysts expect the rand to remain volatile against the dollar this week.",
+    "The minister told Parliament that the tender process had been reviewed.",
+]
+BOILERPLATE = ["Home", "News", "Sport", "Business", "Lifestyle", "Opinion", "Subscribe", "Login"]
+
+
+def news_page(seed: int, paragraphs: int = 30, semantic: bool = True) -> tuple[str, list[str]]:
+    """A news-like page: menus, sidebar, scripts and footer around an article."""
+    rng = random.Random(seed)
+    article = [" ".join(rng.choice(SENTENCES) for _ in range(4)) for _ in range(paragraphs)]
+    menu = "".join(f'<li><a href="/{w.lower()}">{w}</a></li>' for w in BOILERPLATE)
+    related = "".join(
+        f'<li><a href="/story/{i}">Related story number {i} about {rng.choice(BOILERPLATE)}</a></li>'
+        for i in range(15)
+    )
+    body = "".join(f"<p>{p}</p>" for p in article)
+    # Without semantic tags the content hint often matches a wrapper around the sidebar too
+    container = ("<article>", "</article>") if semantic else ("<div>", "</div>")
+    layout = "layout" if semantic else "page-content"
+    html = (
+        "<html><head><title>Story</title>"
+        "<script>var analytics = {track: function() { return 'x'.repeat(500); }};</script>"
+        "<style>.menu { display: flex; } .ad { width: 300px; }</style></head><body>"
+        f'<header><div class="logo">Daily Paper</div><ul class="menu">{menu}</ul></header>'
+        f'<div class="{layout}"><div class="sidebar"><h3>Trending</h3><ul>{related}</ul></div>'
+        f"{container[0]}<h1>Headline {seed}</h1>{body}{container[1]}"
+        f'<div class="share"><a href="#">Share</a> <a href="#">Tweet</a></div></div>'
+        f'<footer><p>Copyright Daily Paper. All rights reserved.</p><ul>{menu}</ul></footer>'
+        "<script>window.dataLayer = window.dataLayer || [];</script></body></html>"
+    )
+    return html, article
+
+
+def legacy_extract(html: str, max_chars: int = 8000) -> str:
+    """The BeautifulSoup extraction SearchService used before (baseline)."""
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style", "nav", "header", "footer", "aside", "iframe", "noscript"]):
+        element.decompose()
+    main_content = soup.find("main") or soup.find("article") or soup.find(class_=re.compile(r"content|article|post|body"))
+    text = (main_content or soup).get_text(separator=" ", strip=True)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[:max_chars] + "..." if len(text) > max_chars else text
+
+
+def noise(text: str) -> int:
+    """Boilerplate fragments that leaked into extracted text."""
+    return sum(text.count(marker) for marker in ("Related story", "Trending", "Share", "Copyright", "Subscribe"))
+
+
+class TestExtraction:
+
+    def test_prefers_article_and_skips_boilerplate(self):
+        html, article = news_page(1, paragraphs=3)
+        text = extract_main_text(html, 8000)
+        assert text.startswith("Headline 1")
+        assert all(p in text for p in article)
+        assert noise(text) == 0
+        assert "analytics" not in text
+
+    def test_content_class_container_without_semantic_tags(self):
+        html, article = news_page(2, paragraphs=3, semantic=False)
+        text = extract_main_text(html, 8000)
+        assert all(p in text for p in article)
+        assert "Related story" not in text
+        assert "Related story" in legacy_extract(html)
+
+    def test_link_heavy_blocks_are_dropped_from_plain_pages(self):
+        links = "".join(f'<a href="/{i}">Category {i}</a> ' for i in range(10))
+        html = f"<body><div>{links}</div><div><p>Load shedding is suspended for the weekend, Eskom said.</p></div></body>"
+        assert extract_main_text(html, 8000) == "Load shedding is suspended for the weekend, Eskom said."
+
+    def test_truncates_and_stops_early(self):
+        html, _ = news_page(3, paragraphs=400)
+        text = extract_main_text(html, 1000)
+        assert len(text) == 1003 and text.endswith("...")
+
+    def test_tolerates_broken_markup(self):
+        html = "<body><main><p>First <b>bold<p>Second</i></main><footer>Footer</footer>"
+        text = extract_main_text(html, 8000)
+        assert "First bold" in text and "Second" in text
+        assert "Footer" not in text
+
+    def test_entities_are_decoded(self):
+        assert extract_main_text("<p>Fish &amp; chips &ndash; R45</p>", 100) == "Fish & chips – R45"
+
+    def test_html_content_types(self):
+        assert is_html_content_type("text/html; charset=utf-8")
+        assert is_html_content_type("application/xhtml+xml")
+        assert is_html_content_type("")
+        assert not is_html_content_type("application/pdf")
+        assert not is_html_content_type("image/png")
+
+
+class TestOffLoop:
+
+    async def test_large_pages_use_the_worker_pool(self, monkeypatch):
+        html, article = news_page(4, paragraphs=5)
+        monkeypatch.setattr(html_extract, "INLINE_EXTRACT_CHARS", 0)
+        try:
+            text = await extract_main_text_async(html, 8000)
+            assert html_extract._pool.started
+        finally:
+            html_extract.shutdown_extract_pool()
+        assert text == extract_main_text(html, 8000)
+
+    async def test_small_pages_are_extracted_inline(self):
+        html, _ = news_page(5, paragraphs=2)
+        await extract_main_text_async(html, 8000)
+        assert not html_extract._pool.started
+
+
+@pytest.mark.slow
+class TestBenchmark:
+    """Throughput and quality against the BeautifulSoup baseline (GOGGA_EXTRACT_BENCH_PAGES, default 200)."""
+
+    def test_faster_and_no_worse(self):
+        pages = int(os.environ.get("GOGGA_EXTRACT_BENCH_PAGES", 200))
+        corpus = [news_page(seed, paragraphs=20 + seed % 60, semantic=seed % 3 != 0) for seed in range(pages)]
+        megabytes = sum(len(html) for html, _ in corpus) / 1e6
+
+        results = {}
+        for name, extract in (("beautifulsoup", legacy_extract), ("streaming", lambda h: extract_main_text(h, 8000))):
+            start = time.perf_counter()
+            texts = [extract(html) for html, _ in corpus]
+            elapsed = time.perf_counter() - start
+            # Recall: article paragraphs that fit in the 8000-char budget and made it out
+            recall = sum(
+                sum(p in text for p in article[:5]) for text, (_, article) in zip(texts, corpus)
+            ) / (5 * pages)
+            results[name] = (megabytes / elapsed, recall, sum(noise(t) for t in texts) / pages)
+
+        for name, (throughput, recall, leaked) in results.items():
+            print(f"\n   {name:>13}: {throughput:6.1f} MB/s | recall {recall:.2f} | boilerplate/page {leaked:.1f}")
+        legacy, streaming = results["beautifulsoup"], results["streaming"]
+        assert streaming[0] > legacy[0]
+        assert streaming[1] >= legacy[1]
+        assert streaming[2] <= legacy[2]
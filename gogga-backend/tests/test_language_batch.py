@@ -0,0 +1,123 @@
+"""
+Tests for GOGGA batch language detection (worker process pool)
+
+Run with: pytest tests/test_language_batch.py -v
+Benchmark: pytest tests/test_language_batch.py -v -s -m slow
+"""
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.plugins.language_detector import LanguageDetectorPlugin, LanguageFamily
+from app.services import language_batch, process_pool
+from app.services.language_batch import BatchLanguageDetector
+from app.services.process_pool import pool_context
+
+
+TEXTS = [
+    "Sawubona, ngicela ungisize ngomsebenzi wami",
+    "Molo, ndicela uncedo nge-CV yam",
+    "Dumela, ke kopa thuso ka kgwebo ya ka",
+    "Goeie môre, hoe gaan dit met jou?",
+    "Hello, how are you today?",
+    "Avuxeni, ndzi kombela ku pfuniwa",
+    "Ndaa, ndi khou humbela thuso",
+    "",
+]
+
+
+def reference(texts):
+    detector = LanguageDetectorPlugin()
+    return [(r.code, r.confidence) for r in map(detector.detect, texts)]
+
+
+def labels(results):
+    return [(r.code, r.confidence) for r in results]
+
+
+class TestBatchDetection:
+
+    def test_inline_batch_matches_plugin(self):
+        detector = BatchLanguageDetector(workers=1)
+        assert labels(detector.detect(TEXTS)) == reference(TEXTS)
+
+    def test_pool_preserves_input_order(self, monkeypatch):
+        monkeypatch.setattr(language_batch, "INLINE_MAX", 0)
+        texts = TEXTS * 5
+        random.Random(7).shuffle(texts)
+        detector = BatchLanguageDetector(workers=2, chunk_size=3)
+        try:
+            results = detector.detect(texts)
+            assert detector.get_stats()["pool_started"]
+        finally:
+            detector.close()
+        assert labels(results) == reference(texts)
+
+    def test_pool_does_not_fork_the_server_process(self):
+        assert pool_context().get_start_method() in ("forkserver", "spawn")
+        assert language_batch.__name__ in process_pool._preload
+
+    def test_concurrent_inline_batches(self):
+        detector = BatchLanguageDetector(workers=1)
+        texts = TEXTS * 50
+        with ThreadPoolExecutor(8) as threads:
+            batches = list(threads.map(detector.detect, [texts] * 8))
+        assert all(labels(batch) == reference(texts) for batch in batches)
+
+    def test_results_are_full_detection_results(self):
+        result = BatchLanguageDetector(workers=1).detect(["Sawubona, unjani namhlanje?"])[0]
+        assert result.code == "zu"
+        assert result.name == "isiZulu"
+        assert result.family == LanguageFamily.NGUNI
+
+    def test_stats(self):
+        detector = BatchLanguageDetector(workers=1)
+        detector.detect(TEXTS)
+        stats = detector.get_stats()
+        assert stats["batches"] == 1
+        assert stats["texts"] == len(TEXTS)
+        assert not stats["pool_started"]
+
+
+def synthetic_messages(count: int) -> list[str]:
+    """Unique chat-like messages assembled from the test texts' words."""
+    rng = random.Random(42)
+    words_by_text = [text.split() for text in TEXTS if text]
+    messages = []
+    for i in range(count):
+        words = rng.choice(words_by_text)
+        messages.append(" ".join(rng.sample(words, len(words))) + f" {i}")
+    return messages
+
+
+@pytest.mark.slow
+class TestBatchBenchmark:
+    """Inline vs worker pool throughput (GOGGA_BATCH_BENCH_SIZE messages)."""
+
+    def test_pool_vs_inline(self):
+        size = int(os.environ.get("GOGGA_BATCH_BENCH_SIZE", 100_000))
+        messages = synthetic_messages(size)
+
+        inline = BatchLanguageDetector(workers=1)
+        start = time.perf_counter()
+        inline_results = inline.detect(messages)
+        inline_rate = size / (time.perf_counter() - start)
+
+        pooled = BatchLanguageDetector()
+        try:
+            pooled.detect(messages[:language_batch.INLINE_MAX + 1])  # Start workers
+            start = time.perf_counter()
+            pool_results = pooled.detect(messages)
+            pool_rate = size / (time.perf_counter() - start)
+        finally:
+            pooled.close()
+
+        print(f"\n   {size} messages | inline: {inline_rate:,.0f}/s"
+              f" | pool ({pooled.workers} workers): {pool_rate:,.0f}/s"
+              f" ({pool_rate / inline_rate:.1f}x)")
+        assert labels(pool_results) == labels(inline_results)
+        if (os.cpu_count() or 1) >= 4:
+            assert pool_rate > inline_rate
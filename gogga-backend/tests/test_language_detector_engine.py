@@ -0,0 +1,379 @@
+"""
+Tests for the Language Detector scoring engine (compiled profile indexes)
+
+The indexed engine must make the same decisions as the original per-profile
+tuple scans and per-family regexes (kept below as LegacyDetector). The only
+intended difference: cultural markers must now match whole words.
+
+Run with: pytest tests/test_language_detector_engine.py -v
+Benchmark: pytest tests/test_language_detector_engine.py -v -s -m slow
+"""
+import math
+import random
+import re
+import time
+from collections import defaultdict
+
+import pytest
+
+from app.core.text_features import extract_features
+from app.plugins.language_detector import (
+    LANGUAGE_PROFILES,
+    NGRAM_INDEX,
+    VOCAB_INDEX,
+    SAMPLE_WINDOW_CHARS,
+    LanguageDetectorPlugin,
+    count_morphology_roots,
+    sample_windows,
+)
+from app.plugins import language_detector
+
+
+# The per-family regexes the morphology scan replaced
+LEGACY_MORPHOLOGY = {
+    'nguni': re.compile(r'\b(ngi|ndi|si|ba|siya|kwi|nga|uma|uku|molo|sawu|lotjh|bona|yebo|cha|ewe|hayi|enkosi|kahle|kakhulu)\w*', re.IGNORECASE),
+    'sotho': re.compile(r'\b(ka|ke|go|ho|ha|le|re|tsa|tse|tlh|dum|lum|thob|lebo|gabotse|hantle|sentle|pula|motho|batho)\w*', re.IGNORECASE),
+    'afrikaans': re.compile(r'\b(die|is|en|ek|jy|hy|ons|het|nie|te|van|wat|maar|ook|sal|kan|moet|dankie|asseblief|lekker|baie)\b', re.IGNORECASE),
+    'english': re.compile(r'\b(the|and|is|are|to|in|of|that|it|you|for|with|have|this|was|were|been|being|would|could|howzit|lekker|braai|bru)\b', re.IGNORECASE),
+    'tsonga': re.compile(r'\b(ndzi|ku|hi|ka|va|avu|xeni|khensa|riva|swinene|famba|mina|hina|kahle|n\'we|dyambu|mpfula)\w*', re.IGNORECASE),
+    'venda': re.compile(r'\b(ndi|vha|u|nda|livhu|tshi|vho|hani|ndaa|zwavhudi|nga|maanda|shango|thavha|duvha|mvula)\w*', re.IGNORECASE),
+}
+
+
+# Realistic mixed-language chat traffic
+CHAT_CORPUS = [
+    "Sawubona, ngicela usizo ngomthetho wami",
+    "Molo, ndifuna uncedo ngomthetho wami",
+    "Hallo, ek het hulp nodig met my saak",
+    "Thobela, ke nyaka thušo ka molao",
+    "Dumela, ke batla thuso ka molao",
+    "Lumela, ke batla thuso ka molao waka",
+    "Avuxeni, ndzi lava mpfuno hi nawu",
+    "Ndaa, ndi toda thuso nga mulayo",
+    "Sawubona make, ngicela lusizo",
+    "Lotjhani, ngibawa usizo ngomthetho",
+    "Hello, I need help with my legal matter",
+    "Howzit bru, the braai was lekker but load shedding ruined it",
+    "Eish, ngiyabonga kakhulu for the help with my CV",
+    "Ek is baie moeg vandag, can you help me with my tax return?",
+    "Ke a leboga, now-now I will send the documents",
+    "Ngifuna ukuya edolobheni namhlanje but the taxi is late",
+    "Dankie vir die hulp, ek waardeer dit regtig",
+    "Enkosi kakhulu, ndiyabulela ngoncedo lwakho",
+    "What is the capital of South Africa?",
+    "Please summarise this contract and list the key obligations",
+    "Ndza khensa swinene, n'wana wa mina u kahle",
+    "Ndi a livhuwa nga maanda, vho vha vha tshi ntshumela zwavhudi",
+    "Ngiyabonga make, ngicela kutsi ungisite",
+    "Ke kopa thuso ka kgwebo ya ka, ke a leboga",
+    "Can you translate 'ngiyakuthanda' to English?",
+    "ok thanks",
+    "Goeie môre, hoe gaan dit met jou?",
+]
+
+
+class LegacyDetector(LanguageDetectorPlugin):
+    """The original tuple-scanning scorers."""
+
+    def _calculate_vocabulary_score(self, features):
+        text_lower = features.lower
+        scores = defaultdict(float)
+        words = set(re.findall(r"\b[a-zA-Z']+\b", text_lower))
+        word_language_map = defaultdict(set)
+        for word in words:
+            for lang_code, profile in LANGUAGE_PROFILES.items():
+                if word in profile.core_vocab:
+                    word_language_map[word].add(lang_code)
+        for lang_code, profile in LANGUAGE_PROFILES.items():
+            word_matches = 0.0
+            for vocab_word in profile.core_vocab:
+                if vocab_word in words:
+                    word_matches += 1.5 if len(word_language_map.get(vocab_word, set())) == 1 else 1.0
+            substring_matches = sum(
+                1 for vocab_word in profile.core_vocab
+                if vocab_word in text_lower and vocab_word not in words
+            )
+            total_matches = word_matches + (substring_matches * 0.3)
+            if total_matches > 0:
+                scores[lang_code] = min(1.0, 0.3 + (math.log2(1 + total_matches) * 0.25))
+        return scores
+
+    def _calculate_morphology_score(self, text_lower):
+        scores = defaultdict(float)
+        counts = {family: len(regex.findall(text_lower)) for family, regex in LEGACY_MORPHOLOGY.items()}
+        if counts['nguni']:
+            nguni_score = min(0.4, counts['nguni'] * 0.1)
+            scores['zu'] += nguni_score
+            scores['xh'] += nguni_score * 0.9
+            scores['ss'] += nguni_score * 0.7
+            scores['nr'] += nguni_score * 0.7
+        if counts['sotho']:
+            sotho_score = min(0.4, counts['sotho'] * 0.1)
+            scores['nso'] += sotho_score
+            scores['tn'] += sotho_score * 0.95
+            scores['st'] += sotho_score * 0.95
+        if counts['afrikaans']:
+            scores['af'] += min(0.5, counts['afrikaans'] * 0.12)
+        if counts['english']:
+            scores['en'] += min(0.3, counts['english'] * 0.08)
+        if counts['tsonga']:
+            scores['ts'] += min(0.4, counts['tsonga'] * 0.12)
+        if counts['venda']:
+            scores['ve'] += min(0.4, counts['venda'] * 0.12)
+        return scores
+
+    def _calculate_cultural_score(self, features):
+        scores = defaultdict(float)
+        for lang_code, profile in LANGUAGE_PROFILES.items():
+            for marker in profile.cultural_markers:
+                if marker.lower() in features.lower:
+                    scores[lang_code] += 0.2 + (len(marker.split()) - 1) * 0.15
+        return scores
+
+    def _calculate_ngram_score(self, text):
+        scores = defaultdict(float)
+        if len(text) < 4:
+            return scores
+        normalized = text.lower().replace(" ", "")
+        grams = [normalized[i:i + 3] for i in range(len(normalized) - 2)]
+        if not grams:
+            return scores
+        for lang_code, profile in LANGUAGE_PROFILES.items():
+            matches = sum(1 for gram in grams if gram in profile.fingerprints)
+            if matches > 0:
+                scores[lang_code] = matches / len(grams)
+        return scores
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return LanguageDetectorPlugin()
+
+
+@pytest.fixture(scope="module")
+def legacy():
+    return LegacyDetector()
+
+
+class TestCompiledIndexes:
+
+    def test_vocab_index_keeps_profile_multiplicity(self):
+        # 'bona' appears twice in the isiZulu profile and once in several others
+        entry = dict(VOCAB_INDEX["bona"])
+        assert entry["zu"] == LANGUAGE_PROFILES["zu"].core_vocab.count("bona")
+        assert set(entry) == {c for c, p in LANGUAGE_PROFILES.items() if "bona" in p.core_vocab}
+
+    def test_ngram_index_covers_every_fingerprint(self):
+        for lang_code, profile in LANGUAGE_PROFILES.items():
+            for gram in profile.fingerprints:
+                assert lang_code in NGRAM_INDEX[gram]
+
+
+class TestIdenticalResults:
+
+    @pytest.mark.parametrize("text", CHAT_CORPUS)
+    def test_same_scores_as_legacy(self, detector, legacy, text):
+        features = extract_features(text)
+        assert detector._calculate_vocabulary_score(features) == legacy._calculate_vocabulary_score(features)
+        assert detector._calculate_ngram_score(text) == legacy._calculate_ngram_score(text)
+
+    @pytest.mark.parametrize("text", CHAT_CORPUS)
+    def test_same_morphology_as_legacy(self, detector, legacy, text):
+        assert detector._calculate_morphology_score(text.lower()) == legacy._calculate_morphology_score(text.lower())
+
+    def test_morphology_counts_match_regexes_on_edge_cases(self):
+        texts = [
+            "n'weti wa mina", "N'we n'wana ku", "it's ndi'ndi", "ngiyabonga_ kakhulu",
+            "ü ubuntu ukuthi", "ka-ka ka'ka", "the THE tHe isn't", "bona...bona,bona",
+        ]
+        for text in texts + [t.lower() for t in CHAT_CORPUS]:
+            lower = text.lower()
+            counts = count_morphology_roots(lower)
+            assert {f: counts[f] for f in LEGACY_MORPHOLOGY} == {
+                f: len(r.findall(lower)) for f, r in LEGACY_MORPHOLOGY.items()
+            }, text
+
+    @pytest.mark.parametrize("text", CHAT_CORPUS)
+    def test_same_language_as_legacy(self, detector, legacy, text):
+        assert detector.detect(text).code == legacy.detect(text).code
+
+
+class TestCulturalMarkerBoundaries:
+
+    def test_marker_inside_word_does_not_count(self, detector):
+        # Venda 'aa' used to fire inside 'baas'; Setswana 'pula' inside 'popular'
+        scores = detector._calculate_cultural_score(extract_features("Die baas is popular"))
+        assert "ve" not in scores
+        assert "tn" not in scores
+
+    def test_whole_marker_phrases_count(self, detector):
+        scores = detector._calculate_cultural_score(extract_features("Ee rra, ke a leboga!"))
+        # 'ee rra' (2 words) + 'ke a leboga' (3 words) for both Sepedi and Setswana
+        assert scores["nso"] == pytest.approx(0.85)
+        assert scores["tn"] == pytest.approx(0.85)
+
+
+class TestDetectionCache:
+
+    def test_normalized_repeats_hit_the_cache(self):
+        detector = LanguageDetectorPlugin()
+        first = detector.detect_cached("Sawubona, unjani?")
+        assert detector.detect_cached("  sawubona,   UNJANI?") is first
+        stats = detector.get_stats()
+        assert (stats["cache_hits"], stats["cache_misses"]) == (1, 1)
+
+
+class TestSessionLanguage:
+
+    def test_short_replies_inherit_with_decay(self):
+        detector = LanguageDetectorPlugin()
+        opening = detector.detect_in_session("Sawubona, ngicela usizo ngomthetho wami", "u1:c1")
+        assert opening.code == "zu"
+
+        first = detector.detect_in_session("ok thanks", "u1:c1")
+        second = detector.detect_in_session("👍", "u1:c1")
+        assert (first.code, first.method) == ("zu", "session")
+        assert first.confidence == pytest.approx(opening.confidence * 0.85)
+        assert second.confidence < first.confidence
+        assert detector.get_stats()["inherited"] == 2
+
+    def test_short_reply_without_session_is_detected(self):
+        detector = LanguageDetectorPlugin()
+        assert detector.detect_in_session("ok thanks", "u1:new").method != "session"
+        assert detector.detect_in_session("ok thanks", None).code == "en"
+
+    def test_strong_short_signal_switches_language(self):
+        detector = LanguageDetectorPlugin()
+        detector.detect_in_session("Sawubona, ngicela usizo ngomthetho wami", "u1:c1")
+        result = detector.detect_in_session("Dankie!", "u1:c1")
+        assert result.code == "af"
+        assert result.method != "session"
+
+    def test_clear_english_message_code_switches(self):
+        detector = LanguageDetectorPlugin()
+        detector.detect_in_session("Sawubona, ngicela usizo ngomthetho wami", "u1:c1")
+        detector.detect_in_session("ok", "u1:c1")
+        result = detector.detect_in_session("Can you explain the second point in more detail please?", "u1:c1")
+        assert result.code == "en"
+        assert detector.get_stats()["switches"] == 1
+        assert detector.detect_in_session("thanks", "u1:c1").code == "en"
+
+    def test_sessions_are_isolated(self):
+        detector = LanguageDetectorPlugin()
+        detector.detect_in_session("Sawubona, ngicela usizo ngomthetho wami", "u1:c1")
+        detector.detect_in_session("Hallo, ek het hulp nodig met my saak", "u1:c2")
+        assert detector.detect_in_session("ok thanks", "u1:c1").code == "zu"
+        assert detector.detect_in_session("ok thanks", "u1:c2").code == "af"
+
+    async def test_before_request_uses_session_id(self):
+        detector = LanguageDetectorPlugin()
+        await detector.before_request({
+            "session_id": "u1:c1",
+            "messages": [{"role": "user", "content": "Molo, ndifuna uncedo ngomthetho wami"}],
+        })
+        request = await detector.before_request({
+            "session_id": "u1:c1",
+            "messages": [{"role": "user", "content": "ok"}],
+        })
+        intel = request["metadata"]["language_intelligence"]
+        assert (intel["code"], intel["method"]) == ("xh", "session")
+
+
+def long_document(text: str, chars: int, seed: int = 0) -> str:
+    """Prose-like document built by shuffling the words of a chat message."""
+    rng = random.Random(seed)
+    words = text.split()
+    sentences, length = [], 0
+    while length < chars:
+        sentence = " ".join(rng.sample(words, len(words))) + "."
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def full_scan(text: str):
+    """Detection with sampling disabled."""
+    original = language_detector.SAMPLE_MIN_CHARS
+    language_detector.SAMPLE_MIN_CHARS = math.inf
+    try:
+        return LanguageDetectorPlugin().detect(text)
+    finally:
+        language_detector.SAMPLE_MIN_CHARS = original
+
+
+class TestLengthAwareSampling:
+
+    def test_short_text_is_one_window(self):
+        assert sample_windows("Sawubona, unjani?") == ["Sawubona, unjani?"]
+
+    def test_windows_cover_start_middle_and_end_on_word_boundaries(self):
+        text = long_document(CHAT_CORPUS[10], 20_000)
+        windows = sample_windows(text)
+        assert len(windows) == 3
+        assert text.startswith(windows[0])
+        assert text.endswith(windows[2].rstrip())
+        for window in windows:
+            assert 0 < len(window) <= SAMPLE_WINDOW_CHARS
+            start = text.index(window)
+            assert start == 0 or text[start - 1] == " "
+
+    @pytest.mark.parametrize("text", [CHAT_CORPUS[i] for i in (1, 2, 6, 10, 16)])
+    def test_conclusive_documents_are_sampled(self, text):
+        document = long_document(text, 50_000)
+        detector = LanguageDetectorPlugin()
+        assert detector.detect(document).code == full_scan(document).code
+        assert detector.get_stats()["sampled"] == 1
+
+    def test_ambiguous_documents_fall_back_to_full_scan(self, monkeypatch):
+        monkeypatch.setattr(language_detector, "SAMPLE_MARGIN", 1.0)
+        document = long_document(CHAT_CORPUS[0], 20_000)
+        detector = LanguageDetectorPlugin()
+        result = detector.detect(document)
+        expected = full_scan(document)
+        assert (result.code, result.confidence) == (expected.code, expected.confidence)
+        assert detector.get_stats()["sample_fallbacks"] == 1
+
+    def test_windows_must_agree(self):
+        # English start, isiXhosa middle and end: the start window alone is not enough
+        document = " ".join([
+            long_document(CHAT_CORPUS[10], 10_000),
+            long_document(CHAT_CORPUS[1], 30_000),
+        ])
+        assert LanguageDetectorPlugin().detect(document).code == full_scan(document).code == "xh"
+
+
+@pytest.mark.slow
+class TestDetectorThroughputBenchmark:
+    """Messages per second: legacy scans vs compiled indexes and single-pass roots."""
+
+    def test_messages_per_second(self, detector, legacy):
+        messages = CHAT_CORPUS * 40
+
+        rates = {}
+        for name, engine in (("legacy", legacy), ("indexed", detector)):
+            engine.detect(messages[0])
+            start = time.perf_counter()
+            for message in messages:
+                extract_features.cache_clear()  # No cross-message reuse
+                engine.detect(message)
+            rates[name] = len(messages) / (time.perf_counter() - start)
+
+        print(f"\n   language detection | legacy: {rates['legacy']:,.0f} msg/s"
+              f" | indexed: {rates['indexed']:,.0f} msg/s"
+              f" ({rates['indexed'] / rates['legacy']:.1f}x)")
+        assert rates["indexed"] > rates["legacy"]
+
+    def test_long_document_cost(self, detector):
+        timings = {}
+        for chars in (10_000, 100_000):
+            document = long_document(CHAT_CORPUS[10], chars)
+            for name, detect in (("sampled", detector.detect), ("full", full_scan)):
+                extract_features.cache_clear()
+                start = time.perf_counter()
+                detect(document)
+                timings[name, chars] = (time.perf_counter() - start) * 1e3
+
+        print(f"\n   long documents | full: {timings['full', 10_000]:.1f}ms (10k chars)"
+              f" / {timings['full', 100_000]:.1f}ms (100k chars)"
+              f" | sampled: {timings['sampled', 10_000]:.1f}ms / {timings['sampled', 100_000]:.1f}ms")
+        assert timings["sampled", 100_000] < timings["full", 100_000]
@@ -0,0 +1,193 @@
+"""
+Tests for the local SA legislation index (SQLite FTS5) and legal_search
+
+Run with: pytest tests/test_legal_corpus.py -v
+Benchmark: pytest tests/test_legal_corpus.py -v -s -m slow
+"""
+import os
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.services import legal_corpus
+from app.services.legal_corpus import BUNDLED_CORPUS_DIR, LegalCorpus, parse_corpus_file, query_terms
+from app.services import tool_result_cache
+from app.services.tool_result_cache import ToolResultCache
+from app.tools.search_executor import execute_legal_search, execute_search_tools
+
+ACT = """---
+act: Example Act 1 of 2024
+aliases: EXA, example
+url: https://example.gov.za/act
+---
+## 1. Definitions
+In this Act "braai" means an outdoor barbecue.
+
+## 2A. Braai permits
+A permit is required for a braai in a public park.
+"""
+
+
+@pytest.fixture
+def corpus():
+    corpus = LegalCorpus(":memory:", [BUNDLED_CORPUS_DIR])
+    corpus.sync()
+    yield corpus
+    corpus.close()
+
+
+class TestParsing:
+
+    def test_front_matter_and_sections(self):
+        meta, sections = parse_corpus_file(ACT)
+        assert meta == {"act": "Example Act 1 of 2024", "aliases": "EXA, example", "url": "https://example.gov.za/act"}
+        assert [(number, title) for number, title, _ in sections] == [("1", "Definitions"), ("2A", "Braai permits")]
+        assert sections[1][2] == "A permit is required for a braai in a public park."
+
+    def test_query_terms(self):
+        assert query_terms("What does South African law say about POPIA fines? POPIA!") == ["say", "popia", "fines"]
+
+
+class TestSearch:
+
+    @pytest.mark.parametrize("query, act, section", [
+        ("BCEA notice of termination after one year", "Basic Conditions of Employment Act", "37"),
+        ("POPIA administrative fine maximum", "Protection of Personal Information Act", "109"),
+        ("CPA cooling-off period direct marketing", "Consumer Protection Act", "16"),
+        ("constitution right to privacy", "Constitution", "14"),
+        ("refer unfair dismissal to the CCMA within 30 days", "Labour Relations Act", "191"),
+        ("maternity leave months", "Basic Conditions of Employment Act", "25"),
+    ])
+    def test_answers_from_the_bundled_corpus(self, corpus, query, act, section):
+        result = corpus.search(query)
+        assert result.strong
+        assert result.sections[0].act.startswith(act)
+        assert result.sections[0].section == section
+        assert result.elapsed_ms < 50
+
+    def test_weak_recall_for_other_topics(self, corpus):
+        assert not corpus.search("speed limit on national highways").strong
+        assert not corpus.search("crypto capital gains tax").strong
+        assert not corpus.search("").sections
+
+    def test_fts_syntax_in_queries_is_harmless(self, corpus):
+        assert corpus.search('leave" OR body:* NEAR(') is not None
+
+    def test_format_for_llm(self, corpus):
+        context = corpus.search("BCEA sick leave").format_for_llm()
+        assert context.startswith("[SA LEGAL SEARCH RESULTS]")
+        assert "Basic Conditions of Employment Act 75 of 1997, section 22" in context
+        assert context.endswith("[END SEARCH RESULTS]")
+
+
+class TestIncrementalSync:
+
+    def test_drop_dir_add_change_override_remove(self, tmp_path):
+        drop = tmp_path / "drop"
+        drop.mkdir()
+        corpus = LegalCorpus(tmp_path / "index.db", [BUNDLED_CORPUS_DIR, drop])
+        bundled = corpus.sync()["indexed"]
+        assert corpus.sync() == {"indexed": 0, "unchanged": bundled, "removed": 0}
+
+        (drop / "example.md").write_text(ACT)
+        assert corpus.sync()["indexed"] == 1
+        assert corpus.search("braai permit public park").sections[0].act == "Example Act 1 of 2024"
+
+        # Changed content is re-indexed; a touched but identical file is not
+        (drop / "example.md").write_text(ACT.replace("public park", "nature reserve"))
+        assert corpus.sync()["indexed"] == 1
+        assert "nature reserve" in corpus.search("braai permit").sections[0].body
+        os.utime(drop / "example.md", (time.time() + 10, time.time() + 10))
+        assert corpus.sync()["indexed"] == 0
+
+        # A dropped file replaces the bundled one of the same name
+        (drop / "popia.md").write_text(ACT.replace("Example Act 1 of 2024", "POPIA full text"))
+        corpus.sync()
+        assert not any(s.act.startswith("Protection of Personal") for s in corpus.search("POPIA", limit=50).sections)
+
+        (drop / "example.md").unlink()
+        (drop / "popia.md").unlink()
+        counts = corpus.sync()
+        assert counts["removed"] == 1 and counts["indexed"] == 1  # popia.md falls back to the bundled file
+        assert not corpus.search("braai").sections
+        assert corpus.get_stats()["files"] == bundled
+        corpus.close()
+
+    def test_index_persists_across_instances(self, tmp_path):
+        LegalCorpus(tmp_path / "index.db", [BUNDLED_CORPUS_DIR]).sync()
+        reopened = LegalCorpus(tmp_path / "index.db", [BUNDLED_CORPUS_DIR])
+        assert reopened.sync()["indexed"] == 0
+        assert reopened.search("POPIA consent withdraw").strong
+
+
+class TestLegalSearchTool:
+
+    async def test_local_answer_skips_the_web(self, corpus, monkeypatch):
+        monkeypatch.setattr(legal_corpus, "_legal_corpus", corpus)
+        with patch("app.tools.search_executor.get_search_service", side_effect=AssertionError("web used")):
+            result = await execute_legal_search("BCEA annual leave days")
+        assert result["success"] and result["source"] == "local"
+        assert "section 20" in result["context"]
+
+    async def test_weak_recall_falls_back_to_the_web(self, corpus, monkeypatch):
+        monkeypatch.setattr(legal_corpus, "_legal_corpus", corpus)
+        with patch("app.tools.search_executor.get_search_service") as get_service:
+            get_service.return_value.search.side_effect = RuntimeError("Serper down")
+            result = await execute_legal_search("speed limit on national highways")
+        get_service.return_value.search.assert_called_once()
+        # Weak local matches are still better than nothing when the web fails
+        assert result["success"] == bool(corpus.search("speed limit on national highways").sections)
+
+    async def test_planned_lookup_is_not_repeated(self, corpus, monkeypatch):
+        monkeypatch.setattr(legal_corpus, "_legal_corpus", corpus)
+        monkeypatch.setattr(tool_result_cache, "_tool_cache", ToolResultCache())
+        queries = []
+        search = corpus.search
+        monkeypatch.setattr(corpus, "search", lambda query, limit=None: queries.append(query) or search(query, limit))
+        with patch("app.tools.search_executor.get_search_service", side_effect=AssertionError("web used")):
+            [result] = await execute_search_tools([("legal_search", {"query": "BCEA annual leave days"})])
+        assert result["source"] == "local"
+        assert queries == ["BCEA annual leave days"]
+
+    async def test_case_law_only_goes_to_the_web(self, corpus, monkeypatch):
+        monkeypatch.setattr(legal_corpus, "_legal_corpus", corpus)
+        with patch("app.tools.search_executor.get_search_service") as get_service:
+            get_service.return_value.search.side_effect = RuntimeError("Serper down")
+            result = await execute_legal_search("BCEA annual leave days", legislation=False)
+        assert not result["success"]
+
+
+@pytest.mark.slow
+class TestLatency:
+    """Query latency on a synthetic corpus (GOGGA_LEGAL_BENCH_SECTIONS, default 20,000 sections)."""
+
+    def test_millisecond_queries(self, tmp_path):
+        sections = int(os.environ.get("GOGGA_LEGAL_BENCH_SECTIONS", 20_000))
+        rng = random.Random(3)
+        words = " ".join(open(BUNDLED_CORPUS_DIR / "lra.md").read().split()).split()
+        per_file = 500
+        for n in range(sections // per_file):
+            body = [f"---\nact: Synthetic Act {n} of 2024\n---"]
+            for s in range(per_file):
+                text = " ".join(rng.choice(words) for _ in range(120))
+                body.append(f"## {s + 1}. Section {s + 1}\n{text}")
+            (tmp_path / f"act_{n}.md").write_text("\n".join(body))
+
+        corpus = LegalCorpus(tmp_path / "index.db", [BUNDLED_CORPUS_DIR, tmp_path])
+        start = time.perf_counter()
+        corpus.sync()
+        index_s = time.perf_counter() - start
+
+        queries = ["unfair dismissal compensation", "BCEA notice of termination", "POPIA consent",
+                   "protected strike dismissal", "deposit refund interest landlord"]
+        timings = []
+        for _ in range(20):
+            for query in queries:
+                timings.append(corpus.search(query).elapsed_ms)
+        p50, p95 = statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
+        print(f"\n   {sections:,} sections indexed in {index_s:.1f}s | query p50 {p50:.1f}ms p95 {p95:.1f}ms")
+        assert p95 < 100
+        corpus.close()
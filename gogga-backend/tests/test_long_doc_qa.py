@@ -0,0 +1,255 @@
+"""
+Tests for GOGGA Long Document QA (map-reduce over token-bounded parts)
+
+Run with: pytest tests/test_long_doc_qa.py -v
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.config import settings
+from app.core.router import UserTier
+from app.services import ai_service as ai_module
+from app.services.credit_service import DeductionSource
+from app.services.long_doc_qa import (
+    LongDocumentQA,
+    parse_finding,
+    split_document,
+    split_question,
+)
+
+FILLER = "The municipality publishes its budget every year after public participation."
+
+
+def completion(content: str, prompt: int = 100, output: int = 20):
+    """Minimal OpenAI-compatible completion."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt, completion_tokens=output),
+    )
+
+
+def contract(sections: int = 40, fact_at: int = 37) -> str:
+    """A long contract whose only termination clause is near the end."""
+    lines = []
+    for i in range(1, sections + 1):
+        lines.append(f"Clause {i}. " + " ".join([FILLER] * 30))
+        if i == fact_at:
+            lines.append("The lease may be terminated by either party with 60 days written notice.")
+    return "\n".join(lines)
+
+
+class FakeLLM:
+    """Map calls answer when their part mentions the needle; reduce echoes findings."""
+
+    def __init__(self, needle: str = "terminated", delay: float = 0.01, fail_parts: frozenset[int] = frozenset()):
+        self.needle = needle
+        self.delay = delay
+        self.fail_parts = fail_parts
+        self.inflight = self.max_inflight = 0
+        self.map_calls: list[int] = []
+        self.reduce_calls: list[str] = []
+
+    async def __call__(self, model, messages, max_tokens):
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.inflight -= 1
+        content = messages[-1]["content"]
+        if content.startswith("Findings:"):
+            self.reduce_calls.append(content)
+            cited = [line.split("]")[0] + "]" for line in content.split("\n") if line.startswith("[Part")]
+            return completion("<think>merging</think>Answer " + " ".join(cited))
+        number = int(content.split()[1])
+        self.map_calls.append(number)
+        if number in self.fail_parts:
+            raise RuntimeError("rate limited")
+        if self.needle in content.split("\n\nQuestion:")[0]:
+            return completion(json.dumps({"res": "ans", "content": f"60 days notice (part {number})"}))
+        return completion('{"res": "none", "content": ""}')
+
+
+def make_qa(llm, **options) -> LongDocumentQA:
+    options.setdefault("chunk_tokens", 1000)
+    return LongDocumentQA(map_model="qwen-3-32b", completer=llm, **options)
+
+
+class TestSplitting:
+
+    def test_question_before_document(self):
+        question, document = split_question("How much notice is needed?\n\n" + contract(3))
+        assert question == "How much notice is needed?"
+        assert document.startswith("Clause 1.")
+
+    def test_question_after_document(self):
+        question, document = split_question(contract(3) + "\n\nWhat does clause 2 say?")
+        assert question == "What does clause 2 say?"
+        assert document == contract(3)
+
+    def test_parts_are_token_bounded_and_cover_everything(self):
+        document = contract()
+        parts = split_document(document, 1000)
+        assert len(parts) > 5
+        assert all(part.tokens <= 1000 for part in parts)
+        assert [part.number for part in parts] == list(range(1, len(parts) + 1))
+        for part in parts:
+            assert document[part.start:].startswith(part.text[:50])
+        assert sum(len(part.text) for part in parts) >= len(document) - len(parts)
+
+    def test_table_header_repeats(self):
+        rows = ["date,account,amount"] + [f"2025-01-{i % 28 + 1:02d},ACC{i},{i * 10}" for i in range(3000)]
+        parts = split_document("\n".join(rows), 500)
+        assert len(parts) > 3
+        assert all(part.text.startswith("date,account,amount\n") for part in parts)
+
+    def test_long_single_line_is_wrapped(self):
+        parts = split_document("x" * 20_000, 1000)
+        assert len(parts) == 5
+        assert all(part.tokens <= 1000 for part in parts)
+
+
+class TestParseFinding:
+
+    def test_json_answer(self):
+        assert parse_finding('<think>hmm</think>{"res": "ans", "content": "R500 fine"}') == "R500 fine"
+
+    def test_none_is_dropped(self):
+        assert parse_finding('```json\n{"res": "none", "content": ""}\n```') is None
+        assert parse_finding("None.") is None
+
+    def test_free_text_is_kept(self):
+        assert parse_finding("The deposit earns interest.") == "The deposit earns interest."
+
+
+class TestMapReduce:
+
+    @pytest.mark.asyncio
+    async def test_finds_fact_beyond_the_old_truncation(self):
+        message = "How much notice is needed to terminate the lease?\n\n" + contract()
+        assert message.index("60 days") > 50_000  # Beyond what line truncation kept
+        llm = FakeLLM()
+        result = await make_qa(llm).answer(message)
+        [relevant] = [part for part in result.parts if part.status == "answer"]
+        assert f"[Part {relevant.number}]" in result.answer
+        assert result.thinking == "merging"
+        assert len(llm.reduce_calls) == 1 and "none" not in llm.reduce_calls[0]
+        assert result.usage["qwen-3-32b"][0] == 100 * (len(llm.map_calls) + 1)
+
+    @pytest.mark.asyncio
+    async def test_targeted_question_skips_unrelated_parts(self):
+        document = "\n".join(
+            ["Clause 1. " + " ".join(["Load shedding schedules are published weekly."] * 60)] * 20
+            + ["Clause 21. The lease may be terminated with 60 days written notice."]
+        )
+        llm = FakeLLM()
+        result = await make_qa(llm).answer("When can the lease be terminated?\n\n" + document)
+        coverage = result.coverage()
+        assert coverage["skipped"] > 0
+        assert coverage["relevant"] == 1
+        assert len(llm.map_calls) == coverage["mapped"] < coverage["parts"]
+
+    @pytest.mark.asyncio
+    async def test_whole_document_request_maps_every_part(self):
+        llm = FakeLLM()
+        result = await make_qa(llm).answer("Summarise this contract.\n\n" + contract())
+        assert result.coverage()["skipped"] == 0
+        assert sorted(llm.map_calls) == [part.number for part in result.parts]
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap_is_shared(self):
+        llm = FakeLLM(delay=0.02)
+        qa = make_qa(llm, max_concurrency=3)
+        await asyncio.gather(*(qa.answer("Summarise this.\n\n" + contract()) for _ in range(3)))
+        assert llm.max_inflight == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_parts_are_reported(self):
+        llm = FakeLLM(fail_parts=frozenset({2, 3}))
+        result = await make_qa(llm).answer("Summarise this contract.\n\n" + contract())
+        assert result.coverage()["failed"] == [2, 3]
+        assert "part(s) 2, 3 of" in result.answer
+
+    @pytest.mark.asyncio
+    async def test_all_parts_failing_raises(self):
+        llm = FakeLLM(fail_parts=frozenset(range(1, 100)))
+        with pytest.raises(RuntimeError):
+            await make_qa(llm).answer("Summarise this contract.\n\n" + contract())
+
+    @pytest.mark.asyncio
+    async def test_no_relevant_part_skips_reduce(self):
+        llm = FakeLLM(needle="braai")
+        result = await make_qa(llm).answer("Summarise the braai rules.\n\n" + contract())
+        assert llm.reduce_calls == []
+        assert "none of them answer" in result.answer
+
+    @pytest.mark.asyncio
+    async def test_large_findings_are_merged_in_rounds(self):
+        llm = FakeLLM(needle="Clause")
+        result = await make_qa(llm, reduce_input_tokens=60).answer("Summarise every clause.\n\n" + contract())
+        assert len(llm.reduce_calls) > 1
+        assert result.coverage()["relevant"] == len(result.parts)
+
+
+class TestLatency:
+
+    @pytest.mark.asyncio
+    async def test_faster_than_one_long_call(self):
+        """Prefill-bound model: latency grows with input tokens, so parallel parts win."""
+        async def model(model_id, messages, max_tokens):
+            tokens = sum(len(m["content"]) for m in messages) // 4
+            await asyncio.sleep(0.01 + tokens * 2e-5)
+            return completion('{"res": "ans", "content": "noted"}')
+
+        message = "Summarise this contract.\n\n" + contract(sections=80)
+        start = time.perf_counter()
+        await model("qwen-3-32b", [{"role": "user", "content": message}], 4096)
+        single = time.perf_counter() - start
+
+        result = await make_qa(model, chunk_tokens=2000, max_concurrency=8).answer(message)
+        assert result.coverage()["skipped"] == 0
+        assert result.latency_seconds < single * 0.6
+
+
+class TestChatIntegration:
+
+    @pytest.mark.asyncio
+    async def test_free_tier_keeps_truncation(self):
+        from app.api.v1.endpoints.chat import TieredChatRequest, _answer_long_document, _truncate_message
+        request = TieredChatRequest(message="Summarise.\n\n" + contract(), user_id="u1")
+        assert await _answer_long_document(request, UserTier.FREE, MagicMock()) is None
+        truncated = _truncate_message(request.message)
+        assert len(truncated) <= 50_000 and "[DATA TRUNCATED" in truncated
+
+    @pytest.mark.asyncio
+    async def test_paid_tier_uses_map_reduce_and_bills_each_model(self):
+        from app.api.v1.endpoints import chat
+        request = chat.TieredChatRequest(message="Summarise.\n\n" + contract(), user_id="u1", user_tier=UserTier.JIGGA)
+        qa = make_qa(FakeLLM(needle="Clause"))
+        usage = AsyncMock(return_value={"usd": 0.01, "zar": 0.2})
+        reservations = MagicMock()
+        reservations.settle.return_value = {"settlementId": "chat:u1:r1", "creditsDeducted": 1}
+        preflight = SimpleNamespace(
+            deduction_source=DeductionSource.CREDITS,
+            reservation=SimpleNamespace(quantity=9),
+            verified_tier=UserTier.JIGGA,
+        )
+        with patch.object(chat, "get_long_doc_qa", return_value=qa), patch.object(chat, "track_usage", usage), \
+             patch.object(ai_module, "get_credit_reservations", return_value=reservations):
+            result = await chat._answer_long_document(request, UserTier.JIGGA, preflight)
+        assert result["meta"]["layer"] == "long_document"
+        assert result["meta"]["long_document"]["relevant"] > 0
+        assert "[Part 1]" in result["response"]
+        billed = {call.kwargs["model"] for call in usage.await_args_list}
+        assert billed == {settings.MODEL_JIVE, settings.MODEL_JIGGA_235B}
+        # Map and reduce tokens settle together against the reservation
+        tokens = result["meta"]["input_tokens"] + result["meta"]["output_tokens"]
+        reservations.settle.assert_called_once()
+        assert reservations.settle.call_args.args == (preflight.reservation, (tokens + 9999) // 10_000)
+        assert result["meta"]["billing"]["event_id"] == "chat:u1:r1"
+        reservations.release.assert_not_called()
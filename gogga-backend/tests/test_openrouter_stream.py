@@ -0,0 +1,168 @@
+"""
+Tests for GOGGA FREE tier streaming (OpenRouter SSE)
+
+Run with: pytest tests/test_openrouter_stream.py -v
+"""
+import json
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.openrouter_service import (
+    OPENROUTER_BASE_URL,
+    OpenRouterService,
+    OpenRouterStreamError,
+)
+
+
+def sse_body(*chunks: dict | str, done: bool = True) -> bytes:
+    """Build an OpenRouter-style SSE body."""
+    lines = [": OPENROUTER PROCESSING", ""]
+    for chunk in chunks:
+        lines.append(chunk if isinstance(chunk, str) else f"data: {json.dumps(chunk)}")
+        lines.append("")
+    if done:
+        lines += ["data: [DONE]", ""]
+    return "\n".join(lines).encode()
+
+
+def delta(text: str) -> dict:
+    return {"choices": [{"delta": {"content": text}, "finish_reason": None}]}
+
+
+USAGE = {"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 3}}
+
+
+def service_with(bodies: dict[str, bytes]) -> tuple[OpenRouterService, list[dict]]:
+    """OpenRouterService whose HTTP client serves canned bodies per model."""
+    requests: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        requests.append(payload)
+        body = bodies.get(payload["model"])
+        if body is None:
+            return httpx.Response(503, text="unavailable")
+        return httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+
+    service = OpenRouterService()
+    service.free_fallback_models = ["backup/model:free"]
+    service._client = httpx.AsyncClient(
+        base_url=OPENROUTER_BASE_URL, transport=httpx.MockTransport(handler)
+    )
+    return service, requests
+
+
+class TestChatCompletionStream:
+
+    async def test_parses_deltas_and_final_usage(self):
+        service, requests = service_with({
+            "m": sse_body(delta("Howzit"), delta(", bru"), USAGE),
+        })
+        events = [e async for e in service._chat_completion_stream("m", [])]
+        assert [e["content"] for e in events if "content" in e] == ["Howzit", ", bru"]
+        assert events[-1] == {"usage": {"prompt_tokens": 12, "completion_tokens": 3}, "model": "m"}
+        assert requests[0]["stream"] is True
+
+    async def test_skips_comments_and_malformed_lines(self):
+        service, _ = service_with({"m": sse_body("data: {not json", delta("ok"))})
+        events = [e async for e in service._chat_completion_stream("m", [])]
+        assert events[0] == {"content": "ok"}
+
+    async def test_error_chunk_raises(self):
+        service, _ = service_with({
+            "m": sse_body(delta("half"), {"error": {"message": "provider overloaded"}}, done=False),
+        })
+        with pytest.raises(OpenRouterStreamError, match="overloaded"):
+            async for _ in service._chat_completion_stream("m", []):
+                pass
+
+
+class TestChatFreeStreamFallback:
+
+    async def test_primary_failure_falls_back_silently(self):
+        service, requests = service_with({
+            "backup/model:free": sse_body(delta("Sharp"), USAGE),
+        })
+        events = [e async for e in service.chat_free_stream("hi", "sys")]
+        assert events[0] == {"fallback": "backup/model:free"}
+        assert [e["content"] for e in events if "content" in e] == ["Sharp"]
+        assert events[-1]["model"] == "backup/model:free"
+        # Nothing emitted yet, so the fallback gets the original conversation
+        assert requests[1]["messages"][-1] == {"role": "user", "content": "hi"}
+
+    async def test_mid_stream_failure_continues_from_partial(self):
+        service, requests = service_with({
+            OpenRouterService().model_qwen: sse_body(
+                delta("Load shedding is "), {"error": {"message": "boom"}}, done=False
+            ),
+            "backup/model:free": sse_body(delta("rolling blackouts."), USAGE),
+        })
+        events = [e async for e in service.chat_free_stream("What is load shedding?", "sys")]
+        text = "".join(e["content"] for e in events if "content" in e)
+        assert text == "Load shedding is rolling blackouts."
+        continuation = requests[1]["messages"]
+        assert continuation[-2] == {"role": "assistant", "content": "Load shedding is "}
+        assert continuation[-1]["role"] == "user"
+
+    async def test_all_models_failing_raises(self):
+        service, _ = service_with({})
+        with pytest.raises(httpx.HTTPStatusError):
+            async for _ in service.chat_free_stream("hi", "sys"):
+                pass
+
+
+class TestFreeTierStreamEvents:
+
+    async def test_same_schema_as_paid_stream(self):
+        from app.core.router import CognitiveLayer
+        from app.services import ai_service as ai_module
+        from app.services.openrouter_service import openrouter_service
+
+        async def fake_stream(**kwargs):
+            yield {"content": "<think>"}
+            yield {"content": "hmm"}
+            yield {"content": "</think>"}
+            yield {"content": "Eish, "}
+            yield {"content": "stage 6."}
+            yield {"usage": {"prompt_tokens": 40, "completion_tokens": 5}, "model": "qwen:free"}
+
+        track = AsyncMock(return_value={"usd": 0.0, "zar": 0.0})
+        with patch.object(openrouter_service, "chat_free_stream", fake_stream), \
+             patch.object(ai_module, "track_usage", track), \
+             patch.object(ai_module, "run_plugins_before_request", AsyncMock(return_value={"metadata": {}})):
+            raw = [e async for e in ai_module.AIService.generate_stream(
+                user_id="u1", message="Stage 6?", history=None, layer=CognitiveLayer.FREE_TEXT,
+            )]
+
+        events = [json.loads(e[len("data: "):]) for e in raw]
+        types = [e["type"] for e in events]
+        assert types[0] == "meta"
+        assert types[-1] == "done"
+        assert "thinking_start" in types and "thinking_end" in types
+        assert [e["content"] for e in events if e["type"] == "thinking"] == ["<think>", "hmm"]
+        assert "".join(e["content"] for e in events if e["type"] == "content").endswith("Eish, stage 6.")
+
+        done = events[-1]["meta"]
+        assert done["tier"] == "free"
+        assert done["provider"] == "openrouter"
+        assert done["tokens"] == {"input": 40, "output": 5}
+        assert track.call_args.kwargs["tier"] == "free"
+
+    async def test_provider_failure_yields_error_event(self):
+        from app.core.router import CognitiveLayer
+        from app.services import ai_service as ai_module
+        from app.services.openrouter_service import openrouter_service
+
+        async def broken(**kwargs):
+            yield {"content": "partial"}
+            raise OpenRouterStreamError("all free models down")
+
+        with patch.object(openrouter_service, "chat_free_stream", broken), \
+             patch.object(ai_module, "run_plugins_before_request", AsyncMock(return_value={"metadata": {}})):
+            raw = [e async for e in ai_module.AIService.generate_stream(
+                user_id="u1", message="hi", history=None, layer=CognitiveLayer.FREE_TEXT,
+            )]
+
+        assert json.loads(raw[-1][len("data: "):])["type"] == "error"
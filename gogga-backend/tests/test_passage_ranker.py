@@ -0,0 +1,194 @@
+"""
+Tests for BM25 passage selection and search context packing
+
+Run with: pytest tests/test_passage_ranker.py -v -s
+"""
+import pytest
+
+import app.core.router  # noqa: F401 - registers the router vocabularies used for boosts
+from app.services.passage_ranker import (
+    PASSAGE_WORDS,
+    estimate_tokens,
+    pack_passages,
+    router_boosts,
+    score_passages,
+    split_passages,
+    tokenize,
+)
+from app.services.search_service import SearchResponse, SearchResult, SearchService
+
+BOILERPLATE = (
+    "We use cookies to improve your experience on our website. By continuing to browse you agree to our "
+    "cookie policy. Subscribe to our newsletter for the latest updates delivered to your inbox every morning. "
+    "Follow us on social media and share this article with your friends and family. Advertise with us today. "
+    "Our team of writers works around the clock to bring you the stories that matter most to you. "
+    "All rights reserved. Reproduction without permission is prohibited. Read our privacy notice. "
+)
+
+# Fixed offline set: query, scraped pages, and a fact the context must keep
+EVAL_SET = [
+    (
+        "how long does an employer have to give notice of dismissal",
+        [
+            BOILERPLATE * 3 + "The Basic Conditions of Employment Act requires one week notice of termination "
+            "during the first six months of employment, two weeks for up to a year and four weeks thereafter. "
+            + BOILERPLATE * 2,
+            BOILERPLATE * 5,
+            "Employees dismissed without notice may approach the CCMA. " + BOILERPLATE * 4,
+        ],
+        "four weeks thereafter",
+    ),
+    (
+        "popia penalties for data breach",
+        [
+            BOILERPLATE * 4 + "Under POPIA the Information Regulator can impose an administrative fine of up to "
+            "R10 million for a data breach, and offenders can face up to ten years imprisonment. " + BOILERPLATE,
+            BOILERPLATE * 6,
+        ],
+        "R10 million",
+    ),
+    (
+        "load shedding stage schedule gauteng tonight",
+        [
+            BOILERPLATE * 2 + "Eskom announced stage 4 load shedding for Gauteng tonight from 16:00 to 22:00, "
+            "with the schedule dropping to stage 2 tomorrow morning. " + BOILERPLATE * 3,
+            # Syndicated copy of the same story on another site
+            BOILERPLATE + "Eskom announced stage 4 load shedding for Gauteng tonight from 16:00 to 22:00, "
+            "with the schedule dropping to stage 2 tomorrow morning. " + BOILERPLATE * 2,
+            BOILERPLATE * 5,
+        ],
+        "16:00 to 22:00",
+    ),
+    (
+        "repo rate decision reserve bank",
+        [
+            BOILERPLATE * 3 + "The South African Reserve Bank kept the repo rate unchanged at 8.25 percent, "
+            "with two members of the monetary policy committee voting for a cut. " + BOILERPLATE * 3,
+            BOILERPLATE * 4,
+        ],
+        "8.25 percent",
+    ),
+    (
+        "rental housing act deposit refund",
+        [
+            BOILERPLATE * 2 + "The Rental Housing Act requires a landlord to refund the deposit with interest "
+            "within fourteen days of the end of the lease if no damage is found. " + BOILERPLATE * 4,
+            BOILERPLATE * 3 + "Tenants can lodge a complaint with the Rental Housing Tribunal. " + BOILERPLATE,
+        ],
+        "within fourteen days",
+    ),
+    (
+        "sars tax filing season deadline",
+        [
+            BOILERPLATE * 5 + "SARS said the tax filing season for individuals closes on 20 October for "
+            "non-provisional taxpayers. " + BOILERPLATE * 2,
+            BOILERPLATE * 3,
+            BOILERPLATE * 3,
+        ],
+        "20 October",
+    ),
+]
+
+
+def response_for(query, pages):
+    return SearchResponse(
+        query=query,
+        results=[
+            SearchResult(url=f"https://example{i}.co.za", title=f"Page {i}", snippet="...", position=i,
+                         full_content=text, scrape_success=True)
+            for i, text in enumerate(pages, 1)
+        ],
+        total_results=len(pages),
+        search_time_ms=10,
+        scrape_time_ms=10,
+    )
+
+
+def legacy_context(response):
+    """Result-order concatenation format_for_llm produced before packing."""
+    return "\n".join(f"Title: {r.title}\nContent: {r.full_content}" for r in response.results)
+
+
+class TestRanking:
+
+    def test_tokenize(self):
+        assert tokenize("What are the Labour Relations Act's rules?") == ["labour", "relation", "act", "rule"]
+        assert tokenize("employer employment dismissal dismissed business") == [
+            "employ", "employ", "dismiss", "dismiss", "business",
+        ]
+
+    def test_split_on_sentence_boundaries(self):
+        text = " ".join(f"Sentence number {i} has exactly seven words." for i in range(40))
+        passages = split_passages(text, source=2)
+        assert len(passages) == 4
+        assert all(p.source == 2 and p.text.endswith(".") for p in passages)
+        assert [p.position for p in passages] == [0, 1, 2, 3]
+        assert all(len(p.text.split()) >= PASSAGE_WORDS for p in passages[:-1])
+
+    def test_bm25_prefers_rare_query_terms(self):
+        passages = [
+            *(split_passages(f"The rand weakened on day {i}.", i) for i in range(1, 4)),
+            split_passages("Eskom load shedding stage 6 tonight.", 4),
+        ]
+        passages = [p for group in passages for p in group]
+        score_passages("eskom rand", passages)
+        assert passages[-1].score > passages[0].score > 0
+
+    def test_router_keywords_are_boosted(self):
+        assert router_boosts("what does popia say about consent")["popia"] > 0
+        assert "consent" not in router_boosts("what does popia say about consent")
+
+
+class TestPacking:
+
+    def test_irrelevant_passages_are_dropped(self):
+        packed = pack_passages("popia fine", {1: BOILERPLATE * 3, 2: "POPIA fines reach R10 million."}, 1000)
+        assert [p.source for p in packed.passages] == [2]
+        assert packed.reduction > 0.9
+
+    def test_duplicates_across_sources_are_dropped(self):
+        story = "Eskom announced stage 4 load shedding for Gauteng tonight from 16:00 to 22:00."
+        packed = pack_passages("load shedding gauteng", {1: story, 2: story, 3: "Load shedding in Gauteng may ease this weekend."}, 1000)
+        assert sorted(p.source for p in packed.passages) == [1, 3]
+        assert packed.duplicates == 1
+
+    def test_budget_is_respected(self):
+        text = " ".join(f"Load shedding update {i} for Soweto residents tonight." for i in range(200))
+        packed = pack_passages("load shedding soweto", {1: text}, token_budget=500)
+        assert 0 < packed.tokens_out <= 500
+        assert sum(estimate_tokens(p.text) for p in packed.passages) == packed.tokens_out
+
+    def test_format_keeps_citations(self):
+        SearchService._instance = None
+        service = SearchService()
+        query, pages, fact = EVAL_SET[1]
+        context = service.format_for_llm(response_for(query, pages))
+        result_1 = context.split("--- Result 1 ---")[1].split("--- Result 2 ---")[0]
+        assert fact in result_1
+        # Result 2 is all boilerplate: listed for citation, no content
+        assert "Content:" not in context.split("--- Result 2 ---")[1]
+        packing = service.get_cache_stats()["packing"]
+        assert packing["packed"] == 1 and packing["token_reduction"] > 0.5
+
+
+class TestOfflineEval:
+    """Token reduction and answer retention on EVAL_SET, against result-order concatenation."""
+
+    @pytest.mark.parametrize("budget", [300, 1000])
+    def test_fewer_tokens_same_answers(self, budget):
+        tokens_before = tokens_after = answered_before = answered_after = 0
+        for query, pages, fact in EVAL_SET:
+            response = response_for(query, pages)
+            before = legacy_context(response)
+            packed = pack_passages(query, {i: r.full_content for i, r in enumerate(response.results, 1)}, budget)
+            after = " ".join(p.text for p in packed.passages)
+            tokens_before += estimate_tokens(before)
+            tokens_after += estimate_tokens(after)
+            answered_before += fact in before
+            answered_after += fact in after
+
+        reduction = 1 - tokens_after / tokens_before
+        print(f"\n   budget {budget}: {tokens_before} -> {tokens_after} tokens ({reduction:.0%} fewer)"
+              f" | answers kept {answered_after}/{len(EVAL_SET)} (before {answered_before}/{len(EVAL_SET)})")
+        assert reduction > 0.7
+        assert answered_after == answered_before == len(EVAL_SET)
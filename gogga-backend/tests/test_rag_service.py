@@ -0,0 +1,253 @@
+"""
+Tests for per-user hybrid document retrieval (BM25 + int8 embeddings)
+
+Run with: pytest tests/test_rag_service.py -v
+Benchmark: pytest tests/test_rag_service.py -v -s -m slow
+"""
+import os
+import statistics
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.legal_corpus import BUNDLED_CORPUS_DIR
+from app.services import rag_service
+from app.services.rag_service import HashingEmbedder, RagService, quantize
+
+DOCUMENTS = {path.stem: path.read_text() for path in sorted(BUNDLED_CORPUS_DIR.glob("*.md"))}
+
+QUERIES = [
+    ("how much notice must an employer give after a year", "bcea"),
+    ("maximum fine for a data breach", "popia"),
+    ("landlord must refund the deposit with interest", "rental_housing"),
+    ("cooling off period for direct marketing", "cpa"),
+    ("refer an unfair dismissal dispute to the CCMA", "lra"),
+    ("right to privacy", "constitution"),
+]
+
+
+def make_service(path, **options):
+    return RagService(path, embedder=HashingEmbedder(), chunk_words=120, **options)
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = make_service(tmp_path)
+    for doc_id, text in DOCUMENTS.items():
+        service.add_document("user-1", text, title=doc_id.upper(), doc_id=doc_id)
+    yield service
+    service.close()
+
+
+class TestEmbeddings:
+
+    def test_int8_quantization_keeps_cosine(self):
+        vectors = HashingEmbedder().embed(list(DOCUMENTS.values()))
+        quantized, scales = quantize(vectors)
+        restored = quantized.astype(np.float32) * scales[:, None]
+        assert np.abs(restored @ vectors.T - vectors @ vectors.T).max() < 0.01
+
+    def test_hashing_embedder_tolerates_typos(self):
+        embedder = HashingEmbedder()
+        query, typo, other = embedder.embed(["unfair dismissal", "unfiar dismisal", "deposit refund"])
+        assert query @ typo > 0.2
+        assert abs(query @ other) < 0.1
+
+
+class TestSearch:
+
+    @pytest.mark.parametrize("mode", ["hybrid", "keyword", "semantic"])
+    def test_finds_the_right_document(self, service, mode):
+        for query, doc_id in QUERIES:
+            result = service.search("user-1", query, limit=3, mode=mode)
+            assert result.chunks[0].doc_id == doc_id, (mode, query)
+
+    def test_hybrid_fuses_both_rankings(self, service):
+        result = service.search("user-1", "unfiar dismisal CCMA", limit=3)
+        top = result.chunks[0]
+        assert top.doc_id == "lra"
+        assert top.keyword_rank is not None and top.vector_rank is not None
+        assert result.searched_chunks == sum(d["chunks"] for d in service.list_documents("user-1"))
+
+    def test_format_for_llm_cites_documents(self, service):
+        context = service.search("user-1", "maximum fine for a data breach", limit=2).format_for_llm()
+        assert context.startswith("[DOCUMENT SEARCH RESULTS]")
+        assert "Document: POPIA (part" in context
+
+    def test_unknown_mode(self, service):
+        with pytest.raises(ValueError):
+            service.search("user-1", "leave", mode="fuzzy")
+
+
+class TestNamespaces:
+
+    def test_users_do_not_share_documents(self, service, tmp_path):
+        assert service.search("user-2", "right to privacy").chunks == []
+        assert service.list_documents("user-2") == []
+        assert not any("user-1" in path.name for path in tmp_path.iterdir())
+
+    def test_delete_namespace_removes_files(self, service, tmp_path):
+        directory = tmp_path / service.namespace_id("user-1")
+        assert directory.is_dir()
+        service.delete_namespace("user-1")
+        assert not directory.exists()
+        assert service.list_documents("user-1") == []
+
+    def test_eviction_skips_namespaces_in_use(self, tmp_path):
+        service = make_service(tmp_path, max_open=1)
+        with service.namespace("a") as held:
+            service.add_document("b", "Load shedding stage 2.", doc_id="eskom")
+            service.add_document("c", "Water outage in Tshwane.", doc_id="water")
+            with service.namespace("a") as again:
+                assert again is held  # One live index per namespace
+            held.add_text("doc", "Braai permit at the municipal office.")  # Not closed under us
+            assert service.get_stats()["open_namespaces"] == 1
+        stats = service.get_stats()
+        assert stats["open_namespaces"] == 1 and stats["namespaces_in_use"] == 0
+        assert service.search("a", "braai permit").chunks[0].doc_id == "doc"
+        service.close()
+
+    def test_delete_waits_for_callers(self, service, tmp_path):
+        directory = tmp_path / service.namespace_id("user-1")
+        with service.namespace("user-1") as index:
+            deleter = threading.Thread(target=service.delete_namespace, args=("user-1",))
+            deleter.start()
+            time.sleep(0.05)
+            assert deleter.is_alive() and directory.is_dir()
+            assert index.search("CCMA unfair dismissal", 3, "keyword").chunks
+        deleter.join(timeout=5)
+        assert not deleter.is_alive() and not directory.exists()
+        assert service.list_documents("user-1") == []
+
+
+class TestUpdates:
+
+    def test_replace_and_delete(self, service):
+        service.add_document("user-1", "The braai permit costs R50 at the municipal office.", doc_id="popia")
+        assert service.search("user-1", "braai permit").chunks[0].doc_id == "popia"
+        assert service.search("user-1", "Information Regulator fine", mode="keyword").chunks[0].doc_id != "popia"
+
+        assert service.delete_document("user-1", "lra")
+        assert not service.delete_document("user-1", "lra")
+        assert all(c.doc_id != "lra" for c in service.search("user-1", "CCMA unfair dismissal", limit=10).chunks)
+
+    def test_compaction_renumbers_chunks(self, service):
+        with service.namespace("user-1") as index:
+            total = index.count
+            for doc_id in ("bcea", "constitution", "cpa", "popia"):
+                service.delete_document("user-1", doc_id)
+            stats = index.get_stats()
+            assert index.count < total
+            assert stats["dead_chunks"] * 2 <= index.count
+        assert stats["chunks"] == sum(d["chunks"] for d in service.list_documents("user-1"))
+        assert service.search("user-1", "refer an unfair dismissal dispute to the CCMA").chunks[0].doc_id == "lra"
+        assert service.search("user-1", "deposit interest", mode="semantic").chunks[0].doc_id == "rental_housing"
+
+    def test_segments_are_merged_without_changing_scores(self, tmp_path):
+        merged, separate = make_service(tmp_path / "a", max_segments=2), make_service(tmp_path / "b", max_segments=100)
+        for service in (merged, separate):
+            for doc_id, text in DOCUMENTS.items():
+                service.add_document("u", text, doc_id=doc_id)
+        with merged.namespace("u") as a_index, separate.namespace("u") as b_index:
+            assert a_index.get_stats()["segments"] <= 2
+            assert b_index.get_stats()["segments"] == len(DOCUMENTS)
+            for query, _ in QUERIES:
+                a = a_index.keyword_rank(query, 10)
+                b = b_index.keyword_rank(query, 10)
+                assert a[0].tolist() == b[0].tolist()
+                assert np.allclose(a[1], b[1])
+
+    def test_common_term_pruning_is_exact(self, tmp_path, monkeypatch):
+        rng = np.random.default_rng(1)
+        vocab = [f"word{i}" for i in range(1000)]
+        chunks = [
+            "municipal rates " + " ".join(rng.choice(vocab, 20)) + (" tariff" if i % 3 else "")
+            for i in range(3000)
+        ]
+        with make_service(tmp_path).namespace("u") as index:
+            index.add("doc", chunks)
+            queries = ["municipal tariff word7", "rates word42 word43", "tariff word999 word1", "municipal rates"]
+            pruned = [index.keyword_rank(query, 20) for query in queries]
+            monkeypatch.setattr(rag_service, "COMMON_TERM_SHARE", 1.0)
+            full = [index.keyword_rank(query, 20) for query in queries]
+        for query, (ids, scores), (full_ids, full_scores) in zip(queries, pruned, full):
+            assert np.allclose(scores, full_scores), query
+            ahead = scores > scores[-1]  # ties at the cut-off may resolve either way
+            assert set(ids[ahead].tolist()) == set(full_ids[ahead].tolist())
+
+    def test_hamming_preselection_matches_exact_scan(self, tmp_path):
+        exact, approximate = make_service(tmp_path / "a"), make_service(tmp_path / "b", exact_scan_chunks=0, rescore_candidates=10)
+        for service in (exact, approximate):
+            for doc_id, text in DOCUMENTS.items():
+                service.add_document("u", text, doc_id=doc_id)
+        hits = 0
+        for query, _ in QUERIES:
+            top = lambda s: [(c.doc_id, c.ordinal) for c in s.search("u", query, limit=3, mode="semantic").chunks]
+            hits += len(set(top(exact)) & set(top(approximate)))
+        assert hits / (3 * len(QUERIES)) >= 0.8
+
+
+class TestPersistence:
+
+    def test_reopen(self, service, tmp_path):
+        before = [c.text for c in service.search("user-1", "maternity leave").chunks]
+        service.close()
+        reopened = make_service(tmp_path)
+        assert [c.text for c in reopened.search("user-1", "maternity leave").chunks] == before
+
+    def test_interrupted_append_is_rolled_back(self, service, tmp_path):
+        with service.namespace("user-1") as index:
+            count, directory = index.count, index.path
+        service.close()
+        with open(directory / "vectors.i8", "ab") as f:
+            f.write(b"\x01" * 1000)
+        (directory / "seg_999999").mkdir()
+
+        reopened = make_service(tmp_path)
+        reopened.add_document("user-1", "Load shedding stage 6 tonight in Soweto.", doc_id="eskom")
+        with reopened.namespace("user-1") as index:
+            assert index.count == count + 1
+            assert (directory / "vectors.i8").stat().st_size == index.count * index.embedder.dim
+        assert not (directory / "seg_999999").exists()
+        assert reopened.search("user-1", "load shedding soweto").chunks[0].doc_id == "eskom"
+
+    def test_embedder_change_reembeds(self, service, tmp_path):
+        service.close()
+        reopened = RagService(tmp_path, embedder=HashingEmbedder(dim=128))
+        result = reopened.search("user-1", "cooling off period for direct marketing", mode="semantic")
+        assert result.chunks[0].doc_id == "cpa"
+        with reopened.namespace("user-1") as index:
+            assert index.get_stats()["dim"] == 128
+
+
+@pytest.mark.slow
+class TestLatency:
+    """Query latency at scale (GOGGA_RAG_BENCH_CHUNKS, default 1,000,000 chunks)."""
+
+    def test_million_chunks(self, tmp_path):
+        total = int(os.environ.get("GOGGA_RAG_BENCH_CHUNKS", 1_000_000))
+        per_doc, words = 10_000, 60
+        rng = np.random.default_rng(0)
+        vocab = [f"term{i}x" for i in range(50_000)]
+        weights = 1 / np.arange(1, len(vocab) + 1) ** 1.1
+        weights /= weights.sum()
+
+        service = make_service(tmp_path)
+        with service.namespace("bench") as index:
+            start = time.perf_counter()
+            for d in range(total // per_doc):
+                chunks = [" ".join(vocab[i] for i in row) for row in rng.choice(len(vocab), (per_doc, words), p=weights)]
+                # Random unit vectors stand in for model embeddings (latency only)
+                index.add(f"doc-{d}", chunks, vectors=rng.standard_normal((per_doc, 384)).astype(np.float32))
+            ingest_s = time.perf_counter() - start
+
+            queries = [" ".join(vocab[i] for i in rng.choice(len(vocab), 4, p=weights)) for _ in range(40)]
+            print(f"\n   {index.count:,} chunks indexed in {ingest_s:.0f}s, {index.get_stats()['disk_bytes'] / 1e6:.0f}MB on disk")
+            for mode in ("keyword", "semantic", "hybrid"):
+                timings = [service.search("bench", query, limit=10, mode=mode).elapsed_ms for query in queries]
+                p50, p95 = statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
+                print(f"   {mode:>8}: p50 {p50:.1f}ms p95 {p95:.1f}ms")
+                assert p95 < 500
+        service.close()
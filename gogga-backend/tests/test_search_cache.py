@@ -0,0 +1,152 @@
+"""
+Tests for the byte-budgeted, compressed search cache
+
+Run with: pytest tests/test_search_cache.py -v
+Soak test: pytest tests/test_search_cache.py -v -s -m slow
+"""
+import os
+import random
+import time
+
+import pytest
+
+from app.core.compression import is_zstd_available
+from app.services import search_cache
+from app.services.search_cache import ENTRY_OVERHEAD_BYTES, SearchCache
+from app.services.search_service import SearchResponse, SearchResult, SearchService
+
+
+def page(size: int, seed: int = 0) -> dict:
+    """A scraped-page-like payload of roughly `size` characters."""
+    rng = random.Random(seed)
+    words = ["load", "shedding", "eskom", "stage", "gauteng", "schedule", "tonight", "update"]
+    return {"content": " ".join(rng.choice(words) for _ in range(size // 7))}
+
+
+class TestBudget:
+
+    def test_stays_within_budget(self):
+        cache = SearchCache(max_bytes=20_000)
+        for i in range(100):
+            cache.set(f"q{i}", page(1000, i), ttl=60)
+        stats = cache.get_stats()
+        assert stats["bytes"] <= 20_000
+        assert stats["evictions"] > 0
+        assert cache.get("q99") is not None
+        assert cache.get("q0") is None
+
+    def test_read_entries_get_a_second_chance(self):
+        cache = SearchCache(max_bytes=5 * (1000 + ENTRY_OVERHEAD_BYTES))
+        cache.set("popular", page(900), ttl=60)
+        for i in range(10):
+            assert cache.get("popular") is not None
+            cache.set(f"once{i}", page(900, i), ttl=60)
+        assert "popular" in cache
+        assert "once0" not in cache
+
+    def test_oversized_value_is_rejected(self):
+        cache = SearchCache(max_bytes=1000)
+        assert not cache.set("huge", page(5000), ttl=60)
+        assert len(cache) == 0
+        assert cache.get_stats()["rejected"] == 1
+
+    def test_replacing_a_key_keeps_accounting(self):
+        cache = SearchCache(max_bytes=100_000)
+        cache.set("q", page(2000), ttl=60)
+        cache.set("q", page(500), ttl=60)
+        stats = cache.get_stats()
+        assert stats["entries"] == 1
+        assert stats["bytes"] == cache._entries["q"].size
+
+
+class TestExpiry:
+
+    def test_soft_and_hard_ttl(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(search_cache.time, "time", lambda: now[0])
+        cache = SearchCache(max_bytes=100_000)
+        cache.set("q", {"v": 1}, ttl=10, stale_ttl=100)
+        assert cache.get("q").is_fresh
+        now[0] += 50
+        assert not cache.get("q").is_fresh
+        now[0] += 60
+        assert cache.get("q") is None
+
+    def test_sweep_drops_unread_expired_entries(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(search_cache.time, "time", lambda: now[0])
+        cache = SearchCache(max_bytes=100_000, sweep_interval=30)
+        for i in range(10):
+            cache.set(f"q{i}", {"v": i}, ttl=5)
+        now[0] += 31
+        cache.set("new", {"v": 0}, ttl=5)  # Triggers the periodic sweep
+        assert len(cache) == 1
+        assert cache.get_stats()["expired"] == 10
+
+
+class TestPayloads:
+
+    def test_search_response_round_trip(self):
+        SearchService._instance = None
+        service = SearchService()
+        response = SearchResponse(
+            query="eskom schedule", total_results=1, search_time_ms=5, scrape_time_ms=9,
+            results=[SearchResult(url="https://example.co.za", title="T", snippet="S", position=1,
+                                  full_content="body " * 500, scrape_success=True)],
+            metadata={"query_class": "news"},
+        )
+        service._set_cache("k", response)
+        restored = service._get_cached("k")
+        assert restored == response
+        assert restored is not response
+
+    @pytest.mark.skipif(not is_zstd_available(), reason="zstd not available")
+    def test_large_payloads_are_compressed(self):
+        cache = SearchCache(max_bytes=1_000_000)
+        cache.set("q", page(20_000), ttl=60)
+        assert cache.get_stats()["compression_ratio"] < 0.5
+        assert cache.get("q").data == page(20_000)
+
+    def test_stats(self):
+        cache = SearchCache(max_bytes=100_000)
+        cache.set("q", {"v": 1}, ttl=60)
+        cache.get("q")
+        cache.get("missing")
+        stats = cache.get_stats()
+        assert (stats["entries"], stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 1, 0.5)
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc")
+class TestSoak:
+    """Memory stays flat over GOGGA_SOAK_QUERIES (default 1M) queries."""
+
+    def test_memory_is_flat(self):
+        queries = int(os.environ.get("GOGGA_SOAK_QUERIES", 1_000_000))
+        budget = 8 * 1024 * 1024
+        cache = SearchCache(max_bytes=budget, sweep_interval=1.0)
+        payloads = [page(4000, seed) for seed in range(32)]
+        rng = random.Random(1)
+
+        start = time.perf_counter()
+        checkpoints = {}
+        for i in range(queries):
+            # Zipf-ish traffic: a few hot queries, a long tail of one-offs
+            key = f"hot{rng.randrange(50)}" if rng.random() < 0.3 else f"q{i}"
+            if cache.get(key) is None:
+                cache.set(key, payloads[i % len(payloads)], ttl=300, stale_ttl=900)
+            if i + 1 in (queries // 10, queries):
+                checkpoints[i + 1] = rss_bytes()
+            assert cache._bytes <= budget
+
+        stats = cache.get_stats()
+        growth = checkpoints[queries] - checkpoints[queries // 10]
+        print(f"\n   {queries:,} queries in {time.perf_counter() - start:.1f}s"
+              f" | cache {stats['bytes'] / 1e6:.1f}MB / {stats['entries']} entries"
+              f" | hit rate {stats['hit_rate']:.2f} | RSS growth after warm-up {growth / 1e6:.1f}MB")
+        assert growth < budget
@@ -5,16 +5,29 @@ Run with: python -m pytest tests/test_search_service.py -v
 Or directly: python tests/test_search_service.py
 """
 import asyncio
+import json
 import sys
 import os
+import time
+from contextlib import asynccontextmanager
 
 # Add parent to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import httpx
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 
-from app.services.search_service import SearchService, get_search_service, SearchResult
+from app.services.search_service import (
+    SEARCH_TTLS,
+    SearchResponse,
+    SearchResult,
+    SearchService,
+    canonical_url,
+    classify_query,
+    get_search_service,
+)
+from app.config import settings
 from app.tools.search_executor import execute_web_search, execute_legal_search, execute_search_tool
 
 
@@ -108,13 +121,13 @@ class TestSearchService:
             serper_response.json.return_value = MOCK_SERPER_RESPONSE
             serper_response.raise_for_status = MagicMock()
             
-            # Mock scrape response
-            scrape_response = MagicMock()
-            scrape_response.text = MOCK_HTML
-            scrape_response.raise_for_status = MagicMock()
+            # Mock streamed scrape response
+            @asynccontextmanager
+            async def stream(method, url, headers=None):
+                yield httpx.Response(200, html=MOCK_HTML, request=httpx.Request(method, url))
             
             mock_client.post = AsyncMock(return_value=serper_response)
-            mock_client.get = AsyncMock(return_value=scrape_response)
+            mock_client.stream = stream
             mock_get_client.return_value = mock_client
             
             result = await service.search(
@@ -123,7 +136,8 @@ class TestSearchService:
             )
             
             # Check scraping worked
-            assert result.results[0].scrape_success or result.results[0].scrape_error
+            assert result.results[0].scrape_success
+            assert "Labour Relations Act" in result.results[0].full_content
     
     def test_extract_content(self, service):
         """Test HTML content extraction."""
@@ -187,6 +201,288 @@ class TestSearchService:
         assert service._get_cached(other_key) is None
 
 
+class TestStaleWhileRevalidate:
+    """Soft/hard TTLs, background refresh and coalesced fetches."""
+    
+    @pytest.fixture
+    def service(self, monkeypatch):
+        SearchService._instance = None
+        service = SearchService()
+        service.fetches = []
+        
+        async def fake_fetch(**params):
+            service.fetches.append(params["query"])
+            await asyncio.sleep(0.01)
+            if getattr(service, "fail", False):
+                raise RuntimeError("Serper down")
+            return SearchResponse(
+                query=params["query"], results=[], total_results=len(service.fetches),
+                search_time_ms=1, scrape_time_ms=0, metadata={},
+            )
+        
+        monkeypatch.setattr(service, "_fetch", fake_fetch)
+        return service
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        import app.services.search_service as search_module
+        now = [time.time()]
+        monkeypatch.setattr(search_module.time, "time", lambda: now[0])
+        return now
+    
+    def test_query_classes(self):
+        assert classify_query("latest load shedding stage") == "news"
+        assert classify_query("anything", time_filter="qdr:d") == "news"
+        assert classify_query("cheapest flights to Durban") == "price"
+        assert classify_query("Labour Relations Act section 187") == "legal"
+        assert classify_query("how to make potjiekos") == "general"
+    
+    async def test_fresh_hit_is_a_copy(self, service):
+        first = await service.search("how to make potjiekos")
+        second = await service.search("how to make potjiekos")
+        assert service.fetches == ["how to make potjiekos"]
+        assert second.cached and not first.cached
+        assert first.metadata["query_class"] == "general"
+    
+    async def test_stale_result_served_while_refreshing(self, service, clock):
+        await service.search("latest news Gauteng")
+        soft, hard = SEARCH_TTLS["news"]
+        clock[0] += soft + 1
+        
+        stale = await service.search("latest news Gauteng")
+        again = await service.search("latest news Gauteng")
+        assert stale.metadata["stale"] and again.metadata["stale"]
+        assert stale.total_results == 1
+        
+        await asyncio.sleep(0.05)  # Let the single background refresh finish
+        assert len(service.fetches) == 2
+        refreshed = await service.search("latest news Gauteng")
+        assert refreshed.total_results == 2
+        assert "stale" not in refreshed.metadata
+        assert service.get_cache_stats()["background_refreshes"] == 1
+    
+    async def test_hard_expiry_fetches_synchronously(self, service, clock):
+        await service.search("latest news Gauteng")
+        clock[0] += SEARCH_TTLS["news"][1] + 1
+        result = await service.search("latest news Gauteng")
+        assert result.total_results == 2
+        assert not result.cached
+    
+    async def test_concurrent_misses_share_one_fetch(self, service):
+        results = await asyncio.gather(*(service.search("braai tips") for _ in range(5)))
+        assert service.fetches == ["braai tips"]
+        assert all(r is results[0] for r in results)
+    
+    async def test_failed_refresh_keeps_stale_entry(self, service, clock):
+        await service.search("petrol price July")
+        clock[0] += SEARCH_TTLS["price"][0] + 1
+        service.fail = True
+        await service.search("petrol price July")
+        await asyncio.sleep(0.05)
+        assert (await service.search("petrol price July")).metadata["stale"]
+        assert service.get_cache_stats()["refresh_failures"] == 1
+
+
+class TestPageCache:
+    """Scraped pages cached by canonical URL, revalidated with conditional GETs."""
+    
+    @pytest.fixture
+    def service(self):
+        SearchService._instance = None
+        service = SearchService()
+        service.requests = []
+        service.page_version = "v1"
+        
+        def handler(request):
+            service.requests.append(request)
+            if request.headers.get("if-none-match") == f'"{service.page_version}"':
+                return httpx.Response(304)
+            return httpx.Response(
+                200, html=MOCK_HTML, headers={"ETag": f'"{service.page_version}"'},
+            )
+        
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return service
+    
+    def result(self, url):
+        return SearchResult(url=url, title="T", snippet="S", position=1)
+    
+    def test_canonical_url(self):
+        assert canonical_url("HTTPS://Example.co.za:443/a?b=2&utm_source=x&a=1#top") == "https://example.co.za/a?a=1&b=2"
+        assert canonical_url("http://example.co.za") == "http://example.co.za/"
+        assert canonical_url("http://example.co.za:8080/x?fbclid=1") == "http://example.co.za:8080/x"
+    
+    async def test_same_url_from_different_queries_is_scraped_once(self, service):
+        first = await service._scrape_page(self.result("https://labourguide.co.za/dismissal?utm_source=a"))
+        second = await service._scrape_page(self.result("https://labourguide.co.za/dismissal"))
+        assert len(service.requests) == 1
+        assert first.full_content == second.full_content
+        assert second.scrape_success
+        pages = service.get_cache_stats()["pages"]
+        assert (pages["downloads"], pages["hits"]) == (1, 1)
+        assert pages["bytes_saved"] == len(MOCK_HTML.encode())
+    
+    async def test_stale_page_is_revalidated(self, service, monkeypatch):
+        import app.services.search_service as search_module
+        url = "https://labourguide.co.za/dismissal"
+        await service._scrape_page(self.result(url))
+        
+        now = time.time()
+        monkeypatch.setattr(search_module.time, "time", lambda: now + settings.PAGE_CACHE_TTL_SECONDS + 1)
+        revalidated = await service._scrape_page(self.result(url))
+        assert service.requests[-1].headers["if-none-match"] == '"v1"'
+        assert revalidated.scrape_success
+        assert service.get_cache_stats()["pages"]["revalidated"] == 1
+    
+    async def test_changed_page_is_downloaded_again(self, service, monkeypatch):
+        import app.services.search_service as search_module
+        url = "https://labourguide.co.za/dismissal"
+        await service._scrape_page(self.result(url))
+        
+        service.page_version = "v2"
+        now = time.time()
+        monkeypatch.setattr(search_module.time, "time", lambda: now + settings.PAGE_CACHE_TTL_SECONDS + 1)
+        await service._scrape_page(self.result(url))
+        pages = service.get_cache_stats()["pages"]
+        assert (pages["downloads"], pages["revalidated"]) == (2, 0)
+
+
+class TestStreamedDownload:
+    """Scrapes stream the body, stop at SCRAPE_MAX_BYTES and skip non-HTML."""
+    
+    def service_for(self, handler):
+        SearchService._instance = None
+        service = SearchService()
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return service
+    
+    def result(self, url="https://example.co.za/page"):
+        return SearchResult(url=url, title="T", snippet="S", position=1)
+    
+    async def test_non_html_is_not_downloaded(self):
+        service = self.service_for(lambda request: httpx.Response(
+            200, content=b"%PDF-1.7", headers={"Content-Type": "application/pdf"},
+        ))
+        result = await service._scrape_page(self.result())
+        assert not result.scrape_success
+        assert result.scrape_error == "Skipped (application/pdf)"
+        assert service.get_cache_stats()["pages"]["skipped_non_html"] == 1
+    
+    async def test_body_is_capped(self, monkeypatch):
+        monkeypatch.setattr(settings, "SCRAPE_MAX_BYTES", 64 * 1024)
+        article = "<p>" + "Eskom confirmed stage two load shedding for Gauteng tonight. " * 50 + "</p>"
+        html = "<html><body><main>" + article * 200 + "</main></body></html>"
+        service = self.service_for(lambda request: httpx.Response(200, html=html))
+        result = await service._scrape_page(self.result())
+        assert result.scrape_success
+        pages = service.get_cache_stats()["pages"]
+        assert pages["truncated"] == 1
+        assert service._pages.get(canonical_url(self.result().url)).data["bytes"] == 64 * 1024
+
+
+class SerperStub:
+    """Local stand-in for Serper (single and batch requests) and the scraped sites."""
+    
+    # Result URLs per query; queries about the same story overlap
+    RESULTS = {
+        "eskom load shedding": ["https://news24.com/eskom", "https://iol.co.za/stage4", "https://eskom.co.za/schedule"],
+        "load shedding schedule gauteng": ["https://eskom.co.za/schedule", "https://news24.com/eskom?utm_source=x"],
+        "eskom tariffs": ["https://eskom.co.za/tariffs", "https://news24.com/eskom"],
+    }
+    
+    def __init__(self, batch: bool = True):
+        self.batch = batch
+        self.serper_requests = 0
+        self.pages: list[str] = []
+    
+    def organic(self, query: str) -> dict:
+        urls = self.RESULTS.get(query.split(" price")[0].split(" (site:")[0], [])
+        return {
+            "organic": [
+                {"link": url, "title": f"Title {i}", "snippet": f"About {query}", "position": i}
+                for i, url in enumerate(urls, 1)
+            ],
+            "credits": 1,
+        }
+    
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "google.serper.dev":
+            self.serper_requests += 1
+            payload = json.loads(request.content)
+            if isinstance(payload, list):
+                if not self.batch:
+                    return httpx.Response(400, json={"message": "batch not supported"})
+                return httpx.Response(200, json=[self.organic(item["q"]) for item in payload])
+            return httpx.Response(200, json=self.organic(payload["q"]))
+        self.pages.append(str(request.url))
+        return httpx.Response(200, html=f"<main><p>Eskom article at {request.url.path}</p></main>")
+
+
+class TestFanOut:
+    """search_many(): one Serper batch, one scrape per unique URL, results per query."""
+    
+    def service_for(self, stub):
+        SearchService._instance = None
+        service = SearchService()
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(stub))
+        return service
+    
+    async def test_overlapping_queries_share_serper_and_scrapes(self):
+        stub = SerperStub()
+        service = self.service_for(stub)
+        queries = ["eskom load shedding", "load shedding schedule gauteng", "eskom tariffs"]
+        responses = await service.search_many([{"query": q, "num_results": 5} for q in queries])
+        
+        assert stub.serper_requests == 1
+        assert len(stub.pages) == 4  # 7 result URLs, 4 unique pages
+        assert [r.query for r in responses] == queries
+        gauteng = responses[1]
+        assert [r.url for r in gauteng.results] == ["https://eskom.co.za/schedule", "https://news24.com/eskom?utm_source=x"]
+        assert [r.position for r in gauteng.results] == [1, 2]
+        assert gauteng.results[1].full_content == "Eskom article at /eskom"
+        assert gauteng.results[1].snippet == "About load shedding schedule gauteng"
+        fanout = service.get_cache_stats()["fanout"]
+        assert (fanout["queries"], fanout["urls"], fanout["unique_urls"]) == (3, 7, 4)
+    
+    async def test_responses_are_cached_per_query(self):
+        stub = SerperStub()
+        service = self.service_for(stub)
+        await service.search_many([{"query": "eskom load shedding"}, {"query": "eskom tariffs"}])
+        cached = await service.search("eskom tariffs")
+        assert cached.cached
+        again = await service.search_many([{"query": "eskom load shedding"}, {"query": "eskom load shedding"}])
+        assert stub.serper_requests == 1
+        assert all(r.cached for r in again)
+    
+    async def test_falls_back_to_single_requests(self):
+        stub = SerperStub(batch=False)
+        service = self.service_for(stub)
+        responses = await service.search_many([{"query": "eskom load shedding"}, {"query": "eskom tariffs"}])
+        assert stub.serper_requests == 3  # Rejected batch, then one each
+        assert len(stub.pages) == 4
+        assert all(r.total_results for r in responses)
+    
+    async def test_turn_tool_calls_fan_out(self, monkeypatch):
+        from app.services import tool_result_cache
+        from app.services.tool_result_cache import ToolResultCache
+        from app.tools.search_executor import execute_search_tools
+        
+        monkeypatch.setattr(tool_result_cache, "_tool_cache", ToolResultCache())
+        stub = SerperStub()
+        service = self.service_for(stub)
+        with patch("app.tools.search_executor.get_search_service", return_value=service):
+            results = await execute_search_tools([
+                ("web_search", {"query": "eskom load shedding"}),
+                ("shopping_search", {"query": "eskom tariffs"}),
+                ("web_search", {"query": "load shedding schedule gauteng"}),
+                ("web_search", {"bogus": True}),
+            ])
+        assert stub.serper_requests == 1
+        assert [r["success"] for r in results] == [True, True, True, False]
+        assert "[SA SHOPPING RESULTS]" in results[1]["context"]
+        assert "eskom.co.za/schedule" in results[2]["context"]
+
+
 class TestSearchExecutor:
     """Tests for search tool executor."""
     
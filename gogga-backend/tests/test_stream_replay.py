@@ -0,0 +1,180 @@
+"""
+Tests for GOGGA Stream Replay (resumable SSE with Last-Event-ID)
+
+Run with: pytest tests/test_stream_replay.py -v
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.stream_replay import (
+    GenerationStream,
+    StreamReplayRegistry,
+    parse_last_event_id,
+)
+
+
+def sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def parse(event: str) -> tuple[str | None, dict]:
+    """Split an emitted event into (id, payload)."""
+    event_id = None
+    data = None
+    for line in event.strip().split("\n"):
+        if line.startswith("id: "):
+            event_id = line[4:]
+        elif line.startswith("data: "):
+            data = json.loads(line[6:])
+    return event_id, data
+
+
+async def chunks(n: int, gate: asyncio.Event | None = None, started: asyncio.Event | None = None):
+    for i in range(n):
+        if i == n // 2 and gate is not None:
+            if started is not None:
+                started.set()
+            await gate.wait()
+        yield sse({"type": "content", "content": f"c{i}"})
+    yield sse({"type": "done"})
+
+
+class TestParseLastEventId:
+
+    def test_valid(self):
+        assert parse_last_event_id("abc123:7") == ("abc123", 7)
+
+    def test_missing(self):
+        assert parse_last_event_id(None) == (None, 0)
+
+    def test_garbage(self):
+        assert parse_last_event_id("nope") == (None, 0)
+
+
+class TestReplay:
+
+    async def test_events_have_sequential_ids(self):
+        registry = StreamReplayRegistry()
+        stream = registry.start(chunks(3), user_id="u1")
+        events = [parse(e) for e in [e async for e in stream.subscribe()]]
+        ids = [eid for eid, _ in events]
+        assert ids == [f"{stream.generation_id}:{i}" for i in range(1, 5)]
+        assert events[-1][1]["type"] == "done"
+
+    async def test_resume_replays_missed_then_live_tail(self):
+        registry = StreamReplayRegistry()
+        gate, started = asyncio.Event(), asyncio.Event()
+        stream = registry.start(chunks(6, gate, started), user_id="u1")
+
+        # First client reads two events then "drops"
+        first = stream.subscribe()
+        seen = [parse(await first.__anext__()) for _ in range(2)]
+        await first.aclose()
+        last_id = seen[-1][0]
+
+        # Generation keeps going in the background while disconnected
+        await started.wait()
+        assert stream.subscribers == 0
+        assert not stream.done
+
+        _, after = parse_last_event_id(last_id)
+        resumed = stream.subscribe(after)
+        gate.set()
+        rest = [parse(e) async for e in resumed]
+
+        contents = [d.get("content") for _, d in seen + rest if d["type"] == "content"]
+        assert contents == [f"c{i}" for i in range(6)]
+        assert rest[-1][1]["type"] == "done"
+
+    async def test_finished_stream_is_replayable(self):
+        registry = StreamReplayRegistry()
+        stream = registry.start(chunks(2), user_id="u1")
+        await stream.task
+        replay = [parse(e) async for e in registry.get(stream.generation_id, "u1").subscribe(1)]
+        assert [d.get("content") for _, d in replay[:-1]] == ["c1"]
+
+    async def test_byte_cap_reports_gap(self):
+        registry = StreamReplayRegistry(buffer_bytes=120)
+        stream = registry.start(chunks(10), user_id="u1")
+        await stream.task
+        assert stream.buffered_bytes <= 120
+        assert stream.first_seq > 1
+        replay = [parse(e) async for e in stream.subscribe(0)]
+        assert replay[0][1]["type"] == "replay_gap"
+        assert replay[-1][1]["type"] == "done"
+
+    async def test_live_subscriber_that_falls_behind_gets_gap(self):
+        stream = GenerationStream("g1", "u1", max_bytes=120)
+        await stream.append(sse({"type": "content", "content": "c0"}))
+        live = stream.subscribe()
+        assert parse(await live.__anext__())[0] == "g1:1"
+
+        # Reader stalls while the producer overruns the byte cap
+        for i in range(1, 10):
+            await stream.append(sse({"type": "content", "content": f"c{i}"}))
+        await stream.finish()
+        rest = [parse(e) async for e in live]
+
+        _, gap = rest[0]
+        assert gap == {"type": "replay_gap", "missed_from": 2, "resumed_at": stream.first_seq}
+        assert [eid for eid, _ in rest[1:]] == [f"g1:{i}" for i in range(stream.first_seq, 11)]
+
+    async def test_other_user_cannot_resume(self):
+        registry = StreamReplayRegistry()
+        stream = registry.start(chunks(1), user_id="owner")
+        assert registry.get(stream.generation_id, "intruder") is None
+        await stream.task
+
+
+class TestLifecycle:
+
+    async def test_abandoned_generation_is_cancelled_after_grace(self):
+        registry = StreamReplayRegistry(grace_seconds=0.0)
+        gate = asyncio.Event()
+        stream = registry.start(chunks(4, gate), user_id="u1")
+        await asyncio.sleep(0.01)
+        stream.last_detached_at -= 1
+        registry.sweep()
+        await asyncio.gather(stream.task, return_exceptions=True)
+        assert stream.done
+        assert stream.cancelled
+        assert registry.get_stats()["abandoned"] == 1
+
+    async def test_expired_streams_are_swept(self):
+        registry = StreamReplayRegistry(ttl_seconds=0.0)
+        stream = registry.start(chunks(1), user_id="u1")
+        await stream.task
+        stream.finished_at -= 1
+        registry.sweep()
+        assert registry.get(stream.generation_id, "u1") is None
+
+    async def test_source_error_becomes_error_event(self):
+        async def broken():
+            yield sse({"type": "content", "content": "partial"})
+            raise RuntimeError("upstream died")
+
+        registry = StreamReplayRegistry()
+        stream = registry.start(broken(), user_id="u1")
+        events = [parse(e)[1] async for e in stream.subscribe()]
+        assert events[-1]["type"] == "error"
+
+
+class TestResumeEndpoint:
+
+    async def test_resume_rejects_unknown_stream(self):
+        from fastapi import HTTPException
+        from app.api.v1.endpoints.chat import resume_stream
+
+        with pytest.raises(HTTPException) as exc:
+            await resume_stream("does-not-exist", user_id="u1", last_event_id=None, after=None)
+        assert exc.value.status_code == 404
+
+    async def test_resume_rejects_mismatched_header(self):
+        from fastapi import HTTPException
+        from app.api.v1.endpoints.chat import resume_stream
+
+        with pytest.raises(HTTPException) as exc:
+            await resume_stream("gen-a", user_id="u1", last_event_id="gen-b:3", after=None)
+        assert exc.value.status_code == 400
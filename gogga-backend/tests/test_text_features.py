@@ -0,0 +1,242 @@
+"""
+Tests for GOGGA shared text features (single-pass classifier scan)
+
+Verifies the classifiers built on extract_features() make the same decisions
+as the per-classifier substring scans they replaced, except where a short
+keyword was only found embedded inside a longer word.
+
+Run with: pytest tests/test_text_features.py -v
+Benchmark: pytest tests/test_text_features.py -v -s -m slow
+"""
+import re
+import time
+
+import pytest
+
+from app.core.math_router import CALC_PATTERNS, MATH_KEYWORDS, MathCategory, classify_math_intent
+from app.core.router import (
+    CATEGORY_PATTERNS,
+    PatternCategory,
+    contains_african_language,
+    get_pattern_matcher,
+    is_complex_output_request,
+    is_document_analysis_request,
+    is_extended_output_request,
+    is_image_prompt,
+    _matches_complex_keywords,
+)
+from app.core.text_features import extract_features, register_vocabulary
+from app.services.optillm_enhancements import PLANNING_INDICATORS, should_use_planning
+from app.tools.document_classifier import DocumentClassifier
+from app.tools.document_definitions import DocumentDomain, DocumentIntent
+
+
+CORPUS = [
+    "Hello, how are you today?",
+    "Draw a picture of a lion at sunset over the Kruger",
+    "Generate an image of Table Mountain in watercolour",
+    "Write a comprehensive analysis of the Labour Relations Act and unfair dismissal",
+    "Sawubona, ngicela ungisize ngomsebenzi wami",
+    "Molo, ndicela uncedo nge-CV yam",
+    "Calculate the average of 12, 15, 18 and 21",
+    "What is the compound interest on R10 000 at 11% over 5 years?",
+    "How much tax will I pay on a salary of R450 000?",
+    "Convert 100 USD to ZAR please",
+    "Explain step by step how to register a company with CIPC",
+    "Compare and contrast a sole proprietorship and a partnership",
+    "Draft a POPIA compliant privacy policy for my online shop",
+    "Summarize the key points of this contract",
+    "Please write a detailed report on load shedding in Gauteng",
+    "Translate this letter into Zulu",
+    "Review my cover letter for a graduate position",
+    "Create a business plan for a spaza shop in Soweto",
+    "What's the weather like in Durban?",
+    "Write a thesis chapter on municipal service delivery",
+    "Analyze this document and list the legal requirements",
+    "Can you help me with my CCMA case against my employer?",
+    "Tell me a joke about braai",
+    "Make a simple invoice template",
+    "Dumela, ke kopa thuso ka kgwebo ya ka",
+    "Goeie môre, hoe gaan dit met jou?",
+]
+
+
+# -----------------------------------------------------------------------------
+# Legacy implementations (one substring scan per classifier)
+# -----------------------------------------------------------------------------
+
+def legacy_categories(message: str) -> set[PatternCategory]:
+    lower = message.lower()
+    return {c for c, patterns in CATEGORY_PATTERNS.items() if any(p.lower() in lower for p in patterns)}
+
+
+def legacy_is_image_prompt(prompt: str) -> bool:
+    start = prompt[:200].lower()
+    return any(p in start for p in CATEGORY_PATTERNS[PatternCategory.IMAGE])
+
+
+def legacy_math(message: str) -> tuple[MathCategory, float]:
+    lower = message.lower()
+    best, confidence = MathCategory.NONE, 0.0
+    for name, keywords in MATH_KEYWORDS.items():
+        matches = sum(1 for kw in keywords if kw in lower)
+        if matches and min(matches / 3, 1.0) > confidence:
+            best, confidence = MathCategory(name), min(matches / 3, 1.0)
+    for pattern in CALC_PATTERNS:
+        if re.search(pattern, lower):
+            if best == MathCategory.NONE:
+                best, confidence = MathCategory.STATISTICS, 0.5
+            else:
+                confidence = min(confidence + 0.2, 1.0)
+            break
+    return best, confidence
+
+
+def legacy_document(content: str) -> tuple:
+    lower = content.lower()
+    cls = DocumentClassifier
+    scores, matched = {}, {}
+    for domain, triggers in cls.DOMAIN_TRIGGERS.items():
+        hits = [t for t in triggers if t in lower]
+        if hits:
+            scores[domain] = sum(triggers[t] for t in hits)
+            matched[domain] = hits
+    domain = max(scores, key=lambda d: scores[d]) if scores else DocumentDomain.GENERAL
+    intent = next(
+        (i for i, patterns in cls.INTENT_PATTERNS.items()
+         if any(re.search(p, lower, re.IGNORECASE) for p in patterns)),
+        DocumentIntent.CREATE,
+    )
+    mandatory = any(t in lower for t in cls.MANDATORY_235B)
+    return domain, tuple(matched.get(domain, [])), intent, mandatory
+
+
+def legacy_planning(message: str) -> bool:
+    lower = message.lower()
+    return any(i in lower for i in PLANNING_INDICATORS)
+
+
+def document_decisions(content: str) -> tuple:
+    features = extract_features(content)
+    domain, _, triggers = DocumentClassifier._detect_domain(features)
+    intent = DocumentClassifier._detect_intent(features)
+    mandatory = features.any("document.mandatory_235b")
+    return domain, tuple(triggers), intent, mandatory
+
+
+class TestEquivalence:
+    """Same decisions as the legacy scans on ordinary messages."""
+
+    @pytest.mark.parametrize("message", CORPUS)
+    def test_router_categories(self, message):
+        assert get_pattern_matcher().find_categories(message) == legacy_categories(message)
+        assert is_image_prompt(message) == legacy_is_image_prompt(message)
+
+    @pytest.mark.parametrize("message", CORPUS)
+    def test_math_intent(self, message):
+        intent = classify_math_intent(message)
+        assert (intent.category, intent.confidence) == legacy_math(message)
+
+    @pytest.mark.parametrize("message", CORPUS)
+    def test_document_classifier(self, message):
+        assert document_decisions(message) == legacy_document(message)
+
+    @pytest.mark.parametrize("message", CORPUS)
+    def test_planning(self, message):
+        assert should_use_planning(message) == legacy_planning(message)
+
+
+class TestWordBoundaries:
+    """Short keywords no longer fire inside longer words."""
+
+    def test_africa_is_not_complex(self):
+        assert not _matches_complex_keywords("Tell me about South Africa")
+
+    def test_fewer_is_not_a_bantu_language(self):
+        assert not contains_african_language("I want fewer meetings")
+
+    def test_private_is_not_vat(self):
+        assert classify_math_intent("Is my private info safe?").category == MathCategory.NONE
+
+    def test_finance_is_not_nca(self):
+        triggers = DocumentClassifier.classify("Write a finance summary", "en").triggers_matched
+        assert "nca" not in triggers
+
+    def test_suffixes_still_match(self):
+        assert classify_math_intent("What VAT do I charge?").category == MathCategory.TAX
+        assert classify_math_intent("How do PAYE's deductions work?").category == MathCategory.TAX
+
+    def test_long_patterns_keep_substring_semantics(self):
+        assert should_use_planning("I need the legalities explained")
+
+
+class TestTextFeatures:
+
+    def test_features_are_cached_per_message(self):
+        assert extract_features("Howzit bru") is extract_features("Howzit bru")
+
+    def test_within_limits_match_position(self):
+        prompt = "x" * 250 + " draw a cat"
+        assert not is_image_prompt(prompt)
+        assert is_image_prompt("draw a cat " + "x" * 250)
+
+    def test_words_match_language_detector_tokenizer(self):
+        text = "Ngiyabonga, it's lekker!"
+        assert list(extract_features(text).words) == re.findall(r"\b[a-zA-Z']+\b", text.lower())
+
+    def test_registering_vocabulary_invalidates_cache(self):
+        before = extract_features("the shongololo crawled")
+        register_vocabulary("test.millipede", {"shongololo"})
+        after = extract_features("the shongololo crawled")
+        assert after is not before
+        assert after.any("test.millipede")
+        assert after.matched("test.millipede") == ["shongololo"]
+
+    def test_helpers_share_one_scan(self):
+        message = "Please write a full comprehensive analysis of POPIA step by step"
+        extract_features.cache_clear()
+        for check in (
+            is_extended_output_request, is_complex_output_request,
+            is_document_analysis_request, _matches_complex_keywords,
+            contains_african_language, should_use_planning,
+        ):
+            check(message)
+        classify_math_intent(message)
+        DocumentClassifier.classify(message, "en")
+        info = extract_features.cache_info()
+        assert info.misses == 1
+        assert info.hits >= 7
+
+
+@pytest.mark.slow
+class TestRoutingOverheadBenchmark:
+    """Per-message classifier overhead: legacy scans vs one shared scan."""
+
+    def test_unified_vs_legacy(self):
+        messages = CORPUS * 40
+
+        def legacy(message):
+            legacy_categories(message)
+            legacy_math(message)
+            legacy_document(message)
+            legacy_planning(message)
+
+        def unified(message):
+            extract_features.cache_clear()  # Count the scan on every message
+            get_pattern_matcher().find_categories(message)
+            classify_math_intent(message)
+            document_decisions(message)
+            should_use_planning(message)
+
+        timings = {}
+        for name, fn in (("legacy", legacy), ("unified", unified)):
+            fn(messages[0])
+            start = time.perf_counter()
+            for message in messages:
+                fn(message)
+            timings[name] = (time.perf_counter() - start) / len(messages) * 1e6
+
+        print(f"\n   classifier overhead per message | legacy: {timings['legacy']:.1f}µs"
+              f" | unified: {timings['unified']:.1f}µs"
+              f" ({timings['legacy'] / timings['unified']:.1f}x)")
+        assert timings["unified"] < timings["legacy"]
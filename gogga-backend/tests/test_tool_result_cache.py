@@ -0,0 +1,197 @@
+"""
+Tests for the two-tier tool result cache (LRU + Redis, single-flight)
+
+Run with: pytest tests/test_tool_result_cache.py -v
+"""
+import asyncio
+import fnmatch
+import time
+
+import pytest
+
+from app.services import tool_result_cache
+from app.services.tool_result_cache import ToolResultCache, is_cacheable
+
+
+class LocalRedis:
+    """In-memory stand-in for redis.asyncio (the commands the cache uses)."""
+
+    def __init__(self):
+        self.data: dict[str, tuple[float, str]] = {}
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    async def get(self, key):
+        self._check()
+        entry = self.data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    async def setex(self, key, ttl, value):
+        self._check()
+        self.data[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, *keys):
+        self._check()
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def scan_iter(self, pattern):
+        self._check()
+        for key in list(self.data):
+            if fnmatch.fnmatch(key, pattern):
+                yield key
+
+
+def counting(result, delay=0.0):
+    """Async tool stand-in that records how often it ran."""
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+
+    return execute, calls
+
+
+class TestTiers:
+
+    async def test_local_hit_skips_execution(self):
+        cache = ToolResultCache()
+        execute, calls = counting({"success": True, "value": 42})
+        for _ in range(3):
+            assert await cache.get_or_execute("math_sa_tax", {"income": 1}, execute) == {"success": True, "value": 42}
+        assert len(calls) == 1
+        stats = cache.get_stats()
+        assert (stats["hits_local"], stats["misses"], stats["executions"]) == (2, 1, 1)
+
+    async def test_shared_tier_serves_other_workers(self):
+        redis = LocalRedis()
+        worker_a = ToolResultCache(redis=redis)
+        worker_b = ToolResultCache(redis=redis)
+        execute, calls = counting({"success": True, "context": "results"})
+        await worker_a.get_or_execute("web_search", {"query": "load shedding"}, execute)
+        assert await worker_b.get_or_execute("web_search", {"query": "load shedding"}, execute) == {
+            "success": True, "context": "results"
+        }
+        assert len(calls) == 1
+        assert worker_b.get_stats()["hits_remote"] == 1
+        # Promoted into worker B's local tier
+        await worker_b.get("web_search", {"query": "load shedding"})
+        assert worker_b.get_stats()["hits_local"] == 1
+
+    async def test_keys_are_namespaced(self):
+        redis = LocalRedis()
+        cache = ToolResultCache(redis=redis)
+        await cache.set("weather", {"lat": 1, "lon": 2}, {"temp": 20})
+        [key] = redis.data
+        assert key.startswith("tool:weather:")
+        assert await cache.clear_all()
+        assert not redis.data
+        assert await cache.get("weather", {"lat": 1, "lon": 2}) is None
+
+    async def test_lru_is_bounded(self):
+        cache = ToolResultCache(max_entries=2)
+        for i in range(5):
+            await cache.set("math_conversion", {"value": i}, {"success": True})
+        assert cache.get_stats()["local_entries"] == 2
+        assert await cache.get("math_conversion", {"value": 4}) is not None
+        assert await cache.get("math_conversion", {"value": 0}) is None
+
+    async def test_entries_expire(self, monkeypatch):
+        cache = ToolResultCache()
+        await cache.set("web_search", {"query": "x"}, {"success": True}, ttl_seconds=1)
+        now = time.monotonic()
+        monkeypatch.setattr(tool_result_cache.time, "monotonic", lambda: now + 2)
+        assert await cache.get("web_search", {"query": "x"}) is None
+
+    async def test_failures_are_not_cached(self):
+        cache = ToolResultCache()
+        execute, calls = counting({"success": False, "error": "Serper timeout"})
+        await cache.get_or_execute("web_search", {"query": "x"}, execute)
+        await cache.get_or_execute("web_search", {"query": "x"}, execute)
+        assert len(calls) == 2
+        assert not is_cacheable({"success": False})
+        assert is_cacheable({"temperature": 21})
+        assert not is_cacheable(object())
+
+    async def test_redis_outage_falls_back_to_local_tier(self):
+        redis = LocalRedis()
+        redis.fail = True
+        cache = ToolResultCache(redis=redis)
+        execute, calls = counting({"success": True})
+        await cache.get_or_execute("web_search", {"query": "x"}, execute)
+        await cache.get_or_execute("web_search", {"query": "x"}, execute)
+        assert len(calls) == 1
+        stats = cache.get_stats()
+        assert stats["remote_errors"] == 1
+        assert not stats["remote_available"]
+
+
+class TestSingleFlight:
+
+    async def test_concurrent_misses_share_one_execution(self):
+        cache = ToolResultCache()
+        execute, calls = counting({"success": True, "context": "serper"}, delay=0.05)
+        results = await asyncio.gather(*(
+            cache.get_or_execute("web_search", {"query": "braai recipes"}, execute)
+            for _ in range(10)
+        ))
+        assert len(calls) == 1
+        assert all(r == {"success": True, "context": "serper"} for r in results)
+        assert cache.get_stats()["coalesced"] == 9
+
+    async def test_errors_reach_every_waiter(self):
+        cache = ToolResultCache()
+
+        async def explode():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            *(cache.get_or_execute("web_search", {"query": "x"}, explode) for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.get_stats()["inflight"] == 0
+
+    async def test_cancelled_leader_hands_over(self):
+        cache = ToolResultCache()
+        execute, calls = counting({"success": True}, delay=0.05)
+        leader = asyncio.create_task(cache.get_or_execute("web_search", {"query": "x"}, execute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_execute("web_search", {"query": "x"}, execute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == {"success": True}
+        assert len(calls) == 2
+
+
+class TestAdoption:
+
+    async def test_math_tool_results_are_cached(self, monkeypatch):
+        from app.tools.executor import execute_math_tool
+
+        monkeypatch.setattr(tool_result_cache, "_tool_cache", ToolResultCache())
+        args = {"operation": "summary", "data": [1, 2, 3, 4]}
+        first = await execute_math_tool("math_statistics", args)
+        second = await execute_math_tool("math_statistics", args)
+        assert isinstance(first, dict) and isinstance(second, dict)
+        assert first == second
+        assert first["success"] is True and first["type"] == "math"
+        assert first["data"]["mean"] == 2.5
+        assert tool_result_cache.get_tool_result_cache().get_stats()["hits_local"] == 1
+
+    async def test_fraud_analysis_cache_is_per_tier(self, monkeypatch):
+        from app.tools.executor import execute_math_tool
+
+        monkeypatch.setattr(tool_result_cache, "_tool_cache", ToolResultCache())
+        args = {"operation": "benfords_law", "data": list(range(1, 200))}
+        await execute_math_tool("math_fraud_analysis", args, tier="jigga")
+        denied = await execute_math_tool("math_fraud_analysis", args, tier="free")
+        assert not denied["success"]
@@ -0,0 +1,245 @@
+"""
+Tests for GOGGA Usage Ledger (write-ahead log with batched delivery)
+
+Run with: pytest tests/test_usage_ledger.py -v
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.services import cost_tracker
+from app.services.usage_ledger import UsageLedger
+
+ENDPOINT = "https://frontend:3000/api/usage/log"
+
+
+def usage(user: str = "u1", tokens: int = 100) -> dict:
+    return {"userId": user, "promptTokens": tokens, "completionTokens": 10, "model": "qwen-3-32b",
+            "provider": "cerebras", "endpoint": "chat", "tier": "jive"}
+
+
+class FakeFrontend:
+    """Idempotent /api/usage/log: stores each record id once, can be taken down."""
+
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+        self.posts: list[int] = []
+        self.down = False
+        self.status: int | None = None  # Answer every batch with this status instead
+        self.failing: set[str] = set()  # Users whose records fail to store
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if self.down:
+            return httpx.Response(503)
+        records = json.loads(request.content)["records"]
+        self.posts.append(len(records))
+        if self.status is not None:
+            return httpx.Response(self.status, json={"error": "nope"})
+        rejected = [r["id"] for r in records if not r.get("userId")]
+        failed = [r["id"] for r in records if r.get("userId") in self.failing]
+        duplicates = [r["id"] for r in records if r["id"] in self.rows]
+        for record in records:
+            if record.get("userId") and record["id"] not in failed:
+                self.rows.setdefault(record["id"], record)
+        return httpx.Response(200, json={
+            "success": True, "duplicates": duplicates, "rejected": rejected, "failed": failed,
+        })
+
+
+def make_ledger(tmp_path, frontend: FakeFrontend, **options) -> UsageLedger:
+    options.setdefault("ship_interval", 0.01)
+    options.setdefault("fsync_interval", 0.01)
+    ledger = UsageLedger(tmp_path / "wal", ENDPOINT, **options)
+    ledger._client = httpx.AsyncClient(transport=httpx.MockTransport(frontend.handler))
+    return ledger
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+class TestLog:
+
+    def test_record_returns_id_without_network(self, tmp_path):
+        ledger = UsageLedger(tmp_path / "wal", "http://unreachable.invalid/api/usage/log")
+        record_id = ledger.record(usage())
+        assert len(record_id) == 32
+        assert ledger.get_stats()["pending"] == 1
+        ledger.sync()
+        [segment] = (tmp_path / "wal").iterdir()
+        line = json.loads(segment.read_text().splitlines()[0])
+        assert line["r"]["id"] == record_id and line["r"]["recordedAt"]
+
+    def test_replay_restores_unacked_records_only(self, tmp_path):
+        ledger = UsageLedger(tmp_path / "wal", ENDPOINT)
+        ids = [ledger.record(usage(tokens=i)) for i in range(5)]
+        ledger.acknowledge(ids[:2])
+        ledger.sync()
+        ledger._file.close()
+
+        reopened = UsageLedger(tmp_path / "wal", ENDPOINT)
+        reopened._open()
+        assert list(reopened._pending) == ids[2:]
+        assert reopened.get_stats()["replayed"] == 3
+
+    def test_torn_last_line_is_ignored(self, tmp_path):
+        ledger = UsageLedger(tmp_path / "wal", ENDPOINT)
+        record_id = ledger.record(usage())
+        ledger.sync()
+        ledger._file.write(b'{"r":{"id":"half')
+        ledger._file.close()
+
+        reopened = UsageLedger(tmp_path / "wal", ENDPOINT)
+        reopened._open()
+        assert list(reopened._pending) == [record_id]
+
+    def test_acknowledged_segments_are_deleted(self, tmp_path):
+        ledger = UsageLedger(tmp_path / "wal", ENDPOINT, segment_bytes=1000)
+        ids = [ledger.record(usage(tokens=i)) for i in range(30)]
+        assert len(list((tmp_path / "wal").iterdir())) > 3
+        ledger.acknowledge(ids[:-1])
+        # Only the segment still holding the last record (and the active one) remain
+        assert len(list((tmp_path / "wal").iterdir())) <= 2
+        assert ledger.get_stats()["pending"] == 1
+
+
+class TestShipping:
+
+    @pytest.mark.asyncio
+    async def test_batches_are_shipped_in_background(self, tmp_path):
+        frontend = FakeFrontend()
+        ledger = make_ledger(tmp_path, frontend, batch_size=10)
+        await ledger.start()
+        ids = [ledger.record(usage(tokens=i)) for i in range(25)]
+        await wait_for(lambda: len(frontend.rows) == 25)
+        assert set(frontend.rows) == set(ids)
+        assert max(frontend.posts) == 10 and len(frontend.posts) < 25
+        await ledger.stop()
+        assert ledger.get_stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_frontend_outage_retries_without_loss(self, tmp_path):
+        frontend = FakeFrontend()
+        frontend.down = True
+        ledger = make_ledger(tmp_path, frontend)
+        with patch("app.services.usage_ledger.RETRY_SECONDS", 0.01):
+            await ledger.start()
+            ids = [ledger.record(usage(tokens=i)) for i in range(5)]
+            await wait_for(lambda: ledger.get_stats()["failures"] >= 2)
+            frontend.down = False
+            await wait_for(lambda: len(frontend.rows) == 5)
+            await ledger.stop()
+        assert set(frontend.rows) == set(ids)
+
+    @pytest.mark.asyncio
+    async def test_restart_ships_leftovers_exactly_once(self, tmp_path):
+        frontend = FakeFrontend()
+        frontend.down = True
+        ledger = make_ledger(tmp_path, frontend)
+        ids = [ledger.record(usage(tokens=i)) for i in range(4)]
+        await ledger.stop(timeout=0.1)  # Shutdown while the frontend is down
+        assert frontend.rows == {}
+
+        frontend.down = False
+        restarted = make_ledger(tmp_path, frontend)
+        await restarted.start()
+        await wait_for(lambda: len(frontend.rows) == 4)
+        await restarted.stop()
+        assert set(frontend.rows) == set(ids)
+        assert sum(frontend.posts) == 4  # Nothing resent
+
+        again = make_ledger(tmp_path, frontend)
+        await again.start()
+        assert again.get_stats()["replayed"] == 0
+        await again.stop()
+
+    @pytest.mark.asyncio
+    async def test_resend_after_lost_response_is_idempotent(self, tmp_path):
+        frontend = FakeFrontend()
+        ledger = make_ledger(tmp_path, frontend)
+        ids = [ledger.record(usage(tokens=i)) for i in range(3)]
+        # Frontend stored the batch but the ack was lost (crash before ack line)
+        for record in list(ledger._pending.values()):
+            frontend.rows[record["id"]] = record
+        await ledger.ship_once()
+        assert len(frontend.rows) == 3 and set(frontend.rows) == set(ids)
+        assert ledger.get_stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_rejected_records_do_not_block_the_queue(self, tmp_path):
+        frontend = FakeFrontend()
+        ledger = make_ledger(tmp_path, frontend)
+        ledger.record({**usage(), "userId": ""})
+        good = ledger.record(usage())
+        assert await ledger.ship_once() == 2
+        assert list(frontend.rows) == [good]
+        assert ledger.get_stats()["rejected"] == 1
+        await ledger.stop()
+
+    @pytest.mark.asyncio
+    async def test_client_error_drops_the_batch(self, tmp_path):
+        frontend = FakeFrontend()
+        frontend.status = 400
+        ledger = make_ledger(tmp_path, frontend, batch_size=2)
+        for i in range(3):
+            ledger.record(usage(tokens=i))
+        assert await ledger.ship_once() == 2
+        stats = ledger.get_stats()
+        assert stats["pending"] == 1 and stats["rejected"] == 2 and stats["shipped"] == 0
+
+        frontend.status = None
+        assert await ledger.ship_once() == 1
+        assert len(frontend.rows) == 1
+        await ledger.stop()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("status", [500, 401, 429])
+    async def test_server_and_auth_errors_are_retried(self, tmp_path, status):
+        frontend = FakeFrontend()
+        frontend.status = status
+        ledger = make_ledger(tmp_path, frontend)
+        ledger.record(usage())
+        with pytest.raises(httpx.HTTPStatusError):
+            await ledger.ship_once()
+        assert ledger.get_stats()["pending"] == 1 and ledger.get_stats()["rejected"] == 0
+        await ledger.stop(timeout=0.1)
+
+    @pytest.mark.asyncio
+    async def test_failed_records_go_to_the_back_of_the_queue(self, tmp_path):
+        frontend = FakeFrontend()
+        frontend.failing = {"bad"}
+        ledger = make_ledger(tmp_path, frontend, batch_size=2)
+        stuck = ledger.record(usage(user="bad"))
+        first = ledger.record(usage())
+        second = ledger.record(usage(user="u2"))
+        assert await ledger.ship_once() == 1
+        assert await ledger.ship_once() == 1  # The next batch starts with the record behind it
+        assert set(frontend.rows) == {first, second}
+        assert [r["id"] for r in ledger.pending_records()] == [stuck]
+
+        with pytest.raises(httpx.HTTPError):  # Nothing stored: the loop backs off
+            await ledger.ship_once()
+        frontend.failing = set()
+        assert await ledger.ship_once() == 1
+        assert ledger.get_stats()["pending"] == 0
+        await ledger.stop()
+
+
+class TestCostTracker:
+
+    @pytest.mark.asyncio
+    async def test_track_usage_records_to_ledger(self, tmp_path):
+        ledger = UsageLedger(tmp_path / "wal", "http://unreachable.invalid/api/usage/log")
+        with patch.object(cost_tracker, "get_usage_ledger", return_value=ledger):
+            cost = await cost_tracker.track_usage("u1", "qwen-3-32b", "jive_text", 1000, 200, tier="jive")
+        [record] = ledger._pending.values()
+        assert record["userId"] == "u1" and record["promptTokens"] == 1000
+        assert record["completionTokens"] == 200 and record["tier"] == "JIVE"
+        assert cost["usd"] > 0
@@ -11,6 +11,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { auth } from '@/auth'
 import { prisma } from '@/lib/prisma'
+import { invalidateBackendEntitlements } from '@/lib/entitlements'
 
 interface AdjustmentRequest {
   userId: string;
@@ -130,6 +131,8 @@ export async function POST(request: NextRequest) {
       return { user: updatedUser, adjustment }
     })
 
+    invalidateBackendEntitlements({ userId: result.user.id, email: result.user.email })
+
     return NextResponse.json({
       success: true,
       adjustment: {
@@ -11,6 +11,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { auth } from '@/auth'
 import { prisma } from '@/lib/prisma'
+import { invalidateBackendEntitlements } from '@/lib/entitlements'
 
 interface TierOverrideRequest {
   userId: string;
@@ -205,6 +206,8 @@ export async function POST(request: NextRequest) {
       return { user: updatedUser, subscription, oldTier }
     })
 
+    invalidateBackendEntitlements({ userId: result.user.id, email: result.user.email })
+
     return NextResponse.json({
       success: true,
       override: {
@@ -11,10 +11,18 @@
  * - Atomic transactions for credit deductions
  * - Full audit trail via UsageEvent model
  * 
+ * The backend settles chat requests locally against a reservation and ships
+ * the settlements in batches as {"records": [...]}; each record's id is its
+ * idempotency key, so a batch resent after a timeout skips records already
+ * applied. Settlements that can never apply come back as rejected and
+ * those that failed for another reason as failed (the ledger retries them
+ * later), so one bad record never fails the whole batch. Single-request
+ * posts are still accepted.
+ *
  * Requires INTERNAL_API_KEY authorization.
  */
 import { NextRequest, NextResponse } from 'next/server'
-import { prisma } from '@/lib/prisma'
+import { prisma, isInvalidRecordError } from '@/lib/prisma'
 
 type ActionType = 
   | 'chat_10k_tokens'
@@ -39,6 +47,8 @@ interface DeductRequest {
   durationMs?: number;      // Request duration
 }
 
+class UnknownUserError extends Error {}
+
 // Credit costs per action
 const CREDIT_COSTS: Record<ActionType, number> = {
   chat_10k_tokens: 1,
@@ -49,65 +59,54 @@ const CREDIT_COSTS: Record<ActionType, number> = {
   gogga_talk_min: 1,
 };
 
-export async function POST(request: NextRequest) {
-  try {
-    // Verify internal API key
-    const authHeader = request.headers.get('x-internal-key')
-    const expectedKey = process.env.INTERNAL_API_KEY || 'dev-internal-key-change-in-production'
-    
-    if (authHeader !== expectedKey) {
-      return NextResponse.json(
-        { error: 'Unauthorized - internal API key required' },
-        { status: 401 }
-      )
-    }
+type DeductResult =
+  | { status: 'deducted'; eventId: string; creditsDeducted: number; newState: Record<string, unknown> }
+  | { status: 'duplicate'; eventId: string }
+  | { status: 'rejected'; error: string }
 
-    const body: DeductRequest = await request.json()
-    const { 
-      userId, 
-      action, 
-      quantity, 
-      source,
-      idempotencyKey,
-      requestId,
-      model,
-      provider,
-      tier,
-      durationMs,
-    } = body
-
-    if (!userId || !action || !quantity || !source) {
-      return NextResponse.json(
-        { error: 'Missing required fields: userId, action, quantity, source' },
-        { status: 400 }
-      )
-    }
+async function deductOne(body: DeductRequest & { id?: string }): Promise<DeductResult> {
+  const {
+    id,
+    userId,
+    action,
+    quantity,
+    source,
+    idempotencyKey,
+    requestId,
+    model,
+    provider,
+    tier,
+    durationMs,
+  } = body
+
+  if (!userId || !action || !quantity || !source) {
+    return { status: 'rejected', error: 'Missing required fields: userId, action, quantity, source' }
+  }
+  if (!(action in CREDIT_COSTS)) {
+    return { status: 'rejected', error: `Unknown action: ${action}` }
+  }
 
-    // Generate idempotency key if not provided
-    const finalIdempotencyKey = idempotencyKey || 
-      `${action}:${userId}:${Date.now()}:${requestId || Math.random().toString(36)}`
+  // Generate idempotency key if not provided (batched settlements use their id)
+  const finalIdempotencyKey = idempotencyKey || id ||
+    `${action}:${userId}:${Date.now()}:${requestId || Math.random().toString(36)}`
 
-    // Check for duplicate (idempotency)
-    const existingEvent = await prisma.usageEvent.findUnique({
-      where: { idempotencyKey: finalIdempotencyKey },
-    })
+  // Check for duplicate (idempotency)
+  const existingEvent = await prisma.usageEvent.findUnique({
+    where: { idempotencyKey: finalIdempotencyKey },
+  })
 
-    if (existingEvent) {
-      // Already processed - return success (idempotent)
-      console.log(`[deduct-usage] Duplicate request detected: ${finalIdempotencyKey}`)
-      return NextResponse.json({
-        success: true,
-        duplicate: true,
-        eventId: existingEvent.id,
-        message: 'Request already processed (idempotent)',
-      })
-    }
+  if (existingEvent) {
+    // Already processed - return success (idempotent)
+    console.log(`[deduct-usage] Duplicate request detected: ${finalIdempotencyKey}`)
+    return { status: 'duplicate', eventId: existingEvent.id }
+  }
 
-    // Calculate credits to deduct
-    const creditsToDeduct = source === 'credits' 
-      ? CREDIT_COSTS[action] * quantity 
-      : 0
+  // Calculate credits to deduct
+  const creditsToDeduct = source === 'credits' 
+    ? CREDIT_COSTS[action] * quantity 
+    : 0
 
+  try {
     // Atomic transaction: create event + update user
     const result = await prisma.$transaction(async (tx) => {
       // Get current user state for audit
@@ -125,12 +124,12 @@ export async function POST(request: NextRequest) {
       })
 
       if (!user) {
-        throw new Error('User not found')
+        throw new UnknownUserError()
       }
 
       // Build update based on source
       const updateData: Record<string, unknown> = {}
-      
+    
       if (source === 'subscription') {
         // Increment usage counters
         switch (action) {
@@ -195,15 +194,103 @@ export async function POST(request: NextRequest) {
       return { user: updatedUser, event: usageEvent }
     })
 
+    return {
+      status: 'deducted',
+      eventId: result.event.id,
+      creditsDeducted: creditsToDeduct,
+      newState: result.user,
+    }
+  } catch (error: any) {
+    // Unknown user (deleted account) can never succeed; don't block the batch
+    if (error instanceof UnknownUserError) {
+      return { status: 'rejected', error: 'User not found' }
+    }
+    // Concurrent delivery of the same key lost the race on the unique index
+    if (error?.code === 'P2002') {
+      const event = await prisma.usageEvent.findUnique({ where: { idempotencyKey: finalIdempotencyKey } })
+      if (event) return { status: 'duplicate', eventId: event.id }
+    }
+    if (isInvalidRecordError(error)) {
+      return { status: 'rejected', error: 'Invalid record' }
+    }
+    throw error
+  }
+}
+
+export async function POST(request: NextRequest) {
+  try {
+    // Verify internal API key
+    const authHeader = request.headers.get('x-internal-key')
+    const expectedKey = process.env.INTERNAL_API_KEY || 'dev-internal-key-change-in-production'
+    
+    if (authHeader !== expectedKey) {
+      return NextResponse.json(
+        { error: 'Unauthorized - internal API key required' },
+        { status: 401 }
+      )
+    }
+
+    const body = await request.json()
+
+    // Batch of settlements from the backend
+    if (Array.isArray(body.records)) {
+      const results: Record<string, { eventId: string; duplicate: boolean; creditsDeducted: number }> = {}
+      const rejected: string[] = []
+      const failed: string[] = []
+
+      // Sequential: SQLite has a single writer anyway
+      for (const record of body.records) {
+        let result: DeductResult
+        try {
+          result = await deductOne(record ?? {})
+        } catch (error) {
+          console.error('[deduct-usage] Failed settlement:', record?.id, error)
+          if (record?.id) failed.push(record.id)
+          continue
+        }
+        if (result.status === 'rejected') {
+          console.warn('[deduct-usage] Rejected settlement:', record?.id, result.error)
+          if (record?.id) rejected.push(record.id)
+        } else if (record.id) {
+          results[record.id] = {
+            eventId: result.eventId,
+            duplicate: result.status === 'duplicate',
+            creditsDeducted: result.status === 'deducted' ? result.creditsDeducted : 0,
+          }
+        }
+      }
+
+      return NextResponse.json({ success: true, results, rejected, failed })
+    }
+
+    const { action, quantity, source } = body as DeductRequest
+    const result = await deductOne(body)
+
+    if (result.status === 'rejected') {
+      return NextResponse.json(
+        { error: result.error },
+        { status: result.error === 'User not found' ? 500 : 400 }
+      )
+    }
+
+    if (result.status === 'duplicate') {
+      return NextResponse.json({
+        success: true,
+        duplicate: true,
+        eventId: result.eventId,
+        message: 'Request already processed (idempotent)',
+      })
+    }
+
     return NextResponse.json({
       success: true,
       duplicate: false,
-      eventId: result.event.id,
+      eventId: result.eventId,
       action,
       quantity,
       source,
-      creditsDeducted: creditsToDeduct,
-      newState: result.user,
+      creditsDeducted: result.creditsDeducted,
+      newState: result.newState,
     })
   } catch (error) {
     console.error('[deduct-usage] Error:', error)
@@ -16,6 +16,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import * as crypto from 'crypto';
 import { prisma } from '@/lib/prisma';
+import { invalidateBackendEntitlements } from '@/lib/entitlements';
 
 // PayFast IP whitelist (sandbox + production)
 const PAYFAST_IPS = [
@@ -408,6 +409,9 @@ export async function POST(request: NextRequest) {
         console.log(`PayFast ITN: Unknown status ${paymentStatus}`);
     }
 
+    // Tier, status or credits may have changed; don't let the backend serve its cached copy
+    invalidateBackendEntitlements({ userId: user.id, email: userEmail });
+
     // PayFast expects 200 OK
     return new NextResponse('OK', { status: 200 });
   } catch (error) {
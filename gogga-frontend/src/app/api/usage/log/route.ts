@@ -5,9 +5,17 @@
  * Called by the backend after each chat/enhance/image request.
  * 
  * Now includes OptiLLM-adjusted tokens and reasoning token tracking.
+ *
+ * The backend usage ledger ships batches as {"records": [...]}. Each record
+ * carries an id that becomes the Usage row id, so a batch resent after a
+ * timeout or restart skips the records already stored instead of counting
+ * them twice. Records that can never be stored come back as rejected and
+ * records that failed for another reason as failed (the ledger retries
+ * those later), so one bad record never fails the whole batch.
+ * Single-record posts are still accepted.
  */
 import { NextRequest, NextResponse } from 'next/server'
-import prisma from '@/lib/prisma'
+import prisma, { isInvalidRecordError } from '@/lib/prisma'
 import { randomUUID } from 'crypto'
 
 // Pricing per 1M tokens in USD (synchronized with backend config.py)
@@ -44,104 +52,175 @@ function calculateCostCents(model: string, inputTokens: number, outputTokens: nu
     return Math.ceil(totalCostZar * 100) // Return in ZAR cents
 }
 
+type LogResult =
+    | { status: 'logged'; id: string; costCents: number }
+    | { status: 'duplicate'; id: string }
+    | { status: 'rejected'; id?: string; error: string }
+
+async function logRecord(data: Record<string, any>): Promise<LogResult> {
+    const {
+        id,
+        userId,
+        promptTokens = 0,
+        completionTokens = 0,
+        adjustedCompletionTokens,
+        reasoningTokens = 0,
+        totalTokens = promptTokens + completionTokens,
+        model,
+        provider,
+        endpoint,
+        tier,
+        optillmLevel,
+        optillmMultiplier,
+        conversationId,
+        requestId,
+        durationMs,
+        recordedAt,
+    } = data
+
+    if (!userId || !model || !provider || !endpoint || !tier) {
+        return { status: 'rejected', id, error: 'Missing required fields: userId, model, provider, endpoint, tier' }
+    }
+
+    // Idempotency: a record already stored under this id was shipped before
+    if (id && await prisma.usage.findUnique({ where: { id }, select: { id: true } })) {
+        return { status: 'duplicate', id }
+    }
+
+    // Use adjusted tokens for cost calculation if provided, otherwise use raw
+    const tokensForCost = adjustedCompletionTokens ?? completionTokens
+    const costCents = calculateCostCents(model, promptTokens, tokensForCost)
+
+    // Bill the month the usage happened in, not the month it was delivered
+    const parsed = recordedAt ? new Date(recordedAt) : new Date()
+    const createdAt = isNaN(parsed.getTime()) ? new Date() : parsed
+    const year = createdAt.getFullYear()
+    const month = createdAt.getMonth() + 1 // 1-12
+
+    const isImage = endpoint === 'images'
+    const isEnhance = endpoint === 'enhance'
+
+    try {
+        // Usage row and monthly summary commit together, so a retry never double-counts
+        const usage = await prisma.$transaction(async (tx) => {
+            const usage = await tx.usage.create({
+                data: {
+                    id: id ?? randomUUID(),
+                    userId,
+                    promptTokens,
+                    completionTokens,
+                    adjustedCompletionTokens: adjustedCompletionTokens ?? null,
+                    reasoningTokens: reasoningTokens || null,
+                    totalTokens,
+                    costCents,
+                    model,
+                    provider,
+                    endpoint,
+                    tier,
+                    optillmLevel: optillmLevel ?? null,
+                    optillmMultiplier: optillmMultiplier ?? null,
+                    conversationId,
+                    requestId,
+                    durationMs,
+                    createdAt,
+                },
+            })
+
+            await tx.usageSummary.upsert({
+                where: {
+                    userId_year_month: { userId, year, month },
+                },
+                create: {
+                    id: randomUUID(),
+                    userId,
+                    year,
+                    month,
+                    totalTokens,
+                    promptTokens,
+                    completionTokens,
+                    totalCostCents: costCents,
+                    chatRequests: !isImage && !isEnhance ? 1 : 0,
+                    enhanceRequests: isEnhance ? 1 : 0,
+                    imageRequests: isImage ? 1 : 0,
+                    imagesUsed: isImage ? 1 : 0,
+                },
+                update: {
+                    totalTokens: { increment: totalTokens },
+                    promptTokens: { increment: promptTokens },
+                    completionTokens: { increment: completionTokens },
+                    totalCostCents: { increment: costCents },
+                    ...(!isImage && !isEnhance ? { chatRequests: { increment: 1 } } : {}),
+                    ...(isEnhance ? { enhanceRequests: { increment: 1 } } : {}),
+                    ...(isImage ? { imageRequests: { increment: 1 } } : {}),
+                    ...(isImage ? { imagesUsed: { increment: 1 } } : {}),
+                },
+            })
+
+            return usage
+        })
+
+        return { status: 'logged', id: usage.id, costCents }
+    } catch (error: any) {
+        // Concurrent delivery of the same id lost the race on the primary key
+        if (id && error?.code === 'P2002') {
+            return { status: 'duplicate', id }
+        }
+        // Unknown user (deleted account) can never succeed; don't block the batch
+        if (error?.code === 'P2003') {
+            return { status: 'rejected', id, error: 'Unknown user' }
+        }
+        if (isInvalidRecordError(error)) {
+            return { status: 'rejected', id, error: 'Invalid record' }
+        }
+        throw error
+    }
+}
+
 export async function POST(request: NextRequest) {
     try {
         const data = await request.json()
 
-        const {
-            userId,
-            promptTokens = 0,
-            completionTokens = 0,
-            adjustedCompletionTokens,
-            reasoningTokens = 0,
-            totalTokens = promptTokens + completionTokens,
-            model,
-            provider,
-            endpoint,
-            tier,
-            optillmLevel,
-            optillmMultiplier,
-            conversationId,
-            requestId,
-            durationMs,
-        } = data
-
-        if (!userId || !model || !provider || !endpoint || !tier) {
-            return NextResponse.json(
-                { error: 'Missing required fields: userId, model, provider, endpoint, tier' },
-                { status: 400 }
-            )
+        // Batch from the backend usage ledger
+        if (Array.isArray(data.records)) {
+            const logged: string[] = []
+            const duplicates: string[] = []
+            const rejected: string[] = []
+            const failed: string[] = []
+
+            // Sequential: SQLite has a single writer anyway
+            for (const record of data.records) {
+                let result: LogResult
+                try {
+                    result = await logRecord(record ?? {})
+                } catch (error) {
+                    console.error('[usage/log] Failed record:', record?.id, error)
+                    if (record?.id) failed.push(record.id)
+                    continue
+                }
+                if (result.status === 'logged') {
+                    logged.push(result.id)
+                } else if (result.status === 'duplicate') {
+                    duplicates.push(result.id)
+                } else {
+                    console.warn('[usage/log] Rejected record:', result.id, result.error)
+                    if (result.id) rejected.push(result.id)
+                }
+            }
+
+            return NextResponse.json({ success: true, logged, duplicates, rejected, failed })
         }
 
-        // Use adjusted tokens for cost calculation if provided, otherwise use raw
-        const tokensForCost = adjustedCompletionTokens ?? completionTokens
-        const costCents = calculateCostCents(model, promptTokens, tokensForCost)
-
-        // Create usage record with OptiLLM fields
-        const usage = await prisma.usage.create({
-            data: {
-                id: randomUUID(),
-                userId,
-                promptTokens,
-                completionTokens,
-                adjustedCompletionTokens: adjustedCompletionTokens ?? null,
-                reasoningTokens: reasoningTokens || null,
-                totalTokens,
-                costCents,
-                model,
-                provider,
-                endpoint,
-                tier,
-                optillmLevel: optillmLevel ?? null,
-                optillmMultiplier: optillmMultiplier ?? null,
-                conversationId,
-                requestId,
-                durationMs,
-            },
-        })
+        const result = await logRecord(data)
 
-        // Update monthly summary (upsert)
-        const now = new Date()
-        const year = now.getFullYear()
-        const month = now.getMonth() + 1 // 1-12
-
-        const isImage = endpoint === 'images'
-        const isEnhance = endpoint === 'enhance'
-
-        await prisma.usageSummary.upsert({
-            where: {
-                userId_year_month: { userId, year, month },
-            },
-            create: {
-                id: randomUUID(),
-                userId,
-                year,
-                month,
-                totalTokens,
-                promptTokens,
-                completionTokens,
-                totalCostCents: costCents,
-                chatRequests: !isImage && !isEnhance ? 1 : 0,
-                enhanceRequests: isEnhance ? 1 : 0,
-                imageRequests: isImage ? 1 : 0,
-                imagesUsed: isImage ? 1 : 0,
-            },
-            update: {
-                totalTokens: { increment: totalTokens },
-                promptTokens: { increment: promptTokens },
-                completionTokens: { increment: completionTokens },
-                totalCostCents: { increment: costCents },
-                ...(!isImage && !isEnhance ? { chatRequests: { increment: 1 } } : {}),
-                ...(isEnhance ? { enhanceRequests: { increment: 1 } } : {}),
-                ...(isImage ? { imageRequests: { increment: 1 } } : {}),
-                ...(isImage ? { imagesUsed: { increment: 1 } } : {}),
-            },
-        })
+        if (result.status === 'rejected') {
+            return NextResponse.json({ error: result.error }, { status: 400 })
+        }
 
         return NextResponse.json({
             success: true,
-            id: usage.id,
-            costCents,
+            id: result.id,
+            costCents: result.status === 'logged' ? result.costCents : 0,
+            duplicate: result.status === 'duplicate',
         })
     } catch (error) {
         console.error('[usage/log] Error:', error)
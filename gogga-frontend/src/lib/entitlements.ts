@@ -0,0 +1,27 @@
+/**
+ * GOGGA - Backend Entitlement Cache Invalidation (Server-Side)
+ *
+ * The backend caches subscription and credit lookups for a few seconds so
+ * paid requests don't pay two round trips to this app before the first token.
+ * Call this after changing a user's tier, status or credit balance so the
+ * next request sees the change immediately instead of after the TTL.
+ *
+ * Fire-and-forget: a failed call only means the cache expires on its own.
+ */
+
+const BACKEND_URL = process.env.BACKEND_URL || 'http://localhost:8000'
+const INTERNAL_API_KEY = process.env.INTERNAL_API_KEY || 'dev-internal-key-change-in-production'
+
+export function invalidateBackendEntitlements(user: { userId?: string; email?: string | null }): void {
+  fetch(`${BACKEND_URL}/api/v1/entitlements/invalidate`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-Internal-Key': INTERNAL_API_KEY,
+    },
+    body: JSON.stringify({ userId: user.userId, email: user.email ?? undefined }),
+    signal: AbortSignal.timeout(2000),
+  }).catch((error) => {
+    console.warn('[entitlements] Backend invalidation failed:', error)
+  })
+}
@@ -88,4 +88,17 @@ export async function withRetry<T>(
   throw new Error('Transaction retry loop exited unexpectedly')
 }
 
+// Query errors caused by the data itself (too long, wrong type, null in a
+// required column, ...): the same record will fail the same way every time
+const INVALID_DATA_CODES = new Set(['P2000', 'P2005', 'P2006', 'P2007', 'P2011', 'P2012', 'P2019', 'P2020'])
+
+/**
+ * Whether a Prisma error means the record itself is invalid
+ * (as opposed to a transient database problem worth retrying)
+ */
+export function isInvalidRecordError(error: unknown): boolean {
+  if (error instanceof Prisma.PrismaClientValidationError) return true
+  return error instanceof Prisma.PrismaClientKnownRequestError && INVALID_DATA_CODES.has(error.code)
+}
+
 export default prisma